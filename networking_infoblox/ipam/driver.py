@@ -17,6 +17,7 @@ import functools
 import netaddr
 import sys
 
+from neutron_lib import constants as n_const
 from neutron_lib.plugins import directory
 from oslo_log import log as logging
 from oslo_utils import excutils
@@ -32,12 +33,15 @@ from infoblox_client import objects as ib_objects
 from networking_infoblox._i18n import _LE
 from networking_infoblox._i18n import _LW
 from networking_infoblox.ipam import requests
+from networking_infoblox.neutron.common import config as cfg
 from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import context as ib_context
 from networking_infoblox.neutron.common import dns
+from networking_infoblox.neutron.common import dns_binding
 from networking_infoblox.neutron.common import exceptions as exc
 from networking_infoblox.neutron.common import grid
 from networking_infoblox.neutron.common import ipam
+from networking_infoblox.neutron.common import metrics
 from networking_infoblox.neutron.db import infoblox_db as dbi
 
 
@@ -56,6 +60,18 @@ def catch_ib_client_exception(f):
     return func
 
 
+def record_metrics(f):
+    @functools.wraps(f)
+    def func(*args, **kwargs):
+        with metrics.IPAM_DRIVER_SECONDS.time(operation=f.__name__):
+            try:
+                return f(*args, **kwargs)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    metrics.IPAM_DRIVER_ERRORS.inc(operation=f.__name__)
+    return func
+
+
 def rollback_wrapper(f):
     @functools.wraps(f)
     def rollback(*args, **kwargs):
@@ -86,11 +102,14 @@ class InfobloxPool(subnet_alloc.SubnetAllocator):
     @catch_ib_client_exception
     def __init__(self, subnetpool, context):
         super(InfobloxPool, self).__init__(subnetpool, context)
+        metrics.start_http_server(cfg.CONF.infoblox.ipam_driver_metrics_port,
+                                  cfg.CONF.infoblox.metrics_bind_host)
         self._plugin = directory.get_plugin()
         self._grid_manager = grid.GridManager(self._context)
         self._grid_manager.get_config()
         self._grid_config = self._grid_manager.grid_config
 
+    @record_metrics
     @catch_ib_client_exception
     def get_subnet(self, subnet_id):
         """Retrieve an IPAM subnet.
@@ -130,6 +149,7 @@ class InfobloxPool(subnet_alloc.SubnetAllocator):
     def _fetch_subnet(self, subnet_id):
         return self._plugin.get_subnet(self._context, subnet_id)
 
+    @record_metrics
     @catch_ib_client_exception
     @rollback_wrapper
     def allocate_subnet(self, rollback_list, subnet_request):
@@ -176,9 +196,8 @@ class InfobloxPool(subnet_alloc.SubnetAllocator):
         ipam_controller = ipam.IpamSyncController(ib_cxt)
         dns_controller = dns.DnsController(ib_cxt)
 
-        ib_network = self._create_ib_network(rollback_list, ipam_controller)
-        if ib_network:
-            dns_controller.create_dns_zones(rollback_list)
+        ib_network = self._create_ib_network(rollback_list, ipam_controller,
+                                             dns_controller)
 
         return InfobloxSubnet(subnet_request, neutron_subnet, ib_network,
                               ib_cxt)
@@ -198,13 +217,14 @@ class InfobloxPool(subnet_alloc.SubnetAllocator):
                 'dns_nameservers': subnet_request.dns_nameservers}
 
     @staticmethod
-    def _create_ib_network(rollback_list, ipam_controller):
+    def _create_ib_network(rollback_list, ipam_controller, dns_controller):
         ib_network = None
         retry = 1
         while True:
             try:
                 LOG.info("Attempting to create ib network...")
-                ib_network = ipam_controller.create_subnet(rollback_list)
+                ib_network = ipam_controller.create_subnet(rollback_list,
+                                                           dns_controller)
                 LOG.info("Successfully created ib network.")
                 break
             except ib_exc.InfobloxMemberAlreadyAssigned:
@@ -217,6 +237,7 @@ class InfobloxPool(subnet_alloc.SubnetAllocator):
                                "to server the current subnet.")
         return ib_network
 
+    @record_metrics
     @catch_ib_client_exception
     @rollback_wrapper
     def update_subnet(self, rollback_list, subnet_request):
@@ -264,6 +285,7 @@ class InfobloxPool(subnet_alloc.SubnetAllocator):
                     old_subnet_name != new_subnet_name)
         return False
 
+    @record_metrics
     @catch_ib_client_exception
     def remove_subnet(self, subnet_id):
         """Remove IPAM Subnet.
@@ -367,6 +389,7 @@ class InfobloxSubnet(driver.Subnet):
                        'network': self._neutron_subnet['cidr']})
         return ib_network
 
+    @record_metrics
     @catch_ib_client_exception
     def allocate(self, address_request):
         """Allocate an IP address based on the request passed in.
@@ -417,19 +440,35 @@ class InfobloxSubnet(driver.Subnet):
             # we can deal with instance name as hostname in the ipam agent.
             instance_name = None
             try:
-                dns_controller.bind_names(allocated_ip,
-                                          instance_name,
-                                          address_request.port_id,
-                                          address_request.tenant_id,
-                                          address_request.device_id,
-                                          address_request.device_owner,
-                                          port_name=port_name)
+                if self._is_dns_binding_deferred(address_request):
+                    dns_binding.enqueue(self._ib_cxt.context.session,
+                                        address_request.port_id,
+                                        self._neutron_subnet['id'],
+                                        allocated_ip,
+                                        self._ib_cxt.user_id)
+                else:
+                    dns_controller.bind_names(allocated_ip,
+                                              instance_name,
+                                              address_request.port_id,
+                                              address_request.tenant_id,
+                                              address_request.device_id,
+                                              address_request.device_owner,
+                                              port_name=port_name)
             except Exception:
                 with excutils.save_and_reraise_exception():
                     ipam_controller.deallocate_ip(allocated_ip)
 
         return allocated_ip
 
+    @staticmethod
+    def _is_dns_binding_deferred(address_request):
+        # floating ip names are bound with the instance name on association
+        return (dns_binding.is_enabled() and
+                address_request.port_id and
+                address_request.device_owner !=
+                n_const.DEVICE_OWNER_FLOATINGIP)
+
+    @record_metrics
     @catch_ib_client_exception
     def deallocate(self, address):
         """Deallocate previously allocated address.
@@ -450,6 +489,9 @@ class InfobloxSubnet(driver.Subnet):
         dns_controller = dns.DnsController(self._ib_cxt)
 
         ipam_controller.deallocate_ip(ip_addr)
+        if dns_binding.is_enabled():
+            dns_binding.discard(self._ib_cxt.context.session,
+                                self._neutron_subnet['id'], ip_addr)
         port_name = (address_request.port_name
                      if hasattr(address_request, 'port_name')
                      else None)
@@ -24,6 +24,7 @@ from oslo_service import service
 from neutron.common import config as common_config
 from neutron.conf.agent import common as agent_conf
 
+from networking_infoblox.neutron.common import agent_profiler
 from networking_infoblox.neutron.common import config
 from networking_infoblox.neutron.common import notification
 
@@ -35,13 +36,36 @@ def register_options():
                                        cfg.CONF.infoblox.cloud_data_center_id)
 
 
+def setup_profiler():
+    # installed before workers are forked so that each of them inherits it
+    profiler = agent_profiler.AgentProfiler(
+        config.CONF.infoblox.ipam_agent_profiler_dir,
+        config.CONF.infoblox.ipam_agent_profiler_duration,
+        config.CONF.infoblox.ipam_agent_profiler_interval)
+    profiler.install_signal_handlers()
+    return profiler
+
+
+def launch_workers(workers):
+    if workers <= 1:
+        return service.launch(config.CONF,
+                              notification.NotificationService())
+    # Each worker is forked as soon as it is launched, so the first one,
+    # which owns grid syncs, has synced the grid before the others load
+    # grid data.
+    launcher = service.ProcessLauncher(config.CONF)
+    for worker_index in range(workers):
+        launcher.launch_service(notification.NotificationService(
+            worker_index=worker_index, workers=workers))
+    return launcher
+
+
 def main():
     common_config.init(sys.argv[1:])
     common_config.setup_logging()
     register_options()
-    service.launch(config.CONF,
-                   notification.NotificationService(),
-                   config.CONF.infoblox.ipam_agent_workers).wait()
+    setup_profiler()
+    launch_workers(config.CONF.infoblox.ipam_agent_workers).wait()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+from datetime import datetime
+import gc
+import os
+import signal
+import sys
+import traceback
+
+import eventlet
+import greenlet
+from oslo_log import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+PROFILE_SIGNAL = 'SIGUSR1'
+STACK_DUMP_SIGNAL = 'SIGUSR2'
+
+
+def _format_frame(frame):
+    code = frame.f_code
+    return '%s (%s:%d)' % (code.co_name, code.co_filename,
+                           code.co_firstlineno)
+
+
+def format_greenthread_stacks():
+    """Returns the stacks of all greenthreads and native threads.
+
+    A greenthread that is not running is suspended where it switched to
+    the hub, so its stack shows what it is blocked on.
+    """
+    lines = []
+    current = greenlet.getcurrent()
+    for obj in gc.get_objects():
+        if not isinstance(obj, greenlet.greenlet) or not obj.gr_frame:
+            continue
+        lines.append('Greenthread %s%s:' % (
+            obj, ' (current)' if obj is current else ''))
+        lines.extend(traceback.format_stack(obj.gr_frame))
+        lines.append('\n')
+    for thread_id, frame in sys._current_frames().items():
+        lines.append('Native thread %s:' % thread_id)
+        lines.extend(traceback.format_stack(frame))
+        lines.append('\n')
+    return '\n'.join(line.rstrip('\n') for line in lines)
+
+
+class AgentProfiler(object):
+    """Statistical profiler and stack dumper of the ipam agent process.
+
+    Nothing runs until profiling is requested, so an idle profiler costs
+    nothing. While profiling, an ITIMER_PROF timer interrupts the process
+    every interval seconds of CPU time and the interrupted stack is
+    counted; after duration seconds the timer is disarmed and the counts
+    are written in folded stack format, one 'caller;...;callee count'
+    line per stack, which flame graph tools read as is.
+
+    Greenthreads run in one native thread, so the sampled stack is the one
+    of the greenthread that was using the CPU. Signal dispositions can only
+    be changed from that thread, which is why the window is closed by a
+    greenthread rather than a native timer thread.
+    """
+
+    def __init__(self, output_dir, duration=30, interval=0.01):
+        self.output_dir = output_dir
+        self.duration = duration
+        self.interval = interval
+        self._samples = None
+        self._timer = None
+
+    @property
+    def running(self):
+        return self._samples is not None
+
+    def install_signal_handlers(self):
+        """Starts profiling on SIGUSR1 and dumps stacks on SIGUSR2."""
+        signal.signal(getattr(signal, PROFILE_SIGNAL),
+                      self._handle_profile_signal)
+        signal.signal(getattr(signal, STACK_DUMP_SIGNAL),
+                      self._handle_stack_dump_signal)
+
+    # Signal handlers can run between any two instructions, so the work is
+    # done in a greenthread like the oslo.service signal handler does.
+    def _handle_profile_signal(self, signo, frame):
+        eventlet.spawn(self.start)
+
+    def _handle_stack_dump_signal(self, signo, frame):
+        eventlet.spawn(self.dump_stacks)
+
+    def start(self):
+        if self.running:
+            LOG.info("Profiling is already in progress.")
+            return
+        self._samples = collections.Counter()
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self._timer = eventlet.spawn_after(self.duration, self.stop)
+        LOG.info("Profiling for %s seconds.", self.duration)
+
+    def _sample(self, signo, frame):
+        samples = self._samples
+        if samples is None:
+            # delivered after the window was closed
+            return
+        stack = []
+        while frame is not None:
+            stack.append(_format_frame(frame))
+            frame = frame.f_back
+        samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        """Stops profiling and returns the path of the written profile."""
+        if not self.running:
+            return None
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        samples, self._samples = self._samples, None
+        content = '\n'.join('%s %d' % sample
+                            for sample in samples.most_common())
+        path = self._write('profile', content)
+        LOG.info("Profile of %(count)d samples written to %(path)s",
+                 {'count': sum(samples.values()), 'path': path})
+        return path
+
+    def dump_stacks(self):
+        """Writes the stacks of all threads and returns the path."""
+        path = self._write('stacks', format_greenthread_stacks())
+        LOG.info("Greenthread stacks written to %s", path)
+        return path
+
+    def _write(self, kind, content):
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        file_name = '%s-%d-%s.txt' % (
+            kind, os.getpid(), datetime.utcnow().strftime('%Y%m%d%H%M%S%f'))
+        path = os.path.join(self.output_dir, file_name)
+        with open(path, 'w') as f:
+            f.write(content + '\n')
+        return path
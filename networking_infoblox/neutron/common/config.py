@@ -23,7 +23,16 @@ ipam_opts = [
                       "more grids to serve networks in Infoblox backend.")),
     cfg.IntOpt('ipam_agent_workers',
                default=1,
-               help=_("Number of Infoblox IPAM agent workers to run")),
+               help=_("Number of Infoblox IPAM agent workers to run. Every "
+                      "worker receives all notifications and handles the "
+                      "ones whose resource id hashes to it, so events of a "
+                      "resource stay in order. The first worker owns grid "
+                      "syncs and state reports. Each worker listens on a "
+                      "notification queue of its own; when the number of "
+                      "workers changes, the first worker deletes the queues "
+                      "no worker listens to anymore, so all ipam agents "
+                      "sharing a message bus must run the same number of "
+                      "workers.")),
     cfg.StrOpt('keystone_auth_uri',
                help=_('Keystone Authtoken URI')),
     cfg.StrOpt('keystone_admin_username',
@@ -42,6 +51,161 @@ ipam_opts = [
                help='Admin Domain id'),
     cfg.StrOpt('keystone_auth_version',
                default='v2.0', help='Auth Version.'),
+    cfg.IntOpt('keystone_page_size',
+               default=500,
+               help=_("Number of tenants requested from keystone per page "
+                      "on tenant sync.")),
+    cfg.IntOpt('keystone_unknown_tenant_ttl',
+               default=300,
+               help=_("Number of seconds a tenant id that is not found in "
+                      "keystone is remembered as unknown, so that tenant "
+                      "sync is not repeated for it.")),
+    cfg.IntOpt('tenant_name_cache_size',
+               default=10000,
+               help=_("Maximum number of tenant names cached in memory by "
+                      "each process. Set to 0 to disable the cache.")),
+    cfg.IntOpt('tenant_name_cache_ttl',
+               default=600,
+               help=_("Number of seconds a cached tenant name is used "
+                      "before it is looked up again.")),
+    cfg.StrOpt('member_scheduler_policy',
+               default='least_loaded',
+               choices=['random', 'least_loaded', 'capacity_capped'],
+               help=_("Policy used to choose authority and DHCP members for "
+                      "new network views. 'random' picks any available "
+                      "member, 'least_loaded' picks the member with the "
+                      "least weighted load, 'capacity_capped' does the same "
+                      "but skips members whose load reached "
+                      "'member_scheduler_capacity'.")),
+    cfg.DictOpt('member_scheduler_weights',
+                default={'network': '1', 'range': '1', 'zone': '1'},
+                help=_("Weights of the number of networks, ranges and zones "
+                       "served by a member when its load is calculated.")),
+    cfg.IntOpt('member_scheduler_capacity',
+               default=0,
+               help=_("Maximum weighted load of a member for the "
+                      "'capacity_capped' policy. 0 means no limit.")),
+    cfg.IntOpt('subnet_index_ttl',
+               default=300,
+               help=_("Number of seconds subnets of a network are kept in "
+                      "the agent subnet index before they are reloaded.")),
+    cfg.IntOpt('neutron_object_cache_ttl',
+               default=300,
+               help=_("Number of seconds neutron networks and subnets read "
+                      "by the ipam agent are cached unless a notification "
+                      "updates them first. 0 disables the cache.")),
+    cfg.IntOpt('context_pool_size',
+               default=1000,
+               help=_("Maximum number of subnet contexts the ipam agent "
+                      "keeps for reuse across events. Set to 0 to disable "
+                      "the pool.")),
+    cfg.IntOpt('context_pool_ttl',
+               default=60,
+               help=_("Number of seconds a pooled subnet context is reused "
+                      "before its mapping is looked up again.")),
+    cfg.IntOpt('host_mac_index_sync_interval',
+               default=3600,
+               help=_("Number of seconds after which grid sync rebuilds the "
+                      "index of host record MAC addresses used to skip "
+                      "searching NIOS for host records on ip allocation. "
+                      "Set to 0 to disable the index.")),
+    cfg.BoolOpt('async_dns_binding',
+                default=False,
+                help=_("If enabled, the ipam driver only reserves ip "
+                       "addresses and leaves binding of their dns names to "
+                       "the ipam agent, which takes port creation off "
+                       "the dns zone and record calls.")),
+    cfg.IntOpt('dns_binding_batch_size',
+               default=100,
+               help=_("Maximum number of dns binding jobs the ipam agent "
+                      "claims at once.")),
+    cfg.IntOpt('dns_binding_drain_interval',
+               default=10,
+               help=_("Number of seconds between runs of the ipam agent "
+                      "binding dns names left by the ipam driver. Names "
+                      "of new ports are bound on port create events "
+                      "already; this catches jobs whose event was "
+                      "missed.")),
+    cfg.IntOpt('service_member_cache_ttl',
+               default=60,
+               help=_("Number of seconds DHCP and DNS service members of "
+                      "network views are cached in memory before they are "
+                      "reloaded from the database.")),
+    cfg.StrOpt('metrics_bind_host',
+               default='127.0.0.1',
+               help=_("Address the metrics endpoints of the ipam agent and "
+                      "the ipam driver listen on.")),
+    cfg.PortOpt('ipam_agent_metrics_port',
+                default=0,
+                help=_("Port on which the ipam agent serves its metrics in "
+                       "Prometheus text format at /metrics. 0 disables the "
+                       "endpoint. With several workers the endpoint is "
+                       "served by the worker that binds the port first.")),
+    cfg.PortOpt('ipam_driver_metrics_port',
+                default=0,
+                help=_("Port on which the neutron server process running "
+                       "the ipam driver serves its metrics in Prometheus "
+                       "text format at /metrics. 0 disables the endpoint. "
+                       "With several API workers the endpoint is served by "
+                       "the worker that binds the port first.")),
+    cfg.StrOpt('ipam_agent_profiler_dir',
+               default='$state_path/infoblox-ipam-agent',
+               help=_("Directory the ipam agent writes profiles to on "
+                      "SIGUSR1 and greenthread stack dumps to on SIGUSR2. "
+                      "With several workers, send the signal to the worker "
+                      "process.")),
+    cfg.IntOpt('ipam_agent_profiler_duration',
+               default=30,
+               help=_("Number of seconds the ipam agent is profiled for "
+                      "after receiving SIGUSR1.")),
+    cfg.FloatOpt('ipam_agent_profiler_interval',
+                 default=0.01,
+                 help=_("Seconds of CPU time between two stack samples "
+                        "taken while the ipam agent is profiled.")),
+    cfg.StrOpt('ipam_agent_notification_capture_file',
+               help=_("File the ipam agent appends every notification it "
+                      "receives to, as JSON lines that "
+                      "tools/notification_replay.py replays. Credentials "
+                      "in the message context are left out and only the "
+                      "first worker captures. Capturing is disabled when "
+                      "not set.")),
+    cfg.IntOpt('ipam_agent_snapshot_refresh_interval',
+               default=5,
+               min=1,
+               max=60,
+               help=_("Number of seconds between the checks ipam agent "
+                      "workers other than the first make for a newer grid "
+                      "sync, after which they reload grid data from the "
+                      "database. Port, floating ip and instance events "
+                      "handled by these workers use grid data that is up "
+                      "to this many seconds older than the latest grid "
+                      "sync.")),
+    cfg.IntOpt('ipam_agent_resync_max_interval',
+               default=0,
+               help=_("Longest number of seconds the ipam agent waits "
+                      "between grid resyncs. Each resync that changes no "
+                      "grid data doubles the wait from the grid sync "
+                      "maximum wait time up to this value; a resync that "
+                      "changes grid data, or an alert of networks or "
+                      "subnets about to be created, brings the wait back "
+                      "to the grid sync minimum wait time. With 0, the "
+                      "wait is always the grid sync maximum wait time.")),
+    cfg.IntOpt('ipam_agent_event_queue_size',
+               default=100,
+               help=_("Number of events each priority lane of the ipam "
+                      "agent holds. Network and subnet updates and "
+                      "deletions and instance deletions wait in the low "
+                      "priority lane, other events in the high priority "
+                      "one. The agent stops fetching notifications while "
+                      "a lane is full. With 0, events are handled in the "
+                      "order they are received. Queued events are "
+                      "acknowledged already, so they are lost when the "
+                      "agent crashes.")),
+    cfg.IntOpt('ipam_agent_event_drain_timeout',
+               default=30,
+               help=_("Number of seconds a stopping ipam agent handles the "
+                      "events still queued in its priority lanes. Events "
+                      "not handled by then are dropped and logged.")),
 
 ]
 
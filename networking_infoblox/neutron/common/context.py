@@ -13,7 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 from collections import Counter
+import copy
+import threading
+import time
+
 from neutron_lib.plugins import directory
 from oslo_log import log as logging
 
@@ -23,10 +28,14 @@ from infoblox_client import object_manager as obj_mgr
 from infoblox_client import objects as ib_objects
 
 from networking_infoblox._i18n import _LI
+from networking_infoblox.neutron.common import config as cfg
 from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import exceptions as exc
 from networking_infoblox.neutron.common import ip_allocator
 from networking_infoblox.neutron.common import keystone_manager as km
+from networking_infoblox.neutron.common import mac_index
+from networking_infoblox.neutron.common import member as grid_member
+from networking_infoblox.neutron.common import metrics
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
 
@@ -47,23 +56,12 @@ class InfobloxContext(object):
         self.ib_network = ib_network
 
         self.grid_config = grid_config
-        self.connector = None
-        self.ibom = None
-        self.ip_alloc = None
-        self.dhcp_port_ip_alloc = None
+        # connector and managers are built on first use and shared with
+        # copies made by for_request
+        self._managers = {}
 
         self.grid_id = self.grid_config.grid_id
-        self.mapping = utils.json_to_obj(
-            'Mapping',
-            {'network_view_id': None,
-             'network_view': None,
-             'authority_member': None,
-             'shared': False,
-             'dns_view': None,
-             'dhcp_members': [],
-             'dns_members': [],
-             'ib_dhcp_members': [],
-             'ib_nameservers': None})
+        self.mapping = self._new_mapping()
 
         self._discovered_grid_members = grid_members
         self._discovered_network_views = network_views
@@ -71,6 +69,86 @@ class InfobloxContext(object):
 
         self._update()
 
+    @staticmethod
+    def _new_mapping(mapping=None):
+        attrs = {'network_view_id': None,
+                 'network_view': None,
+                 'authority_member': None,
+                 'shared': False,
+                 'dns_view': None,
+                 'dhcp_members': [],
+                 'dns_members': [],
+                 'ib_dhcp_members': [],
+                 'ib_nameservers': None}
+        if mapping is not None:
+            attrs = dict((name, getattr(mapping, name)) for name in attrs)
+        return utils.json_to_obj('Mapping', attrs)
+
+    def for_request(self, user_id):
+        """Returns a copy of the context to serve a request of the user.
+
+        The copy shares grid data, managers and connector with this context
+        while the user, neutron objects and mapping are its own, so the
+        request may update them without affecting other copies.
+        """
+        ib_context = copy.copy(self)
+        ib_context.user_id = user_id
+        ib_context.network = dict(self.network)
+        ib_context.subnet = dict(self.subnet)
+        ib_context.mapping = self._new_mapping(self.mapping)
+        return ib_context
+
+    def _get_manager(self, name, build):
+        host = self._get_connector_host()
+        if self._managers.get('host', host) != host:
+            # authority member changed so managers need a new connector
+            self._managers.clear()
+        self._managers['host'] = host
+        if name not in self._managers:
+            self._managers[name] = build()
+        return self._managers[name]
+
+    def _set_manager(self, name, value, dependents=()):
+        self._managers['host'] = self._get_connector_host()
+        self._managers[name] = value
+        for dependent in dependents:
+            self._managers.pop(dependent, None)
+
+    @property
+    def connector(self):
+        return self._get_manager('connector', self._get_connector)
+
+    @connector.setter
+    def connector(self, value):
+        self._set_manager('connector', value,
+                          ('ibom', 'ip_alloc', 'dhcp_port_ip_alloc'))
+
+    @property
+    def ibom(self):
+        return self._get_manager(
+            'ibom', lambda: obj_mgr.InfobloxObjectManager(self.connector))
+
+    @ibom.setter
+    def ibom(self, value):
+        self._set_manager('ibom', value, ('ip_alloc', 'dhcp_port_ip_alloc'))
+
+    @property
+    def ip_alloc(self):
+        return self._get_manager('ip_alloc', self._get_ip_allocator)
+
+    @ip_alloc.setter
+    def ip_alloc(self, value):
+        self._set_manager('ip_alloc', value)
+
+    @property
+    def dhcp_port_ip_alloc(self):
+        return self._get_manager('dhcp_port_ip_alloc',
+                                 lambda: self._get_ip_allocator(True))
+
+    @dhcp_port_ip_alloc.setter
+    def dhcp_port_ip_alloc(self, value):
+        self._set_manager('dhcp_port_ip_alloc', value)
+
     @property
     def discovered_grid_members(self):
         if self._discovered_grid_members is None:
@@ -94,33 +172,43 @@ class InfobloxContext(object):
         return self._discovered_mapping_conditions
 
     def get_tenant_name(self, tenant_id=None):
-        """Returns tenant name from context or db.
+        """Returns tenant name from context, cache or db.
 
         If tenant id stored in context matches requested one,
         then return tenant name from context.
-        If incoming tenant_id is different from context one then query db.
+        If incoming tenant_id is different from context one then check
+        process wide tenant name cache and then query db.
         """
         tenant_id_in_query = tenant_id or self.tenant_id
+        cache = km.tenant_name_cache
         if tenant_id_in_query:
             if self.context.tenant_name and (
                     self.context.tenant_id == tenant_id_in_query):
                 return self.context.tenant_name
 
+            tenant_name = cache.get(tenant_id_in_query)
+            if tenant_name:
+                return tenant_name
+
             if self.grid_config.tenant_name_persistence:
                 tenant = dbi.get_tenant(self.context.session,
                                         tenant_id_in_query)
                 if tenant:
+                    cache.put(tenant.tenant_id, tenant.tenant_name)
                     return tenant.tenant_name
 
         if self.grid_config.tenant_name_persistence:
             # Try resync with keystone if still no tenant name is found
-            if km.sync_tenants_from_keystone(self.context):
+            tenant_ids = [tenant_id_in_query] if tenant_id_in_query else None
+            if km.sync_tenants_from_keystone(self.context, tenant_ids):
                 tenant = dbi.get_tenant(self.context.session,
                                         tenant_id_in_query)
                 if tenant:
+                    cache.put(tenant.tenant_id, tenant.tenant_name)
                     return tenant.tenant_name
         else:
             tenants = km.get_all_tenants()
+            cache.update({tenant.id: tenant.name for tenant in tenants})
             for tenant in tenants:
                 if tenant.id == tenant_id_in_query:
                     return tenant.name
@@ -130,8 +218,8 @@ class InfobloxContext(object):
         """Reserves the next available authority member.
 
         Find the next available authority member and reserve it, then
-        update mapping metadata and load managers if the authority member is
-        CPM.
+        update mapping metadata. Managers are rebuilt on next use if the
+        authority member is CPM.
         :return: None
         """
         session = self.context.session
@@ -179,14 +267,11 @@ class InfobloxContext(object):
                              dns_view,
                              True,
                              False)
+        # connector and managers follow the new authority member on next use
         self.mapping.network_view_id = network_view_id
         self.mapping.authority_member = authority_member
         self.mapping.dns_view = dns_view
 
-        # change connector if authority member is changed.
-        if self.connector.host != self.mapping.authority_member.member_wapi:
-            self._load_managers()
-
     def reserve_service_members(self, ib_network=None):
         """Reserve DHCP and DNS service members.
 
@@ -313,24 +398,23 @@ class InfobloxContext(object):
         #     if true, then try to get the next available dhcp member.
         #     if false, use gm for dhcp
         session = self.context.session
+        service_member_cache = grid_member.service_member_cache
         dhcp_member = None
 
-        dhcp_service_members = dbi.get_service_members(
-            session,
-            network_view_id=self.mapping.network_view_id,
-            service=const.SERVICE_TYPE_DHCP)
-        if dhcp_service_members:
+        dhcp_member_ids = service_member_cache.get_member_ids(
+            session, self.grid_id, self.mapping.network_view_id,
+            const.SERVICE_TYPE_DHCP)
+        if dhcp_member_ids:
             dhcp_member = utils.find_one_in_list(
                 'member_id',
-                dhcp_service_members[0].member_id,
+                dhcp_member_ids[0],
                 self.discovered_grid_members)
         else:
             if self.grid_config.use_grid_master_for_dhcp:
-                dhcp_service_members = dbi.get_service_members(
-                    session,
-                    member_id=self.mapping.authority_member.member_id,
-                    service=const.SERVICE_TYPE_DHCP)
-                if dhcp_service_members:
+                if service_member_cache.is_serving(
+                        session, self.grid_id,
+                        self.mapping.authority_member.member_id,
+                        const.SERVICE_TYPE_DHCP):
                     # authority is GM, a dhcp member needs to be selected.
                     dhcp_member = dbi.get_next_dhcp_member(session,
                                                            self.grid_id, True)
@@ -453,33 +537,21 @@ class InfobloxContext(object):
 
     def _register_services(self):
         session = self.context.session
+        service_member_cache = grid_member.service_member_cache
 
-        service = const.SERVICE_TYPE_DHCP
-        for member in self.mapping.dhcp_members:
-            service_members = dbi.get_service_members(
-                session,
-                network_view_id=self.mapping.network_view_id,
-                member_id=member.member_id,
-                grid_id=self.grid_id,
-                service=service)
-            if not service_members:
-                dbi.add_service_member(session, self.mapping.network_view_id,
-                                       member.member_id, service)
-
-        service = const.SERVICE_TYPE_DNS
-        for member in self.mapping.dns_members:
-            service_members = dbi.get_service_members(
-                session,
-                network_view_id=self.mapping.network_view_id,
-                member_id=member.member_id,
-                grid_id=self.grid_id,
-                service=service)
-            if not service_members:
-                dbi.add_service_member(session, self.mapping.network_view_id,
-                                       member.member_id, service)
+        for service, members in (
+                (const.SERVICE_TYPE_DHCP, self.mapping.dhcp_members),
+                (const.SERVICE_TYPE_DNS, self.mapping.dns_members)):
+            for member in members:
+                service_member_cache.register(session, self.grid_id,
+                                              self.mapping.network_view_id,
+                                              member.member_id, service)
 
     def _update(self):
-        """Finds mapping and load managers that can interact with NIOS grid."""
+        """Finds mapping to NIOS grid objects.
+
+        Managers that interact with NIOS grid are built on first use.
+        """
         if not self.network and self.subnet:
             network_id = self.subnet.get('network_id')
             if not network_id:
@@ -499,14 +571,6 @@ class InfobloxContext(object):
             if self.subnet:
                 self._find_mapping()
 
-        self._load_managers()
-
-    def _load_managers(self):
-        self.connector = self._get_connector()
-        self.ibom = obj_mgr.InfobloxObjectManager(self.connector)
-        self.ip_alloc = self._get_ip_allocator()
-        self.dhcp_port_ip_alloc = self._get_ip_allocator(True)
-
     def _get_ip_allocator(self, for_dhcp_port=False):
         options = dict()
         options['configure_for_dns'] = self.grid_config.dns_support
@@ -518,6 +582,7 @@ class InfobloxContext(object):
                 options['configure_for_dns'] = False
             if for_dhcp_port:
                 options['configure_for_dhcp'] = False
+            options['host_mac_index'] = mac_index.HostMacIndex()
         else:
             options['use_host_record'] = False
             options['dns_record_binding_types'] = (
@@ -528,13 +593,14 @@ class InfobloxContext(object):
                 self.grid_config.dns_record_removable_types)
         return ip_allocator.IPAllocator(self.ibom, options)
 
-    def _get_connector(self):
+    def _get_connector_host(self):
+        """Returns wapi host of the authority member or None for GM."""
         if self.grid_config.is_cloud_wapi is False:
-            return self.grid_config.gm_connector
+            return None
 
         # if mapping network view does not exist yet, connect to GM
         if self.mapping.network_view_id is None:
-            return self.grid_config.gm_connector
+            return None
 
         # use gm_connector in the following cases:
         # 1. authority member is not set
@@ -545,13 +611,20 @@ class InfobloxContext(object):
                 const.MEMBER_TYPE_GRID_MASTER or
                 self.mapping.authority_member.member_status !=
                 const.MEMBER_STATUS_ON):
+            return None
+
+        return self.mapping.authority_member.member_wapi
+
+    def _get_connector(self):
+        host = self._get_connector_host()
+        if host is None:
             return self.grid_config.gm_connector
 
         grid_connection = self.grid_config.get_grid_connection()
         wapi_user = grid_connection['admin_user'].get('name')
         wapi_pwd = grid_connection['admin_user'].get('password')
         opts = {
-            'host': self.mapping.authority_member.member_wapi,
+            'host': host,
             'wapi_version': grid_connection['wapi_version'],
             'username': wapi_user,
             'password': wapi_pwd,
@@ -565,7 +638,7 @@ class InfobloxContext(object):
         # Silent ssl warnings, if certificate verification is not enabled
         if opts['ssl_verify'] == 'False':
             opts['silent_ssl_warnings'] = True
-        return connector.Connector(opts)
+        return metrics.instrument_connector(connector.Connector(opts))
 
     def _get_address_scope(self, subnetpool_id):
         session = self.context.session
@@ -831,13 +904,12 @@ class InfobloxContext(object):
         dns_members = self._get_dns_members(self.ib_network)
         if not dns_members:
             dns_members = []
-            dns_service_members = dbi.get_service_members(
-                session,
-                network_view_id=self.mapping.network_view_id,
-                service=const.SERVICE_TYPE_DNS)
-            for sm in dns_service_members:
+            dns_member_ids = grid_member.service_member_cache.get_member_ids(
+                session, self.grid_id, self.mapping.network_view_id,
+                const.SERVICE_TYPE_DNS)
+            for member_id in dns_member_ids:
                 member = utils.find_one_in_list('member_id',
-                                                sm.member_id,
+                                                member_id,
                                                 self.discovered_grid_members)
                 if member:
                     dns_members.append(member)
@@ -881,3 +953,97 @@ class InfobloxContext(object):
     @property
     def network_is_shared_or_external(self):
         return self.network_is_external or self.network_is_shared
+
+
+class InfobloxContextPool(object):
+    """Pool of InfobloxContext objects built for subnets.
+
+    Building a context finds the mapping of the subnet and loads managers,
+    which costs several db queries and a connector. The pool keeps built
+    contexts by subnet id and sync generation and hands out per request
+    copies of them.
+
+    The owner starts a new generation whenever grid data the contexts were
+    built from is resynced, which drops all pooled contexts. Contexts also
+    expire after 'context_pool_ttl' seconds.
+    """
+
+    def __init__(self, size=None, ttl=None):
+        self._size = size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._contexts = collections.OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self):
+        if self._size is None:
+            return cfg.CONF.infoblox.context_pool_size
+        return self._size
+
+    @property
+    def ttl(self):
+        if self._ttl is None:
+            return cfg.CONF.infoblox.context_pool_ttl
+        return self._ttl
+
+    def new_generation(self):
+        with self._lock:
+            self.generation += 1
+            self._contexts.clear()
+
+    def get(self, neutron_context, user_id, network, subnet, grid_config,
+            plugin=None, grid_members=None, network_views=None,
+            mapping_conditions=None):
+        """Returns a context for the subnet, building it on first use."""
+        subnet_id = subnet.get('id') if subnet else None
+        if subnet_id is None:
+            return InfobloxContext(neutron_context, user_id, network, subnet,
+                                   grid_config, plugin, grid_members,
+                                   network_views, mapping_conditions)
+
+        with self._lock:
+            key = (subnet_id, self.generation)
+            entry = self._contexts.pop(key, None)
+            if entry is not None and entry[1] > time.time():
+                # re-insert to mark the context as most recently used
+                self._contexts[key] = entry
+                self.hits += 1
+                return entry[0].for_request(user_id)
+            self.misses += 1
+
+        ib_context = InfobloxContext(neutron_context, user_id, network,
+                                     subnet, grid_config, plugin,
+                                     grid_members, network_views,
+                                     mapping_conditions)
+        size = self.size
+        with self._lock:
+            # a context built from data of the previous generation is stale
+            if size > 0 and key[1] == self.generation:
+                self._contexts[key] = (ib_context, time.time() + self.ttl)
+                while len(self._contexts) > size:
+                    self._contexts.popitem(last=False)
+        return ib_context.for_request(user_id)
+
+    def invalidate(self, subnet_id=None, network_id=None):
+        """Drops contexts of the subnet, of the network or all of them."""
+        with self._lock:
+            if subnet_id is None and network_id is None:
+                self._contexts.clear()
+                return
+            for key, entry in list(self._contexts.items()):
+                ib_context = entry[0]
+                if (subnet_id is not None and key[0] == subnet_id or
+                        network_id is not None and
+                        ib_context.subnet.get('network_id') == network_id):
+                    del self._contexts[key]
+
+    def __len__(self):
+        return len(self._contexts)
+
+    def __repr__(self):
+        return ("InfobloxContextPool{size: %s, generation: %s, hits: %s, "
+                "misses: %s}" % (len(self), self.generation, self.hits,
+                                 self.misses))
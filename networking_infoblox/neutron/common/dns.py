@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
+
 from infoblox_client import exceptions as ibc_exc
 from infoblox_client import objects as obj
 from neutron_lib import constants as n_const
@@ -57,80 +59,72 @@ class DnsController(object):
                 self.ib_cxt.tenant_name, self.ib_cxt.network,
                 self.ib_cxt.subnet)
 
-    def create_dns_zones(self, rollback_list):
+    def create_dns_zones(self, rollback_list, plan=None):
+        """Creates forward and reverse zones of the subnet.
+
+        If a provisioning plan is given, zones are added to the plan instead
+        and get created when the plan is run.
+        """
         if self.grid_config.dns_support is False:
             return
         LOG.debug("Initialized DNS Zone creation")
+
+        for zone_fields in self._get_dns_zones():
+            search_fields = dict((field, zone_fields[field])
+                                 for field in ('view', 'fqdn', 'zone_format')
+                                 if field in zone_fields)
+            build = functools.partial(self._add_dns_zone_servers,
+                                      zone_fields)
+            if plan:
+                plan.create_check(obj.DNSZone, search_fields, fields=build)
+                continue
+
+            ib_zone, obj_created = obj.DNSZone.create_check_exists(
+                self.ib_cxt.connector, **build())
+            if ib_zone and obj_created:
+                LOG.info("Created dns zone: %s", ib_zone)
+                rollback_list.append(ib_zone)
+
+    def _get_dns_zones(self):
         cidr = self.ib_cxt.subnet['cidr']
-        subnet_name = self.ib_cxt.subnet['name']
         dns_view = self.ib_cxt.mapping.dns_view
+        zones = []
+        if self.need_forward:
+            zones.append({'view': dns_view,
+                          'fqdn': self.dns_zone,
+                          'extattrs': self.forward_zone_eas})
+        if self.need_reverse:
+            subnet_name = self.ib_cxt.subnet['name']
+            zones.append({'view': dns_view,
+                          'fqdn': cidr,
+                          'prefix': utils.get_ipv4_network_prefix(
+                              cidr, subnet_name),
+                          'zone_format': "IPV%s" % (
+                              self.ib_cxt.subnet['ip_version']),
+                          'extattrs': self.reverse_zone_eas})
+        return zones
+
+    def _add_dns_zone_servers(self, zone_fields):
+        """Adds name servers to zone fields.
+
+        Grid members are looked up only here since they are known only
+        after service members are reserved for the network.
+        """
+        zone_fields = dict(zone_fields)
+        is_forward = 'zone_format' not in zone_fields
         ns_group = self.grid_config.ns_group
-        zone_format = "IPV%s" % self.ib_cxt.subnet['ip_version']
-        prefix = utils.get_ipv4_network_prefix(cidr, subnet_name)
+        if ns_group:
+            if is_forward:
+                zone_fields['ns_group'] = ns_group
+            return zone_fields
 
         grid_primaries, grid_secondaries = self.ib_cxt.get_dns_members()
+        zone_fields['grid_primary'] = grid_primaries
+        if is_forward:
+            zone_fields['grid_secondaries'] = grid_secondaries
+        return zone_fields
 
-        if ns_group:
-            # create Forward zone
-            if self.need_forward:
-                ib_zone, obj_created = obj.DNSZone.create_check_exists(
-                    self.ib_cxt.connector,
-                    view=dns_view,
-                    ns_group=ns_group,
-                    fqdn=self.dns_zone,
-                    extattrs=self.forward_zone_eas)
-                if ib_zone and obj_created:
-                    LOG.info("Created forward zone: %s with ns_group: %s" % (
-                             self.dns_zone, ns_group))
-                    rollback_list.append(ib_zone)
-
-            # create Reverse zone
-            if self.need_reverse:
-                ib_zone_cidr, obj_created = obj.DNSZone.create_check_exists(
-                    self.ib_cxt.connector,
-                    view=dns_view,
-                    fqdn=cidr,
-                    prefix=prefix,
-                    zone_format=zone_format,
-                    extattrs=self.reverse_zone_eas)
-                if ib_zone_cidr and obj_created:
-                    LOG.info("Created reverse zone: %s with ns_group: %s" % (
-                             cidr, ns_group))
-                    rollback_list.append(ib_zone_cidr)
-        else:
-            # create Forward zone
-            if self.need_forward:
-                ib_zone, obj_created = obj.DNSZone.create_check_exists(
-                    self.ib_cxt.connector,
-                    view=dns_view,
-                    fqdn=self.dns_zone,
-                    grid_primary=grid_primaries,
-                    grid_secondaries=grid_secondaries,
-                    extattrs=self.forward_zone_eas)
-                if ib_zone and obj_created:
-                    LOG.info("Created forward zone: %s with "
-                             "grid_primaries: %s, grid_secondaries: %s" % (
-                                 self.dns_zone, grid_primaries,
-                                 grid_secondaries))
-                    rollback_list.append(ib_zone)
-
-            # create Reverse zone
-            if self.need_reverse:
-                ib_zone_cidr, obj_created = obj.DNSZone.create_check_exists(
-                    self.ib_cxt.connector,
-                    view=dns_view,
-                    fqdn=cidr,
-                    grid_primary=grid_primaries,
-                    prefix=prefix,
-                    zone_format=zone_format,
-                    extattrs=self.reverse_zone_eas)
-                if ib_zone_cidr and obj_created:
-                    LOG.info("Created reverse zone: %s with "
-                             "grid_primaries: %s, grid_secondaries: %s" % (
-                                 cidr, grid_primaries, grid_secondaries))
-                    rollback_list.append(ib_zone_cidr)
-
-    def update_dns_zones(self):
+    def update_dns_zones(self, ea_stats=None):
         if self.grid_config.dns_support is False:
             return
 
@@ -138,12 +132,21 @@ class DnsController(object):
 
         # update Forward zone
         if self.need_forward:
-            self.ib_cxt.ibom.update_dns_zone_attrs(
-                dns_view, self.dns_zone, self.forward_zone_eas)
+            self._update_dns_zone_eas(dns_view, self.dns_zone,
+                                      self.forward_zone_eas, ea_stats)
         # update Reverse zone
         if self.need_reverse:
-            self.ib_cxt.ibom.update_dns_zone_attrs(
-                dns_view, self.ib_cxt.subnet['cidr'], self.reverse_zone_eas)
+            self._update_dns_zone_eas(dns_view, self.ib_cxt.subnet['cidr'],
+                                      self.reverse_zone_eas, ea_stats)
+
+    def _update_dns_zone_eas(self, dns_view, fqdn, extattrs, ea_stats=None):
+        if not extattrs:
+            return
+        ib_zone = obj.DNSZone.search(self.ib_cxt.connector,
+                                     view=dns_view,
+                                     fqdn=fqdn)
+        if ib_zone:
+            eam.update_eas(ib_zone, extattrs, ea_stats)
 
     def delete_dns_zones(self, dns_zone=None, ib_network=None):
         if self.grid_config.dns_support is False:
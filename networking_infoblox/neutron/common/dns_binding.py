@@ -0,0 +1,167 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+from datetime import timedelta
+import uuid
+
+from neutron_lib import context as neutron_context
+from oslo_log import log as logging
+
+from networking_infoblox.neutron.common import config as cfg
+from networking_infoblox.neutron.db import infoblox_db as dbi
+
+
+LOG = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return cfg.CONF.infoblox.async_dns_binding
+
+
+def enqueue(session, port_id, subnet_id, ip_address, user_id=None):
+    """Adds a job to bind dns names of an allocated ip.
+
+    The job is added in the transaction that allocates the ip, so it is
+    dropped together with the port if the allocation is rolled back.
+    """
+    return dbi.add_dns_binding_job(session, port_id, subnet_id, ip_address,
+                                   user_id)
+
+
+def discard(session, subnet_id, ip_address):
+    """Drops pending jobs of an ip that is being deallocated."""
+    dbi.remove_dns_binding_jobs(session, subnet_id=subnet_id,
+                                ip_address=ip_address)
+
+
+class DnsBindingQueue(object):
+    """Drains dns binding jobs added by the ipam driver.
+
+    A job is claimed for LEASE_TIME seconds and deleted only after its
+    names are bound, so a job of an agent that dies while binding is
+    picked up again once the claim expires. Jobs of a port are bound in
+    the order they were added; after a failure the remaining jobs of the
+    port are left for the next drain.
+
+    Claims are committed in a session of their own, so other agents see
+    them at once, even when the drain runs in a transaction of the caller.
+    """
+
+    LEASE_TIME = 60
+    MAX_ATTEMPTS = 10
+
+    def __init__(self, context, plugin, batch_size=None):
+        self.context = context
+        self.plugin = plugin
+        self.batch_size = (batch_size if batch_size is not None
+                           else cfg.CONF.infoblox.dns_binding_batch_size)
+        self._claim_context = None
+
+    @property
+    def claim_session(self):
+        if self._claim_context is None:
+            self._claim_context = neutron_context.get_admin_context()
+        return self._claim_context.session
+
+    def drain(self, bind_func, port_ids=None):
+        """Binds names of pending jobs and returns the number of done jobs.
+
+        bind_func is called with a job and its neutron port. When port_ids
+        are given only jobs of these ports are drained. Jobs that failed
+        are not retried within the same drain.
+        """
+        done = 0
+        last_id = None
+        failed_ports = set()
+        while True:
+            jobs = self._claim(port_ids, last_id)
+            if not jobs:
+                break
+            done += self._process(jobs, bind_func, failed_ports)
+            last_id = jobs[-1].id
+            if len(jobs) < self.batch_size:
+                break
+        return done
+
+    def _claim(self, port_ids, after_id):
+        session = self.claim_session
+        now = datetime.utcnow()
+        claimable_before = now - timedelta(seconds=self.LEASE_TIME)
+        jobs = dbi.get_dns_binding_jobs(session, port_ids=port_ids,
+                                        claimable_before=claimable_before,
+                                        after_id=after_id,
+                                        limit=self.batch_size)
+        if not jobs:
+            return []
+        token = str(uuid.uuid4())
+        if not dbi.claim_dns_binding_jobs(session, [job.id for job in jobs],
+                                          token, now, claimable_before):
+            return []
+        return dbi.get_dns_binding_jobs(session, claimed_by=token)
+
+    def _get_ports(self, jobs):
+        port_ids = list(set(job.port_id for job in jobs))
+        ports = self.plugin.get_ports(self.context,
+                                      filters={'id': port_ids})
+        return dict((port['id'], port) for port in ports)
+
+    @staticmethod
+    def _has_ip(port, job):
+        for fixed_ip in port.get('fixed_ips') or []:
+            if (fixed_ip['subnet_id'] == job.subnet_id and
+                    fixed_ip['ip_address'] == job.ip_address):
+                return True
+        return False
+
+    def _process(self, jobs, bind_func, failed_ports):
+        session = self.context.session
+        ports = self._get_ports(jobs)
+        done_ids = []
+        failed_ids = []
+        deferred_ids = []
+        for job in jobs:
+            if job.port_id in failed_ports:
+                deferred_ids.append(job.id)
+                continue
+            port = ports.get(job.port_id)
+            if port is None or not self._has_ip(port, job):
+                # port is gone or the ip was moved, nothing left to bind
+                done_ids.append(job.id)
+                continue
+            try:
+                bind_func(job, port)
+                done_ids.append(job.id)
+            except Exception as e:
+                failed_ports.add(job.port_id)
+                if job.attempts + 1 >= self.MAX_ATTEMPTS:
+                    LOG.error("Giving up binding dns names of ip %s of "
+                              "port %s after %s attempts: %s",
+                              job.ip_address, job.port_id,
+                              job.attempts + 1, e)
+                    done_ids.append(job.id)
+                else:
+                    LOG.warning("Unable to bind dns names of ip %s of "
+                                "port %s: %s", job.ip_address,
+                                job.port_id, e)
+                    failed_ids.append(job.id)
+
+        if done_ids:
+            dbi.remove_dns_binding_jobs(session, job_ids=done_ids)
+        if failed_ids:
+            dbi.release_dns_binding_jobs(session, failed_ids, failed=True)
+        if deferred_ids:
+            dbi.release_dns_binding_jobs(session, deferred_ids)
+        return len(done_ids)
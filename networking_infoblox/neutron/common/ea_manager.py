@@ -21,7 +21,6 @@ from neutron.api.v2 import attributes
 from neutron_lib.api.definitions import external_net
 
 from networking_infoblox.neutron.common import constants as const
-from networking_infoblox.neutron.common import utils
 
 
 def get_ea_for_network_view(tenant_id, tenant_name, cloud_adapter_id):
@@ -95,16 +94,17 @@ def get_ea_for_network(user_id, tenant_id, tenant_name, network, subnet):
     return ib_objects.EA(attributes)
 
 
-def reset_ea_for_network(ib_network):
-    if not ib_network or not ib_network.extattrs:
-        return
+def reset_ea_for_network(ib_network, ea_stats=None):
+    """Resets OpenStack owned EAs of a network that is kept in NIOS.
 
-    utils.reset_required_eas(ib_network)
+    Only changed EAs are sent to NIOS.
+    :return: True if NIOS network has been updated, False otherwise
+    """
+    if not ib_network or not ib_network.extattrs:
+        return False
 
-    eas = ib_network.extattrs
-    ea_dict = eas.to_dict()
-    map(lambda ea: ea_dict.pop(ea, None), const.NETWORK_EA_LIST)
-    ib_network.extattrs = ib_objects.EA.from_dict(ea_dict)
+    reset_eas = _get_reset_eas(const.NETWORK_EA_LIST)
+    return update_eas(ib_network, reset_eas, ea_stats)
 
 
 def get_ea_for_range(user_id, tenant_id, tenant_name, network):
@@ -112,16 +112,17 @@ def get_ea_for_range(user_id, tenant_id, tenant_name, network):
                                        tenant_name))
 
 
-def reset_ea_for_range(ib_range):
-    if not ib_range or not ib_range.extattrs:
-        return
+def reset_ea_for_range(ib_range, ea_stats=None):
+    """Resets OpenStack owned EAs of an ip range that is kept in NIOS.
 
-    utils.reset_required_eas(ib_range)
+    Only changed EAs are sent to NIOS.
+    :return: True if NIOS ip range has been updated, False otherwise
+    """
+    if not ib_range or not ib_range.extattrs:
+        return False
 
-    eas = ib_range.extattrs
-    ea_dict = eas.to_dict()
-    map(lambda ea: ea_dict.pop(ea, None), const.RANGE_EA_LIST)
-    ib_range.extattrs = ib_objects.EA.from_dict(ea_dict)
+    reset_eas = _get_reset_eas(const.RANGE_EA_LIST)
+    return update_eas(ib_range, reset_eas, ea_stats)
 
 
 def get_dict_for_ip(port_id, device_owner, device_id,
@@ -175,16 +176,32 @@ def get_ea_for_forward_zone(user_id, tenant_id, tenant_name, network, subnet,
     return ib_objects.EA(ea_dict)
 
 
-def reset_ea_for_zone(ib_zone):
+def reset_ea_for_zone(ib_zone, ea_stats=None):
+    """Resets OpenStack owned EAs of a dns zone that is kept in NIOS.
+
+    Only changed EAs are sent to NIOS.
+    :return: True if NIOS zone has been updated, False otherwise
+    """
     if not ib_zone or not ib_zone.extattrs:
-        return
+        return False
+
+    reset_eas = _get_reset_eas(const.ZONE_EA_LIST)
+    return update_eas(ib_zone, reset_eas, ea_stats)
 
-    utils.reset_required_eas(ib_zone)
 
-    eas = ib_zone.extattrs
-    ea_dict = eas.to_dict()
-    map(lambda ea: ea_dict.pop(ea, None), const.ZONE_EA_LIST)
-    ib_zone.extattrs = ib_objects.EA.from_dict(ea_dict)
+def _get_reset_eas(ea_list):
+    """Generates EAs that release an object from OpenStack ownership.
+
+    Required EAs are set to reset values and EAs from ea_list are set to None
+    so that they are removed from the object.
+    """
+    ea_dict = {ea: None for ea in ea_list}
+    for ea in const.REQUIRED_EA_LIST:
+        if ea == const.EA_CLOUD_API_OWNED:
+            ea_dict[ea] = 'False'
+        else:
+            ea_dict[ea] = const.EA_RESET_VALUE
+    return ib_objects.EA(ea_dict)
 
 
 def get_common_ea(network, user_id, tenant_id, tenant_name, for_network=False):
@@ -205,3 +222,79 @@ def get_common_ea(network, user_id, tenant_id, tenant_name, for_network=False):
         ea_dict[const.EA_IS_EXTERNAL] = str(is_external)
         ea_dict[const.EA_IS_SHARED] = str(is_shared)
     return ea_dict
+
+
+class EaUpdateStats(object):
+    """Counts EA updates sent and skipped during a single operation."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.updated = 0
+        self.skipped = 0
+
+    def __repr__(self):
+        return ("operation: %s, updated: %s, skipped: %s" %
+                (self.operation, self.updated, self.skipped))
+
+
+def _is_empty_ea_value(value):
+    return value is None or value == '' or value == []
+
+
+def get_ea_changes(current_eas, desired_eas):
+    """Calculates difference between current and desired EAs.
+
+    Desired EAs are merged into current ones, so EAs that are present on
+    the object but not in desired EAs are kept as is. Desired EAs with empty
+    value are removed from the object.
+
+    :param current_eas: ib_objects.EA currently set on NIOS object or None
+    :param desired_eas: ib_objects.EA generated by ea_manager
+    :return: tuple with two elements:
+        - dict with EAs to be added or changed in NIOS WAPI format;
+        - dict with EAs to be removed in NIOS WAPI format;
+    """
+    current = current_eas.to_dict() if current_eas else {}
+    desired = desired_eas.ea_dict if desired_eas else {}
+
+    eas_to_set = {}
+    eas_to_remove = {}
+    for name, value in desired.items():
+        if _is_empty_ea_value(value):
+            if name in current:
+                eas_to_remove[name] = {}
+            continue
+        new_value = ib_objects.EA({name: value}).to_dict()[name]
+        if current.get(name) != new_value:
+            eas_to_set[name] = new_value
+    return eas_to_set, eas_to_remove
+
+
+def update_eas(ib_obj, desired_eas, ea_stats=None):
+    """Sends only changed EAs of NIOS object.
+
+    Uses 'extattrs+' and 'extattrs-' WAPI semantics, so unchanged EAs are
+    not sent and object without changes is not updated at all.
+    :return: True if NIOS object has been updated, False otherwise
+    """
+    eas_to_set, eas_to_remove = get_ea_changes(ib_obj.extattrs, desired_eas)
+    if not eas_to_set and not eas_to_remove:
+        if ea_stats:
+            ea_stats.skipped += 1
+        return False
+
+    payload = {}
+    if eas_to_set:
+        payload['extattrs+'] = eas_to_set
+    if eas_to_remove:
+        payload['extattrs-'] = eas_to_remove
+    ib_obj.connector.update_object(ib_obj.ref, payload)
+
+    ea_dict = ib_obj.extattrs.ea_dict if ib_obj.extattrs else {}
+    ea_dict.update(desired_eas.ea_dict)
+    ib_obj.extattrs = ib_objects.EA(
+        {name: value for name, value in ea_dict.items()
+         if not _is_empty_ea_value(value)})
+    if ea_stats:
+        ea_stats.updated += 1
+    return True
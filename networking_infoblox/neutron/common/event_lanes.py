@@ -0,0 +1,117 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+import eventlet
+from eventlet import queue
+from eventlet import semaphore
+from oslo_log import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+LANE_HIGH = 'high'
+LANE_LOW = 'low'
+LANES = (LANE_HIGH, LANE_LOW)
+
+
+class EventLanes(object):
+    """Bounded priority lanes between the notification listener and handler.
+
+    put blocks while the lane of the event is full, which holds up the
+    listener so that it stops fetching messages until the handler catches
+    up. One greenthread hands events to handle, taking them from the high
+    lane first; after low_lane_share events of the high lane in a row, a
+    waiting event of the low lane is taken so that it is not starved.
+    Events of a lane are handled in the order they were put. The listener
+    acknowledges an event once it is put, so stop handles the queued
+    events before it returns, for up to the given timeout; events still
+    queued then are dropped and logged. Queued events are lost as well
+    when the process crashes.
+    """
+
+    def __init__(self, handle, size, low_lane_share=10):
+        self._handle = handle
+        self._queues = dict((lane, queue.LightQueue(size)) for lane in LANES)
+        self.low_lane_share = low_lane_share
+        self._pending = semaphore.Semaphore(0)
+        self._high_streak = 0
+        self._busy = False
+        self._current = None
+        self._thread = None
+
+    def depths(self):
+        return dict((lane, self._queues[lane].qsize()) for lane in LANES)
+
+    def put(self, lane, *event):
+        self._queues[lane].put(event)
+        self._pending.release()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+
+    def stop(self, timeout=None):
+        """Stops handling events once the queued ones are handled.
+
+        :param timeout: seconds to wait for queued events, no limit if None
+        :return: list of events that were dropped, including the one being
+        handled when the timeout passed
+        """
+        if self._thread is None:
+            return []
+        deadline = None if timeout is None else time.time() + timeout
+        while self._busy or any(self.depths().values()):
+            if deadline is not None and time.time() >= deadline:
+                break
+            eventlet.sleep(0.1)
+        dropped = [self._current] if self._busy else []
+        self._thread.kill()
+        self._thread = None
+        for lane in LANES:
+            while self._queues[lane].qsize():
+                dropped.append(self._queues[lane].get_nowait())
+        self._pending = semaphore.Semaphore(0)
+        self._busy = False
+        self._current = None
+        if dropped:
+            LOG.warning("Dropped %(count)s queued events not handled within "
+                        "%(timeout)s seconds.",
+                        {'count': len(dropped), 'timeout': timeout})
+        return dropped
+
+    def _next(self):
+        self._pending.acquire()
+        high, low = self._queues[LANE_HIGH], self._queues[LANE_LOW]
+        if low.qsize():
+            if not high.qsize() or self._high_streak >= self.low_lane_share:
+                self._high_streak = 0
+                return low.get_nowait()
+            self._high_streak += 1
+        return high.get_nowait()
+
+    def _run(self):
+        while True:
+            event = self._next()
+            self._busy = True
+            self._current = event
+            try:
+                self._handle(*event)
+            except Exception as e:
+                LOG.exception("Handling a queued event failed: %s", e)
+            finally:
+                self._busy = False
+                self._current = None
@@ -32,6 +32,8 @@ from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import exceptions as exc
 from networking_infoblox.neutron.common import mapping as grid_mapping
 from networking_infoblox.neutron.common import member as grid_member
+from networking_infoblox.neutron.common import metrics
+from networking_infoblox.neutron.common import sync_profile
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
 
@@ -59,6 +61,47 @@ class GridSyncer(object):
     def sync(self, force_sync=False):
         self._grid_manager.sync(force_sync)
 
+    def get_config(self):
+        self._grid_manager.get_config()
+
+
+class ResyncInterval(object):
+    """Time to wait between grid resyncs, following how much syncs change.
+
+    Without a ceiling the wait is grid_sync_maximum_wait_time. With one,
+    every sync that changes no grid data doubles the wait, up to the
+    ceiling. A sync that changes grid data, or an alert of networks or
+    subnets about to be created, brings it back to
+    grid_sync_minimum_wait_time, from where it doubles again.
+    """
+
+    # the wait stops growing long before this many quiet syncs
+    MAX_QUIET_SYNCS = 32
+
+    def __init__(self, ceiling=0, backoff=2):
+        self.ceiling = ceiling
+        self.backoff = backoff
+        self._from_minimum = False
+        self._quiet_syncs = 0
+
+    def get(self, minimum, maximum):
+        if not self.ceiling:
+            return maximum
+        start = minimum if self._from_minimum else maximum
+        return min(start * self.backoff ** self._quiet_syncs,
+                   max(self.ceiling, maximum))
+
+    def record_sync(self, changes):
+        if changes:
+            self.tighten()
+        else:
+            self._quiet_syncs = min(self._quiet_syncs + 1,
+                                    self.MAX_QUIET_SYNCS)
+
+    def tighten(self):
+        self._from_minimum = True
+        self._quiet_syncs = 0
+
 
 class GridManager(object):
 
@@ -66,12 +109,16 @@ class GridManager(object):
     member = None
     mapping = None
     last_sync_time = None
+    last_sync_profile = None
+    last_sync_changes = None
 
     def __init__(self, context):
         self.grid_config = self._create_grid_configuration(context)
         self.member = grid_member.GridMemberManager(self.grid_config)
         self.mapping = grid_mapping.GridMappingManager(self.grid_config)
         self.hostname = socket.gethostname()
+        self.resync_interval = ResyncInterval(
+            cfg.CONF.infoblox.ipam_agent_resync_max_interval)
 
     def is_sync_needed(self, resync_interval):
         session = self.grid_config.context.session
@@ -94,13 +141,62 @@ class GridManager(object):
                 allow_sync = True
 
         if allow_sync:
-            self.member.sync()
-            self.grid_config.sync()
-            self.mapping.sync()
-            self.last_sync_time = datetime.utcnow().replace(microsecond=0)
-            dbi.record_last_sync_time(session, self.last_sync_time)
-            self._report_sync_time()
-            LOG.info("Infoblox grid has been synced up.")
+            grid_data = self._get_grid_data(session)
+            profile = sync_profile.SyncProfile(self.grid_config)
+            with profile:
+                with profile.phase(sync_profile.PHASE_MEMBERS):
+                    self.member.sync(profile)
+                with profile.phase(sync_profile.PHASE_CONFIG):
+                    self.grid_config.sync()
+                self.mapping.sync(profile)
+                with profile.phase(sync_profile.PHASE_DB_WRITES):
+                    self.last_sync_time = datetime.utcnow().replace(
+                        microsecond=0)
+                    dbi.record_last_sync_time(session, self.last_sync_time)
+                self._report_sync_time()
+            dbi.set_operation_value(session,
+                                    sync_profile.OP_TYPE_LAST_SYNC_PROFILE,
+                                    profile.to_json())
+            self.last_sync_profile = profile
+            self.last_sync_changes = self._count_changes(
+                grid_data, self._get_grid_data(session))
+            self.resync_interval.record_sync(
+                sum(self.last_sync_changes.values()))
+            LOG.info("Infoblox grid has been synced up: %s; changed rows: %s",
+                     profile, self.last_sync_changes)
+
+    def _get_grid_data(self, session):
+        """Returns the values of grid data rows by primary key per kind."""
+        grid_id = self.grid_config.grid_id
+        rows = {
+            'members': dbi.get_members(session, grid_id=grid_id),
+            'network_views': dbi.get_network_views(session, grid_id=grid_id),
+            'mapping_conditions': dbi.get_mapping_conditions(
+                session, grid_id=grid_id),
+            'mapping_members': dbi.get_mapping_members(session,
+                                                       grid_id=grid_id),
+            'service_members': dbi.get_service_members(session,
+                                                       grid_id=grid_id)}
+        grid_data = {}
+        for kind, kind_rows in rows.items():
+            grid_data[kind] = {}
+            for row in kind_rows:
+                table = row.__table__
+                key = tuple(getattr(row, column.name)
+                            for column in table.primary_key.columns)
+                grid_data[kind][key] = tuple(getattr(row, column.name)
+                                             for column in table.columns)
+        return grid_data
+
+    @staticmethod
+    def _count_changes(before, after):
+        """Counts rows added, removed or updated per kind."""
+        changes = {}
+        for kind in after:
+            old_rows, new_rows = before[kind], after[kind]
+            changes[kind] = len([key for key in set(old_rows) | set(new_rows)
+                                 if old_rows.get(key) != new_rows.get(key)])
+        return changes
 
     def get_config(self):
         """Gets grid configuration.
@@ -146,7 +242,8 @@ class GridManager(object):
         # Silent ssl warnings, if certificate verification is not enabled
         if gm_connection_opts['ssl_verify'] == 'False':
             gm_connection_opts['silent_ssl_warnings'] = True
-        grid_conf.gm_connector = connector.Connector(gm_connection_opts)
+        grid_conf.gm_connector = metrics.instrument_connector(
+            connector.Connector(gm_connection_opts))
         return grid_conf
 
     @handle_gm_disconnection_exc
@@ -0,0 +1,46 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import hashlib
+
+from oslo_utils import encodeutils
+
+
+def _hash(key):
+    digest = hashlib.md5(encodeutils.safe_encode(key)).hexdigest()
+    return int(digest[:8], 16)
+
+
+class HashRing(object):
+    """Consistent hash ring mapping keys to nodes.
+
+    Every node is placed on the ring replicas times, so keys spread evenly
+    and adding or removing a node only moves the keys of that node.
+    """
+
+    def __init__(self, nodes, replicas=100):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("A hash ring needs at least one node.")
+        ring = sorted((_hash('%s-%d' % (node, replica)), node)
+                      for node in self.nodes
+                      for replica in range(replicas))
+        self._hashes = [position for position, node in ring]
+        self._nodes = [node for position, node in ring]
+
+    def get_node(self, key):
+        index = bisect.bisect(self._hashes, _hash(key))
+        return self._nodes[index % len(self._nodes)]
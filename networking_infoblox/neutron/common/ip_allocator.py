@@ -19,6 +19,7 @@ import six
 
 from infoblox_client import objects
 from networking_infoblox.neutron.common import constants as const
+from networking_infoblox.neutron.common import multi_request
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -31,7 +32,8 @@ class IPAllocator(object):
         'configure_for_dns': True,
         'dns_record_binding_types': [],
         'dns_record_unbinding_types': [],
-        'dns_record_removable_types': []}
+        'dns_record_removable_types': [],
+        'host_mac_index': None}
 
     def __new__(cls, ib_obj_manager, options):
         cls._validate_and_set_default_options(options)
@@ -92,35 +94,70 @@ class HostRecordIPAllocator(IPAllocator):
 
         # See OPENSTACK-181. In case hostname already exists on NIOS, update
         # host record which contains that hostname with the new IP address
-        # rather than creating a separate host record object
-        reserved_hostname_hr = self.manager.find_hostname(
-            dns_view, name, ip, net_view)
-        reserved_ip_hr = self.manager.get_host_record(
-            dns_view, ip, net_view)
-
-        if (reserved_hostname_hr and reserved_ip_hr and
-                reserved_hostname_hr.ref == reserved_ip_hr.ref):
+        # rather than creating a separate host record object.
+        # Host records holding the ip include the one reserved with the
+        # hostname, so a single search finds both of them.
+        host_records = self._find_host_records_by_ip(dns_view, ip, net_view)
+        if not host_records:
+            return
+
+        reserved_ip_hr = host_records[0]
+        reserved_hostname_hr = None
+        for host_record in host_records:
+            hr_name = getattr(host_record, 'name', None)
+            if hr_name and hr_name.lower() == name.lower():
+                reserved_hostname_hr = host_record
+                break
+
+        if not reserved_hostname_hr:
+            reserved_ip_hr.name = name
+            reserved_ip_hr.extattrs = extattrs
+            reserved_ip_hr.update()
+            return
+
+        if reserved_hostname_hr.ref == reserved_ip_hr.ref:
             reserved_hostname_hr.extattrs = extattrs
             reserved_hostname_hr.update()
             return
 
-        if reserved_hostname_hr:
-            for hr_ip in reserved_ip_hr.ips:
-                ip_mac = hr_ip.mac if hr_ip.ip_version == 4 else hr_ip.duid
-                if hr_ip == ip:
-                    reserved_ip_hr.delete()
-                    reserved_hostname_hr.extattrs = extattrs
-                    self.manager.add_ip_to_record(
-                        reserved_hostname_hr, ip, ip_mac)
-                    break
-        else:
-            self.manager.bind_name_with_host_record(
-                dns_view, ip, name, extattrs, net_view)
+        for hr_ip in reserved_ip_hr.ips:
+            ip_mac = hr_ip.mac if hr_ip.ip_version == 4 else hr_ip.duid
+            if hr_ip == ip:
+                reserved_hostname_hr.extattrs = extattrs
+                if ip not in reserved_hostname_hr.ips:
+                    reserved_hostname_hr.ips.append(
+                        objects.IP.create(ip=ip, mac=ip_mac,
+                                          configure_for_dhcp=True))
+                # the ip has to be released before it is added to the
+                # hostname record, both in one call
+                request = multi_request.MultiRequest(self.manager.connector)
+                request.delete(reserved_ip_hr.ref)
+                request.update_object(reserved_hostname_hr)
+                request.call()
+                break
+
+    def _find_host_records_by_ip(self, dns_view, ip, network_view):
+        ip_version = netaddr.IPAddress(ip).version
+        return_fields = ['ipv%saddrs' % ip_version, 'extattrs', 'name']
+        return objects.HostRecord.search_all(self.manager.connector,
+                                             view=dns_view,
+                                             ip=ip,
+                                             network_view=network_view,
+                                             return_fields=return_fields)
 
     def unbind_names(self, network_view, dns_view, ip, name, extattrs):
         # Nothing to delete, all will be deleted together with host record.
         pass
 
+    def _may_have_host(self, network_view, mac):
+        index = self.opts['host_mac_index']
+        return index is None or index.may_have_host(network_view, mac)
+
+    def _add_to_host_mac_index(self, host_record, network_view, mac):
+        index = self.opts['host_mac_index']
+        if index is not None:
+            index.add(host_record.ref, network_view, mac)
+
     def allocate_ip_from_range(self, network_view, dns_view,
                                zone_auth, hostname, mac, first_ip, last_ip,
                                extattrs=None):
@@ -133,13 +170,16 @@ class HostRecordIPAllocator(IPAllocator):
         if host_record:
             hr = self.manager.add_ip_to_host_record_from_range(
                 host_record, network_view, mac, first_ip, last_ip, use_dhcp)
+            self._add_to_host_mac_index(hr, network_view, mac)
         else:
             # First search hosts with same MAC and if exists address within
             # given range - use it instead of creating new one
             # https://bugs.launchpad.net/networking-infoblox/+bug/1628517
-            hosts = self.manager.find_host_records_by_mac(dns_view,
-                                                          mac.lower(),
-                                                          network_view)
+            hosts = None
+            if self._may_have_host(network_view, mac):
+                hosts = self.manager.find_host_records_by_mac(dns_view,
+                                                              mac.lower(),
+                                                              network_view)
             if hosts:
                 ip_range = netaddr.IPRange(first_ip, last_ip)
                 ip_version = netaddr.IPAddress(first_ip).version
@@ -159,6 +199,7 @@ class HostRecordIPAllocator(IPAllocator):
             hr = self.manager.create_host_record_from_range(
                 dns_view, network_view, zone_auth, hostname, mac,
                 first_ip, last_ip, extattrs, use_dhcp, use_dns)
+            self._add_to_host_mac_index(hr, network_view, mac)
         return hr.ip[-1].ip
 
     def allocate_given_ip(self, network_view, dns_view, zone_auth,
@@ -172,9 +213,11 @@ class HostRecordIPAllocator(IPAllocator):
         ip_version = ip_obj.ip_version
         ip_mac = ip_obj.mac if ip_version == 4 else ip_obj.duid
 
-        hosts = self.manager.find_host_records_by_mac(dns_view,
-                                                      ip_mac,
-                                                      network_view)
+        hosts = None
+        if self._may_have_host(network_view, mac):
+            hosts = self.manager.find_host_records_by_mac(dns_view,
+                                                          ip_mac,
+                                                          network_view)
         if hosts:
             for host in hosts:
                 if host.ip_version != ip_version:
@@ -192,6 +235,7 @@ class HostRecordIPAllocator(IPAllocator):
         hr = self.manager.create_host_record_for_given_ip(
             dns_view, zone_auth, hostname, mac, ip, extattrs, use_dhcp,
             use_dns)
+        self._add_to_host_mac_index(hr, network_view, mac)
         return hr.ip[-1].ip
 
     def deallocate_ip(self, network_view, dns_view_name, ip):
@@ -201,6 +245,9 @@ class HostRecordIPAllocator(IPAllocator):
                 self.manager.delete_ip_from_host_record(host_record, ip)
             else:
                 host_record.delete()
+                index = self.opts['host_mac_index']
+                if index is not None:
+                    index.remove(host_record.ref)
 
 
 class FixedAddressIPAllocator(IPAllocator):
@@ -30,6 +30,8 @@ from networking_infoblox.neutron.common import context
 from networking_infoblox.neutron.common import dns
 from networking_infoblox.neutron.common import ea_manager as eam
 from networking_infoblox.neutron.common import exceptions as exc
+from networking_infoblox.neutron.common import member as grid_member
+from networking_infoblox.neutron.common import multi_request
 from networking_infoblox.neutron.common import pattern
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
@@ -50,7 +52,7 @@ class IpamSyncController(object):
         return self.ib_cxt.ibom.get_network(self.ib_cxt.mapping.network_view,
                                             self.ib_cxt.subnet.get('cidr'))
 
-    def create_subnet(self, rollback_list):
+    def create_subnet(self, rollback_list, dns_controller=None):
         """Creates subnet equivalent NIOS objects.
 
         infoblox context contains subnet dictionary from ipam driver and
@@ -60,6 +62,11 @@ class IpamSyncController(object):
         - network view
         - network
         - ip range
+        - dns zones if dns controller is given
+
+        A new network view is created first since service members are
+        reserved under its id. The other objects are searched for in one
+        WAPI multi request and the missing ones are created in another.
         """
         session = self.ib_cxt.context.session
         network = self.ib_cxt.network
@@ -82,28 +89,28 @@ class IpamSyncController(object):
             if ib_network_view and obj_created:
                 rollback_list.append(ib_network_view)
 
-        ib_network, created = self._create_ib_network()
-        if ib_network:
-            if created:
-                rollback_list.append(ib_network)
-            self._create_ib_ip_range(rollback_list)
-
-        # tenats available only with wapi 2.0+
-        features = utils.get_features(self.grid_config.wapi_version)
-        if features.tenants:
-            ib_tenant = ib_objects.Tenant.search(self.ib_cxt.connector,
-                                                 id=self.ib_cxt.tenant_id)
-            if (ib_tenant and self.ib_cxt.tenant_name and
-                    ib_tenant.name != self.ib_cxt.tenant_name):
-                ib_tenant.name = self.ib_cxt.tenant_name
-                ib_tenant.update()
+        plan = multi_request.ProvisioningPlan(self.ib_cxt.connector)
+        network_item = self._plan_ib_network(plan)
+        if self.grid_config.network_template:
+            # service members of a template network are known only after
+            # the network is created, and dns zones are served by them.
+            plan.run(rollback_list)
+            plan = multi_request.ProvisioningPlan(self.ib_cxt.connector)
+        self._plan_ib_ip_ranges(plan)
+        self._plan_tenant_update(plan)
+        if dns_controller:
+            dns_controller.create_dns_zones(rollback_list, plan=plan)
+        plan.run(rollback_list)
+
+        if network_item.created and not self.grid_config.network_template:
+            self._restart_services()
 
         # associate the network view to neutron
         dbi.associate_network_view(session,
                                    self.ib_cxt.mapping.network_view_id,
                                    network_id,
                                    subnet_id)
-        return ib_network
+        return network_item.ib_obj
 
     def _create_ib_network_view(self):
         session = self.ib_cxt.context.session
@@ -128,62 +135,81 @@ class IpamSyncController(object):
         LOG.info(_LI("Created a network view: %s"), ib_network_view)
         return ib_network_view, obj_created
 
-    def _create_ib_network(self):
+    def _plan_ib_network(self, plan):
         network_view = self.ib_cxt.mapping.network_view
-        network = self.ib_cxt.network
-        subnet = self.ib_cxt.subnet
-        cidr = subnet.get('cidr')
-        gateway_ip = subnet.get('gateway_ip')
+        cidr = self.ib_cxt.subnet.get('cidr')
+        network_template = self.grid_config.network_template
 
         ea_network = eam.get_ea_for_network(self.ib_cxt.user_id,
                                             self.ib_cxt.tenant_id,
                                             self.ib_cxt.tenant_name,
-                                            network,
-                                            subnet)
-        network_template = self.grid_config.network_template
+                                            self.ib_cxt.network,
+                                            self.ib_cxt.subnet)
 
-        # check if network already exists
-        ib_network = ib_objects.Network.search(self.ib_cxt.connector,
-                                               network_view=network_view,
-                                               cidr=cidr)
-        if ib_network:
-            if self.ib_cxt.network_is_shared_or_external:
-                self.ib_cxt.reserve_service_members(ib_network)
-                self.ib_cxt.ibom.update_network_options(ib_network, ea_network)
-                LOG.info("ib network already exists so updated options: %s",
-                         ib_network)
-                return ib_network, False
-            raise exc.InfobloxPrivateSubnetAlreadyExist()
-
-        # network creation using template
-        if network_template:
-            ib_network = self.ib_cxt.ibom.create_network_from_template(
-                self.ib_cxt.mapping.network_view, cidr, network_template,
-                ea_network)
-            self._register_mapping_member()
+        def on_exists(ib_network):
+            if not self.ib_cxt.network_is_shared_or_external:
+                raise exc.InfobloxPrivateSubnetAlreadyExist()
             self.ib_cxt.reserve_service_members(ib_network)
             self.ib_cxt.ibom.update_network_options(ib_network, ea_network)
-            LOG.info("ib network created from template %s: %s",
-                     network_template, ib_network)
-            return ib_network, True
-
-        # network creation starts
-        self.ib_cxt.reserve_service_members()
+            LOG.info("ib network already exists so updated options: %s",
+                     ib_network)
+
+        def get_fields():
+            fields = {'network_view': network_view,
+                      'cidr': cidr,
+                      'extattrs': ea_network}
+            if network_template:
+                fields['template'] = network_template
+                return fields
+            # network creation starts
+            self.ib_cxt.reserve_service_members()
+            fields['members'] = self.ib_cxt.mapping.ib_dhcp_members
+            fields['options'] = self._get_dhcp_options()
+            return fields
+
+        def on_created(ib_network):
+            self._register_mapping_member()
+            if network_template:
+                self.ib_cxt.reserve_service_members(ib_network)
+                self.ib_cxt.ibom.update_network_options(ib_network,
+                                                        ea_network)
+                LOG.info("ib network created from template %s: %s",
+                         network_template, ib_network)
+
+        return plan.create_check(ib_objects.Network,
+                                 {'network_view': network_view,
+                                  'cidr': cidr},
+                                 fields=get_fields,
+                                 on_exists=on_exists,
+                                 on_created=on_created)
+
+    def _get_dhcp_options(self):
+        """Builds dhcp options the way object manager create_network does."""
+        subnet = self.ib_cxt.subnet
+        gateway_ip = subnet.get('gateway_ip')
+        nameservers = self.ib_cxt.mapping.ib_nameservers
+        options = []
+        if nameservers:
+            options.append(ib_objects.DhcpOption(
+                name='domain-name-servers', value=",".join(nameservers)))
+        if subnet.get('ip_version') == 4 and gateway_ip:
+            options.append(ib_objects.DhcpOption(name='routers',
+                                                 value=str(gateway_ip)))
+        return options
+
+    def _plan_tenant_update(self, plan):
+        # tenats available only with wapi 2.0+
+        features = utils.get_features(self.grid_config.wapi_version)
+        if not features.tenants or not self.ib_cxt.tenant_name:
+            return
 
-        relay_trel_ip = None
-        ib_network = self.ib_cxt.ibom.create_network(
-            self.ib_cxt.mapping.network_view,
-            cidr,
-            self.ib_cxt.mapping.ib_nameservers,
-            self.ib_cxt.mapping.ib_dhcp_members,
-            gateway_ip,
-            relay_trel_ip,
-            ea_network)
-        self._register_mapping_member()
-        LOG.info("ib network has been created: %s", ib_network)
+        def on_exists(ib_tenant):
+            if ib_tenant.name != self.ib_cxt.tenant_name:
+                ib_tenant.name = self.ib_cxt.tenant_name
+                plan.update(ib_tenant)
 
-        self._restart_services()
-        return ib_network, True
+        plan.search(ib_objects.Tenant, {'id': self.ib_cxt.tenant_id},
+                    on_exists=on_exists)
 
     def _get_service_members(self, field='member_id'):
         dhcp_members = [m.get(field) for m in self.ib_cxt.mapping.dhcp_members]
@@ -226,7 +252,7 @@ class IpamSyncController(object):
                 self.ib_cxt.mapping.authority_member.member_id,
                 mapping_relation)
 
-    def _create_ib_ip_range(self, rollback_list):
+    def _plan_ib_ip_ranges(self, plan):
         subnet = self.ib_cxt.subnet
         cidr = subnet.get('cidr')
         ip_version = subnet.get('ip_version')
@@ -234,54 +260,67 @@ class IpamSyncController(object):
         allocation_pools = subnet.get('allocation_pools')
         if not allocation_pools:
             allocation_pools = ipam_utils.generate_pools(cidr, gateway_ip)
-        self._allocate_pools(rollback_list, allocation_pools, cidr,
-                             ip_version, True)
-
-    def _allocate_pools(self, rollback_list, pools, cidr, ip_version,
-                        check_if_exists=False):
         ea_range = eam.get_ea_for_range(self.ib_cxt.user_id,
                                         self.ib_cxt.tenant_id,
                                         self.ib_cxt.tenant_name,
                                         self.ib_cxt.network)
-        is_shared = self.ib_cxt.network_is_shared_or_external
 
-        for pool in pools:
-            disable = True
+        def on_exists(ib_ip_range):
+            if self._merge_ip_range_eas(ib_ip_range, ea_range):
+                plan.update(ib_ip_range)
 
-            # db_base_plugin uses netaddr but neutronclient uses dict for
-            # ip range
-            if isinstance(pool, dict) and pool.get('start'):
-                start_ip = pool.get('start')
-            else:
-                start_ip = netaddr.IPAddress(pool.first, ip_version).format()
+        for pool in allocation_pools:
+            start_ip, end_ip = self._get_pool_addresses(pool, ip_version)
+            search_fields = {'network_view': self.ib_cxt.mapping.network_view,
+                             'start_addr': start_ip,
+                             'end_addr': end_ip}
+            fields = dict(search_fields, cidr=cidr, disable=True,
+                          extattrs=ea_range)
+            plan.create_check(ib_objects.IPRange, search_fields,
+                              fields=fields, on_exists=on_exists)
+
+    @staticmethod
+    def _get_pool_addresses(pool, ip_version):
+        # db_base_plugin uses netaddr but neutronclient uses dict for
+        # ip range
+        if isinstance(pool, dict) and pool.get('start'):
+            start_ip = pool.get('start')
+        else:
+            start_ip = netaddr.IPAddress(pool.first, ip_version).format()
+
+        if isinstance(pool, dict) and pool.get('end'):
+            end_ip = pool.get('end')
+        else:
+            end_ip = netaddr.IPAddress(pool.last, ip_version).format()
+        return start_ip, end_ip
 
-            if isinstance(pool, dict) and pool.get('end'):
-                end_ip = pool.get('end')
+    def _merge_ip_range_eas(self, ib_ip_range, ea_range):
+        """Merges EAs into an existing range if OpenStack manages it.
+
+        Returns True if the range has to be updated.
+        """
+        managed = (not self.ib_cxt.network_is_shared_or_external or
+                   self._range_is_managed(ib_ip_range))
+        if managed:
+            eas = ib_ip_range.extattrs
+            if eas:
+                ea_dict = ib_ip_range.extattrs.ea_dict
+                ea_dict.update(ea_range.ea_dict)
+                ib_ip_range.extattrs = ib_objects.EA(ea_dict)
             else:
-                end_ip = netaddr.IPAddress(pool.last, ip_version).format()
+                ib_ip_range.extattrs = ea_range
+        LOG.info("%s ip range already existed: %s" %
+                 ("Managed" if managed else "Unmanaged", ib_ip_range))
+        return managed
 
-            if check_if_exists:
-                ib_ip_range = ib_objects.IPRange.search(
-                    self.ib_cxt.connector,
-                    network_view=self.ib_cxt.mapping.network_view,
-                    network=cidr,
-                    start_addr=start_ip,
-                    end_addr=end_ip)
-                if ib_ip_range:
-                    managed = "Unmanaged"  # Not managed by OpenStack
-                    if not is_shared or self._range_is_managed(ib_ip_range):
-                        managed = "Managed"  # Managed by OpenStack
-                        eas = ib_ip_range.extattrs
-                        if eas:
-                            ea_dict = ib_ip_range.extattrs.ea_dict
-                            ea_dict.update(ea_range.ea_dict)
-                            ib_ip_range.extattrs = ib_objects.EA(ea_dict)
-                        else:
-                            ib_ip_range.extattrs = ea_range
-                        ib_ip_range.update()
-                    LOG.info("%s ip range already existed: %s" %
-                             (managed, ib_ip_range))
-                    continue
+    def _allocate_pools(self, rollback_list, pools, cidr, ip_version):
+        ea_range = eam.get_ea_for_range(self.ib_cxt.user_id,
+                                        self.ib_cxt.tenant_id,
+                                        self.ib_cxt.tenant_name,
+                                        self.ib_cxt.network)
+        for pool in pools:
+            disable = True
+            start_ip, end_ip = self._get_pool_addresses(pool, ip_version)
 
             ib_ip_range = self.ib_cxt.ibom.create_ip_range(
                 self.ib_cxt.mapping.network_view,
@@ -422,16 +461,16 @@ class IpamSyncController(object):
 
             self._restart_services()
         else:
-            eam.reset_ea_for_network(ib_network)
-            ib_network.update()
+            ea_stats = eam.EaUpdateStats('delete_subnet')
+            eam.reset_ea_for_network(ib_network, ea_stats)
 
             ib_ranges = ib_objects.IPRange.search_all(
                 self.ib_cxt.connector,
                 network_view=network_view,
                 network=cidr)
             for ib_range in ib_ranges:
-                eam.reset_ea_for_range(ib_range)
-                ib_range.update()
+                eam.reset_ea_for_range(ib_range, ea_stats)
+            LOG.info("EA updates for subnet %s: %s", subnet_id, ea_stats)
 
     def _release_service_members(self, is_last_subnet_in_netview):
         """Frees up service members
@@ -481,6 +520,8 @@ class IpamSyncController(object):
                         member_id,
                         const.SERVICE_TYPE_DNS)
 
+        grid_member.service_member_cache.invalidate(self.grid_id)
+
     def _is_member_releasable(self):
         """Determine if service members can be released."""
         session = self.ib_cxt.context.session
@@ -523,6 +564,7 @@ class IpamSyncController(object):
         # remove network view
         dbi.remove_network_views(session,
                                  [self.ib_cxt.mapping.network_view_id])
+        grid_member.service_member_cache.invalidate(self.grid_id)
 
     def allocate_specific_ip(self, ip_address, mac, port_id=None,
                              port_tenant_id=None, device_id=None,
@@ -647,6 +689,7 @@ class IpamAsyncController(object):
         network = self.ib_cxt.network
         network_id = network.get('id')
 
+        ea_stats = eam.EaUpdateStats('update_network_sync')
         subnets = dbi.get_subnets_by_network_id(session, network_id)
         for subnet in subnets:
             network_view = None
@@ -669,7 +712,8 @@ class IpamAsyncController(object):
                                                     self.ib_cxt.tenant_name,
                                                     network,
                                                     subnet)
-                self.ib_cxt.ibom.update_network_options(ib_network, ea_network)
+                if ib_network:
+                    eam.update_eas(ib_network, ea_network, ea_stats)
 
             if need_new_zones:
                 # Need context with ib_network to create zones
@@ -683,13 +727,16 @@ class IpamAsyncController(object):
             else:
                 self.ib_cxt.subnet = subnet
                 dns_controller = dns.DnsController(self.ib_cxt)
-                dns_controller.update_dns_zones()
+                dns_controller.update_dns_zones(ea_stats)
+
+        LOG.info("EA updates for network %s: %s", network_id, ea_stats)
 
     def update_port_sync(self, port):
         if not port or not port.get('fixed_ips'):
             return
 
         session = self.ib_cxt.context.session
+        ea_stats = eam.EaUpdateStats('update_port_sync')
 
         for fip in port['fixed_ips']:
             subnet_id = fip['subnet_id']
@@ -714,6 +761,11 @@ class IpamAsyncController(object):
                                                   port['id'],
                                                   port['device_id'],
                                                   port['device_owner'])
-                self.ib_cxt.ibom.update_fixed_address_eas(network_view,
-                                                          ip_address,
-                                                          ea_ip_address)
+                ib_address = ib_objects.FixedAddress.search(
+                    self.ib_cxt.connector,
+                    network_view=network_view,
+                    ip=ip_address)
+                if ib_address:
+                    eam.update_eas(ib_address, ea_ip_address, ea_stats)
+
+        LOG.info("EA updates for port %s: %s", port['id'], ea_stats)
@@ -13,16 +13,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import threading
+import time
+
 from keystoneauth1.identity import generic
 from keystoneauth1 import loading
 
 from keystoneclient.v2_0 import client as client_2_0
 from keystoneclient.v3 import client as client_3
 
-# from neutron.common import config as cfg
-from oslo_config import cfg
 from oslo_log import log
 
+from networking_infoblox.neutron.common import config as cfg
 from networking_infoblox.neutron.db import infoblox_db as dbi
 
 
@@ -31,6 +34,117 @@ CONF = cfg.CONF
 
 LOG = log.getLogger(__name__)
 
+_keystone_client = None
+_keystone_client_lock = threading.Lock()
+
+
+class TenantSyncState(object):
+    """Keeps state of tenant synchronization with keystone.
+
+    Only one greenthread pulls projects from keystone at a time; the ones
+    that were waiting for it reuse its result instead of pulling again.
+    Tenant ids that keystone does not know about are remembered for
+    'keystone_unknown_tenant_ttl' seconds so that a burst of events for
+    such a tenant does not trigger a full sync per event.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.synced_count = 0
+        self.unknown_tenants = {}
+
+    def is_unknown(self, tenant_ids):
+        now = time.time()
+        return all(self.unknown_tenants.get(tenant_id, 0) > now
+                   for tenant_id in tenant_ids)
+
+    def mark_unknown(self, tenant_ids):
+        expire_at = time.time() + CONF.infoblox.keystone_unknown_tenant_ttl
+        for tenant_id in tenant_ids:
+            self.unknown_tenants[tenant_id] = expire_at
+
+    def mark_known(self, tenant_ids):
+        for tenant_id in tenant_ids:
+            self.unknown_tenants.pop(tenant_id, None)
+
+
+tenant_sync_state = TenantSyncState()
+
+
+class TenantNameCache(object):
+    """Process wide LRU cache of tenant id to tenant name mapping.
+
+    Entries expire after 'tenant_name_cache_ttl' seconds so that renamed
+    tenants are eventually picked up even if no notification updated
+    the mapping.
+    """
+
+    def __init__(self, size=None, ttl=None):
+        self._size = size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._tenants = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self):
+        if self._size is None:
+            return CONF.infoblox.tenant_name_cache_size
+        return self._size
+
+    @property
+    def ttl(self):
+        if self._ttl is None:
+            return CONF.infoblox.tenant_name_cache_ttl
+        return self._ttl
+
+    def get(self, tenant_id):
+        with self._lock:
+            entry = self._tenants.pop(tenant_id, None)
+            if entry is None or entry[1] <= time.time():
+                self.misses += 1
+                return None
+            # re-insert to mark the entry as most recently used
+            self._tenants[tenant_id] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, tenant_id, tenant_name):
+        self.update({tenant_id: tenant_name})
+
+    def update(self, tenants):
+        size = self.size
+        if size <= 0:
+            return
+        expire_at = time.time() + self.ttl
+        with self._lock:
+            for tenant_id, tenant_name in tenants.items():
+                if not tenant_id or not tenant_name:
+                    continue
+                self._tenants.pop(tenant_id, None)
+                self._tenants[tenant_id] = (tenant_name, expire_at)
+            while len(self._tenants) > size:
+                self._tenants.popitem(last=False)
+
+    def invalidate(self, tenant_id=None):
+        with self._lock:
+            if tenant_id is None:
+                self._tenants.clear()
+            else:
+                self._tenants.pop(tenant_id, None)
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def __repr__(self):
+        return ("TenantNameCache{size: %s, hits: %s, misses: %s}" %
+                (len(self), self.hits, self.misses))
+
+
+tenant_name_cache = TenantNameCache()
+
 
 def get_identity_service(ib_opts):
     allowed_keystone_version = ['v2.0', 'v3']
@@ -43,6 +157,26 @@ def get_identity_service(ib_opts):
 
 
 def get_keystone_client():
+    """Returns keystone client shared by the process.
+
+    The client is built once. Its session keeps the auth token and the
+    http connection pool, so the token is reused until it expires and then
+    keystoneauth re-authenticates transparently.
+    """
+    global _keystone_client
+    if _keystone_client is None:
+        with _keystone_client_lock:
+            if _keystone_client is None:
+                _keystone_client = _create_keystone_client()
+    return _keystone_client
+
+
+def reset_keystone_client():
+    global _keystone_client
+    _keystone_client = None
+
+
+def _create_keystone_client():
     key_client = None
     ib_opts = CONF.infoblox
     identity_service, version = get_identity_service(ib_opts)
@@ -66,15 +200,38 @@ def get_keystone_client():
     return key_client
 
 
+def get_tenant_pages():
+    """Yields tenants from keystone page by page.
+
+    Keystone v2.0 supports marker based paging for tenants. Keystone v3 does
+    not support it for projects, so all projects are returned as one page.
+    """
+    keystone = get_keystone_client()
+    if keystone.version == 'v3':
+        yield keystone.projects.list()
+        return
+
+    page_size = CONF.infoblox.keystone_page_size
+    marker = None
+    while True:
+        tenants = keystone.tenants.list(limit=page_size, marker=marker)
+        if not tenants:
+            return
+        yield tenants
+        if len(tenants) < page_size:
+            return
+        marker = tenants[-1].id
+
+
 def get_all_tenants():
     try:
-        keystone = get_keystone_client()
-        if keystone.version == 'v3':
-            return keystone.projects.list()
-        else:
-            return keystone.tenants.list()
+        tenants = []
+        for page in get_tenant_pages():
+            tenants.extend(page)
+        return tenants
     except Exception as e:
         LOG.warning("Could not get tenants due to error: %s", e)
+        reset_keystone_client()
     return []
 
 
@@ -90,6 +247,8 @@ def update_tenant_mapping(context, networks, tenant_id,
     """
 
     dbi.add_or_update_tenant(context.session, tenant_id, tenant_name)
+    tenant_name_cache.invalidate(tenant_id)
+    tenant_name_cache.put(tenant_id, tenant_name)
 
     # Get unique tenants ids and check if there are unknown one
     tenant_ids = {net['tenant_id']: True for net in networks}
@@ -103,8 +262,9 @@ def update_tenant_mapping(context, networks, tenant_id,
                                      tenant_ids=unknown_ids)
         for tenant in db_tenants:
             tenant_ids[tenant.tenant_id] = False
-        if _get_unknown_ids_from_dict(tenant_ids):
-            sync_tenants_from_keystone(context)
+        unknown_ids = _get_unknown_ids_from_dict(tenant_ids)
+        if unknown_ids:
+            sync_tenants_from_keystone(context, unknown_ids)
 
 
 def _get_unknown_ids_from_dict(tenant_ids):
@@ -112,11 +272,50 @@ def _get_unknown_ids_from_dict(tenant_ids):
             if unknown is True]
 
 
-def sync_tenants_from_keystone(context):
-    tenants = get_all_tenants()
-    for tenant in tenants:
-        LOG.info("Tenants obtained from keystone: %s", tenant)
-        # tenants from keystone have 'id' and 'name' comparing to
-        # db cache where 'tenant_id' and 'tenant_name' are used
-        dbi.add_or_update_tenant(context.session, tenant.id, tenant.name)
-    return len(tenants)
+def sync_tenants_from_keystone(context, tenant_ids=None):
+    """Stores tenant names obtained from keystone.
+
+    :param tenant_ids: tenant ids the caller is looking for. If keystone
+    did not know any of them recently, sync is skipped.
+    :return: number of tenants obtained from keystone
+    """
+    state = tenant_sync_state
+    if tenant_ids and state.is_unknown(tenant_ids):
+        LOG.debug("Tenants %s are unknown to keystone, skip sync.",
+                  tenant_ids)
+        return 0
+
+    generation = state.generation
+    with state.lock:
+        if generation != state.generation:
+            # another greenthread has synced tenants while we were waiting
+            return state.synced_count
+
+        found_ids = set()
+        synced_count = 0
+        listed = False
+        try:
+            for page in get_tenant_pages():
+                # tenants from keystone have 'id' and 'name' comparing to
+                # db cache where 'tenant_id' and 'tenant_name' are used
+                tenants = {tenant.id: tenant.name for tenant in page}
+                written = dbi.add_or_update_tenants(context.session, tenants)
+                LOG.info("Tenants obtained from keystone: %s, written: %s",
+                         len(tenants), written)
+                tenant_name_cache.update(tenants)
+                found_ids.update(tenants)
+                synced_count += len(tenants)
+            listed = True
+        except Exception as e:
+            LOG.warning("Could not get tenants due to error: %s", e)
+            reset_keystone_client()
+
+        if tenant_ids:
+            state.mark_known([t for t in tenant_ids if t in found_ids])
+            # a partial listing does not prove that a tenant is unknown
+            if listed:
+                state.mark_unknown([t for t in tenant_ids
+                                    if t not in found_ids])
+        state.synced_count = synced_count
+        state.generation += 1
+    return synced_count
@@ -0,0 +1,185 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+from datetime import timedelta
+import zlib
+
+from neutron_lib import context as neutron_context
+from oslo_log import log as logging
+
+from networking_infoblox.neutron.common import config as cfg
+from networking_infoblox.neutron.common import constants as const
+from networking_infoblox.neutron.db import infoblox_db as dbi
+
+
+LOG = logging.getLogger(__name__)
+
+OBJECT_TYPE_HOST_RECORD = 'record:host'
+OP_TYPE_HOST_MAC_INDEX_SYNC = 'host_mac_index_sync_time'
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def get_search_hash(network_view, mac):
+    key = '%s/%s' % (network_view, mac.lower())
+    return zlib.crc32(key.encode('utf-8')) & 0x7fffffff
+
+
+def _get_object_id(host_record_ref, mac):
+    return '%s#%s' % (host_record_ref, mac.lower())
+
+
+def _get_host_record_macs(host_record):
+    macs = set()
+    for ip in host_record.get('ipv4addrs') or []:
+        if ip.get('mac'):
+            macs.add(ip['mac'].lower())
+    for ip in host_record.get('ipv6addrs') or []:
+        # duid of host addresses is generated as '00:' + mac[9:] + ':' + mac
+        if ip.get('duid'):
+            macs.add(ip['duid'][-17:].lower())
+    return macs
+
+
+class HostMacIndex(object):
+    """Index of MAC addresses of host records created by the driver.
+
+    Rows are kept in infoblox_objects with the hash of network view and
+    mac as search hash, so allocation can tell that no host record with a
+    mac exists without searching NIOS. The index is complete only after it
+    was synced with NIOS by grid sync; until then, and after any failed
+    index write, lookups always report that a host record may exist.
+
+    Writes use a session of their own so that they are kept even when the
+    neutron transaction that allocated the ip is rolled back, which is
+    the case bug 1628517 is about.
+    """
+
+    def __init__(self, context=None):
+        self._context = context
+
+    @property
+    def session(self):
+        if self._context is None:
+            self._context = neutron_context.get_admin_context()
+        return self._context.session
+
+    @property
+    def enabled(self):
+        return cfg.CONF.infoblox.host_mac_index_sync_interval > 0
+
+    def is_complete(self):
+        if not self.enabled:
+            return False
+        return bool(dbi.get_operation_value(self.session,
+                                            OP_TYPE_HOST_MAC_INDEX_SYNC))
+
+    def may_have_host(self, network_view, mac):
+        """Returns False only if no host record with the mac exists."""
+        try:
+            if not self.is_complete():
+                return True
+            rows = dbi.get_infoblox_objects(
+                self.session,
+                object_type=OBJECT_TYPE_HOST_RECORD,
+                search_hash=get_search_hash(network_view, mac),
+                neutron_object_id=mac.lower())
+            return bool(rows)
+        except Exception as e:
+            LOG.warning("Unable to look up host mac index: %s", e)
+            return True
+
+    def add(self, host_record_ref, network_view, mac):
+        if not self.enabled or not host_record_ref or not mac:
+            return
+        try:
+            dbi.add_infoblox_object(self.session,
+                                    _get_object_id(host_record_ref, mac),
+                                    OBJECT_TYPE_HOST_RECORD,
+                                    mac.lower(),
+                                    get_search_hash(network_view, mac))
+        except Exception as e:
+            LOG.warning("Unable to add host record %s to mac index: %s",
+                        host_record_ref, e)
+            self._mark_incomplete()
+
+    def remove(self, host_record_ref):
+        # a row left behind only makes allocation search NIOS
+        if not self.enabled or not host_record_ref:
+            return
+        try:
+            dbi.remove_infoblox_objects(
+                self.session, object_type=OBJECT_TYPE_HOST_RECORD,
+                object_id_prefix=host_record_ref + '#')
+        except Exception as e:
+            LOG.warning("Unable to remove host record %s from mac index: %s",
+                        host_record_ref, e)
+
+    def _mark_incomplete(self):
+        try:
+            dbi.set_operation_value(self.session,
+                                    OP_TYPE_HOST_MAC_INDEX_SYNC, '')
+        except Exception as e:
+            LOG.error("Unable to invalidate host mac index: %s", e)
+
+    def is_sync_needed(self):
+        if not self.enabled:
+            return False
+        last_sync = dbi.get_operation_value(self.session,
+                                            OP_TYPE_HOST_MAC_INDEX_SYNC)
+        if not last_sync:
+            return True
+        interval = cfg.CONF.infoblox.host_mac_index_sync_interval
+        return (datetime.utcnow() - datetime.strptime(last_sync, TIME_FORMAT)
+                > timedelta(seconds=interval))
+
+    def sync(self, connector):
+        """Rebuilds the index from host records of the cloud platform.
+
+        Rows added while NIOS is searched are not in the search result, so
+        only rows that existed before the search may be removed.
+        """
+        session = self.session
+        sync_time = datetime.utcnow().strftime(TIME_FORMAT)
+        indexed_ids = set(row.object_id for row in dbi.get_infoblox_objects(
+            session, object_type=OBJECT_TYPE_HOST_RECORD))
+        host_records = connector.get_object(
+            'record:host', {},
+            return_fields=['ipv4addrs', 'ipv6addrs', 'network_view'],
+            extattrs={const.EA_CMP_TYPE: {
+                'value': const.CLOUD_PLATFORM_NAME}},
+            paging=True) or []
+
+        with session.begin(subtransactions=True):
+            discovered_ids = set()
+            for host_record in host_records:
+                network_view = host_record.get('network_view')
+                for mac in _get_host_record_macs(host_record):
+                    object_id = _get_object_id(host_record['_ref'], mac)
+                    discovered_ids.add(object_id)
+                    if object_id in indexed_ids:
+                        continue
+                    dbi.add_infoblox_object(
+                        session, object_id, OBJECT_TYPE_HOST_RECORD, mac,
+                        get_search_hash(network_view, mac))
+            stale_ids = list(indexed_ids - discovered_ids)
+            if stale_ids:
+                dbi.remove_infoblox_objects(
+                    session, object_type=OBJECT_TYPE_HOST_RECORD,
+                    object_ids=stale_ids)
+            dbi.set_operation_value(session, OP_TYPE_HOST_MAC_INDEX_SYNC,
+                                    sync_time)
+        LOG.info("Host mac index has been synced with %s host records.",
+                 len(host_records))
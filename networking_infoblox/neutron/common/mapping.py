@@ -13,11 +13,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 import oslo_config.types as types
 from oslo_log import log as logging
 
 from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import exceptions as exc
+from networking_infoblox.neutron.common import mac_index
+from networking_infoblox.neutron.common import member as grid_member
+from networking_infoblox.neutron.common import member_scheduler
+from networking_infoblox.neutron.common import sync_profile
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
 
@@ -44,7 +50,7 @@ class GridMappingManager(object):
         self._context = self._grid_config.context
         self._grid_id = self._grid_config.grid_id
 
-    def sync(self):
+    def sync(self, profile=None):
         """Discovers and syncs networks between Neutron and Infoblox backend.
 
         The following information is discovered and synchronized.
@@ -53,22 +59,51 @@ class GridMappingManager(object):
         3. authority members that owns network views by either GM ownership or
            delegation to Cloud Platform Members (CPM).
 
+        :param profile: SyncProfile that gets the network view, network
+                        and db write phases
         :return: None
         """
+        profile = profile or sync_profile.SyncProfile()
         session = self._context.session
-        self.db_members = dbi.get_members(session, grid_id=self._grid_id)
-        associated_network_views = self._discover_network_views()
-        if not associated_network_views:
-            return
-        associated_dns_views = self._discover_dns_views(
-            associated_network_views)
-        dns_views = self.get_dns_views(associated_dns_views)
-
-        discovered_delegations = self._sync_network_views(
-            associated_network_views, dns_views)
-
-        associated_networks = self._discover_networks(associated_network_views)
-        self._sync_network_mapping(associated_networks, discovered_delegations)
+        with profile.phase(sync_profile.PHASE_NETWORK_VIEWS):
+            self.db_members = dbi.get_members(session, grid_id=self._grid_id)
+            associated_network_views = self._discover_network_views()
+            if not associated_network_views:
+                return
+            profile.add_objects(len(associated_network_views))
+            associated_dns_views = self._discover_dns_views(
+                associated_network_views)
+            dns_views = self.get_dns_views(associated_dns_views)
+
+            discovered_delegations = self._sync_network_views(
+                associated_network_views, dns_views)
+
+        with profile.phase(sync_profile.PHASE_NETWORKS):
+            associated_networks = self._discover_networks(
+                associated_network_views)
+            profile.add_objects(len(associated_networks))
+
+        with profile.phase(sync_profile.PHASE_DB_WRITES):
+            self._sync_network_mapping(associated_networks,
+                                       discovered_delegations)
+            grid_member.service_member_cache.invalidate(self._grid_id)
+
+            try:
+                self._sync_member_loads(associated_network_views,
+                                        associated_networks,
+                                        discovered_delegations)
+            except Exception as e:
+                LOG.warning("Unable to update member loads: %s", e)
+
+            try:
+                self._sync_host_mac_index()
+            except Exception as e:
+                LOG.warning("Unable to sync host mac index: %s", e)
+
+    def _sync_host_mac_index(self):
+        index = mac_index.HostMacIndex(self._context)
+        if index.is_sync_needed():
+            index.sync(self._connector)
 
     def _load_persisted_mappings(self):
         session = self._context.session
@@ -252,6 +287,51 @@ class GridMappingManager(object):
             dbi.remove_service_member(session, network_view_id,
                                       member_id=member_id, service=service)
 
+    def _sync_member_loads(self, associated_network_views,
+                           discovered_networks, discovered_delegations):
+        """Stores loads of grid members for the member scheduler.
+
+        Network count of a member includes networks it owns as authority
+        member and networks it serves as dhcp member. Zones are created per
+        subnet, so zone count is the number of networks the member serves
+        as dns member. Range count is the number of ranges served by the
+        member.
+        """
+        gm_row = utils.find_one_in_list('member_type',
+                                        const.MEMBER_TYPE_GRID_MASTER,
+                                        self.db_members)
+        loads = collections.defaultdict(member_scheduler.MemberLoad)
+
+        for network in discovered_networks:
+            network_member_ids = set(
+                member.member_id for member in self._get_dhcp_members(network))
+            netview = network['network_view']
+            delegated_member = self._get_delegated_member(network)
+            if netview in discovered_delegations:
+                network_member_ids.add(discovered_delegations[netview])
+            elif delegated_member:
+                network_member_ids.add(delegated_member.member_id)
+            elif gm_row:
+                network_member_ids.add(gm_row.member_id)
+            for member_id in network_member_ids:
+                loads[member_id].add(networks=1)
+
+            for member in self._get_dns_members(network):
+                loads[member.member_id].add(zones=1)
+
+        for ib_range in self._discover_ranges(associated_network_views):
+            member_name = (ib_range.get('member') or {}).get('name')
+            member = utils.find_one_in_list('member_name', member_name,
+                                            self.db_members)
+            if member:
+                loads[member.member_id].add(ranges=1)
+
+        # members without networks, ranges and zones have a known load too
+        for member in self.db_members:
+            loads[member.member_id].add()
+        dbi.set_member_loads(self._context.session, self._grid_id, loads)
+        member_scheduler.scheduler.update_loads(loads)
+
     def _discover_network_views(self):
         return_fields = ['name', 'is_default', 'extattrs']
         if self._grid_config.is_cloud_wapi:
@@ -293,6 +373,21 @@ class GridMappingManager(object):
             ipv6networks.extend(_ipv6networks)
         return ipv4networks + ipv6networks
 
+    def _discover_ranges(self, associated_network_views):
+        return_fields = ['member', 'network_view']
+        ranges = []
+        for network_view in associated_network_views:
+            payload = {'network_view': network_view['name']}
+            extattrs = {const.EA_CMP_TYPE: {
+                        'value': [const.CLOUD_PLATFORM_NAME]}}
+            for range_type in ('range', 'ipv6range'):
+                _ranges = self._connector.get_object(
+                    range_type, return_fields=return_fields,
+                    payload=payload, extattrs=extattrs)
+                if _ranges:
+                    ranges.extend(_ranges)
+        return ranges
+
     def _discover_dns_views(self, associated_network_views):
         return_fields = ['name', 'network_view']
         dns_views = []
@@ -13,9 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+import time
+
 import oslo_config.types as types
 from oslo_serialization import jsonutils
+from sqlalchemy import event
 
+from networking_infoblox.neutron.common import config as cfg
 from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
@@ -28,10 +33,10 @@ class GridMemberManager(object):
         self._context = self._grid_config.context
         self._connector = self._grid_config.gm_connector
 
-    def sync(self):
+    def sync(self, profile=None):
         """Discover and sync the active grid and its members."""
         self.sync_grid()
-        self.sync_members()
+        self.sync_members(profile)
 
     def sync_grid(self):
         """Synchronize an active grid.
@@ -71,7 +76,7 @@ class GridMemberManager(object):
                             grid_status=const.GRID_STATUS_OFF)
         session.flush()
 
-    def sync_members(self):
+    def sync_members(self, profile=None):
         """Synchronizes grid members.
 
         Members in the active grid are discovered from NIOS backend and
@@ -92,6 +97,8 @@ class GridMemberManager(object):
         discovered_members = self._discover_members()
         if not discovered_members:
             return
+        if profile:
+            profile.add_objects(len(discovered_members))
 
         dns_member_settings = self._discover_dns_settings()
         dhcp_member_settings = self._discover_dhcp_settings()
@@ -371,3 +378,121 @@ class GridMemberManager(object):
                 member_type = const.MEMBER_TYPE_CP_MEMBER
 
         return member_type
+
+
+class ServiceMemberCache(object):
+    """DHCP and DNS service members of network views cached per process.
+
+    Service members of a grid are loaded with one query and kept current
+    when this process registers new ones, once the transaction adding them
+    is committed. The cache is reloaded after 'service_member_cache_ttl'
+    seconds, and it is invalidated when this process removes service
+    members or network views. A network view without cached service members
+    is looked up in db again, so members registered by other processes are
+    seen before the ttl expires.
+    """
+
+    PENDING_KEY = 'infoblox_pending_service_members'
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._grids = {}
+
+    @property
+    def ttl(self):
+        if self._ttl is None:
+            return cfg.CONF.infoblox.service_member_cache_ttl
+        return self._ttl
+
+    def _get_view_map(self, session, grid_id):
+        entry = self._grids.get(grid_id)
+        if entry and entry[0] > time.time():
+            return entry[1]
+
+        view_map = {}
+        for service_member in dbi.get_service_members(session,
+                                                      grid_id=grid_id):
+            services = view_map.setdefault(service_member.network_view_id, {})
+            services.setdefault(service_member.service, []).append(
+                service_member.member_id)
+        with self._lock:
+            self._grids[grid_id] = (time.time() + self.ttl, view_map)
+        return view_map
+
+    def get_member_ids(self, session, grid_id, network_view_id, service):
+        view_map = self._get_view_map(session, grid_id)
+        member_ids = view_map.get(network_view_id, {}).get(service)
+        if member_ids:
+            return list(member_ids)
+        return [service_member.member_id for service_member in
+                dbi.get_service_members(session,
+                                        network_view_id=network_view_id,
+                                        service=service)]
+
+    def is_serving(self, session, grid_id, member_id, service):
+        """Returns True if the member serves the service in any view."""
+        view_map = self._get_view_map(session, grid_id)
+        if any(member_id in services.get(service, [])
+               for services in view_map.values()):
+            return True
+        return bool(dbi.get_service_members(session, member_id=member_id,
+                                            service=service))
+
+    def register(self, session, grid_id, network_view_id, member_id,
+                 service):
+        """Registers the service member unless it is known already.
+
+        :return: True if the service member is added to db
+        """
+        view_map = self._get_view_map(session, grid_id)
+        if member_id in view_map.get(network_view_id, {}).get(service, []):
+            return False
+        added = dbi.add_service_member_if_missing(session, network_view_id,
+                                                  member_id, service)
+        if added:
+            self._add_after_commit(session, view_map, network_view_id,
+                                   member_id, service)
+        return added
+
+    def _add_after_commit(self, session, view_map, network_view_id,
+                          member_id, service):
+        pending = (view_map, network_view_id, member_id, service)
+        if session.transaction is None:
+            # autocommit session, the row is committed already
+            self._add(*pending)
+            return
+        if self.PENDING_KEY not in session.info:
+            session.info[self.PENDING_KEY] = []
+            event.listen(session, 'after_commit', self._after_commit)
+            event.listen(session, 'after_transaction_end',
+                         self._after_transaction_end)
+        session.info[self.PENDING_KEY].append(pending)
+
+    def _after_commit(self, session):
+        if session.transaction.parent is None:
+            for pending in session.info[self.PENDING_KEY]:
+                self._add(*pending)
+            del session.info[self.PENDING_KEY][:]
+
+    def _after_transaction_end(self, session, transaction):
+        if transaction.parent is None:
+            # rolled back service members never get to the cache
+            del session.info[self.PENDING_KEY][:]
+
+    def _add(self, view_map, network_view_id, member_id, service):
+        with self._lock:
+            member_ids = view_map.setdefault(network_view_id, {}).setdefault(
+                service, [])
+            if member_id not in member_ids:
+                member_ids.append(member_id)
+
+    def invalidate(self, grid_id=None):
+        with self._lock:
+            if grid_id is None:
+                self._grids.clear()
+            else:
+                self._grids.pop(grid_id, None)
+
+
+service_member_cache = ServiceMemberCache()
@@ -0,0 +1,187 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import random
+import threading
+
+from oslo_log import log as logging
+
+from networking_infoblox.neutron.common import config as cfg
+
+
+LOG = logging.getLogger(__name__)
+
+POLICY_RANDOM = 'random'
+POLICY_LEAST_LOADED = 'least_loaded'
+POLICY_CAPACITY_CAPPED = 'capacity_capped'
+
+MAX_RECORDED_DECISIONS = 100
+
+
+class MemberLoad(object):
+    """Number of networks, ranges and zones served by a grid member."""
+
+    def __init__(self, networks=0, ranges=0, zones=0):
+        self.networks = networks
+        self.ranges = ranges
+        self.zones = zones
+
+    def add(self, networks=0, ranges=0, zones=0):
+        self.networks += networks
+        self.ranges += ranges
+        self.zones += zones
+
+    def weighted(self, weights):
+        return (self.networks * weights.get('network', 1) +
+                self.ranges * weights.get('range', 1) +
+                self.zones * weights.get('zone', 1))
+
+    def __eq__(self, other):
+        return (isinstance(other, MemberLoad) and
+                (self.networks, self.ranges, self.zones) ==
+                (other.networks, other.ranges, other.zones))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return ("MemberLoad{networks: %s, ranges: %s, zones: %s}" %
+                (self.networks, self.ranges, self.zones))
+
+
+class MemberScheduler(object):
+    """Chooses grid members for new network views based on member load.
+
+    Member loads are written to the db by grid sync, which runs in the ipam
+    agent, and passed in by the caller at selection time, so neutron server
+    workers place network views on the synced loads as well. The caller
+    records every placement in the db, so placements made between two
+    syncs are spread across workers. Loads fed with update_loads() are
+    used when the caller has none. Until the first grid sync, loads are
+    unknown and all candidates are treated equally. The latest decisions
+    are kept in 'decisions' and logged.
+    """
+
+    def __init__(self, policy=None, weights=None, capacity=None):
+        self._policy = policy
+        self._weights = weights
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self.loads = {}
+        self.decisions = collections.deque(maxlen=MAX_RECORDED_DECISIONS)
+
+    @property
+    def policy(self):
+        if self._policy is None:
+            return cfg.CONF.infoblox.member_scheduler_policy
+        return self._policy
+
+    @property
+    def weights(self):
+        if self._weights is None:
+            weights = cfg.CONF.infoblox.member_scheduler_weights
+            return {key: float(value) for key, value in weights.items()}
+        return self._weights
+
+    @property
+    def capacity(self):
+        if self._capacity is None:
+            return cfg.CONF.infoblox.member_scheduler_capacity
+        return self._capacity
+
+    def update_loads(self, loads):
+        """Replaces member loads with the ones discovered by grid sync.
+
+        :param loads: dict of member_id to MemberLoad
+        """
+        with self._lock:
+            self.loads = dict(loads)
+        LOG.debug("Member loads updated: %s", self.loads)
+
+    def get_load(self, member_id, base_load=0, loads=None):
+        weights = self.weights
+        if loads is None:
+            loads = self.loads
+        load = loads.get(member_id)
+        weighted = load.weighted(weights) if load else 0
+        return weighted + base_load
+
+    def select(self, candidates, purpose, base_loads=None, loads=None):
+        """Returns the member to place a new network view on.
+
+        :param candidates: grid member rows available for the placement
+        :param purpose: short description of the placement for the log
+        :param base_loads: dict of member_id to load known by the caller,
+        added to the synced member load
+        :param loads: dict of member_id to MemberLoad read by the caller,
+        used instead of the loads fed to the scheduler
+        :return: selected grid member row or None
+        """
+        if not candidates:
+            return None
+        base_loads = base_loads or {}
+        policy = self.policy
+
+        with self._lock:
+            member_loads = loads
+            loads = dict((member.member_id,
+                          self.get_load(member.member_id,
+                                        base_loads.get(member.member_id, 0),
+                                        member_loads))
+                         for member in candidates)
+            if policy == POLICY_RANDOM:
+                eligible = list(candidates)
+            else:
+                eligible = candidates
+                capacity = self.capacity
+                if policy == POLICY_CAPACITY_CAPPED and capacity > 0:
+                    eligible = [member for member in candidates
+                                if loads[member.member_id] < capacity]
+                if eligible:
+                    min_load = min(loads[member.member_id]
+                                   for member in eligible)
+                    eligible = [member for member in eligible
+                                if loads[member.member_id] == min_load]
+
+            if not eligible:
+                LOG.warning("No member is available for %(purpose)s: all "
+                            "%(count)s candidates reached capacity "
+                            "%(capacity)s.",
+                            {'purpose': purpose, 'count': len(candidates),
+                             'capacity': self.capacity})
+                return None
+
+            member = random.choice(eligible)
+            if member_loads is None:
+                # a new network view brings at least one network to the
+                # member
+                self.loads.setdefault(member.member_id, MemberLoad()).add(
+                    networks=1)
+
+        decision = {'purpose': purpose,
+                    'policy': policy,
+                    'member_id': member.member_id,
+                    'member_name': member.member_name,
+                    'load': loads[member.member_id],
+                    'candidates': len(candidates)}
+        self.decisions.append(decision)
+        LOG.info("Placed %(purpose)s on member %(member_name)s "
+                 "(policy: %(policy)s, load: %(load)s, "
+                 "candidates: %(candidates)s)", decision)
+        return member
+
+
+scheduler = MemberScheduler()
@@ -0,0 +1,373 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import contextlib
+import threading
+import time
+
+from oslo_log import log as logging
+import six
+from six.moves import BaseHTTPServer
+
+
+LOG = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# upper bounds in seconds of the histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return (six.text_type(value).replace('\\', r'\\').
+            replace('\n', r'\n').replace('"', r'\"'))
+
+
+def _format_labels(names, values, extra=None):
+    labels = ['%s="%s"' % (name, _escape(value))
+              for name, value in zip(names, values)]
+    if extra:
+        labels.append('%s="%s"' % extra)
+    return '{%s}' % ','.join(labels) if labels else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(object):
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError("%s expects labels %s, got %s" %
+                             (self.name, self.labelnames, sorted(labels)))
+        return tuple(six.text_type(labels[name]) for name in self.labelnames)
+
+    def _label_string(self, key):
+        return ','.join('%s=%s' % label
+                        for label in zip(self.labelnames, key))
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def collect(self):
+        lines = ['# HELP %s %s' % (self.name, _escape(self.documentation)),
+                 '# TYPE %s %s' % (self.name, self.type_name)]
+        with self._lock:
+            items = sorted(self._values.items())
+            for key, value in items:
+                lines.extend(self._collect_value(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by label values."""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def total(self, **labels):
+        """Returns the sum of counts whose labels have the given values."""
+        with self._lock:
+            return sum(value for key, value in self._values.items()
+                       if all(key[self.labelnames.index(name)] ==
+                              six.text_type(label)
+                              for name, label in labels.items()))
+
+    def _collect_value(self, key, value):
+        return ['%s%s %s' % (self.name,
+                             _format_labels(self.labelnames, key),
+                             _format_value(value))]
+
+    def summary(self):
+        with self._lock:
+            return dict((self._label_string(key), value)
+                        for key, value in self._values.items())
+
+
+class _HistogramValue(object):
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """Observations counted in fixed buckets, optionally split by labels."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram_value = self._values.get(key)
+            if histogram_value is None:
+                histogram_value = _HistogramValue(self.buckets)
+                self._values[key] = histogram_value
+            histogram_value.counts[index] += 1
+            histogram_value.sum += value
+            histogram_value.count += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observes the time spent in the block, also when it raises."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, **labels)
+
+    def get_count(self, **labels):
+        histogram_value = self._values.get(self._key(labels))
+        return histogram_value.count if histogram_value else 0
+
+    def _collect_value(self, key, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),),
+                                value.counts):
+            cumulative += count
+            lines.append('%s_bucket%s %d' % (
+                self.name,
+                _format_labels(self.labelnames, key,
+                               ('le', _format_value(bound))),
+                cumulative))
+        labels = _format_labels(self.labelnames, key)
+        lines.append('%s_sum%s %s' % (self.name, labels,
+                                      _format_value(value.sum)))
+        lines.append('%s_count%s %d' % (self.name, labels, value.count))
+        return lines
+
+    def _quantile(self, value, quantile):
+        """Returns the upper bound of the bucket holding the quantile."""
+        rank = quantile * value.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, value.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return '+Inf'
+
+    def worst_p99(self):
+        """Returns the highest p99 bucket bound over all label values."""
+        with self._lock:
+            bounds = [self._quantile(value, 0.99)
+                      for value in self._values.values()]
+        if '+Inf' in bounds:
+            return '+Inf'
+        return max(bounds) if bounds else None
+
+    def summary(self):
+        with self._lock:
+            return dict(
+                (self._label_string(key),
+                 {'count': value.count,
+                  'mean': round(value.sum / value.count, 4),
+                  'p99': self._quantile(value, 0.99)})
+                for key, value in self._values.items())
+
+
+class Registry(object):
+    """Counters and histograms of the process."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_class(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames,
+                              buckets=buckets)
+
+    def reset(self):
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def to_prometheus(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].collect())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Returns the non empty metrics split by label values.
+
+        Counters map label values to counts; histograms map them to the
+        count, the mean and the upper bound of the 99th percentile bucket.
+        """
+        summary = {}
+        for name, metric in self._metrics.items():
+            values = metric.summary()
+            if values:
+                summary[name] = values
+        return summary
+
+
+REGISTRY = Registry()
+
+EVENTS = REGISTRY.counter(
+    'infoblox_ipam_agent_events_total',
+    'Notifications processed by the ipam agent.',
+    ('event_type', 'result'))
+EVENT_SECONDS = REGISTRY.histogram(
+    'infoblox_ipam_agent_event_seconds',
+    'Time spent handling a notification.',
+    ('event_type',))
+EVENT_LAG_SECONDS = REGISTRY.histogram(
+    'infoblox_ipam_agent_event_lag_seconds',
+    'Time between emitting a notification and handling it.')
+WAPI_REQUESTS = REGISTRY.counter(
+    'infoblox_wapi_requests_total',
+    'WAPI requests by method and status class.',
+    ('method', 'status'))
+WAPI_SECONDS = REGISTRY.histogram(
+    'infoblox_wapi_request_seconds',
+    'Time until WAPI responded to a request.',
+    ('method',))
+IPAM_DRIVER_SECONDS = REGISTRY.histogram(
+    'infoblox_ipam_driver_seconds',
+    'Time spent in ipam driver operations.',
+    ('operation',))
+IPAM_DRIVER_ERRORS = REGISTRY.counter(
+    'infoblox_ipam_driver_errors_total',
+    'Ipam driver operations that raised.',
+    ('operation',))
+
+
+def state_summary():
+    """Returns totals and worst latencies fit for agent state.
+
+    Neutron keeps agent configurations in a column of 4095 characters, so
+    only a fixed set of aggregates is reported there; the values by label
+    are served on the metrics port.
+    """
+    return {'events': EVENTS.total(),
+            'event_errors': EVENTS.total(result='error'),
+            'event_p99': EVENT_SECONDS.worst_p99(),
+            'event_lag_p99': EVENT_LAG_SECONDS.worst_p99(),
+            'wapi_requests': WAPI_REQUESTS.total(),
+            'wapi_p99': WAPI_SECONDS.worst_p99(),
+            'ipam_driver_errors': IPAM_DRIVER_ERRORS.total(),
+            'ipam_driver_p99': IPAM_DRIVER_SECONDS.worst_p99()}
+
+
+def _on_wapi_response(response, *args, **kwargs):
+    method = response.request.method if response.request else ''
+    WAPI_REQUESTS.inc(method=method,
+                      status='%dxx' % (response.status_code // 100))
+    WAPI_SECONDS.observe(response.elapsed.total_seconds(), method=method)
+    return response
+
+
+def instrument_connector(connector):
+    """Records the WAPI requests sent by connector.
+
+    A response hook is added to the requests session of the connector, so
+    requests that fail before a response is received are not counted.
+    """
+    hooks = getattr(getattr(connector, 'session', None), 'hooks', None)
+    if isinstance(hooks, dict):
+        response_hooks = hooks.setdefault('response', [])
+        if _on_wapi_response not in response_hooks:
+            response_hooks.append(_on_wapi_response)
+    return connector
+
+
+class _MetricsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.to_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOG.debug("metrics request: " + format, *args)
+
+
+_http_server = None
+
+
+def start_http_server(port, host='127.0.0.1'):
+    """Serves /metrics of the process registry on host and port.
+
+    The endpoint is started once per process; a port of 0 disables it.
+    When the port is already taken, e.g. by another worker of the same
+    service, the endpoint is not started and a warning is logged.
+    """
+    global _http_server
+    if not port or _http_server is not None:
+        return _http_server or None
+    try:
+        _http_server = BaseHTTPServer.HTTPServer((host, port),
+                                                 _MetricsRequestHandler)
+    except EnvironmentError as e:
+        # remember the attempt so that it is not repeated per request
+        _http_server = False
+        LOG.warning("Unable to serve metrics on %(host)s:%(port)s: "
+                    "%(error)s", {'host': host, 'port': port, 'error': e})
+        return None
+    thread = threading.Thread(target=_http_server.serve_forever,
+                              name='infoblox-metrics')
+    thread.daemon = True
+    thread.start()
+    LOG.info("Serving metrics on http://%(host)s:%(port)s/metrics",
+             {'host': host, 'port': _http_server.server_port})
+    return _http_server
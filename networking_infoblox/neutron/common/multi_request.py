@@ -0,0 +1,207 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_log import log as logging
+import requests
+
+from infoblox_client import exceptions as ib_exc
+from infoblox_client import utils as ib_utils
+
+
+LOG = logging.getLogger(__name__)
+
+WAPI_REQUEST_OBJECT = 'request'
+
+
+def send(connector, calls):
+    """Posts calls as a WAPI 'request' object and returns their results.
+
+    connector.create_object can not be used since it accepts only 201
+    while NIOS replies 200 to a multi request.
+    """
+    url = connector._construct_url(WAPI_REQUEST_OBJECT)
+    opts = connector._get_request_options(data=calls)
+    connector._log_request('post', url, opts)
+    reply = connector.session.post(url, **opts)
+    connector._validate_authorized(reply)
+    if reply.status_code not in (requests.codes.OK, requests.codes.CREATED):
+        response = ib_utils.safe_json_load(reply.content)
+        raise ib_exc.InfobloxCannotCreateObject(
+            response=response,
+            obj_type=WAPI_REQUEST_OBJECT,
+            content=reply.content,
+            args=calls,
+            code=reply.status_code)
+    return connector._parse_reply(reply)
+
+
+class MultiRequest(object):
+    """Collects WAPI calls and sends them in one 'request' object call.
+
+    NIOS runs the calls in the given order within a single transaction,
+    so either all of them are applied or none is.
+    """
+
+    def __init__(self, connector):
+        self.connector = connector
+        self._requests = []
+
+    def add(self, method, obj, data=None, args=None):
+        """Adds a call and returns its position in the results."""
+        request = {'method': method, 'object': obj}
+        if data is not None:
+            request['data'] = data
+        if args is not None:
+            request['args'] = args
+        self._requests.append(request)
+        return len(self._requests) - 1
+
+    @staticmethod
+    def _get_args(return_fields):
+        if return_fields:
+            return {'_return_fields': ','.join(return_fields)}
+        return None
+
+    def search(self, obj_type, data, return_fields=None):
+        return self.add('GET', obj_type, data, self._get_args(return_fields))
+
+    def create(self, obj_type, data, return_fields=None):
+        return self.add('POST', obj_type, data,
+                        self._get_args(return_fields))
+
+    def update(self, ref, data):
+        return self.add('PUT', ref, data)
+
+    def delete(self, ref):
+        return self.add('DELETE', ref)
+
+    def update_object(self, ib_obj):
+        """Adds update of all changed fields of an infoblox_client object."""
+        return self.update(ib_obj.ref,
+                           ib_obj.to_dict(search_fields='exclude'))
+
+    def call(self):
+        """Sends collected calls and returns their results in order."""
+        if not self._requests:
+            return []
+        calls, self._requests = self._requests, []
+        LOG.debug("Sending WAPI multi request with %s calls", len(calls))
+        return send(self.connector, calls)
+
+    def __len__(self):
+        return len(self._requests)
+
+
+class PlanItem(object):
+
+    def __init__(self, obj_class, search_fields, fields=None, on_exists=None,
+                 on_created=None, create=True):
+        self.obj_class = obj_class
+        self.search_fields = search_fields
+        self.fields = fields
+        self.on_exists = on_exists
+        self.on_created = on_created
+        self.create = create
+        self.ib_obj = None
+        self.created = False
+
+
+class ProvisioningPlan(object):
+    """Create-checks infoblox objects with one read and one write request.
+
+    All items are searched in one multi request. Items that were not found
+    are then built and created in the order they were added, followed by
+    updates queued by on_exists callbacks, in a second multi request.
+    Since NIOS applies a multi request in one transaction, a failed write
+    leaves nothing behind; created objects are added to the rollback list
+    so that later failures can remove them.
+    """
+
+    def __init__(self, connector):
+        self.connector = connector
+        self._items = []
+        self._updates = []
+
+    def create_check(self, obj_class, search_fields, fields=None,
+                     on_exists=None, on_created=None):
+        """Adds an object to create unless it exists.
+
+        fields of the new object may be given as a callable, which is called
+        only when the object was not found; search_fields are used if fields
+        are not set.
+        """
+        item = PlanItem(obj_class, search_fields, fields, on_exists,
+                        on_created)
+        self._items.append(item)
+        return item
+
+    def search(self, obj_class, search_fields, on_exists=None):
+        item = PlanItem(obj_class, search_fields, on_exists=on_exists,
+                        create=False)
+        self._items.append(item)
+        return item
+
+    def update(self, ib_obj):
+        """Queues an update, meant to be called by on_exists callbacks."""
+        self._updates.append(ib_obj)
+
+    def run(self, rollback_list):
+        reads = MultiRequest(self.connector)
+        for item in self._items:
+            local_obj = item.obj_class(self.connector, **item.search_fields)
+            reads.search(local_obj.infoblox_type,
+                         local_obj.to_dict(search_fields='update'),
+                         local_obj.return_fields)
+        results = reads.call()
+
+        for item, found in zip(self._items, results):
+            if found:
+                item.ib_obj = item.obj_class.from_dict(self.connector,
+                                                       found[0])
+                if item.on_exists:
+                    item.on_exists(item.ib_obj)
+
+        writes = MultiRequest(self.connector)
+        created = []
+        for item in self._items:
+            if item.ib_obj is not None or not item.create:
+                continue
+            fields = item.fields or item.search_fields
+            if callable(fields):
+                fields = fields()
+            local_obj = item.obj_class(self.connector, **fields)
+            position = writes.create(local_obj.infoblox_type,
+                                     local_obj.to_dict(),
+                                     local_obj.return_fields)
+            created.append((item, local_obj, position))
+        for ib_obj in self._updates:
+            writes.update_object(ib_obj)
+        results = writes.call()
+
+        for item, local_obj, position in created:
+            reply = results[position]
+            if isinstance(reply, dict):
+                item.ib_obj = item.obj_class.from_dict(self.connector, reply)
+            else:
+                # reply is just a reference without return fields
+                local_obj._ref = reply
+                item.ib_obj = local_obj
+            item.created = True
+            rollback_list.append(item.ib_obj)
+            LOG.info("Infoblox %s was created: %s",
+                     item.ib_obj.infoblox_type, item.ib_obj)
+        for item, _, _ in created:
+            if item.on_created:
+                item.on_created(item.ib_obj)
@@ -0,0 +1,126 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+from networking_infoblox.neutron.common import config as cfg
+
+
+RESOURCES = ('network', 'subnet')
+
+
+class NeutronObjectCache(object):
+    """Read-through cache of neutron networks and subnets.
+
+    Objects are read from the plugin on miss and kept until a matching
+    notification updates or invalidates them, or until
+    'neutron_object_cache_ttl' seconds pass since notifications may be
+    consumed by another agent worker.
+
+    Every change bumps the version of the resource type so a plugin read
+    that started before it is not stored, and notifications carrying an
+    older 'revision_number' than the cached object are ignored.
+    """
+
+    def __init__(self, neutron_context, plugin, ttl=None):
+        self.context = neutron_context
+        self.plugin = plugin
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._objects = dict((resource, {}) for resource in RESOURCES)
+        self._versions = dict((resource, 0) for resource in RESOURCES)
+        self._purge_at = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        if self._ttl is None:
+            return cfg.CONF.infoblox.neutron_object_cache_ttl
+        return self._ttl
+
+    def get(self, resource, obj_id):
+        with self._lock:
+            entry = self._objects[resource].get(obj_id)
+            if entry is not None and entry[1] > time.time():
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            version = self._versions[resource]
+
+        getter = getattr(self.plugin, 'get_%s' % resource)
+        obj = getter(self.context, obj_id)
+
+        if obj:
+            with self._lock:
+                if version == self._versions[resource]:
+                    self._store(resource, obj_id, obj)
+        return obj
+
+    def get_network(self, network_id):
+        return self.get('network', network_id)
+
+    def get_subnet(self, subnet_id):
+        return self.get('subnet', subnet_id)
+
+    def put(self, resource, obj):
+        """Stores object from a notification unless a newer one is cached."""
+        obj_id = obj.get('id') if obj else None
+        if not obj_id:
+            return
+        with self._lock:
+            self._versions[resource] += 1
+            entry = self._objects[resource].get(obj_id)
+            if entry is not None and self._is_older(obj, entry[0]):
+                return
+            self._store(resource, obj_id, obj)
+
+    def invalidate(self, resource, obj_id=None):
+        with self._lock:
+            self._versions[resource] += 1
+            if obj_id is None:
+                self._objects[resource].clear()
+            else:
+                self._objects[resource].pop(obj_id, None)
+
+    def _store(self, resource, obj_id, obj):
+        ttl = self.ttl
+        if ttl <= 0:
+            return
+        now = time.time()
+        if now >= self._purge_at:
+            # drop expired objects that were never read again
+            self._purge_at = now + ttl
+            for objects in self._objects.values():
+                for expired_id in [cached_id for cached_id, entry
+                                   in objects.items() if entry[1] <= now]:
+                    del objects[expired_id]
+        self._objects[resource][obj_id] = (obj, now + ttl)
+
+    @staticmethod
+    def _is_older(obj, cached_obj):
+        revision = obj.get('revision_number')
+        cached_revision = cached_obj.get('revision_number')
+        if revision is None or cached_revision is None:
+            return False
+        return revision < cached_revision
+
+    def __len__(self):
+        return sum(len(objects) for objects in self._objects.values())
+
+    def __repr__(self):
+        return ("NeutronObjectCache{size: %s, hits: %s, misses: %s}" %
+                (len(self), self.hits, self.misses))
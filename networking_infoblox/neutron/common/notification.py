@@ -27,12 +27,46 @@ from networking_infoblox._i18n import _LI
 from networking_infoblox._i18n import _LW
 from networking_infoblox.neutron.common import config
 from networking_infoblox.neutron.common import constants as const
+from networking_infoblox.neutron.common import event_lanes
 from networking_infoblox.neutron.common import grid
+from networking_infoblox.neutron.common import hash_ring
+from networking_infoblox.neutron.common import metrics
+from networking_infoblox.neutron.common import notification_capture
 from networking_infoblox.neutron.common import notification_handler
+from networking_infoblox.neutron.common import utils
+from networking_infoblox.neutron.db import infoblox_db as dbi
 
 
 LOG = logging.getLogger(__name__)
 
+OP_TYPE_AGENT_WORKERS = 'ipam_agent_workers'
+
+
+def get_notification_pools(workers):
+    """Returns the notification pools listened to by workers."""
+    if workers > 1:
+        # every worker needs a queue of its own to receive all events
+        return ['%s-%d' % (const.AGENT_NOTIFICATION_POOL, worker_index)
+                for worker_index in range(workers)]
+    return [const.AGENT_NOTIFICATION_POOL]
+
+
+def delete_notification_pools(transport, pools):
+    """Deletes the queues the message broker keeps for pools.
+
+    Only amqp drivers keep a queue per pool, so nothing is deleted with
+    other drivers.
+
+    :return: True if the queues were deleted
+    """
+    get_connection = getattr(transport._driver, '_get_connection', None)
+    if get_connection is None:
+        return False
+    with get_connection() as connection:
+        for pool in pools:
+            connection.channel.queue_delete(pool)
+    return True
+
 
 class NotificationEndpoint(object):
 
@@ -57,8 +91,25 @@ class NotificationEndpoint(object):
         'compute.instance.create.end',
         'compute.instance.delete.end']
 
-    def __init__(self, context, grid_manager):
+    # events of these resources trigger grid syncs, so with several workers
+    # only the sync owner handles them and the others update their caches
+    sync_owner_resources = ('network', 'subnet')
+
+    # events no other event depends on; they wait in the low lane so that
+    # e.g. a network rename does not delay dns names of booting instances
+    low_priority_events = ('network.update.end',
+                           'network.delete.end',
+                           'subnet.update.end',
+                           'subnet.delete.end',
+                           'compute.instance.delete.end')
+
+    def __init__(self, context, grid_manager, worker_index=0, workers=1):
         self.context = context
+        self.worker_index = worker_index
+        self.lanes = None
+        self.hash_ring = None
+        if workers > 1:
+            self.hash_ring = hash_ring.HashRing(range(workers))
         # Using filter in oslo_messaing 4.1.1 did not work for some reason
         # so commenting filter out
         # self.filter_rule = oslo_messaging.NotificationFilter(
@@ -66,11 +117,75 @@ class NotificationEndpoint(object):
         #    event_type='|'.join(self.event_subscription_list))
         self.handler = notification_handler.IpamEventHandler(
             self.context, grid_manager=grid_manager)
+        self.capture = None
+        capture_file = (
+            config.CONF.infoblox.ipam_agent_notification_capture_file)
+        if capture_file and self.is_sync_owner:
+            self.capture = notification_capture.NotificationCapture(
+                capture_file)
+
+    @property
+    def is_sync_owner(self):
+        return self.worker_index == 0
 
     def info(self, ctxt, publisher_id, event_type, payload, metadata):
         if event_type in self.event_subscription_list:
-            return self.handler.process(ctxt, publisher_id, event_type,
-                                        payload, metadata)
+            if self.capture:
+                self.capture.write(ctxt, publisher_id, event_type, payload)
+            if not self._is_handled_here(event_type, payload):
+                return None
+            if self.lanes is None or self.handler.is_trace_only(event_type):
+                return self.handler.process(ctxt, publisher_id, event_type,
+                                            payload, metadata)
+            # the message is acknowledged once it is queued
+            lane = (event_lanes.LANE_LOW
+                    if event_type in self.low_priority_events
+                    else event_lanes.LANE_HIGH)
+            self.lanes.put(lane, ctxt, publisher_id, event_type, payload,
+                           metadata)
+            return oslo_messaging.NotificationResult.HANDLED
+
+    def start_lanes(self, size):
+        """Queues events that are not trace only in lanes of size events.
+
+        Until started, and when size is 0, events are handled as they are
+        received.
+        """
+        if size > 0 and self.lanes is None:
+            self.lanes = event_lanes.EventLanes(self.handler.process, size)
+            self.lanes.start()
+
+    def stop_lanes(self, timeout=None):
+        """Handles queued events for up to timeout seconds and drops the
+        rest, logging every dropped event.
+        """
+        if self.lanes is not None:
+            for event in self.lanes.stop(timeout):
+                ctxt, publisher_id, event_type, payload, metadata = event
+                resource_id = utils.get_notification_resource_id(event_type,
+                                                                 payload)
+                LOG.warning(_LW("Dropped queued event %(event_type)s of "
+                                "%(resource_id)s."),
+                            {'event_type': event_type,
+                             'resource_id': resource_id})
+            self.lanes = None
+
+    def _is_handled_here(self, event_type, payload):
+        """Tells whether this worker handles the event.
+
+        Every worker receives all events. Events of a resource are handled
+        by the worker its id hashes to, which keeps them in order.
+        """
+        if self.hash_ring is None:
+            return True
+        if event_type.split('.')[0] in self.sync_owner_resources:
+            if not self.is_sync_owner:
+                self.handler.update_caches(event_type, payload)
+            return self.is_sync_owner
+        resource_id = utils.get_notification_resource_id(event_type, payload)
+        if resource_id is None:
+            return self.is_sync_owner
+        return self.hash_ring.get_node(resource_id) == self.worker_index
 
 
 class NotificationService(service.Service):
@@ -79,23 +194,36 @@ class NotificationService(service.Service):
     NOTIFICATION_TOPIC = 'notifications'
     RESYNC_TRY_INTERVAL = 30
 
-    def __init__(self, report_interval=None):
+    def __init__(self, report_interval=None, worker_index=0, workers=1):
         super(NotificationService, self).__init__()
         self.report_thread = None
+        self.resync_thread = None
+        self.snapshot_thread = None
+        self.dns_binding_thread = None
         self.event_listener = None
         self.executor = "blocking"
         if report_interval:
             self.report_interval = report_interval
         else:
             self.report_interval = config.CONF.AGENT.report_interval
+        # the first worker owns grid syncs and state reports, the others
+        # reload the grid data it writes to the database
+        self.worker_index = worker_index
+        self.workers = workers
+        self.is_sync_owner = worker_index == 0
         self.context = context.get_admin_context()
-        # Make sure config is in sync before using grid_sync_maximum_wait_time
         self.grid_syncer = grid.GridSyncer()
-        self.grid_syncer.sync(True)
+        if self.is_sync_owner:
+            # Make sure config is in sync before using
+            # grid_sync_maximum_wait_time
+            self.grid_syncer.sync(True)
+        else:
+            self.grid_syncer.get_config()
         self.grid_manager = self.grid_syncer._grid_manager
-        self._init_agent_report_thread()
+        self.snapshot_sync_time = dbi.get_last_sync_time(self.context.session)
         self._init_notification_listener()
-        self._init_periodic_resync()
+        if self.is_sync_owner:
+            self._remove_stale_pools()
 
     def _init_notification_listener(self):
         self.transport = oslo_messaging.get_transport(config.CONF)
@@ -105,17 +233,49 @@ class NotificationService(service.Service):
             oslo_messaging.Target(exchange=const.NOTIFICATION_EXCHANGE_NOVA,
                                   topic=self.NOTIFICATION_TOPIC)
         ]
-        self.event_endpoints = [NotificationEndpoint(self.context,
-                                                     self.grid_manager)]
+        self.event_endpoints = [NotificationEndpoint(
+            self.context, self.grid_manager, self.worker_index, self.workers)]
+        self.pool = get_notification_pools(self.workers)[self.worker_index]
+
+    def _remove_stale_pools(self):
+        """Deletes queues of pools left by a different number of workers.
+
+        The message broker keeps the queue of a pool after its listener is
+        gone and keeps filling it with every notification, so the sync
+        owner records the number of workers and deletes the queues of the
+        pools that no worker listens to anymore.
+        """
+        session = self.context.session
+        try:
+            previous = int(dbi.get_operation_value(
+                session, OP_TYPE_AGENT_WORKERS) or 0)
+            stale_pools = []
+            if previous:
+                stale_pools = sorted(
+                    set(get_notification_pools(previous)) -
+                    set(get_notification_pools(self.workers)))
+            if stale_pools and delete_notification_pools(self.transport,
+                                                         stale_pools):
+                LOG.info(_LI("Deleted queues of notification pools %s."),
+                         ', '.join(stale_pools))
+            # not recorded when deleting failed, so the next start retries
+            dbi.set_operation_value(session, OP_TYPE_AGENT_WORKERS,
+                                    str(self.workers))
+        except Exception as e:
+            LOG.warning(_LW("Unable to delete queues of stale notification "
+                            "pools: %s"), e)
 
     def _get_resync_interval(self):
         conf = self.grid_manager.grid_config
         try:
-            return int(conf.grid_sync_maximum_wait_time)
+            minimum = int(conf.grid_sync_minimum_wait_time)
+            maximum = int(conf.grid_sync_maximum_wait_time)
         except TypeError:
-            LOG.warning(_LW("Invalid resync interval set: %s"),
-                        conf.grid_sync_maximum_wait_time)
+            LOG.warning(_LW("Invalid resync interval set: %(min)s, %(max)s"),
+                        {'min': conf.grid_sync_minimum_wait_time,
+                         'max': conf.grid_sync_maximum_wait_time})
             return self.RESYNC_TRY_INTERVAL
+        return self.grid_manager.resync_interval.get(minimum, maximum)
 
     def _init_periodic_resync(self):
         self.resync_thread = loopingcall.FixedIntervalLoopingCall(
@@ -131,6 +291,42 @@ class NotificationService(service.Service):
         except Exception as e:
             LOG.exception(_LE("Resync failed due to error: %s"), e)
 
+    def _init_snapshot_refresh(self):
+        interval = config.CONF.infoblox.ipam_agent_snapshot_refresh_interval
+        self.snapshot_thread = loopingcall.FixedIntervalLoopingCall(
+            self._refresh_snapshot)
+        self.snapshot_thread.start(interval=interval, initial_delay=interval)
+
+    def _refresh_snapshot(self):
+        try:
+            last_sync_time = dbi.get_last_sync_time(self.context.session)
+            if last_sync_time == self.snapshot_sync_time:
+                return
+            LOG.info(_LI("Reloading grid data synced at %s."),
+                     last_sync_time)
+            for endpoint in self.event_endpoints:
+                endpoint.handler.refresh_grid_data()
+            self.snapshot_sync_time = last_sync_time
+        except Exception as e:
+            LOG.exception(_LE("Reloading grid data failed due to error: %s"),
+                          e)
+
+    def _init_dns_binding_drain(self):
+        if not config.CONF.infoblox.async_dns_binding:
+            return
+        self.dns_binding_thread = loopingcall.FixedIntervalLoopingCall(
+            self._drain_dns_binding_jobs)
+        self.dns_binding_thread.start(
+            interval=config.CONF.infoblox.dns_binding_drain_interval)
+
+    def _drain_dns_binding_jobs(self):
+        try:
+            for endpoint in self.event_endpoints:
+                endpoint.handler.drain_dns_binding_jobs()
+        except Exception as e:
+            LOG.exception(_LE("Binding dns names failed due to error: %s"),
+                          e)
+
     def _init_agent_report_thread(self):
         self.state_rpc = agent_rpc.PluginReportStateAPI(topics.PLUGIN)
         self.agent_state = {
@@ -141,12 +337,24 @@ class NotificationService(service.Service):
             'start_flag': True,
             'agent_type': const.AGENT_TYPE_INFOBLOX_IPAM}
         self.use_call = True
-        if self.report_interval:
+        if self.report_interval and self.is_sync_owner:
             self.report_thread = loopingcall.FixedIntervalLoopingCall(
                 self._report_state)
             self.report_thread.start(interval=self.report_interval)
 
     def _report_state(self):
+        configurations = self.agent_state['configurations']
+        sync_profile = self.grid_manager.last_sync_profile
+        if sync_profile:
+            configurations['grid_sync_profile'] = sync_profile.to_dict()
+        if self.grid_manager.last_sync_changes is not None:
+            configurations['grid_sync_changes'] = (
+                self.grid_manager.last_sync_changes)
+        configurations['resync_interval'] = self._get_resync_interval()
+        configurations['metrics'] = metrics.state_summary()
+        for endpoint in self.event_endpoints:
+            if endpoint.lanes is not None:
+                configurations['event_lanes'] = endpoint.lanes.depths()
         try:
             self.state_rpc.report_state(self.context, self.agent_state,
                                         self.use_call)
@@ -165,11 +373,24 @@ class NotificationService(service.Service):
 
     def start(self):
         super(NotificationService, self).start()
+        # threads are started here since workers are forked after __init__
+        if self.is_sync_owner:
+            self._init_periodic_resync()
+        else:
+            self._init_snapshot_refresh()
+        self._init_agent_report_thread()
+        self._init_dns_binding_drain()
+        for endpoint in self.event_endpoints:
+            endpoint.start_lanes(
+                config.CONF.infoblox.ipam_agent_event_queue_size)
+        metrics.start_http_server(
+            config.CONF.infoblox.ipam_agent_metrics_port,
+            config.CONF.infoblox.metrics_bind_host)
         self.event_listener = get_notification_listener(
             self.transport,
             self.event_targets,
             self.event_endpoints,
-            pool=const.AGENT_NOTIFICATION_POOL,
+            pool=self.pool,
             executor=self.executor
         )
         self.event_listener.start()
@@ -178,8 +399,16 @@ class NotificationService(service.Service):
         if self.event_listener:
             self.event_listener.stop()
             self.event_listener.wait()
-        if self.report_thread:
-            self.report_thread.stop()
+        # queued events are acknowledged already, so they are handled
+        # before stopping even when the service is not stopped gracefully;
+        # the ones not handled within the drain timeout are lost
+        for endpoint in self.event_endpoints:
+            endpoint.stop_lanes(
+                config.CONF.infoblox.ipam_agent_event_drain_timeout)
+        for thread in (self.report_thread, self.resync_thread,
+                       self.snapshot_thread, self.dns_binding_thread):
+            if thread:
+                thread.stop()
         super(NotificationService, self).stop(graceful)
 
 
@@ -0,0 +1,84 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Capture of the notifications received by the ipam agent.
+
+A capture is a file of JSON lines, one notification per line, with the
+keys event_type, payload, ctxt and publisher_id. Credentials found in the
+message context are not written.
+"""
+
+import threading
+
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+
+
+LOG = logging.getLogger(__name__)
+
+SECRET_CONTEXT_KEYS = ('token', 'password', 'catalog')
+
+
+def _strip_secrets(ctxt):
+    return dict((key, value) for key, value in (ctxt or {}).items()
+                if not any(secret in key for secret in SECRET_CONTEXT_KEYS))
+
+
+def build_record(event_type, payload, ctxt=None, publisher_id=None):
+    return {'event_type': event_type,
+            'payload': payload,
+            'ctxt': _strip_secrets(ctxt),
+            'publisher_id': publisher_id}
+
+
+def read_capture(path):
+    """Yields the records of a capture file."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield jsonutils.loads(line)
+
+
+def write_capture(path, records):
+    with open(path, 'w') as f:
+        for record in records:
+            f.write(jsonutils.dumps(record) + '\n')
+
+
+class NotificationCapture(object):
+    """Appends the notifications passed to write to a capture file.
+
+    Each notification is written with a single write to a file opened for
+    appending, so workers of the agent can share the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def write(self, ctxt, publisher_id, event_type, payload):
+        try:
+            line = jsonutils.dumps(build_record(event_type, payload, ctxt,
+                                                publisher_id)) + '\n'
+            with self._lock:
+                self._file.write(line)
+                self._file.flush()
+        except Exception as e:
+            LOG.warning("Unable to capture %(event_type)s: %(error)s",
+                        {'event_type': event_type, 'error': e})
+
+    def close(self):
+        self._file.close()
@@ -14,11 +14,14 @@
 #    under the License.
 
 import netaddr
+import threading
+
 from neutron import manager
 from neutron_lib.plugins import directory
 from oslo_log import log as logging
 import oslo_messaging
 from oslo_utils import encodeutils
+from oslo_utils import timeutils
 from sqlalchemy import exc as sql_exc
 
 from infoblox_client import objects as ib_objects
@@ -26,15 +29,47 @@ from infoblox_client import objects as ib_objects
 from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import context
 from networking_infoblox.neutron.common import dns
+from networking_infoblox.neutron.common import dns_binding
 from networking_infoblox.neutron.common import grid
 from networking_infoblox.neutron.common import ipam
 from networking_infoblox.neutron.common import keystone_manager
+from networking_infoblox.neutron.common import metrics
+from networking_infoblox.neutron.common import neutron_cache
+from networking_infoblox.neutron.common import subnet_index
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
 
 
 LOG = logging.getLogger(__name__)
 
+# oslo.messaging sets the timestamp of notifications to str(utcnow())
+EVENT_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# what a notification handler uses
+DB_READ = 'db_read'
+DB_WRITE = 'db_write'
+WAPI = 'wapi'
+ALL_NEEDS = frozenset([DB_READ, DB_WRITE, WAPI])
+
+
+def needs(*resources, **kwargs):
+    """Declares what a notification handler uses.
+
+    A handler that needs nothing only logs the event. It is run without
+    the handler lock, the message context and a transaction, which only
+    handlers that write to the database get. Handlers that declare
+    nothing are assumed to need everything.
+    :param when: name of a handler method telling whether the resources
+                 are needed, nothing is needed when it returns False
+    """
+    when = kwargs.pop('when', None)
+
+    def decorator(func):
+        func.needs = frozenset(resources)
+        func.needs_when = when
+        return func
+    return decorator
+
 
 class IpamEventHandler(object):
 
@@ -61,10 +96,53 @@ class IpamEventHandler(object):
         self._cached_grid_members = None
         self._cached_network_views = None
         self._cached_mapping_conditions = None
+        self._subnet_index = subnet_index.SubnetIndex()
+        self._neutron_cache = neutron_cache.NeutronObjectCache(self.context,
+                                                               self.plugin)
+        self._context_pool = context.InfobloxContextPool()
+        self._dns_binding_queue = dns_binding.DnsBindingQueue(self.context,
+                                                              self.plugin)
+        # notifications and the periodic dns binding drain share the session
+        self._lock = threading.Lock()
 
     def _resync(self, force_sync=False):
         self.grid_mgr.sync(force_sync)
+        self._load_grid_data()
 
+    def refresh_grid_data(self):
+        """Reloads grid data a grid sync of another worker has written."""
+        with self._lock:
+            self.grid_mgr.get_config()
+            self._load_grid_data()
+
+    def update_caches(self, event_type, payload):
+        """Applies a network or subnet event handled by another worker.
+
+        Only the caches of this worker are updated; grid data is reloaded
+        by refresh_grid_data once the sync the event triggers is done.
+        """
+        resource, action, sequence = event_type.split('.')
+        if sequence != 'end':
+            return
+        with self._lock:
+            if action == 'delete':
+                obj_id = payload.get(resource + '_id')
+                self._neutron_cache.invalidate(resource, obj_id)
+                if resource == 'network':
+                    self._subnet_index.remove_network(obj_id)
+                else:
+                    self._subnet_index.remove_subnet(obj_id)
+                self._context_pool.invalidate(**{resource + '_id': obj_id})
+                return
+            objs = payload.get(resource + 's') or [payload.get(resource)]
+            for obj in objs:
+                self._neutron_cache.put(resource, obj)
+                if resource == 'subnet':
+                    self._subnet_index.add_subnet(obj)
+                self._context_pool.invalidate(
+                    **{resource + '_id': obj.get('id')})
+
+    def _load_grid_data(self):
         self._cached_grid_members = dbi.get_members(
             self.context.session, grid_id=self.grid_id,
             member_status=const.MEMBER_STATUS_ON)
@@ -72,24 +150,71 @@ class IpamEventHandler(object):
             self.context.session, grid_id=self.grid_id)
         self._cached_mapping_conditions = dbi.get_mapping_conditions(
             self.context.session, grid_id=self.grid_id)
+        # pooled contexts were built from the replaced grid data
+        self._context_pool.new_generation()
+
+    def get_needs(self, event_type):
+        """Returns what the handler of the event uses."""
+        return self._get_needs(
+            getattr(self, utils.get_notification_handler_name(event_type)))
+
+    def _get_needs(self, handler):
+        resources = getattr(handler, 'needs', None)
+        if not isinstance(resources, frozenset):
+            return ALL_NEEDS
+        when = getattr(handler, 'needs_when', None)
+        if when is not None and not getattr(self, when)():
+            return frozenset()
+        return resources
+
+    def is_trace_only(self, event_type):
+        """Tells whether the handler of the event only logs it."""
+        return not self.get_needs(event_type)
 
     def process(self, ctxt, publisher_id, event_type, payload, metadata):
-        self.ctxt = ctxt
-        self.user_id = self.ctxt.get('user_id')
+        self._record_event_lag(metadata)
 
+        result = 'error'
         try:
-            handler_name = utils.get_notification_handler_name(event_type)
-            handler = getattr(self, handler_name)
-            if handler:
-                with self.context.session.begin(subtransactions=True):
+            with metrics.EVENT_SECONDS.time(event_type=event_type):
+                handler = getattr(
+                    self, utils.get_notification_handler_name(event_type))
+                resources = self._get_needs(handler)
+                if not resources:
+                    # runs beside queued events, so it must not touch ctxt
                     handler(payload)
+                else:
+                    with self._lock:
+                        self.ctxt = ctxt
+                        self.user_id = self.ctxt.get('user_id')
+                        if DB_WRITE in resources:
+                            with self.context.session.begin(
+                                    subtransactions=True):
+                                handler(payload)
+                        else:
+                            handler(payload)
+            result = 'handled'
             return oslo_messaging.NotificationResult.HANDLED
         except sql_exc.OperationalError as e:
             LOG.info("Operational Error occurred. Please restart the agent.")
             LOG.error(encodeutils.exception_to_unicode(e))
         except Exception as e:
             LOG.error(encodeutils.exception_to_unicode(e))
+        finally:
+            metrics.EVENTS.inc(event_type=event_type, result=result)
 
+    @staticmethod
+    def _record_event_lag(metadata):
+        """Records the time the notification spent in the queue."""
+        try:
+            emitted = timeutils.parse_strtime(metadata['timestamp'],
+                                              EVENT_TIMESTAMP_FORMAT)
+        except (KeyError, TypeError, ValueError):
+            return
+        lag = timeutils.delta_seconds(emitted, timeutils.utcnow())
+        metrics.EVENT_LAG_SECONDS.observe(max(lag, 0))
+
+    @needs(DB_WRITE, WAPI)
     def create_network_alert(self, payload):
         """Notifies that new networks are about to be created.
 
@@ -105,7 +230,10 @@ class IpamEventHandler(object):
                 LOG.info("Creating network: %s", network)
 
         self._resync()
+        # networks are being added, so look at the grid again sooner
+        self.grid_mgr.resync_interval.tighten()
 
+    @needs(DB_WRITE, WAPI)
     def create_subnet_alert(self, payload):
         """Notifies that new subnets are about to be created.
 
@@ -121,7 +249,9 @@ class IpamEventHandler(object):
                 LOG.info("Creating subnet: %s", subnet)
 
         self._resync()
+        self.grid_mgr.resync_interval.tighten()
 
+    @needs(DB_WRITE)
     def create_network_sync(self, payload):
         """Notifies that new networks have been created."""
         if 'networks' in payload:
@@ -132,6 +262,7 @@ class IpamEventHandler(object):
         for network in networks:
             if self.traceable:
                 LOG.info("Created network: %s", network)
+            self._neutron_cache.put('network', network)
             dbi.add_or_update_network(self.context.session,
                                       network.get('id'), network.get('name'))
 
@@ -141,6 +272,7 @@ class IpamEventHandler(object):
                                                    self.ctxt['tenant_id'],
                                                    self.ctxt['tenant_name'])
 
+    @needs(DB_WRITE, WAPI)
     def update_network_sync(self, payload):
         """Notifies that the network property has been updated."""
         network = payload.get('network')
@@ -148,6 +280,8 @@ class IpamEventHandler(object):
         if self.traceable:
             LOG.info("Updated network: %s", network)
 
+        self._neutron_cache.put('network', network)
+        self._context_pool.invalidate(network_id=network.get('id'))
         ib_context = context.InfobloxContext(self.context, self.user_id,
                                              network, None, self.grid_config,
                                              self.plugin)
@@ -165,6 +299,7 @@ class IpamEventHandler(object):
                 need_new_zones = True
         ipam_controller.update_network_sync(need_new_zones)
 
+    @needs(DB_WRITE, WAPI)
     def delete_network_sync(self, payload):
         """Notifies that the network has been deleted."""
         network_id = payload.get('network_id')
@@ -174,7 +309,11 @@ class IpamEventHandler(object):
 
         self._resync()
         dbi.remove_network(self.context.session, network_id)
+        self._subnet_index.remove_network(network_id)
+        self._neutron_cache.invalidate('network', network_id)
+        self._context_pool.invalidate(network_id=network_id)
 
+    @needs(DB_WRITE, WAPI)
     def create_subnet_sync(self, payload):
         """Notifies that new subnets have been created."""
         if 'subnets' in payload:
@@ -185,9 +324,12 @@ class IpamEventHandler(object):
         for subnet in subnets:
             if self.traceable:
                 LOG.info("Created subnet: %s", subnet)
+            self._subnet_index.add_subnet(subnet)
+            self._neutron_cache.put('subnet', subnet)
 
         self._resync(True)
 
+    @needs(DB_WRITE, WAPI)
     def update_subnet_sync(self, payload):
         """Notifies that the subnet has been updated."""
         subnet = payload.get('subnet')
@@ -195,8 +337,12 @@ class IpamEventHandler(object):
         if self.traceable:
             LOG.info("Updated subnet: %s", subnet)
 
+        self._subnet_index.add_subnet(subnet)
+        self._neutron_cache.put('subnet', subnet)
+        self._context_pool.invalidate(subnet_id=subnet.get('id'))
         self._resync(True)
 
+    @needs(DB_WRITE, WAPI)
     def delete_subnet_sync(self, payload):
         """Notifies that the subnet has been deleted."""
         subnet_id = payload.get('subnet_id')
@@ -204,8 +350,12 @@ class IpamEventHandler(object):
         if self.traceable:
             LOG.info("Deleted subnet: %s", subnet_id)
 
+        self._subnet_index.remove_subnet(subnet_id)
+        self._neutron_cache.invalidate('subnet', subnet_id)
+        self._context_pool.invalidate(subnet_id=subnet_id)
         self._resync(True)
 
+    @needs(DB_WRITE, WAPI, when='_binds_dns_names')
     def create_port_sync(self, payload):
         """Notifies that new ports have been created.
 
@@ -221,17 +371,56 @@ class IpamEventHandler(object):
         for port in ports:
             if self.traceable:
                 LOG.info("Created port: %s", port)
+        self._drain_dns_binding_jobs([port['id'] for port in ports])
+
+    @staticmethod
+    def _binds_dns_names():
+        # created ports only bind dns names queued by the ipam driver
+        return dns_binding.is_enabled()
+
+    def drain_dns_binding_jobs(self):
+        """Binds dns names of ips whose port create event was missed."""
+        with self._lock:
+            self._drain_dns_binding_jobs()
+
+    def _drain_dns_binding_jobs(self, port_ids=None):
+        if dns_binding.is_enabled():
+            self._dns_binding_queue.drain(self._bind_dns_binding_job,
+                                          port_ids)
+
+    def _bind_dns_binding_job(self, job, port):
+        subnet = self._neutron_cache.get_subnet(job.subnet_id)
+        if not subnet:
+            LOG.warning("No subnet was found for subnet_id=%s",
+                        job.subnet_id)
+            return
+
+        ib_context = self._context_pool.get(
+            self.context, job.user_id, None, subnet, self.grid_config,
+            self.plugin, self._cached_grid_members,
+            self._cached_network_views,
+            self._cached_mapping_conditions)
+        dns_controller = dns.DnsController(ib_context)
+        dns_controller.bind_names(job.ip_address,
+                                  None,
+                                  port['id'],
+                                  port['tenant_id'],
+                                  port['device_id'],
+                                  port['device_owner'],
+                                  port_name=port['name'])
 
     def _process_port(self, port, event, instance_name=None):
+        # names queued by the ipam driver are bound before they are changed
+        self._drain_dns_binding_jobs([port['id']])
         for fixed_ip in port['fixed_ips']:
             subnet_id = fixed_ip['subnet_id']
-            subnet = self.plugin.get_subnet(self.context, subnet_id)
+            subnet = self._neutron_cache.get_subnet(subnet_id)
             if not subnet:
                 LOG.warning("No subnet was found for subnet_id=%s",
                             subnet_id)
                 continue
 
-            ib_context = context.InfobloxContext(
+            ib_context = self._context_pool.get(
                 self.context, self.user_id, None, subnet, self.grid_config,
                 self.plugin, self._cached_grid_members,
                 self._cached_network_views,
@@ -259,6 +448,7 @@ class IpamEventHandler(object):
                     const.NEUTRON_DEVICE_OWNER_COMPUTE_NOVA,
                     port_name=port['name'])
 
+    @needs(DB_WRITE, WAPI)
     def update_port_sync(self, payload):
         """Notifies that the port has been updated."""
         port = payload.get('port')
@@ -279,6 +469,7 @@ class IpamEventHandler(object):
         if self.traceable:
             LOG.info("Updated port: %s", port)
 
+    @needs()
     def delete_port_sync(self, payload):
         """Notifies that the port has been deleted."""
         port_id = payload.get('port_id')
@@ -286,6 +477,7 @@ class IpamEventHandler(object):
         if self.traceable:
             LOG.info("Deleted port: %s", port_id)
 
+    @needs()
     def create_floatingip_sync(self, payload):
         """Notifies that a new floating ip has been created.
 
@@ -333,18 +525,18 @@ class IpamEventHandler(object):
                         (port, fixed_ip))
             return None
 
-        subnet = self.plugin.get_subnet(self.context, subnet_ids[0])
+        subnet = self._neutron_cache.get_subnet(subnet_ids[0])
         if not subnet:
             LOG.warning("No subnet was found for subnet_id: %s" %
                         subnet_ids[0])
             return
 
-        ib_context = context.InfobloxContext(self.context, self.user_id,
-                                             None, subnet, self.grid_config,
-                                             self.plugin,
-                                             self._cached_grid_members,
-                                             self._cached_network_views,
-                                             self._cached_mapping_conditions)
+        ib_context = self._context_pool.get(self.context, self.user_id,
+                                            None, subnet, self.grid_config,
+                                            self.plugin,
+                                            self._cached_grid_members,
+                                            self._cached_network_views,
+                                            self._cached_mapping_conditions)
 
         connector = ib_context.connector
         netview = ib_context.mapping.network_view
@@ -361,6 +553,7 @@ class IpamEventHandler(object):
 
         return ib_address.extattrs.get(const.EA_VM_NAME)
 
+    @needs(DB_WRITE, WAPI)
     def update_floatingip_sync(self, payload):
         """Notifies that the floating ip has been updated.
 
@@ -386,13 +579,13 @@ class IpamEventHandler(object):
         if subnet is None:
             return
 
-        network = self.plugin.get_network(self.context, network_id)
-        ib_context = context.InfobloxContext(self.context, self.user_id,
-                                             network, subnet, self.grid_config,
-                                             self.plugin,
-                                             self._cached_grid_members,
-                                             self._cached_network_views,
-                                             self._cached_mapping_conditions)
+        network = self._neutron_cache.get_network(network_id)
+        ib_context = self._context_pool.get(self.context, self.user_id,
+                                            network, subnet, self.grid_config,
+                                            self.plugin,
+                                            self._cached_grid_members,
+                                            self._cached_network_views,
+                                            self._cached_mapping_conditions)
         dns_controller = dns.DnsController(ib_context)
 
         if associated_port_id:
@@ -422,17 +615,27 @@ class IpamEventHandler(object):
     def _get_mapping_neutron_subnet(self, network_id, floating_ip):
         """Search subnet by network id and floating ip.
 
-        Iterates through subnets from db and finds cidr that matches
-        floaging ip.
+        Looks up the subnet index of the network for cidr that matches
+        floating ip.
         returns: subnet dict for floating ip and network id combination or
                  None if no subnet was found.
         """
+        loaded = self._subnet_index.is_loaded(network_id)
+        if not loaded:
+            self._load_subnet_index(network_id)
+        subnet = self._subnet_index.find_subnet(network_id, floating_ip)
+        if subnet is None and loaded:
+            # the subnet may have been created while another agent worker
+            # consumed the notification
+            self._load_subnet_index(network_id)
+            subnet = self._subnet_index.find_subnet(network_id, floating_ip)
+        return subnet
+
+    def _load_subnet_index(self, network_id):
         subnets = self.plugin.get_subnets_by_network(self.context, network_id)
-        for subnet in subnets:
-            if (netaddr.IPAddress(floating_ip) in
-                    netaddr.IPNetwork(subnet['cidr'])):
-                return subnet
+        self._subnet_index.load_network(network_id, subnets)
 
+    @needs()
     def delete_floatingip_sync(self, payload):
         """Notifies that the floating ip has been deleted."""
         floatingip_id = payload.get('floatingip_id')
@@ -440,6 +643,7 @@ class IpamEventHandler(object):
         if self.traceable:
             LOG.info("Deleted floatingip: %s", floatingip_id)
 
+    @needs(DB_WRITE, WAPI)
     def create_instance_sync(self, payload):
         """Notifies that an instance has been created."""
         instance_id = payload.get('instance_id')
@@ -462,6 +666,7 @@ class IpamEventHandler(object):
         for port in ports:
             self._process_port(port, 'Instance creation', instance_name)
 
+    @needs(DB_WRITE, WAPI)
     def delete_instance_sync(self, payload):
         """Notifies that an instance has been deleted."""
         instance_id = payload.get('instance_id')
@@ -473,11 +678,14 @@ class IpamEventHandler(object):
         vm_id_ea = ib_objects.EA({'VM ID': instance_id})
         subnets = dbi.get_external_subnets(self.context.session)
         for cur_subnet in subnets:
-            subnet = self.plugin.get_subnet(self.context,
-                                            cur_subnet.id)
-            network = self.plugin.get_network(self.context,
-                                              cur_subnet.network_id)
-            ib_context = context.InfobloxContext(
+            network_id = cur_subnet.network_id
+            if not self._subnet_index.is_loaded(network_id):
+                self._load_subnet_index(network_id)
+            subnet = self._subnet_index.get_subnet(network_id, cur_subnet.id)
+            if subnet is None:
+                subnet = self._neutron_cache.get_subnet(cur_subnet.id)
+            network = self._neutron_cache.get_network(network_id)
+            ib_context = self._context_pool.get(
                 self.context, self.user_id, network, subnet,
                 self.grid_config, self.plugin, self._cached_grid_members,
                 self._cached_network_views, self._cached_mapping_conditions)
@@ -499,9 +707,9 @@ class IpamEventHandler(object):
                 continue
 
             if hasattr(ib_address, 'ips'):
+                subnet_cidr = netaddr.IPNetwork(subnet['cidr'])
                 ips = [ipaddr.ip for ipaddr in ib_address.ips
-                       if netaddr.IPAddress(ipaddr.ip) in
-                       netaddr.IPNetwork(subnet['cidr'])]
+                       if netaddr.IPAddress(ipaddr.ip) in subnet_cidr]
             else:
                 ips = [ib_address.ip]
 
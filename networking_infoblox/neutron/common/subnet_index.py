@@ -0,0 +1,158 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+import netaddr
+
+from networking_infoblox.neutron.common import config as cfg
+
+
+# index of the value slot in a prefix tree node, slots 0 and 1 hold children
+_VALUE = 2
+
+
+class PrefixTree(object):
+    """Binary radix tree of CIDRs of one ip version.
+
+    Lookup walks the bits of an address from the most significant one and
+    returns the value of the longest matching prefix, so it costs at most
+    one step per bit of the longest prefix stored.
+    """
+
+    def __init__(self, version):
+        self.bits = 32 if version == 4 else 128
+        self._root = [None, None, None]
+        self._size = 0
+
+    def _walk(self, network, create=False):
+        node = self._root
+        value = network.value
+        for i in range(network.prefixlen):
+            bit = (value >> (self.bits - 1 - i)) & 1
+            child = node[bit]
+            if child is None:
+                if not create:
+                    return None
+                child = node[bit] = [None, None, None]
+            node = child
+        return node
+
+    def insert(self, cidr, value):
+        node = self._walk(netaddr.IPNetwork(cidr).cidr, create=True)
+        if node[_VALUE] is None:
+            self._size += 1
+        node[_VALUE] = value
+
+    def remove(self, cidr):
+        node = self._walk(netaddr.IPNetwork(cidr).cidr)
+        if node is not None and node[_VALUE] is not None:
+            node[_VALUE] = None
+            self._size -= 1
+
+    def lookup(self, ip_address):
+        ip = netaddr.IPAddress(ip_address)
+        value = ip.value
+        node = self._root
+        found = node[_VALUE]
+        for i in range(self.bits):
+            node = node[(value >> (self.bits - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[_VALUE] is not None:
+                found = node[_VALUE]
+        return found
+
+    def __len__(self):
+        return self._size
+
+
+class SubnetIndex(object):
+    """Per network index of neutron subnets by cidr.
+
+    Answers which subnet of a network contains an ip address without
+    fetching all subnets of the network. Subnets of a network are loaded
+    on first use, kept current by subnet notifications and reloaded after
+    'subnet_index_ttl' seconds because notifications may be consumed by
+    another agent worker.
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._networks = {}
+        self._subnet_networks = {}
+
+    @property
+    def ttl(self):
+        if self._ttl is None:
+            return cfg.CONF.infoblox.subnet_index_ttl
+        return self._ttl
+
+    def is_loaded(self, network_id):
+        network = self._networks.get(network_id)
+        return network is not None and network['expire_at'] > time.time()
+
+    def load_network(self, network_id, subnets):
+        self.remove_network(network_id)
+        self._networks[network_id] = {
+            'expire_at': time.time() + self.ttl,
+            'subnets': {},
+            4: PrefixTree(4),
+            6: PrefixTree(6)}
+        for subnet in subnets:
+            self.add_subnet(subnet)
+
+    def remove_network(self, network_id):
+        network = self._networks.pop(network_id, None)
+        if network:
+            for subnet_id in network['subnets']:
+                self._subnet_networks.pop(subnet_id, None)
+
+    def add_subnet(self, subnet):
+        """Adds or updates subnet if its network is indexed."""
+        network = self._networks.get(subnet.get('network_id'))
+        if network is None:
+            return
+        version = netaddr.IPNetwork(subnet['cidr']).version
+        network[version].insert(subnet['cidr'], subnet['id'])
+        network['subnets'][subnet['id']] = subnet
+        self._subnet_networks[subnet['id']] = subnet['network_id']
+
+    def remove_subnet(self, subnet_id):
+        network_id = self._subnet_networks.pop(subnet_id, None)
+        network = self._networks.get(network_id)
+        if network is None:
+            return
+        subnet = network['subnets'].pop(subnet_id, None)
+        if subnet:
+            version = netaddr.IPNetwork(subnet['cidr']).version
+            network[version].remove(subnet['cidr'])
+
+    def get_subnet(self, network_id, subnet_id):
+        network = self._networks.get(network_id)
+        if network is None:
+            return None
+        return network['subnets'].get(subnet_id)
+
+    def find_subnet(self, network_id, ip_address):
+        """Returns subnet of the network that contains the ip address."""
+        network = self._networks.get(network_id)
+        if network is None:
+            return None
+        version = netaddr.IPAddress(ip_address).version
+        subnet_id = network[version].lookup(ip_address)
+        if subnet_id is None:
+            return None
+        return network['subnets'][subnet_id]
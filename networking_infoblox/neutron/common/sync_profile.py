@@ -0,0 +1,187 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import contextlib
+import time
+
+import eventlet
+from oslo_serialization import jsonutils
+from sqlalchemy import event
+
+
+OP_TYPE_LAST_SYNC_PROFILE = 'last_sync_profile'
+
+PHASE_MEMBERS = 'members'
+PHASE_CONFIG = 'config'
+PHASE_NETWORK_VIEWS = 'network_views'
+PHASE_NETWORKS = 'networks'
+PHASE_DB_WRITES = 'db_writes'
+
+# order of the values stored per phase in the persisted profile
+FIELDS = ('seconds', 'wapi_calls', 'objects', 'db_statements')
+
+# size of infoblox_operations.op_value the profile is stored in
+MAX_JSON_LENGTH = 255
+
+
+class SyncPhase(object):
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.wapi_calls = 0
+        self.objects = 0
+        self.db_statements = 0
+
+    def to_list(self):
+        return [round(self.seconds, 3), self.wapi_calls, self.objects,
+                self.db_statements]
+
+
+class SyncProfile(object):
+    """Per-phase timings and counters of a grid sync.
+
+    While the profile is started, WAPI calls are counted with a response
+    hook on the session of the grid master connector and DB statements
+    with a cursor execute listener on the engine of the neutron session.
+    The engine is shared by the whole process, so only statements issued
+    by the greenthread that started the profile are counted; the session
+    is in autocommit mode and checks out a connection per statement, so
+    neither of them tells sync statements apart.
+    A phase gets the time and the calls and statements issued while it is
+    open; a phase that is opened more than once accumulates.
+
+    A profile that is never started only measures time, so sync methods
+    can fall back to a throwaway one when no profile is given.
+    """
+
+    def __init__(self, grid_config=None):
+        self._grid_config = grid_config
+        self._hooks = None
+        self._engine = None
+        self._owner = None
+        self._current = None
+        self.phases = collections.OrderedDict()
+        self.seconds = 0.0
+        self.wapi_calls = 0
+        self.db_statements = 0
+        self._start_time = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self._start_time = time.time()
+        if self._grid_config is None:
+            return
+        session = getattr(self._grid_config.gm_connector, 'session', None)
+        hooks = getattr(session, 'hooks', None)
+        if isinstance(hooks, dict):
+            self._hooks = hooks
+            self._hooks.setdefault('response', []).append(self._on_response)
+        self._owner = eventlet.getcurrent()
+        self._engine = self._grid_config.context.session.get_bind()
+        event.listen(self._engine, 'before_cursor_execute',
+                     self._on_statement)
+
+    def stop(self):
+        if self._start_time is not None:
+            self.seconds += time.time() - self._start_time
+            self._start_time = None
+        if self._hooks is not None:
+            self._hooks['response'].remove(self._on_response)
+            self._hooks = None
+        if self._engine is not None:
+            event.remove(self._engine, 'before_cursor_execute',
+                         self._on_statement)
+            self._engine = None
+
+    def _on_response(self, response, *args, **kwargs):
+        self.wapi_calls += 1
+        return response
+
+    def _on_statement(self, conn, cursor, statement, parameters, context,
+                      executemany):
+        if eventlet.getcurrent() is self._owner:
+            self.db_statements += 1
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        phase = self.phases.setdefault(name, SyncPhase())
+        previous = self._current
+        self._current = phase
+        start = time.time()
+        wapi_calls = self.wapi_calls
+        db_statements = self.db_statements
+        try:
+            yield phase
+        finally:
+            phase.seconds += time.time() - start
+            phase.wapi_calls += self.wapi_calls - wapi_calls
+            phase.db_statements += self.db_statements - db_statements
+            self._current = previous
+
+    @property
+    def objects(self):
+        return sum(phase.objects for phase in self.phases.values())
+
+    def add_objects(self, count):
+        """Adds count to the objects handled by the current phase."""
+        if self._current is not None:
+            self._current.objects += count
+
+    def to_dict(self):
+        return {'seconds': round(self.seconds, 3),
+                'wapi_calls': self.wapi_calls,
+                'objects': self.objects,
+                'db_statements': self.db_statements,
+                'phases': dict((name, dict(zip(FIELDS, phase.to_list())))
+                               for name, phase in self.phases.items())}
+
+    def to_json(self, max_length=MAX_JSON_LENGTH):
+        """Returns the compact form kept in infoblox_operations.
+
+        Values are listed in FIELDS order. The total is always kept and
+        phases are added as long as the record fits in max_length.
+        """
+        profile = {'total': [round(self.seconds, 3), self.wapi_calls,
+                             self.objects, self.db_statements]}
+        value = self._dumps(profile)
+        for name, phase in self.phases.items():
+            profile[name] = phase.to_list()
+            phase_value = self._dumps(profile)
+            if len(phase_value) > max_length:
+                del profile[name]
+                continue
+            value = phase_value
+        return value
+
+    @staticmethod
+    def _dumps(profile):
+        return jsonutils.dumps(profile, separators=(',', ':'),
+                               sort_keys=True)
+
+    def __str__(self):
+        phases = ', '.join(
+            '%s %.3fs/%d calls/%d objects/%d statements' % (
+                name, phase.seconds, phase.wapi_calls, phase.objects,
+                phase.db_statements)
+            for name, phase in self.phases.items())
+        return ('total %.3fs, %d WAPI calls, %d DB statements; %s' %
+                (self.seconds, self.wapi_calls, self.db_statements, phases))
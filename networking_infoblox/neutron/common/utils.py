@@ -22,6 +22,7 @@ import six
 import time
 import urllib
 
+from neutron_lib import constants as n_const
 from oslo_serialization import jsonutils
 
 from infoblox_client import connector as conn
@@ -30,6 +31,7 @@ from infoblox_client import objects as ib_objects
 
 from networking_infoblox.neutron.common import config as cfg
 from networking_infoblox.neutron.common import constants as const
+from networking_infoblox.neutron.common import metrics
 
 
 def json_to_obj(obj_type, json_data):
@@ -416,7 +418,15 @@ def get_member_status(node_status):
     return member_status
 
 
+# handler name per event type, there are only a few event types
+_notification_handler_names = {}
+
+
 def get_notification_handler_name(event_type):
+    handler_name = _notification_handler_names.get(event_type)
+    if handler_name is not None:
+        return handler_name
+
     service, resource, action, sequence = (None, None, None, None)
     if event_type.count('.') == 2:
         resource, action, sequence = event_type.split('.', 2)
@@ -425,9 +435,33 @@ def get_notification_handler_name(event_type):
 
     event_sequence = 'alert' if sequence == 'start' else 'sync'
     handler_name = "%s_%s_%s" % (action, resource, event_sequence)
+    _notification_handler_names[event_type] = handler_name
     return handler_name
 
 
+def get_notification_resource_id(event_type, payload):
+    """Returns the id of the resource a notification is about.
+
+    Bulk payloads are identified by their first resource; None is returned
+    when the payload carries no id. Ports of instances are identified by
+    the instance id, so that the port and instance events of a vm, which
+    update the same NIOS records, are handled by the same worker.
+    """
+    resource = event_type.split('.')[-3]
+    if resource == 'instance':
+        return payload.get('instance_id')
+    if payload.get(resource + '_id'):
+        return payload[resource + '_id']
+    objs = payload.get(resource + 's') or [payload.get(resource)]
+    if objs and isinstance(objs[0], dict):
+        if (resource == 'port' and objs[0].get('device_id') and
+                (objs[0].get('device_owner') or '').startswith(
+                    n_const.DEVICE_OWNER_COMPUTE_PREFIX)):
+            return objs[0]['device_id']
+        return objs[0].get('id')
+    return None
+
+
 def generate_network_view_name(object_id, object_name=None):
     """Generates Network View name by id and name.
 
@@ -471,7 +505,7 @@ def get_connector(credentials=None):
     if credentials:
         opts['username'] = credentials['username']
         opts['password'] = credentials['password']
-    return conn.Connector(opts)
+    return metrics.instrument_connector(conn.Connector(opts))
 
 
 def get_ipv4_network_prefix(cidr, subnet_name):
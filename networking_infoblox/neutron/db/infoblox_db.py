@@ -14,8 +14,9 @@
 #    under the License.
 
 from datetime import datetime
-import random
+from oslo_db import exception as db_exc
 from sqlalchemy import func
+from sqlalchemy import or_
 from sqlalchemy.sql.expression import true
 
 from neutron.db.models import address_scope as address_scope_db
@@ -25,6 +26,7 @@ from neutron.db import models_v2
 
 from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import exceptions as exc
+from networking_infoblox.neutron.common import member_scheduler
 from networking_infoblox.neutron.db import infoblox_models as ib_models
 
 
@@ -461,11 +463,15 @@ def get_next_authority_member_for_ipam(session, grid_id):
                 const.MEMBER_STATUS_ON,
                 ib_models.InfobloxGridMember.member_type !=
                 const.MEMBER_TYPE_REGULAR_MEMBER).
-         group_by(ib_models.InfobloxNetworkView.authority_member_id).
-         order_by('count'))
-    res = q.first()
-    authority_member = res[0]
-    return authority_member
+         group_by(ib_models.InfobloxGridMember.member_id))
+    candidates = []
+    netview_counts = {}
+    for member, member_id, count in q.all():
+        candidates.append(member)
+        netview_counts[member_id] = count
+    return _select_member(session, grid_id, candidates,
+                          'network view authority for ipam',
+                          base_loads=netview_counts)
 
 
 def get_next_authority_member_for_dhcp(session, grid_id):
@@ -483,10 +489,8 @@ def get_next_authority_member_for_dhcp(session, grid_id):
                 const.MEMBER_TYPE_CP_MEMBER,
                 ib_models.InfobloxMappingMember.member_id.is_(None),
                 ib_models.InfobloxServiceMember.member_id.is_(None)))
-    row_count = int(q.count())
-    q = q.offset(int(row_count * random.random()))
-    authority_member = q.first()
-    return authority_member
+    return _select_member(session, grid_id, q.all(),
+                          'network view authority for dhcp')
 
 
 def get_next_dhcp_member(session, grid_id, use_gm=True):
@@ -512,10 +516,68 @@ def get_next_dhcp_member(session, grid_id, use_gm=True):
         q = q.filter(ib_models.InfobloxGridMember.member_type !=
                      const.MEMBER_TYPE_GRID_MASTER)
     q = q.order_by(ib_models.InfobloxGridMember.member_type.desc())
-    row_count = int(q.count())
-    q = q.offset(int(row_count * random.random()))
-    dhcp_member = q.first()
-    return dhcp_member
+    return _select_member(session, grid_id, q.all(), 'dhcp member')
+
+
+def _select_member(session, grid_id, candidates, purpose, base_loads=None):
+    if not candidates:
+        return None
+    member = member_scheduler.scheduler.select(
+        candidates, purpose, base_loads=base_loads,
+        loads=get_member_loads(session, grid_id))
+    if member:
+        # a new network view brings at least one network to the member
+        add_member_load(session, member.member_id, networks=1)
+    return member
+
+
+# Member Loads
+def get_member_loads(session, grid_id):
+    q = (session.query(ib_models.InfobloxMemberLoad).
+         join(ib_models.InfobloxGridMember,
+              ib_models.InfobloxGridMember.member_id ==
+              ib_models.InfobloxMemberLoad.member_id).
+         filter(ib_models.InfobloxGridMember.grid_id == grid_id))
+    return dict((load.member_id,
+                 member_scheduler.MemberLoad(networks=load.networks,
+                                             ranges=load.ranges,
+                                             zones=load.zones))
+                for load in q.all())
+
+
+def set_member_loads(session, grid_id, loads):
+    """Replaces loads of grid members with the ones found by grid sync.
+
+    :param loads: dict of member_id to MemberLoad
+    """
+    with session.begin(subtransactions=True):
+        grid_member_ids = (session.query(
+            ib_models.InfobloxGridMember.member_id).
+            filter(ib_models.InfobloxGridMember.grid_id == grid_id))
+        q = session.query(ib_models.InfobloxMemberLoad)
+        q = q.filter(
+            ib_models.InfobloxMemberLoad.member_id.in_(grid_member_ids))
+        q.delete(synchronize_session=False)
+        for member_id, load in loads.items():
+            session.add(ib_models.InfobloxMemberLoad(
+                member_id=member_id, networks=load.networks,
+                ranges=load.ranges, zones=load.zones))
+
+
+def add_member_load(session, member_id, networks=0, ranges=0, zones=0):
+    """Adds to the synced load of a member.
+
+    Members without a synced load are left alone, so loads stay unknown
+    until the first grid sync.
+    """
+    with session.begin(subtransactions=True):
+        q = session.query(ib_models.InfobloxMemberLoad)
+        q = q.filter_by(member_id=member_id)
+        q.update({'networks': ib_models.InfobloxMemberLoad.networks +
+                  networks,
+                  'ranges': ib_models.InfobloxMemberLoad.ranges + ranges,
+                  'zones': ib_models.InfobloxMemberLoad.zones + zones},
+                 synchronize_session=False)
 
 
 # Service Member Management
@@ -545,6 +607,30 @@ def add_service_member(session, network_view_id, member_id, service):
     return service_member
 
 
+def add_service_member_if_missing(session, network_view_id, member_id,
+                                  service):
+    """Adds service member unless the same one is registered already.
+
+    The row is inserted in a savepoint and a duplicate entry is ignored,
+    so the caller does not need to query for it first.
+    :return: True if the service member is added
+    """
+    with session.begin(subtransactions=True):
+        try:
+            # a duplicate rolls back the savepoint only, not the
+            # transaction of the caller
+            with session.begin_nested():
+                add_service_member(session, network_view_id, member_id,
+                                   service)
+        except db_exc.DBDuplicateEntry:
+            # the member may serve the service for another network view
+            if get_service_members(session, network_view_id=network_view_id,
+                                   member_id=member_id, service=service):
+                return False
+            raise
+    return True
+
+
 def remove_service_member(session, network_view_id, member_id=None,
                           service=None):
     with session.begin(subtransactions=True):
@@ -703,6 +789,35 @@ def add_or_update_tenant(session, tenant_id, tenant_name):
         db_tenant.tenant_name = tenant_name
 
 
+def add_or_update_tenants(session, tenants):
+    """Adds or updates tenant names in bulk.
+
+    Only new tenants and tenants with changed names are written.
+    :param tenants: dict with tenant name per tenant id
+    :return: number of tenants written
+    """
+    if not tenants:
+        return 0
+
+    db_tenants = {t.tenant_id: t
+                  for t in get_tenants(session, tenant_ids=list(tenants))}
+    new_tenants = []
+    updated_count = 0
+    with session.begin(subtransactions=True):
+        for tenant_id, tenant_name in tenants.items():
+            db_tenant = db_tenants.get(tenant_id)
+            if db_tenant is None:
+                new_tenants.append({'tenant_id': tenant_id,
+                                    'tenant_name': tenant_name})
+            elif db_tenant.tenant_name != tenant_name:
+                db_tenant.tenant_name = tenant_name
+                updated_count += 1
+        if new_tenants:
+            session.bulk_insert_mappings(ib_models.InfobloxTenant,
+                                         new_tenants)
+    return len(new_tenants) + updated_count
+
+
 def get_tenant(session, tenant_id):
     q = session.query(ib_models.InfobloxTenant)
     return q.filter_by(tenant_id=tenant_id).first()
@@ -793,3 +908,153 @@ def remove_network(session, network_id):
         q = session.query(ib_models.InfobloxNetwork)
         q = q.filter_by(network_id=network_id)
         q.delete(synchronize_session=False)
+
+
+# Migration Checkpoint Management
+def add_migration_checkpoint(session, object_type, object_id, status):
+    with session.begin(subtransactions=True):
+        checkpoint = ib_models.InfobloxMigrationCheckpoint(
+            object_type=object_type,
+            object_id=object_id,
+            status=status)
+        session.merge(checkpoint)
+    return checkpoint
+
+
+def get_migration_checkpoints(session, object_type):
+    """Returns {object_id: status} of synced objects of the given type."""
+    q = session.query(ib_models.InfobloxMigrationCheckpoint)
+    q = q.filter_by(object_type=object_type)
+    return {row.object_id: row.status for row in q.all()}
+
+
+def clear_migration_checkpoints(session):
+    with session.begin(subtransactions=True):
+        q = session.query(ib_models.InfobloxMigrationCheckpoint)
+        q.delete(synchronize_session=False)
+
+
+# Infoblox Object Management
+def add_infoblox_object(session, object_id, object_type, neutron_object_id,
+                        search_hash):
+    with session.begin(subtransactions=True):
+        ib_object = ib_models.InfobloxObject(
+            object_id=object_id,
+            object_type=object_type,
+            neutron_object_id=neutron_object_id,
+            search_hash=search_hash)
+        session.merge(ib_object)
+    return ib_object
+
+
+def get_infoblox_objects(session, object_type=None, search_hash=None,
+                         neutron_object_id=None):
+    q = session.query(ib_models.InfobloxObject)
+    if object_type:
+        q = q.filter_by(object_type=object_type)
+    if search_hash is not None:
+        q = q.filter_by(search_hash=search_hash)
+    if neutron_object_id:
+        q = q.filter_by(neutron_object_id=neutron_object_id)
+    return q.all()
+
+
+def remove_infoblox_objects(session, object_type=None, object_ids=None,
+                            object_id_prefix=None):
+    with session.begin(subtransactions=True):
+        q = session.query(ib_models.InfobloxObject)
+        if object_type:
+            q = q.filter_by(object_type=object_type)
+        if object_ids:
+            q = q.filter(ib_models.InfobloxObject.object_id.in_(object_ids))
+        if object_id_prefix:
+            q = q.filter(ib_models.InfobloxObject.object_id.startswith(
+                object_id_prefix))
+        q.delete(synchronize_session=False)
+
+
+def get_operation_value(session, op_type):
+    q = session.query(ib_models.InfobloxOperation)
+    op_row = q.filter_by(op_type=op_type).first()
+    return op_row.op_value if op_row else None
+
+
+def set_operation_value(session, op_type, op_value):
+    with session.begin(subtransactions=True):
+        q = session.query(ib_models.InfobloxOperation)
+        updated = q.filter_by(op_type=op_type).update({'op_value': op_value})
+        if not updated:
+            add_operation_type(session, op_type, op_value)
+
+
+# DNS Binding Job Management
+def add_dns_binding_job(session, port_id, subnet_id, ip_address,
+                        user_id=None):
+    with session.begin(subtransactions=True):
+        job = ib_models.InfobloxDnsBindingJob(port_id=port_id,
+                                              subnet_id=subnet_id,
+                                              ip_address=ip_address,
+                                              user_id=user_id,
+                                              attempts=0)
+        session.add(job)
+    return job
+
+
+def get_dns_binding_jobs(session, port_ids=None, claimed_by=None,
+                         claimable_before=None, after_id=None, limit=None):
+    """Returns jobs in the order they were added.
+
+    claimable_before leaves out jobs claimed at or after the given time.
+    """
+    q = session.query(ib_models.InfobloxDnsBindingJob)
+    if after_id:
+        q = q.filter(ib_models.InfobloxDnsBindingJob.id > after_id)
+    if port_ids:
+        q = q.filter(ib_models.InfobloxDnsBindingJob.port_id.in_(port_ids))
+    if claimed_by:
+        q = q.filter_by(claimed_by=claimed_by)
+    if claimable_before:
+        q = q.filter(or_(
+            ib_models.InfobloxDnsBindingJob.claimed_at.is_(None),
+            ib_models.InfobloxDnsBindingJob.claimed_at < claimable_before))
+    q = q.order_by(ib_models.InfobloxDnsBindingJob.id)
+    if limit:
+        q = q.limit(limit)
+    return q.all()
+
+
+def claim_dns_binding_jobs(session, job_ids, claimed_by, claimed_at,
+                           claimable_before):
+    """Claims jobs that are not claimed by others and returns the count."""
+    with session.begin(subtransactions=True):
+        q = session.query(ib_models.InfobloxDnsBindingJob)
+        q = q.filter(ib_models.InfobloxDnsBindingJob.id.in_(job_ids))
+        q = q.filter(or_(
+            ib_models.InfobloxDnsBindingJob.claimed_at.is_(None),
+            ib_models.InfobloxDnsBindingJob.claimed_at < claimable_before))
+        return q.update({'claimed_by': claimed_by,
+                         'claimed_at': claimed_at},
+                        synchronize_session=False)
+
+
+def release_dns_binding_jobs(session, job_ids, failed=False):
+    with session.begin(subtransactions=True):
+        q = session.query(ib_models.InfobloxDnsBindingJob)
+        q = q.filter(ib_models.InfobloxDnsBindingJob.id.in_(job_ids))
+        values = {'claimed_by': None, 'claimed_at': None}
+        if failed:
+            values['attempts'] = ib_models.InfobloxDnsBindingJob.attempts + 1
+        q.update(values, synchronize_session=False)
+
+
+def remove_dns_binding_jobs(session, job_ids=None, subnet_id=None,
+                            ip_address=None):
+    with session.begin(subtransactions=True):
+        q = session.query(ib_models.InfobloxDnsBindingJob)
+        if job_ids:
+            q = q.filter(ib_models.InfobloxDnsBindingJob.id.in_(job_ids))
+        if subnet_id:
+            q = q.filter_by(subnet_id=subnet_id)
+        if ip_address:
+            q = q.filter_by(ip_address=ip_address)
+        q.delete(synchronize_session=False)
@@ -222,6 +222,29 @@ class InfobloxServiceMember(model_base.BASEV2):
                 (self.network_view_id, self.member_id, self.service))
 
 
+class InfobloxMemberLoad(model_base.BASEV2):
+    """Networks, ranges and zones served by a grid member.
+
+    Written by grid sync and read by the member scheduler when a network
+    view is placed.
+    """
+
+    __tablename__ = 'infoblox_member_loads'
+
+    member_id = sa.Column(sa.String(32),
+                          sa.ForeignKey('infoblox_grid_members.member_id',
+                                        ondelete="CASCADE"),
+                          nullable=False,
+                          primary_key=True)
+    networks = sa.Column(sa.Integer(), nullable=False, default=0)
+    ranges = sa.Column(sa.Integer(), nullable=False, default=0)
+    zones = sa.Column(sa.Integer(), nullable=False, default=0)
+
+    def __repr__(self):
+        return ("member_id: %s, networks: %s, ranges: %s, zones: %s" %
+                (self.member_id, self.networks, self.ranges, self.zones))
+
+
 class InfobloxObject(model_base.BASEV2):
     """Infoblox object reference ids that are created by neutron."""
 
@@ -285,3 +308,41 @@ class InfobloxNetwork(model_base.BASEV2):
                            nullable=False,
                            primary_key=True)
     network_name = sa.Column(sa.String(255), nullable=False)
+
+
+class InfobloxMigrationCheckpoint(model_base.BASEV2):
+    """Neutron objects already synced by sync_neutron_to_infoblox tool."""
+    __tablename__ = 'infoblox_migration_checkpoints'
+
+    object_type = sa.Column(sa.String(48),
+                            nullable=False,
+                            primary_key=True)
+    object_id = sa.Column(sa.String(255),
+                          nullable=False,
+                          primary_key=True)
+    status = sa.Column(sa.String(48), nullable=False)
+
+
+class InfobloxDnsBindingJob(model_base.BASEV2):
+    """DNS names of allocated ips that are bound by the ipam agent."""
+    __tablename__ = 'infoblox_dns_binding_jobs'
+
+    id = sa.Column(sa.Integer(), nullable=False, primary_key=True,
+                   autoincrement=True)
+    port_id = sa.Column(sa.String(36), nullable=False)
+    subnet_id = sa.Column(sa.String(36), nullable=False)
+    ip_address = sa.Column(sa.String(64), nullable=False)
+    user_id = sa.Column(sa.String(255), nullable=True)
+    attempts = sa.Column(sa.Integer(), nullable=False, default=0)
+    claimed_by = sa.Column(sa.String(36), nullable=True)
+    claimed_at = sa.Column(sa.DateTime(), nullable=True)
+    __table_args__ = (
+        sa.Index(
+            'ix_infoblox_dns_binding_jobs_port_id',
+            'port_id'),
+        model_base.BASEV2.__table_args__
+    )
+
+    def __repr__(self):
+        return ("id: %s, port_id: %s, ip_address: %s, attempts: %s" %
+                (self.id, self.port_id, self.ip_address, self.attempts))
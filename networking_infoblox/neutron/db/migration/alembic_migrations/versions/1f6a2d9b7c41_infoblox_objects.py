@@ -0,0 +1,42 @@
+# Copyright 2016 Infoblox Inc
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""infoblox_objects
+
+Revision ID: 1f6a2d9b7c41
+Revises: 3c5a6b4f2c9e
+Create Date: 2016-10-24 14:37:02.917215
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1f6a2d9b7c41'
+down_revision = '3c5a6b4f2c9e'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'infoblox_objects',
+        sa.Column('object_id', sa.String(255),
+                  nullable=False, primary_key=True),
+        sa.Column('object_type', sa.String(48), nullable=False),
+        sa.Column('neutron_object_id', sa.String(255), nullable=False),
+        sa.Column('search_hash', sa.Integer(), nullable=False),
+    )
+    op.create_index('ix_infoblox_objects_search_hash',
+                    'infoblox_objects', ['search_hash'])
@@ -0,0 +1,40 @@
+# Copyright 2016 Infoblox Inc
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""migration_checkpoints
+
+Revision ID: 3c5a6b4f2c9e
+Revises: 0075c5a73439
+Create Date: 2016-10-19 10:12:41.381547
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3c5a6b4f2c9e'
+down_revision = '0075c5a73439'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'infoblox_migration_checkpoints',
+        sa.Column('object_type', sa.String(48),
+                  nullable=False, primary_key=True),
+        sa.Column('object_id', sa.String(255),
+                  nullable=False, primary_key=True),
+        sa.Column('status', sa.String(48), nullable=False),
+    )
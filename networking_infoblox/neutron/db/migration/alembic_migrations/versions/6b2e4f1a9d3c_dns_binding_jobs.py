@@ -0,0 +1,47 @@
+# Copyright 2016 Infoblox Inc
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""dns_binding_jobs
+
+Revision ID: 6b2e4f1a9d3c
+Revises: 1f6a2d9b7c41
+Create Date: 2016-10-27 11:05:41.308126
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '6b2e4f1a9d3c'
+down_revision = '1f6a2d9b7c41'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'infoblox_dns_binding_jobs',
+        sa.Column('id', sa.Integer(), nullable=False, primary_key=True,
+                  autoincrement=True),
+        sa.Column('port_id', sa.String(36), nullable=False),
+        sa.Column('subnet_id', sa.String(36), nullable=False),
+        sa.Column('ip_address', sa.String(64), nullable=False),
+        sa.Column('user_id', sa.String(255), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False,
+                  server_default='0'),
+        sa.Column('claimed_by', sa.String(36), nullable=True),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_infoblox_dns_binding_jobs_port_id',
+                    'infoblox_dns_binding_jobs', ['port_id'])
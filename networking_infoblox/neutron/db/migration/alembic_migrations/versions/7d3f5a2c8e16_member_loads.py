@@ -0,0 +1,46 @@
+# Copyright 2016 Infoblox Inc
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""member_loads
+
+Revision ID: 7d3f5a2c8e16
+Revises: 6b2e4f1a9d3c
+Create Date: 2016-11-08 14:22:09.517342
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7d3f5a2c8e16'
+down_revision = '6b2e4f1a9d3c'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'infoblox_member_loads',
+        sa.Column('member_id', sa.String(32), nullable=False),
+        sa.Column('networks', sa.Integer(), nullable=False,
+                  server_default='0'),
+        sa.Column('ranges', sa.Integer(), nullable=False,
+                  server_default='0'),
+        sa.Column('zones', sa.Integer(), nullable=False,
+                  server_default='0'),
+        sa.ForeignKeyConstraint(['member_id'],
+                                ['infoblox_grid_members.member_id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('member_id')
+    )
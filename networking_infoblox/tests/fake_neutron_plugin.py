@@ -0,0 +1,94 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import copy
+
+from neutron_lib import exceptions as n_exc
+
+
+class FakeNeutronPlugin(object):
+    """In-memory core plugin serving the reads of the ipam agent.
+
+    Networks, subnets and ports are kept as the dicts found in neutron
+    notification payloads; update_from_notification applies a payload the
+    way the neutron server would have before sending it.
+    """
+
+    def __init__(self):
+        self.networks = {}
+        self.subnets = {}
+        self.ports = {}
+
+    def add(self, resource, obj):
+        getattr(self, resource + 's')[obj['id']] = copy.deepcopy(obj)
+
+    def update_from_notification(self, event_type, payload):
+        resource, action = event_type.split('.')[:2]
+        if resource not in ('network', 'subnet', 'port'):
+            return
+        if action == 'delete':
+            getattr(self, resource + 's').pop(
+                payload.get(resource + '_id'), None)
+            return
+        objs = payload.get(resource + 's') or [payload.get(resource)]
+        for obj in objs:
+            if obj and obj.get('id'):
+                self.add(resource, obj)
+
+    @staticmethod
+    def _get(objs, obj_id, exception, **kwargs):
+        if obj_id not in objs:
+            raise exception(**kwargs)
+        return copy.deepcopy(objs[obj_id])
+
+    @staticmethod
+    def _matches(obj, filters):
+        for key, values in (filters or {}).items():
+            if key == 'fixed_ips':
+                if not any(all(fixed_ip.get(field) in field_values
+                               for field, field_values in values.items())
+                           for fixed_ip in obj.get('fixed_ips') or []):
+                    return False
+            elif obj.get(key) not in values:
+                return False
+        return True
+
+    def _get_all(self, objs, filters):
+        return [copy.deepcopy(obj) for obj in objs.values()
+                if self._matches(obj, filters)]
+
+    def get_network(self, context, network_id, fields=None):
+        return self._get(self.networks, network_id, n_exc.NetworkNotFound,
+                         net_id=network_id)
+
+    def get_networks(self, context, filters=None, fields=None):
+        return self._get_all(self.networks, filters)
+
+    def get_subnet(self, context, subnet_id, fields=None):
+        return self._get(self.subnets, subnet_id, n_exc.SubnetNotFound,
+                         subnet_id=subnet_id)
+
+    def get_subnets(self, context, filters=None, fields=None):
+        return self._get_all(self.subnets, filters)
+
+    def get_subnets_by_network(self, context, network_id):
+        return self.get_subnets(context, {'network_id': [network_id]})
+
+    def get_port(self, context, port_id, fields=None):
+        return self._get(self.ports, port_id, n_exc.PortNotFound,
+                         port_id=port_id)
+
+    def get_ports(self, context, filters=None, fields=None):
+        return self._get_all(self.ports, filters)
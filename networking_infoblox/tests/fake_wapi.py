@@ -0,0 +1,673 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-process stand-in for the NIOS WAPI.
+
+FakeWapi keeps NIOS objects in memory and implements the part of WAPI the
+driver and the agent use: searches by fields and extensible attributes
+with return fields and paging, creates with next available ip functions,
+updates, deletes, function calls and multi requests. FakeWapiServer serves
+it over HTTP on a local port with a configurable latency and counts the
+calls it gets, so flows can be run and measured with the real
+infoblox_client connector.
+"""
+
+import base64
+import collections
+import copy
+import itertools
+import json
+import random
+import re
+import threading
+import time
+
+import mock
+import netaddr
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from six.moves.urllib import parse as urlparse
+
+from infoblox_client import connector
+
+from networking_infoblox.tests import base
+
+
+NEXT_AVAILABLE_IP = 'func:nextavailableip:'
+MULTI_REQUEST = 'request'
+
+PAGING_OPTIONS = ('_paging', '_return_as_object', '_max_results', '_page_id')
+QUERY_OPTIONS = PAGING_OPTIONS + ('_return_fields', '_return_fields+',
+                                  '_proxy_search', '_function', '_schema')
+
+# fields that make the readable part of object references
+REF_NAME_FIELDS = {
+    'networkview': ('name',),
+    'network': ('network', 'network_view'),
+    'ipv6network': ('network', 'network_view'),
+    'range': ('start_addr', 'end_addr', 'network_view'),
+    'ipv6range': ('start_addr', 'end_addr', 'network_view'),
+    'fixedaddress': ('ipv4addr', 'network_view'),
+    'ipv6fixedaddress': ('ipv6addr', 'network_view'),
+    'record:host': ('name', 'view'),
+    'record:a': ('name', 'view'),
+    'record:aaaa': ('name', 'view'),
+    'record:ptr': ('ptrdname', 'view'),
+    'zone_auth': ('fqdn', 'view'),
+    'view': ('name',),
+    'member': ('host_name',),
+    'grid:cloudapi:tenant': ('id',),
+}
+
+# fields that identify an object, a second object with the same values
+# is rejected the way NIOS does
+UNIQUE_FIELDS = {
+    'networkview': ('name',),
+    'network': ('network', 'network_view'),
+    'ipv6network': ('network', 'network_view'),
+    'range': ('start_addr', 'end_addr', 'network_view'),
+    'ipv6range': ('start_addr', 'end_addr', 'network_view'),
+    'zone_auth': ('fqdn', 'view'),
+    'view': ('name',),
+    'grid:cloudapi:tenant': ('id',),
+}
+
+NETWORK_VIEW_TYPES = ('network', 'ipv6network', 'range', 'ipv6range',
+                      'fixedaddress', 'ipv6fixedaddress')
+DNS_VIEW_TYPES = ('record:host', 'record:a', 'record:aaaa', 'record:ptr',
+                  'zone_auth')
+HOST_ADDRESS_FIELDS = (('ipv4addrs', 'ipv4addr', 'record:host_ipv4addr'),
+                       ('ipv6addrs', 'ipv6addr', 'record:host_ipv6addr'))
+
+
+class WapiError(Exception):
+
+    def __init__(self, text, code=400):
+        super(WapiError, self).__init__(text)
+        self.text = text
+        self.code = code
+
+    def to_dict(self):
+        return {'Error': 'AdmConDataError: None (IBDataConflictError: '
+                         'IB.Data.Conflict:%s)' % self.text,
+                'code': 'Client.Ibap.Data.Conflict',
+                'text': self.text}
+
+
+class FakeWapi(object):
+    """NIOS objects kept in memory, keyed by reference."""
+
+    def __init__(self):
+        self._objects = collections.OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def seed_from_fixtures(self, cloud=True):
+        """Loads the objects of the unit test fixtures.
+
+        Extensible attributes of the grid master configuration fixture are
+        merged into the grid master member, which is where grid sync reads
+        them from.
+        """
+        resources = base.FixtureResourceMap
+        fixture = base.ConnectorFixture()
+        seeds = [('member:dhcpproperties', resources.FAKE_MEMBER_DHCP),
+                 ('member:dns', resources.FAKE_MEMBER_DNS),
+                 ('view', resources.FAKE_DNS_VIEW)]
+        if cloud:
+            seeds += [('member', resources.FAKE_MEMBERS_WITH_CLOUD),
+                      ('member:license', resources.FAKE_MEMBER_LICENSES),
+                      ('networkview', resources.FAKE_NETWORKVIEW_WITH_CLOUD),
+                      ('network', resources.FAKE_NETWORK_WITH_CLOUD)]
+        else:
+            seeds += [
+                ('member', resources.FAKE_MEMBERS_WITHOUT_CLOUD),
+                ('networkview', resources.FAKE_NETWORKVIEW_WITHOUT_CLOUD),
+                ('network', resources.FAKE_NETWORK_WITHOUT_CLOUD)]
+        for obj_type, resource in seeds:
+            for obj in fixture.get_object(resource):
+                self.load(obj_type, obj)
+
+        config = fixture.get_object(
+            resources.FAKE_GRID_MASTER_GRID_CONFIGURATION)
+        gm = self._objects.get(config['_ref'])
+        if gm is not None:
+            gm[1].setdefault('extattrs', {}).update(config['extattrs'])
+
+    def load(self, obj_type, obj):
+        """Adds an object as is, keeping its reference if it has one."""
+        with self._lock:
+            obj = copy.deepcopy(obj)
+            ref = obj.pop('_ref', None) or self._new_ref(obj_type, obj)
+            self._objects[ref] = (obj_type, obj)
+            return ref
+
+    def objects(self, obj_type):
+        with self._lock:
+            return [dict(obj, _ref=ref)
+                    for ref, (o_type, obj) in self._objects.items()
+                    if o_type == obj_type]
+
+    def handle(self, method, path, query, body):
+        """Serves a WAPI call and returns the status code and the reply.
+
+        path is relative to the WAPI url and query maps arguments to lists
+        of values.
+        """
+        with self._lock:
+            try:
+                return self._handle(method, path, query, body)
+            except WapiError as e:
+                return e.code, e.to_dict()
+
+    def _handle(self, method, path, query, body):
+        args = dict((key, values[-1]) for key, values in query.items()
+                    if key in QUERY_OPTIONS)
+        fields = dict((key, values) for key, values in query.items()
+                      if key not in QUERY_OPTIONS)
+        if method == 'GET':
+            if '/' in path:
+                return 200, self.read(path, args)
+            return 200, self.search(path, fields, args)
+        if method == 'POST':
+            if path == MULTI_REQUEST:
+                return 200, self.multi_request(body or [])
+            if '_function' in args:
+                return 200, self.call_function(path, args['_function'],
+                                               body or {})
+            return 201, self.create(path, body or {}, args)
+        if method == 'PUT':
+            return 200, self.update(path, body or {}, args)
+        if method == 'DELETE':
+            return 200, self.delete(path)
+        raise WapiError("Method %s is not supported" % method)
+
+    def read(self, ref, args=None):
+        obj_type, obj = self._get(ref)
+        return self._reply(ref, obj, args)
+
+    def search(self, obj_type, fields, args=None):
+        """Searches objects by fields and extensible attributes.
+
+        fields maps a field name, optionally with a '~' (regex) or ':'
+        (case insensitive) modifier, or '*' and an extensible attribute
+        name to a value or a list of values.
+        """
+        args = args or {}
+        if obj_type in ('record:host_ipv4addr', 'record:host_ipv6addr'):
+            candidates = self._host_addresses(obj_type)
+        else:
+            candidates = [(ref, obj)
+                          for ref, (o_type, obj) in self._objects.items()
+                          if o_type == obj_type]
+        results = [self._reply(ref, obj, args)
+                   for ref, obj in candidates
+                   if self._matches(obj_type, obj, fields)]
+        if '_paging' not in args:
+            return results
+
+        page_size = int(args.get('_max_results') or 1000)
+        start = int(args.get('_page_id') or 0)
+        page = {'result': results[start:start + page_size]}
+        if start + page_size < len(results):
+            page['next_page_id'] = str(start + page_size)
+        return page
+
+    def create(self, obj_type, data, args=None):
+        if '/' in obj_type:
+            raise WapiError("Object type %s is not valid" % obj_type)
+        obj = copy.deepcopy(data)
+        self._set_defaults(obj_type, obj)
+        self._check_unique(obj_type, obj)
+        self._assign_addresses(obj_type, obj)
+        self._set_zone(obj_type, obj)
+        ref = self._new_ref(obj_type, obj)
+        self._objects[ref] = (obj_type, obj)
+        self._update_host_addresses(ref, obj_type, obj)
+        if args and ('_return_fields' in args or
+                     '_return_fields+' in args):
+            return self._reply(ref, obj, args)
+        return ref
+
+    def update(self, ref, data, args=None):
+        obj_type, obj = self._get(ref)
+        updated = copy.deepcopy(obj)
+        updated.update(copy.deepcopy(data))
+        self._assign_addresses(obj_type, updated, exclude_ref=ref)
+        self._set_zone(obj_type, updated)
+        # a changed name changes the reference the way NIOS does
+        del self._objects[ref]
+        new_ref = self._new_ref(obj_type, updated, oid=self._oid(ref))
+        self._objects[new_ref] = (obj_type, updated)
+        self._update_host_addresses(new_ref, obj_type, updated)
+        if args and ('_return_fields' in args or
+                     '_return_fields+' in args):
+            return self._reply(new_ref, updated, args)
+        return new_ref
+
+    def delete(self, ref):
+        self._get(ref)
+        del self._objects[ref]
+        return ref
+
+    def call_function(self, ref, name, data):
+        obj_type, obj = self._get(ref)
+        if name == 'next_available_ip':
+            ips = []
+            for _ in range(int(data.get('num', 1))):
+                ips.append(self._next_available_ip(
+                    obj_type, obj, exclude=set(data.get('exclude', [])) |
+                    set(ips)))
+            return {'ips': ips}
+        # service restarts and the like have no effect on the model
+        return {}
+
+    def multi_request(self, calls):
+        """Runs calls in order and rolls all of them back on a failure."""
+        snapshot = copy.deepcopy(self._objects)
+        results = []
+        try:
+            for call in calls:
+                results.append(self._multi_request_call(call))
+        except WapiError:
+            self._objects = snapshot
+            raise
+        return results
+
+    def _multi_request_call(self, call):
+        method = call.get('method')
+        obj = call.get('object')
+        data = call.get('data') or {}
+        args = call.get('args') or {}
+        if method == 'GET':
+            if '/' in obj:
+                return self.read(obj, args)
+            return self.search(obj, data, args)
+        if method == 'POST':
+            if '_function' in args:
+                return self.call_function(obj, args['_function'], data)
+            return self.create(obj, data, args)
+        if method == 'PUT':
+            return self.update(obj, data, args)
+        if method == 'DELETE':
+            return self.delete(obj)
+        raise WapiError("Method %s is not supported" % method)
+
+    def _get(self, ref):
+        if ref not in self._objects:
+            raise WapiError("Reference %s not found" % ref, code=404)
+        return self._objects[ref]
+
+    @staticmethod
+    def _oid(ref):
+        return ref.split('/', 1)[1].split(':', 1)[0]
+
+    def _new_ref(self, obj_type, obj, oid=None):
+        if oid is None:
+            oid = base64.b64encode(
+                ('fake.%s$%d' % (obj_type, next(self._ids))).encode(
+                    'utf-8')).decode('ascii').rstrip('=')
+        name_fields = REF_NAME_FIELDS.get(obj_type, ('name',))
+        name = '/'.join(urlparse.quote(str(obj.get(field, '')), safe='/')
+                        for field in name_fields)
+        return '%s/%s:%s' % (obj_type, oid, name)
+
+    @staticmethod
+    def _reply(ref, obj, args=None):
+        args = args or {}
+        reply = {'_ref': ref}
+        return_fields = args.get('_return_fields') or args.get(
+            '_return_fields+')
+        if return_fields:
+            for field in return_fields.split(','):
+                if field in obj:
+                    reply[field] = copy.deepcopy(obj[field])
+        else:
+            reply.update(copy.deepcopy(obj))
+        return reply
+
+    def _set_defaults(self, obj_type, obj):
+        if obj_type in NETWORK_VIEW_TYPES:
+            obj.setdefault('network_view', 'default')
+        if obj_type in DNS_VIEW_TYPES:
+            obj.setdefault('view', 'default')
+        if obj_type == 'record:host':
+            # a dns view belongs to a network view
+            obj.setdefault('network_view', self._get_network_view(obj['view']))
+        if obj_type in ('network', 'ipv6network'):
+            obj['network'] = str(netaddr.IPNetwork(obj['network']).cidr)
+
+    def _get_network_view(self, dns_view):
+        for obj_type, obj in self._objects.values():
+            if obj_type == 'view' and obj.get('name') == dns_view:
+                return obj.get('network_view', 'default')
+        return 'default'
+
+    def _set_zone(self, obj_type, obj):
+        """Sets the zone of a record to the closest authoritative zone."""
+        if obj_type not in DNS_VIEW_TYPES or obj_type == 'zone_auth':
+            return
+        name = obj.get('name') or ''
+        zones = [zone['fqdn']
+                 for o_type, zone in self._objects.values()
+                 if o_type == 'zone_auth' and
+                 zone.get('view') == obj.get('view') and
+                 name.endswith('.' + zone.get('fqdn', ''))]
+        if zones:
+            obj['zone'] = max(zones, key=len)
+
+    def _check_unique(self, obj_type, obj):
+        unique_fields = UNIQUE_FIELDS.get(obj_type)
+        if not unique_fields:
+            return
+        key = tuple(obj.get(field) for field in unique_fields)
+        for o_type, other in self._objects.values():
+            if (o_type == obj_type and
+                    tuple(other.get(field)
+                          for field in unique_fields) == key):
+                raise WapiError("The %s %s already exists." %
+                                (obj_type, '/'.join(str(k) for k in key)))
+
+    def _matches(self, obj_type, obj, fields):
+        for key, values in fields.items():
+            if not isinstance(values, list):
+                values = [values]
+            if key.startswith('*'):
+                if not self._ea_matches(obj, key[1:], values):
+                    return False
+                continue
+
+            field, modifier = key, None
+            if key[-1] in '~:':
+                field, modifier = key[:-1], key[-1]
+            candidates = [self._to_query_value(value) for value in
+                          self._field_values(obj_type, obj, field)]
+            if not any(self._value_matches(candidate, value, modifier)
+                       for candidate in candidates for value in values):
+                return False
+        return True
+
+    @staticmethod
+    def _field_values(obj_type, obj, field):
+        if obj_type == 'record:host':
+            for addrs_field, addr_field, _ in HOST_ADDRESS_FIELDS:
+                addresses = obj.get(addrs_field) or []
+                if field in (addr_field, 'mac', 'duid'):
+                    values = [address.get(field) for address in addresses]
+                    if field == addr_field or any(values):
+                        return [value for value in values if value]
+        value = obj.get(field)
+        return value if isinstance(value, list) else [value]
+
+    @staticmethod
+    def _to_query_value(value):
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if value is None:
+            return None
+        return str(value)
+
+    @staticmethod
+    def _value_matches(candidate, value, modifier):
+        if candidate is None:
+            return False
+        value = str(value)
+        if modifier == '~':
+            return re.search(value, candidate) is not None
+        if modifier == ':':
+            return candidate.lower() == value.lower()
+        return candidate == value
+
+    @staticmethod
+    def _ea_matches(obj, name, values):
+        ea = (obj.get('extattrs') or {}).get(name)
+        if ea is None:
+            return False
+        ea_values = ea.get('value')
+        if not isinstance(ea_values, list):
+            ea_values = [ea_values]
+        ea_values = [str(value) for value in ea_values]
+        return any(str(value) in ea_values for value in values)
+
+    def _host_addresses(self, obj_type):
+        addresses = []
+        for ref, (o_type, obj) in self._objects.items():
+            if o_type != 'record:host':
+                continue
+            for addrs_field, _, address_type in HOST_ADDRESS_FIELDS:
+                if address_type != obj_type:
+                    continue
+                for address in obj.get(addrs_field) or []:
+                    address = dict(address,
+                                   network_view=obj.get('network_view'))
+                    addresses.append((address.pop('_ref'), address))
+        return addresses
+
+    def _update_host_addresses(self, ref, obj_type, obj):
+        if obj_type != 'record:host':
+            return
+        for addrs_field, addr_field, address_type in HOST_ADDRESS_FIELDS:
+            for address in obj.get(addrs_field) or []:
+                address['host'] = obj.get('name')
+                address['_ref'] = '%s/%s:%s/%s/%s' % (
+                    address_type, self._oid(ref), address[addr_field],
+                    obj.get('name'), obj.get('view'))
+
+    def _assign_addresses(self, obj_type, obj, exclude_ref=None):
+        """Resolves next available ip functions and checks for conflicts."""
+        if obj_type == 'record:host':
+            for addrs_field, addr_field, _ in HOST_ADDRESS_FIELDS:
+                for address in obj.get(addrs_field) or []:
+                    self._assign_address(obj, address, addr_field,
+                                         exclude_ref)
+        elif obj_type in ('fixedaddress', 'ipv6fixedaddress'):
+            addr_field = ('ipv4addr' if obj_type == 'fixedaddress'
+                          else 'ipv6addr')
+            self._assign_address(obj, obj, addr_field, exclude_ref)
+
+    def _assign_address(self, obj, address, addr_field, exclude_ref):
+        value = str(address.get(addr_field, ''))
+        if value.startswith(NEXT_AVAILABLE_IP):
+            container, _, network_view = value[
+                len(NEXT_AVAILABLE_IP):].partition(',')
+            network_view = network_view or obj.get('network_view') or (
+                'default')
+            obj.setdefault('network_view', network_view)
+            address[addr_field] = self._next_available_ip_in(
+                container, network_view)
+            return
+
+        network_view = obj.get('network_view') or 'default'
+        used = self._used_ips(network_view, exclude_ref)
+        if value in used:
+            raise WapiError("The IP address %s is already in use." % value)
+
+    def _used_ips(self, network_view, exclude_ref=None):
+        used = set()
+        for ref, (obj_type, obj) in self._objects.items():
+            if ref == exclude_ref:
+                continue
+            if obj.get('network_view', 'default') != network_view:
+                continue
+            if obj_type == 'fixedaddress':
+                used.add(obj.get('ipv4addr'))
+            elif obj_type == 'ipv6fixedaddress':
+                used.add(obj.get('ipv6addr'))
+            elif obj_type == 'record:host':
+                for addrs_field, addr_field, _ in HOST_ADDRESS_FIELDS:
+                    for address in obj.get(addrs_field) or []:
+                        used.add(address.get(addr_field))
+        return used
+
+    def _next_available_ip(self, obj_type, obj, exclude=()):
+        if obj_type in ('range', 'ipv6range'):
+            container = '%s-%s' % (obj['start_addr'], obj['end_addr'])
+        else:
+            container = obj['network']
+        return self._next_available_ip_in(
+            container, obj.get('network_view', 'default'), exclude)
+
+    def _next_available_ip_in(self, container, network_view, exclude=()):
+        if '-' in container:
+            start, end = container.split('-')
+            addresses = netaddr.IPRange(start, end)
+        else:
+            network = netaddr.IPNetwork(container)
+            addresses = network.iter_hosts()
+        used = self._used_ips(network_view) | set(exclude)
+        for address in addresses:
+            if str(address) not in used:
+                return str(address)
+        raise WapiError("Cannot find 1 available IP address(es) in %s" %
+                        container)
+
+
+class _WapiRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # replies are written in parts, which would wait for delayed acks
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        url = urlparse.urlsplit(self.path)
+        match = re.match(r'^/wapi/v[^/]+/(.+)$', urlparse.unquote(url.path))
+        query = collections.defaultdict(list)
+        for key, value in urlparse.parse_qsl(url.query,
+                                             keep_blank_values=True):
+            query[key].append(value)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+
+        self.server.record_call(method, match.group(1) if match else None)
+        self.server.wait()
+        if match:
+            status, reply = self.server.wapi.handle(
+                method, match.group(1), dict(query),
+                json.loads(body) if body else None)
+        else:
+            status, reply = 404, WapiError("Unknown url %s" % url.path,
+                                           code=404).to_dict()
+
+        content = json.dumps(reply).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeWapiServer(object):
+    """Serves a FakeWapi on a local port.
+
+    Every call waits for latency seconds, plus a random part of up to
+    jitter seconds, before it is served. Calls are counted by method and
+    object type; a multi request counts as a single call.
+    """
+
+    def __init__(self, wapi=None, latency=0.0, jitter=0.0, host='127.0.0.1',
+                 port=0):
+        self.wapi = wapi if wapi is not None else FakeWapi()
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = collections.Counter()
+        self._calls_lock = threading.Lock()
+        self._httpd = _ThreadingHTTPServer((host, port), _WapiRequestHandler)
+        self._httpd.wapi = self.wapi
+        self._httpd.record_call = self._record_call
+        self._httpd.wait = self._wait
+        self._thread = None
+
+    @property
+    def host(self):
+        return '%s:%s' % self._httpd.server_address[:2]
+
+    def get_wapi_url(self, wapi_version):
+        return 'http://%s/wapi/v%s/' % (self.host, wapi_version)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def call_count(self):
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._calls_lock:
+            self.calls.clear()
+
+    def patch_connectors(self):
+        """Returns a patch that points new connectors to this server.
+
+        infoblox_client always talks https to the host option, so the url
+        is replaced once the connector has parsed its options.
+        """
+        parse_options = connector.Connector._parse_options
+        server = self
+
+        def _parse_options(conn, options):
+            parse_options(conn, options)
+            conn.wapi_url = server.get_wapi_url(conn.wapi_version)
+
+        return mock.patch.object(connector.Connector, '_parse_options',
+                                 _parse_options)
+
+    def _record_call(self, method, path):
+        obj_type = path.split('/', 1)[0] if path else None
+        with self._calls_lock:
+            self.calls[(method, obj_type)] += 1
+
+    def _wait(self):
+        delay = self.latency
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
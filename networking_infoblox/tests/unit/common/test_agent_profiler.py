@@ -0,0 +1,98 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import signal
+import time
+
+import eventlet
+from eventlet import event as eventlet_event
+import fixtures
+import mock
+
+from networking_infoblox.neutron.common import agent_profiler
+from networking_infoblox.tests import base
+
+
+def _busy_loop(profiler):
+    deadline = time.time() + 5
+    while not profiler._samples and time.time() < deadline:
+        sum(range(1000))
+
+
+def _blocked_greenthread(event):
+    event.wait()
+
+
+class AgentProfilerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(AgentProfilerTestCase, self).setUp()
+        self.output_dir = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, 'profiles')
+        self.profiler = agent_profiler.AgentProfiler(
+            self.output_dir, duration=60, interval=0.001)
+        self.addCleanup(self.profiler.stop)
+
+    def test_profile(self):
+        self.profiler.start()
+        self.assertTrue(self.profiler.running)
+        _busy_loop(self.profiler)
+        path = self.profiler.stop()
+
+        self.assertFalse(self.profiler.running)
+        self.assertEqual(signal.SIG_DFL, signal.getsignal(signal.SIGPROF))
+        self.assertEqual(self.output_dir, os.path.dirname(path))
+        with open(path) as f:
+            lines = f.read().splitlines()
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertIn('_busy_loop (%s' % __file__.rstrip('c'), stack)
+        self.assertLess(0, int(count))
+
+    def test_profile_window_is_bounded(self):
+        self.profiler.duration = 0.01
+        self.profiler.start()
+        self.profiler.start()
+        eventlet.sleep(0.1)
+        self.assertFalse(self.profiler.running)
+        self.assertEqual(1, len(os.listdir(self.output_dir)))
+
+    def test_dump_stacks(self):
+        event = eventlet_event.Event()
+        greenthread = eventlet.spawn(_blocked_greenthread, event)
+        eventlet.sleep(0)
+        path = self.profiler.dump_stacks()
+        event.send()
+        greenthread.wait()
+
+        with open(path) as f:
+            content = f.read()
+        self.assertIn('in _blocked_greenthread', content)
+        self.assertIn('Native thread', content)
+
+    def test_signal_handlers(self):
+        with mock.patch.object(agent_profiler.signal, 'signal') as sig_mock:
+            self.profiler.install_signal_handlers()
+        sig_mock.assert_has_calls([
+            mock.call(signal.SIGUSR1, self.profiler._handle_profile_signal),
+            mock.call(signal.SIGUSR2,
+                      self.profiler._handle_stack_dump_signal)])
+
+        with mock.patch.object(agent_profiler.eventlet,
+                               'spawn') as spawn_mock:
+            self.profiler._handle_profile_signal(signal.SIGUSR1, None)
+            self.profiler._handle_stack_dump_signal(signal.SIGUSR2, None)
+        spawn_mock.assert_has_calls([mock.call(self.profiler.start),
+                                     mock.call(self.profiler.dump_stacks)])
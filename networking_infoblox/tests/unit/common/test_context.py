@@ -26,6 +26,7 @@ from infoblox_client import objects as ib_objects
 
 from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import context as ib_context
+from networking_infoblox.neutron.common import member as grid_member
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
 
@@ -39,6 +40,11 @@ class InfobloxContextTestCase(base.TestCase, testlib_api.SqlTestCase):
     def setUp(self):
         super(InfobloxContextTestCase, self).setUp()
         self.ctx = context.get_admin_context()
+        # service members cached by other tests must not be used
+        cache_patch = mock.patch.object(grid_member, 'service_member_cache',
+                                        grid_member.ServiceMemberCache())
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
 
         self.setup_coreplugin(neutron_plugin_stub.DB_PLUGIN_KLASS)
         self.plugin = directory.get_plugin()
@@ -713,3 +719,82 @@ class InfobloxContextTestCase(base.TestCase, testlib_api.SqlTestCase):
         ib_cxt = self._get_ib_context(user_id, network, subnet)
         ip_allocator = ib_cxt._get_ip_allocator()
         self.assertEqual(False, ip_allocator.opts['configure_for_dns'])
+
+    def test_for_request_separates_request_state(self):
+        tenant_id = 'test-tenant'
+        network = self.plugin_stub.create_network(tenant_id, 'Test Network')
+        subnet = self.plugin_stub.create_subnet(tenant_id, 'Test Subnet',
+                                                network['id'], '12.0.0.0/24')
+        ib_cxt = self._get_ib_context('test user', network, subnet)
+
+        request_cxt = ib_cxt.for_request('other user')
+        self.assertEqual('other user', request_cxt.user_id)
+        self.assertEqual('test user', ib_cxt.user_id)
+        self.assertIs(ib_cxt.connector, request_cxt.connector)
+        self.assertIs(ib_cxt.ibom, request_cxt.ibom)
+        self.assertEqual(ib_cxt.mapping.network_view,
+                         request_cxt.mapping.network_view)
+
+        request_cxt.mapping.network_view = 'changed'
+        request_cxt.subnet['name'] = 'changed'
+        self.assertNotEqual('changed', ib_cxt.mapping.network_view)
+        self.assertEqual('Test Subnet', ib_cxt.subnet['name'])
+
+    def test_context_pool(self):
+        tenant_id = 'test-tenant'
+        network = self.plugin_stub.create_network(tenant_id, 'Test Network')
+        subnet = self.plugin_stub.create_subnet(tenant_id, 'Test Subnet',
+                                                network['id'], '13.0.0.0/24')
+        pool = ib_context.InfobloxContextPool(size=10, ttl=60)
+        mock_km_str = 'networking_infoblox.neutron.common.keystone_manager.'
+        with mock.patch(mock_km_str + 'get_all_tenants'), (
+                mock.patch(mock_km_str + 'sync_tenants_from_keystone')), (
+                mock.patch.object(ib_context.InfobloxContext, '_update',
+                                  autospec=True)) as update_mock:
+            first = pool.get(self.ctx, 'user-1', network, subnet,
+                             self.grid_config, self.plugin)
+            second = pool.get(self.ctx, 'user-2', network, subnet,
+                              self.grid_config, self.plugin)
+            self.assertEqual(1, update_mock.call_count)
+            self.assertEqual('user-1', first.user_id)
+            self.assertEqual('user-2', second.user_id)
+            self.assertEqual(1, pool.hits)
+
+            pool.invalidate(network_id=network['id'])
+            self.assertEqual(0, len(pool))
+            pool.get(self.ctx, 'user-1', network, subnet, self.grid_config,
+                     self.plugin)
+            self.assertEqual(2, update_mock.call_count)
+
+            pool.new_generation()
+            self.assertEqual(0, len(pool))
+            pool.get(self.ctx, 'user-1', network, subnet, self.grid_config,
+                     self.plugin)
+            self.assertEqual(3, update_mock.call_count)
+            self.assertEqual(1, len(pool))
+
+    def test_managers_are_built_on_first_use(self):
+        tenant_id = 'test-tenant'
+        network = self.plugin_stub.create_network(tenant_id, 'Test Network')
+        subnet = self.plugin_stub.create_subnet(tenant_id, 'Test Subnet',
+                                                network['id'], '14.0.0.0/24')
+        ib_cxt = self._get_ib_context('test user', network, subnet)
+        self.assertEqual({}, ib_cxt._managers)
+
+        with mock.patch.object(ib_cxt, '_get_connector') as connector_mock:
+            ip_alloc = ib_cxt.ip_alloc
+            self.assertIs(ip_alloc, ib_cxt.ip_alloc)
+            self.assertIsNotNone(ib_cxt.dhcp_port_ip_alloc)
+            connector_mock.assert_called_once_with()
+
+            # a new authority member needs a new connector
+            ib_cxt.mapping.network_view_id = 'netview-id'
+            ib_cxt.mapping.authority_member = mock.Mock(
+                member_type=const.MEMBER_TYPE_CP_MEMBER,
+                member_status=const.MEMBER_STATUS_ON,
+                member_wapi='192.168.1.10')
+            self.assertTrue(self.grid_config.is_cloud_wapi)
+            self.assertIsNot(ip_alloc, ib_cxt.ip_alloc)
+            self.assertEqual(2, connector_mock.call_count)
+            self.assertIsNotNone(ib_cxt.ibom)
+            self.assertEqual(2, connector_mock.call_count)
@@ -219,6 +219,30 @@ class DnsControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
         self.controller.create_dns_zones(rollback_list)
         assert mock_zone_obj.method_calls == []
 
+    def test_create_dns_zones_with_plan(self):
+        rollback_list = []
+        plan = mock.Mock()
+        self.controller.create_dns_zones(rollback_list, plan=plan)
+
+        self.ib_cxt.get_dns_members.assert_not_called()
+        self.assertEqual(
+            [mock.call(ib_objects.DNSZone,
+                       {'view': self.ib_cxt.mapping.dns_view,
+                        'fqdn': self.test_dns_zone},
+                       fields=mock.ANY),
+             mock.call(ib_objects.DNSZone,
+                       {'view': self.ib_cxt.mapping.dns_view,
+                        'fqdn': self.ib_cxt.subnet['cidr'],
+                        'zone_format': self.test_zone_format},
+                       fields=mock.ANY)],
+            plan.create_check.call_args_list)
+
+        # grid members are looked up only when the zone is created
+        forward_fields = plan.create_check.call_args_list[0][1]['fields']()
+        self.assertEqual([mock.ANY], forward_fields['grid_primary'])
+        self.ib_cxt.get_dns_members.assert_called_once_with()
+        self.assertEqual([], rollback_list)
+
     def _create_ib_zone_ea(self):
         zone_ea = {'CMP Type': {'value': 'OpenStack'},
                    'Cloud API Owned': {'value': 'True'},
@@ -593,45 +617,45 @@ class DnsControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
                 self.ib_cxt.mapping.network_view, self.ib_cxt.mapping.dns_view,
                 ip_address, None, None)]
 
-    def _test_update_calls(self, strategy, calls):
+    @mock.patch.object(ea_manager, 'update_eas')
+    @mock.patch.object(ib_objects.DNSZone, 'search')
+    def _test_update_calls(self, strategy, calls, search_mock,
+                           update_eas_mock):
         self.ib_cxt.grid_config.zone_creation_strategy = strategy
         self.controller._update_strategy_and_eas()
         self.controller.update_dns_zones()
-        assert self.ib_cxt.ibom.method_calls == calls
-        self.ib_cxt.ibom.reset_mock()
+        assert search_mock.call_args_list == calls
+        self.assertEqual(len(calls), update_eas_mock.call_count)
+        assert not self.ib_cxt.ibom.method_calls
 
     def test_update_dns_zones_all(self):
         self._test_update_calls(
             self._get_default_zone_creation_strategy(),
             [
-                mock.call.update_dns_zone_attrs(
-                    self.ib_cxt.mapping.dns_view,
-                    self.test_dns_zone,
-                    mock.ANY),
-                mock.call.update_dns_zone_attrs(
-                    self.ib_cxt.mapping.dns_view,
-                    self.ib_cxt.subnet['cidr'],
-                    mock.ANY)
+                mock.call(self.ib_cxt.connector,
+                          view=self.ib_cxt.mapping.dns_view,
+                          fqdn=self.test_dns_zone),
+                mock.call(self.ib_cxt.connector,
+                          view=self.ib_cxt.mapping.dns_view,
+                          fqdn=self.ib_cxt.subnet['cidr'])
             ])
 
     def test_update_dns_zones_forward(self):
         self._test_update_calls(
             [constants.ZONE_CREATION_STRATEGY_FORWARD],
             [
-                mock.call.update_dns_zone_attrs(
-                    self.ib_cxt.mapping.dns_view,
-                    self.test_dns_zone,
-                    mock.ANY),
+                mock.call(self.ib_cxt.connector,
+                          view=self.ib_cxt.mapping.dns_view,
+                          fqdn=self.test_dns_zone),
             ])
 
     def test_update_dns_zones_reverse(self):
         self._test_update_calls(
             [constants.ZONE_CREATION_STRATEGY_REVERSE],
             [
-                mock.call.update_dns_zone_attrs(
-                    self.ib_cxt.mapping.dns_view,
-                    self.ib_cxt.subnet['cidr'],
-                    mock.ANY)
+                mock.call(self.ib_cxt.connector,
+                          view=self.ib_cxt.mapping.dns_view,
+                          fqdn=self.ib_cxt.subnet['cidr'])
             ])
 
     def test_update_dns_zones_empty(self):
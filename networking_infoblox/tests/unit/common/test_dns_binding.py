@@ -0,0 +1,133 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from networking_infoblox.neutron.common import dns_binding
+from networking_infoblox.neutron.db import infoblox_db as dbi
+from networking_infoblox.tests import base
+
+
+class DnsBindingQueueTestCase(base.TestCase):
+
+    def setUp(self):
+        super(DnsBindingQueueTestCase, self).setUp()
+        self.context = mock.Mock()
+        self.plugin = mock.Mock()
+        self.queue = dns_binding.DnsBindingQueue(self.context, self.plugin,
+                                                 batch_size=10)
+        self.claim_context = mock.Mock()
+        self.queue._claim_context = self.claim_context
+        for name in ('get_dns_binding_jobs', 'claim_dns_binding_jobs',
+                     'release_dns_binding_jobs', 'remove_dns_binding_jobs'):
+            patcher = mock.patch.object(dbi, name)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _job(job_id, port_id, ip_address, attempts=0):
+        return mock.Mock(id=job_id, port_id=port_id, subnet_id='subnet-id',
+                         ip_address=ip_address, attempts=attempts)
+
+    @staticmethod
+    def _port(port_id, *ip_addresses):
+        return {'id': port_id,
+                'fixed_ips': [{'subnet_id': 'subnet-id', 'ip_address': ip}
+                              for ip in ip_addresses]}
+
+    def _set_jobs(self, jobs):
+        self.get_dns_binding_jobs.side_effect = [jobs, jobs, []]
+        self.claim_dns_binding_jobs.return_value = len(jobs)
+
+    def test_drain_binds_claimed_jobs_in_order(self):
+        jobs = [self._job(1, 'port-1', '10.0.0.3'),
+                self._job(2, 'port-2', '10.0.0.4'),
+                self._job(3, 'port-1', '10.0.0.5')]
+        self._set_jobs(jobs)
+        self.plugin.get_ports.return_value = [
+            self._port('port-1', '10.0.0.3', '10.0.0.5'),
+            self._port('port-2', '10.0.0.4')]
+        bind_func = mock.Mock()
+
+        self.assertEqual(3, self.queue.drain(bind_func))
+
+        self.assertEqual([job.id for job in jobs],
+                         [c[0][0].id for c in bind_func.call_args_list])
+        # jobs are claimed outside of the caller's transaction
+        self.assertEqual(self.claim_context.session,
+                         self.claim_dns_binding_jobs.call_args[0][0])
+        self.remove_dns_binding_jobs.assert_called_once_with(
+            self.context.session, job_ids=[1, 2, 3])
+        self.release_dns_binding_jobs.assert_not_called()
+
+    def test_drain_defers_port_jobs_after_failure(self):
+        jobs = [self._job(1, 'port-1', '10.0.0.3'),
+                self._job(2, 'port-2', '10.0.0.4'),
+                self._job(3, 'port-1', '10.0.0.5')]
+        self._set_jobs(jobs)
+        self.plugin.get_ports.return_value = [
+            self._port('port-1', '10.0.0.3', '10.0.0.5'),
+            self._port('port-2', '10.0.0.4')]
+
+        def bind_func(job, port):
+            if job.id == 1:
+                raise Exception('wapi error')
+
+        self.assertEqual(1, self.queue.drain(bind_func))
+
+        self.remove_dns_binding_jobs.assert_called_once_with(
+            self.context.session, job_ids=[2])
+        self.release_dns_binding_jobs.assert_has_calls([
+            mock.call(self.context.session, [1], failed=True),
+            mock.call(self.context.session, [3])])
+
+    def test_drain_drops_jobs_of_released_ips(self):
+        jobs = [self._job(1, 'port-1', '10.0.0.3'),
+                self._job(2, 'port-2', '10.0.0.4')]
+        self._set_jobs(jobs)
+        self.plugin.get_ports.return_value = [self._port('port-1',
+                                                         '10.0.0.9')]
+        bind_func = mock.Mock()
+
+        self.assertEqual(2, self.queue.drain(bind_func))
+
+        bind_func.assert_not_called()
+        self.remove_dns_binding_jobs.assert_called_once_with(
+            self.context.session, job_ids=[1, 2])
+
+    def test_drain_gives_up_after_max_attempts(self):
+        jobs = [self._job(1, 'port-1', '10.0.0.3',
+                          attempts=dns_binding.DnsBindingQueue.MAX_ATTEMPTS -
+                          1)]
+        self._set_jobs(jobs)
+        self.plugin.get_ports.return_value = [self._port('port-1',
+                                                         '10.0.0.3')]
+
+        self.queue.drain(mock.Mock(side_effect=Exception('wapi error')))
+
+        self.remove_dns_binding_jobs.assert_called_once_with(
+            self.context.session, job_ids=[1])
+        self.release_dns_binding_jobs.assert_not_called()
+
+    def test_drain_skips_jobs_claimed_by_other_agent(self):
+        self.get_dns_binding_jobs.return_value = [
+            self._job(1, 'port-1', '10.0.0.3')]
+        self.claim_dns_binding_jobs.return_value = 0
+        bind_func = mock.Mock()
+
+        self.assertEqual(0, self.queue.drain(bind_func))
+
+        bind_func.assert_not_called()
+        self.plugin.get_ports.assert_not_called()
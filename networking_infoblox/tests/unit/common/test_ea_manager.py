@@ -368,59 +368,86 @@ class EaManagerTestCase(base.TestCase):
         self._test_get_ea_for_forward_zone(
             template='private.infoblox.com', skip_eas=skip_eas)
 
-    def test_reset_ea_for_network(self):
-        network_ea = {'CMP Type': {'value': 'OpenStack'},
+    def _test_reset_ea(self, reset_func, ea_list):
+        current_ea = {'CMP Type': {'value': 'OpenStack'},
                       'Cloud API Owned': {'value': 'True'},
                       'Tenant ID': {'value': 'test-id'},
                       'Tenant Name': {'value': 'tenant-name'},
                       'Account': {'value': 'admin'},
-                      'Is External': {'value': 'False'},
-                      'Is Shared': {'value': 'True'},
-                      'Network ID': {'value': 'True'},
-                      'Network Name': {'value': 'True'},
-                      'Subnet ID': {'value': 'True'},
-                      'Subnet Name': {'value': 'True'},
-                      'Network Encap': {'value': 'gre'},
-                      'Segmentation ID': {'value': 'segmentation-id'},
-                      'Physical Network Name': {'value': 'physical-network'}}
-        ib_network_ea = ib_objects.EA.from_dict(network_ea)
-        ib_network_mock = mock.Mock(extattrs=ib_network_ea)
-
-        ea_manager.reset_ea_for_network(ib_network_mock)
-
-        expected_ea = {'Cloud API Owned': {'value': 'N/A'},
-                       'CMP Type': {'value': 'N/A'},
-                       'Tenant ID': {'value': 'N/A'}}
-        ib_network_mock.extattrs.ea_dict == expected_ea
-
-    def test_reset_ea_for_range(self):
-        range_ea = {'CMP Type': {'value': 'OpenStack'},
-                    'Cloud API Owned': {'value': 'True'},
-                    'Tenant ID': {'value': 'test-id'},
-                    'Tenant Name': {'value': 'tenant-name'},
-                    'Account': {'value': 'admin'}}
-        ib_range_ea = ib_objects.EA.from_dict(range_ea)
-        ib_range_mock = mock.Mock(extattrs=ib_range_ea)
+                      'Custom EA': {'value': 'custom'}}
+        ib_obj_mock = mock.Mock(extattrs=ib_objects.EA.from_dict(current_ea))
+        ea_stats = ea_manager.EaUpdateStats('test')
+
+        self.assertTrue(reset_func(ib_obj_mock, ea_stats))
+
+        expected_payload = {
+            'extattrs+': {'CMP Type': {'value': 'N/A'},
+                          'Cloud API Owned': {'value': 'False'},
+                          'Tenant ID': {'value': 'N/A'}},
+            'extattrs-': {ea: {} for ea in ea_list if ea in current_ea}}
+        ib_obj_mock.connector.update_object.assert_called_once_with(
+            ib_obj_mock.ref, expected_payload)
+        self.assertEqual('custom', ib_obj_mock.extattrs.get('Custom EA'))
+        self.assertIsNone(ib_obj_mock.extattrs.get('Account'))
+        self.assertEqual(1, ea_stats.updated)
+
+        # second reset has nothing to change
+        ib_obj_mock.connector.reset_mock()
+        self.assertFalse(reset_func(ib_obj_mock, ea_stats))
+        ib_obj_mock.connector.update_object.assert_not_called()
+        self.assertEqual(1, ea_stats.skipped)
 
-        ea_manager.reset_ea_for_range(ib_range_mock)
+    def test_reset_ea_for_network(self):
+        self._test_reset_ea(ea_manager.reset_ea_for_network,
+                            const.NETWORK_EA_LIST)
 
-        expected_ea = {'Cloud API Owned': {'value': 'N/A'},
-                       'CMP Type': {'value': 'N/A'},
-                       'Tenant ID': {'value': 'N/A'}}
-        ib_range_mock.extattrs.ea_dict == expected_ea
+    def test_reset_ea_for_range(self):
+        self._test_reset_ea(ea_manager.reset_ea_for_range,
+                            const.RANGE_EA_LIST)
 
     def test_reset_ea_for_zone(self):
-        zone_ea = {'CMP Type': {'value': 'OpenStack'},
-                   'Cloud API Owned': {'value': 'True'},
-                   'Tenant ID': {'value': 'test-id'},
-                   'Tenant Name': {'value': 'tenant-name'},
-                   'Account': {'value': 'admin'}}
-        ib_zone_ea = ib_objects.EA.from_dict(zone_ea)
-        ib_zone_mock = mock.Mock(extattrs=ib_zone_ea)
-
-        ea_manager.reset_ea_for_zone(ib_zone_mock)
-
-        expected_ea = {'Cloud API Owned': {'value': 'N/A'},
-                       'CMP Type': {'value': 'N/A'},
-                       'Tenant ID': {'value': 'N/A'}}
-        ib_zone_mock.extattrs.ea_dict == expected_ea
+        self._test_reset_ea(ea_manager.reset_ea_for_zone,
+                            const.ZONE_EA_LIST)
+
+    def test_get_ea_changes(self):
+        current_ea = ib_objects.EA.from_dict(
+            {'Tenant ID': {'value': 'test-id'},
+             'Tenant Name': {'value': 'old-name'},
+             'Cloud API Owned': {'value': 'True'},
+             'VM ID': {'value': 'vm-id'},
+             'Custom EA': {'value': 'custom'}})
+        desired_ea = ib_objects.EA({'Tenant ID': 'test-id',
+                                    'Tenant Name': 'new-name',
+                                    'Cloud API Owned': 'True',
+                                    'VM ID': None,
+                                    'VM Name': None,
+                                    'Port ID': 'port-id'})
+        eas_to_set, eas_to_remove = ea_manager.get_ea_changes(current_ea,
+                                                              desired_ea)
+        self.assertEqual({'Tenant Name': {'value': 'new-name'},
+                          'Port ID': {'value': 'port-id'}}, eas_to_set)
+        self.assertEqual({'VM ID': {}}, eas_to_remove)
+
+    def test_get_ea_changes_no_current_eas(self):
+        desired_ea = ib_objects.EA({'Tenant ID': 'test-id',
+                                    'VM ID': None})
+        eas_to_set, eas_to_remove = ea_manager.get_ea_changes(None,
+                                                              desired_ea)
+        self.assertEqual({'Tenant ID': {'value': 'test-id'}}, eas_to_set)
+        self.assertEqual({}, eas_to_remove)
+
+    def test_update_eas_unchanged(self):
+        current_ea = ib_objects.EA.from_dict(
+            {'Tenant ID': {'value': 'test-id'},
+             'Is External': {'value': 'False'}})
+        ib_obj_mock = mock.Mock(extattrs=current_ea)
+        desired_ea = ib_objects.EA({'Tenant ID': 'test-id',
+                                    'Is External': 'False',
+                                    'VM ID': None})
+        ea_stats = ea_manager.EaUpdateStats('test')
+
+        self.assertFalse(ea_manager.update_eas(ib_obj_mock, desired_ea,
+                                               ea_stats))
+        ib_obj_mock.connector.update_object.assert_not_called()
+        self.assertEqual(0, ea_stats.updated)
+        self.assertEqual(1, ea_stats.skipped)
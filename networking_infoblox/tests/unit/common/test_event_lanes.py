@@ -0,0 +1,78 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import time
+
+from networking_infoblox.neutron.common import event_lanes
+from networking_infoblox.tests import base
+
+
+class EventLanesTestCase(base.TestCase):
+
+    def setUp(self):
+        super(EventLanesTestCase, self).setUp()
+        self.handled = []
+        self.lanes = event_lanes.EventLanes(self._handle, 5,
+                                            low_lane_share=2)
+        self.addCleanup(self.lanes.stop)
+
+    def _handle(self, event):
+        if event == 'fail':
+            raise ValueError(event)
+        self.handled.append(event)
+
+    def test_high_lane_first(self):
+        for event in ('low-1', 'low-2'):
+            self.lanes.put(event_lanes.LANE_LOW, event)
+        for event in ('high-1', 'fail', 'high-2', 'high-3'):
+            self.lanes.put(event_lanes.LANE_HIGH, event)
+        self.lanes.start()
+        self.lanes.stop()
+
+        # a low lane event is taken after low_lane_share high lane ones
+        self.assertEqual(['high-1', 'low-1', 'high-2', 'high-3', 'low-2'],
+                         self.handled)
+
+    def test_put_blocks_while_lane_is_full(self):
+        for i in range(5):
+            self.lanes.put(event_lanes.LANE_HIGH, i)
+        producer = eventlet.spawn(self.lanes.put, event_lanes.LANE_HIGH, 5)
+        eventlet.sleep(0)
+        self.assertFalse(producer.dead)
+        self.assertEqual({'high': 5, 'low': 0}, self.lanes.depths())
+
+        self.lanes.start()
+        producer.wait()
+        self.lanes.stop()
+        self.assertEqual(list(range(6)), self.handled)
+
+    def test_stop_drops_events_after_timeout(self):
+        def handle(event):
+            eventlet.sleep(10)
+
+        lanes = event_lanes.EventLanes(handle, 5)
+        lanes.put(event_lanes.LANE_LOW, 'low-1')
+        lanes.put(event_lanes.LANE_HIGH, 'high-1')
+        lanes.put(event_lanes.LANE_HIGH, 'high-2')
+        lanes.start()
+        eventlet.sleep(0)
+
+        start = time.time()
+        dropped = lanes.stop(timeout=0.2)
+        self.assertLess(time.time() - start, 5)
+        # the event being handled is dropped first
+        self.assertEqual([('high-1',), ('high-2',), ('low-1',)], dropped)
+        self.assertEqual({'high': 0, 'low': 0}, lanes.depths())
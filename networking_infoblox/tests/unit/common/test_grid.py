@@ -22,6 +22,7 @@ from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import exceptions as exc
 from networking_infoblox.neutron.common import grid
 from networking_infoblox.neutron.common import member
+from networking_infoblox.neutron.common import sync_profile
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
 
@@ -158,6 +159,74 @@ class GridTestCase(base.TestCase, testlib_api.SqlTestCase):
         last_sync_time = dbi.get_last_sync_time(self.ctx.session)
         self.assertEqual(last_sync_time, grid_mgr.last_sync_time)
 
+    def test_grid_sync_records_profile(self):
+        stub = grid_sync_stub.GridSyncStub(self.ctx, self.connector_fixture)
+        stub.prepare_grid_manager(wapi_version='2.2')
+        grid_mgr = stub.get_grid_manager()
+        grid_mgr._report_sync_time = mock.Mock()
+        grid_mgr.grid_config.grid_sync_support = True
+
+        grid_mgr.sync(force_sync=True)
+
+        profile = grid_mgr.last_sync_profile
+        self.assertEqual([sync_profile.PHASE_MEMBERS,
+                          sync_profile.PHASE_CONFIG,
+                          sync_profile.PHASE_NETWORK_VIEWS,
+                          sync_profile.PHASE_NETWORKS,
+                          sync_profile.PHASE_DB_WRITES],
+                         list(profile.phases))
+        network_views = grid_mgr.mapping._discover_network_views()
+        self.assertEqual(
+            len(network_views),
+            profile.phases[sync_profile.PHASE_NETWORK_VIEWS].objects)
+        self.assertLess(
+            0, profile.phases[sync_profile.PHASE_DB_WRITES].db_statements)
+        self.assertEqual(profile.to_json(), dbi.get_operation_value(
+            self.ctx.session, sync_profile.OP_TYPE_LAST_SYNC_PROFILE))
+
+    def test_grid_sync_records_changes(self):
+        stub = grid_sync_stub.GridSyncStub(self.ctx, self.connector_fixture)
+        stub.prepare_grid_manager(wapi_version='2.2')
+        grid_mgr = stub.get_grid_manager()
+        grid_mgr._report_sync_time = mock.Mock()
+        grid_mgr.grid_config.grid_sync_support = True
+        grid_mgr.resync_interval = grid.ResyncInterval(ceiling=1200)
+
+        # the first sync brings in the grid data
+        grid_mgr.sync(force_sync=True)
+        self.assertLess(0, grid_mgr.last_sync_changes['members'])
+        self.assertLess(0, grid_mgr.last_sync_changes['network_views'])
+        self.assertEqual(60, grid_mgr.resync_interval.get(60, 300))
+
+        # nothing changed on NIOS, so the next sync changes nothing
+        grid_mgr.sync(force_sync=True)
+        self.assertEqual(0, sum(grid_mgr.last_sync_changes.values()))
+        self.assertEqual(120, grid_mgr.resync_interval.get(60, 300))
+
+    def test_resync_interval(self):
+        interval = grid.ResyncInterval()
+        interval.record_sync(0)
+        self.assertEqual(300, interval.get(60, 300))
+
+        interval = grid.ResyncInterval(ceiling=1000)
+        self.assertEqual(300, interval.get(60, 300))
+        interval.record_sync(0)
+        self.assertEqual(600, interval.get(60, 300))
+        interval.record_sync(0)
+        self.assertEqual(1000, interval.get(60, 300))
+
+        interval.record_sync(3)
+        self.assertEqual(60, interval.get(60, 300))
+        interval.record_sync(0)
+        self.assertEqual(120, interval.get(60, 300))
+        interval.tighten()
+        self.assertEqual(60, interval.get(60, 300))
+
+        # the ceiling never cuts the maximum wait time
+        interval = grid.ResyncInterval(ceiling=100)
+        interval.record_sync(0)
+        self.assertEqual(300, interval.get(60, 300))
+
     def _mock_connector(self, get_object=None, create_object=None,
                         delete_object=None):
         connector = mock.Mock()
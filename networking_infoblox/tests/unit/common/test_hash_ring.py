@@ -0,0 +1,43 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+from networking_infoblox.neutron.common import hash_ring
+from networking_infoblox.tests import base
+
+
+class HashRingTestCase(base.TestCase):
+
+    keys = ['port-%d' % i for i in range(2000)]
+
+    def test_keys_spread_over_nodes(self):
+        ring = hash_ring.HashRing(range(4))
+        counts = collections.Counter(ring.get_node(key) for key in self.keys)
+        self.assertEqual([0, 1, 2, 3], sorted(counts))
+        for count in counts.values():
+            self.assertTrue(300 < count < 700, counts)
+
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        ring = hash_ring.HashRing(range(4))
+        bigger_ring = hash_ring.HashRing(range(5))
+        moved = [key for key in self.keys
+                 if ring.get_node(key) != bigger_ring.get_node(key)]
+        self.assertEqual(set([4]),
+                         set(bigger_ring.get_node(key) for key in moved))
+        self.assertTrue(len(moved) < len(self.keys) / 3)
+
+    def test_no_nodes(self):
+        self.assertRaises(ValueError, hash_ring.HashRing, [])
@@ -18,6 +18,7 @@ import mock
 from infoblox_client import objects as ib_objects
 
 from networking_infoblox.neutron.common import ip_allocator
+from networking_infoblox.neutron.common import multi_request
 from networking_infoblox.tests import base
 
 
@@ -192,6 +193,45 @@ class HostRecordAllocatorTestCase(base.TestCase):
     def _test_creates_host_record_range_on_range_allocation_no_dhcp(self):
         self._test_creates_host_record_range_on_range_allocation(False, False)
 
+    def test_allocate_given_ip_skips_mac_search_not_in_index(self):
+        ib_mock = mock.MagicMock()
+        index_mock = mock.Mock()
+        index_mock.may_have_host.return_value = False
+        options = {'use_host_record': True,
+                   'host_mac_index': index_mock}
+
+        allocator = ip_allocator.IPAllocator(ib_mock, options)
+        allocator.allocate_given_ip('netview', 'dnsview', 'zone-auth',
+                                    'host1', 'de:ad:be:ef:00:00',
+                                    '192.168.1.1')
+
+        index_mock.may_have_host.assert_called_once_with(
+            'netview', 'de:ad:be:ef:00:00')
+        ib_mock.find_host_records_by_mac.assert_not_called()
+        host_record = ib_mock.create_host_record_for_given_ip.return_value
+        index_mock.add.assert_called_once_with(
+            host_record.ref, 'netview', 'de:ad:be:ef:00:00')
+
+    def test_allocate_ip_from_range_searches_mac_in_index(self):
+        ib_mock = mock.MagicMock()
+        ib_mock.find_hostname.return_value = None
+        ib_mock.find_host_records_by_mac.return_value = None
+        index_mock = mock.Mock()
+        index_mock.may_have_host.return_value = True
+        options = {'use_host_record': True,
+                   'host_mac_index': index_mock}
+
+        allocator = ip_allocator.IPAllocator(ib_mock, options)
+        allocator.allocate_ip_from_range(
+            'netview', 'dnsview', 'zone-auth', 'host1', 'de:ad:be:ef:00:00',
+            '192.168.1.2', '192.168.1.254')
+
+        ib_mock.find_host_records_by_mac.assert_called_once_with(
+            'dnsview', 'de:ad:be:ef:00:00', 'netview')
+        host_record = ib_mock.create_host_record_from_range.return_value
+        index_mock.add.assert_called_once_with(
+            host_record.ref, 'netview', 'de:ad:be:ef:00:00')
+
     def test_deletes_host_record(self):
         ib_mock = mock.MagicMock()
 
@@ -215,17 +255,16 @@ class HostRecordAllocatorTestCase(base.TestCase):
         ib_mock.delete_ip_from_host_record.assert_called_once_with(
             host_record_mock, ip_1[0])
 
-    def _check_bind_names_calls(self, opts, params, expected_find,
-                                expected_get_host, expected_bind):
+    def _check_bind_names_search(self, opts, params, expected_search):
         ib_mock = mock.MagicMock()
-        ib_mock.find_hostname.return_value = None
-        ib_mock.get_host_record.return_value = None
         allocator = ip_allocator.IPAllocator(ib_mock, opts)
-        allocator.bind_names(*params)
-        ib_mock.find_hostname.assert_called_once_with(*expected_find)
-        ib_mock.get_host_record.assert_called_once_with(*expected_get_host)
-        ib_mock.bind_name_with_host_record.assert_called_once_with(
-            *expected_bind)
+        with mock.patch.object(ib_objects.HostRecord, 'search_all',
+                               return_value=[]) as search_mock, \
+                mock.patch.object(multi_request, 'send') as send_mock:
+            allocator.bind_names(*params)
+        search_mock.assert_called_once_with(
+            ib_mock.connector, return_fields=mock.ANY, **expected_search)
+        send_mock.assert_not_called()
 
     def test_bind_names_for_non_dns(self):
         netview = 'some-test-net-view'
@@ -239,19 +278,72 @@ class HostRecordAllocatorTestCase(base.TestCase):
                    'configure_for_dns': True}
 
         # First bind dns host - should be used provided dns view name
-        self._check_bind_names_calls(
+        self._check_bind_names_search(
             options,
             [netview, dns_view, ip, hostname, extattrs],
-            [dns_view, hostname, ip, None],  # expected find_hostname params
-            [dns_view, ip, None],  # expected get_host_record params
-            [dns_view, ip, hostname, extattrs, None])  # expected for bind_name
+            {'view': dns_view, 'ip': ip, 'network_view': None})
 
         options['configure_for_dns'] = False
         # Now bind non-dns host in all network view - network view
         # name should be used, dns view name should be not used
-        self._check_bind_names_calls(
+        self._check_bind_names_search(
             options,
             [netview, dns_view, ip, hostname, extattrs],
-            [None, hostname, ip, netview],  # expected find_hostname params
-            [None, ip, netview],  # expected get_host_record params
-            [None, ip, hostname, extattrs, netview])  # expected for bind_name
+            {'view': None, 'ip': ip, 'network_view': netview})
+
+    def _bind_names(self, host_records, hostname='host1.zone.com',
+                    ip='192.168.1.2'):
+        ib_mock = mock.MagicMock()
+        allocator = ip_allocator.IPAllocator(ib_mock,
+                                             {'use_host_record': True})
+        with mock.patch.object(ib_objects.HostRecord, 'search_all',
+                               return_value=host_records), \
+                mock.patch.object(multi_request, 'send') as send_mock:
+            allocator.bind_names('netview', 'dns-view', ip, hostname,
+                                 'test-extattrs')
+        return ib_mock, send_mock
+
+    def _host_record(self, ref, name, ips):
+        host_record = mock.Mock(ref=ref, extattrs=None)
+        host_record.name = name
+        host_record.ips = [ib_objects.IP.create(ip=ip, mac=mac)
+                           for ip, mac in ips]
+        return host_record
+
+    def test_bind_names_renames_host_record_of_ip(self):
+        ip_hr = self._host_record('ref-1', 'host-192-168-1-2.zone.com',
+                                  [('192.168.1.2', 'de:ad:be:ef:00:00')])
+        _, send_mock = self._bind_names([ip_hr])
+        self.assertEqual('host1.zone.com', ip_hr.name)
+        self.assertEqual('test-extattrs', ip_hr.extattrs)
+        ip_hr.update.assert_called_once_with()
+        send_mock.assert_not_called()
+
+    def test_bind_names_updates_eas_of_reserved_host_record(self):
+        hr = self._host_record('ref-1', 'HOST1.zone.com',
+                               [('192.168.1.2', 'de:ad:be:ef:00:00')])
+        _, send_mock = self._bind_names([hr])
+        self.assertEqual('HOST1.zone.com', hr.name)
+        self.assertEqual('test-extattrs', hr.extattrs)
+        hr.update.assert_called_once_with()
+        send_mock.assert_not_called()
+
+    def test_bind_names_moves_ip_to_reserved_hostname(self):
+        ip_hr = self._host_record('ref-1', 'host-192-168-1-2.zone.com',
+                                  [('192.168.1.2', 'de:ad:be:ef:00:00')])
+        hostname_hr = self._host_record(
+            'ref-2', 'host1.zone.com', [('192.168.1.7', 'de:ad:be:ef:00:01')])
+        hostname_hr.to_dict.return_value = {'ipv4addrs': 'test-ips'}
+        ib_mock, send_mock = self._bind_names([ip_hr, hostname_hr])
+
+        self.assertEqual(['192.168.1.7', '192.168.1.2'],
+                         [hr_ip.ip for hr_ip in hostname_hr.ips])
+        self.assertEqual('de:ad:be:ef:00:00', hostname_hr.ips[1].mac)
+        self.assertEqual('test-extattrs', hostname_hr.extattrs)
+        send_mock.assert_called_once_with(
+            ib_mock.connector,
+            [{'method': 'DELETE', 'object': 'ref-1'},
+             {'method': 'PUT', 'object': 'ref-2',
+              'data': {'ipv4addrs': 'test-ips'}}])
+        ip_hr.update.assert_not_called()
+        hostname_hr.update.assert_not_called()
@@ -22,8 +22,10 @@ from neutron_lib import context
 
 from infoblox_client import objects as ib_objects
 
+from networking_infoblox.neutron.common import ea_manager as eam
 from networking_infoblox.neutron.common import exceptions as exc
 from networking_infoblox.neutron.common import ipam
+from networking_infoblox.neutron.common import multi_request
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
 from networking_infoblox.tests import base
@@ -153,7 +155,21 @@ class IpamSyncControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
         self.ib_cxt = self.helper.ib_cxt
         self.grid_config = self.ib_cxt.grid_config
 
-    def validate_network_creation(self, network_view, subnet):
+    def _create_subnet(self, ipam_controller, reads, writes=None,
+                       dns_controller=None):
+        rollback_list = []
+        with mock.patch.object(multi_request, 'send',
+                               side_effect=[reads, writes]) as send_mock:
+            ib_network = ipam_controller.create_subnet(rollback_list,
+                                                       dns_controller)
+        return ib_network, rollback_list, send_mock
+
+    def _tenant_reply(self, name='old-tenant-name'):
+        return {'_ref': 'grid:cloudapi:tenant/ref-3',
+                'id': self.ib_cxt.tenant_id,
+                'name': name}
+
+    def validate_network_creation(self, network_view, subnet, send_mock):
         if self.ib_cxt.mapping.network_view_id:
             self.ib_cxt.ibom.create_network_view.assert_not_called()
         else:
@@ -161,22 +177,35 @@ class IpamSyncControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
 
         self.ib_cxt.reserve_service_members.assert_called_once_with()
 
-        self.ib_cxt.ibom.create_network.assert_called_once_with(
-            network_view, subnet['cidr'], mock.ANY, mock.ANY,
-            subnet['gateway_ip'], None, mock.ANY)
+        # objects are searched and then created in one request each
+        self.assertEqual(2, send_mock.call_count)
+        writes = send_mock.call_args_list[1][0][1]
+        network_post, range_post, tenant_put = writes
+
+        self.assertEqual(('POST', 'network'),
+                         (network_post['method'], network_post['object']))
+        self.assertEqual(network_view, network_post['data']['network_view'])
+        self.assertEqual(subnet['cidr'], network_post['data']['network'])
+        self.assertEqual(
+            [{'name': 'routers', 'value': str(subnet['gateway_ip'])}],
+            network_post['data']['options'])
 
         allocation_pools = subnet['allocation_pools'][0]
         first_ip = netaddr.IPAddress(allocation_pools.first,
                                      subnet['ip_version']).format()
         last_ip = netaddr.IPAddress(allocation_pools.last,
                                     subnet['ip_version']).format()
-        self.ib_cxt.ibom.create_ip_range.assert_called_once_with(
-            network_view,
-            first_ip,
-            last_ip,
-            subnet['cidr'],
-            True,
-            mock.ANY)
+        self.assertEqual(('POST', 'range'),
+                         (range_post['method'], range_post['object']))
+        self.assertEqual(
+            (network_view, first_ip, last_ip, subnet['cidr'], True),
+            tuple(range_post['data'][field]
+                  for field in ('network_view', 'start_addr', 'end_addr',
+                                'network', 'disable')))
+
+        self.assertEqual(('PUT', 'grid:cloudapi:tenant/ref-3'),
+                         (tenant_put['method'], tenant_put['object']))
+        self.assertEqual(self.ib_cxt.tenant_name, tenant_put['data']['name'])
 
     @mock.patch.object(ib_objects, 'NetworkView')
     def test_create_subnet_new_network_view_nwview_preexist(self, mck_nw_view):
@@ -190,60 +219,57 @@ class IpamSyncControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
 
     @mock.patch.object(dbi, 'update_network_view_id', mock.Mock())
     @mock.patch.object(dbi, 'associate_network_view', mock.Mock())
-    @mock.patch('infoblox_client.objects.Tenant')
-    @mock.patch('infoblox_client.objects.IPRange')
-    def _test_create_subnet_new_network_view(self, ip_range_mock, tenant_mock):
+    def _test_create_subnet_new_network_view(self):
         test_opts = dict()
         self.helper.prepare_test(test_opts)
+        self.ib_cxt.mapping.ib_nameservers = []
+        self.ib_cxt.mapping.ib_dhcp_members = []
 
         ipam_controller = ipam.IpamSyncController(self.ib_cxt)
-        ip_range_mock.search = mock.Mock(return_value=None)
-        tenant = mock.Mock()
-        tenant_mock.search = mock.Mock(return_value=tenant)
-        with mock.patch.object(ib_objects.Network,
-                               'search',
-                               return_value=None):
-            ipam_controller._register_mapping_member = mock.Mock()
-            rollback_list = []
-            ipam_controller.create_subnet(rollback_list)
-
-        tenant_mock.search.assert_called_once_with(
-            self.ib_cxt.connector, id=self.ib_cxt.tenant_id)
-        tenant.update.assert_called_once_with()
-        assert tenant.name == self.ib_cxt.tenant_name
-
+        ipam_controller._register_mapping_member = mock.Mock()
+        ib_network, rollback_list, send_mock = self._create_subnet(
+            ipam_controller,
+            [[], [], [self._tenant_reply()]],
+            [{'_ref': 'network/ref-1', 'network_view': 'test-network-view',
+              'network': self.helper.subnet['cidr']},
+             'range/ref-2',
+             'grid:cloudapi:tenant/ref-3'])
+
+        self.assertEqual('network/ref-1', ib_network.ref)
+        self.assertEqual(['network/ref-1', 'range/ref-2'],
+                         [ib_obj.ref for ib_obj in rollback_list[-2:]])
+        ipam_controller._register_mapping_member.assert_called_once_with()
         self.validate_network_creation(self.helper.options['network_view'],
-                                       self.helper.subnet)
+                                       self.helper.subnet, send_mock)
 
     @mock.patch.object(dbi, 'update_network_view_id', mock.Mock())
     @mock.patch.object(dbi, 'associate_network_view', mock.Mock())
-    @mock.patch('infoblox_client.objects.Tenant')
     @mock.patch('infoblox_client.objects.Member')
-    @mock.patch('infoblox_client.objects.IPRange')
-    def test_create_subnet_existing_network_view(self, ip_range_mock,
-                                                 member_mock, tenant_mock):
+    def test_create_subnet_existing_network_view(self, member_mock):
         test_opts = {'cidr': '12.12.12.0/24', 'network_view_exists': True}
         self.helper.prepare_test(test_opts)
+        self.ib_cxt.mapping.ib_nameservers = []
+        self.ib_cxt.mapping.ib_dhcp_members = []
 
         ipam_controller = ipam.IpamSyncController(self.ib_cxt)
+        ipam_controller._register_mapping_member = mock.Mock()
         member_mock.search = mock.Mock(return_value=None)
-        ip_range_mock.search = mock.Mock(return_value=None)
-        tenant = mock.Mock()
-        tenant_mock.search = mock.Mock(return_value=tenant)
-        with mock.patch.object(ib_objects.Network,
-                               'search',
-                               return_value=None):
-            ipam_controller._register_mapping_member = mock.Mock()
-            rollback_list = []
-            ipam_controller.create_subnet(rollback_list)
-
-        tenant_mock.search.assert_called_once_with(
-            self.ib_cxt.connector, id=self.ib_cxt.tenant_id)
-        tenant.update.assert_called_once_with()
-        assert tenant.name == self.ib_cxt.tenant_name
-
+        dns_controller = mock.Mock()
+        ib_network, rollback_list, send_mock = self._create_subnet(
+            ipam_controller,
+            [[], [], [self._tenant_reply()]],
+            [{'_ref': 'network/ref-1', 'network_view': 'test-network-view',
+              'network': self.helper.subnet['cidr']},
+             'range/ref-2',
+             'grid:cloudapi:tenant/ref-3'],
+            dns_controller=dns_controller)
+
+        dns_controller.create_dns_zones.assert_called_once_with(
+            rollback_list, plan=mock.ANY)
+        self.assertEqual(['network/ref-1', 'range/ref-2'],
+                         [ib_obj.ref for ib_obj in rollback_list])
         self.validate_network_creation(self.helper.options['network_view'],
-                                       self.helper.subnet)
+                                       self.helper.subnet, send_mock)
 
     @mock.patch.object(ib_objects, 'NetworkView')
     def test_create_subnet_existing_private_network_nwview_preexist(
@@ -268,12 +294,13 @@ class IpamSyncControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
         self.ib_cxt.mapping.shared = False
         self.ib_cxt.network_is_shared_or_external = False
         ipam_controller = ipam.IpamSyncController(self.ib_cxt)
-        with mock.patch.object(ib_objects.Network,
-                               'search',
-                               return_value=mock.Mock()):
-            self.assertRaises(exc.InfobloxPrivateSubnetAlreadyExist,
-                              ipam_controller.create_subnet,
-                              [])
+        existing_network = {'_ref': 'network/ref-1',
+                            'network_view': 'test-network-view',
+                            'network': self.helper.subnet['cidr']}
+        self.assertRaises(exc.InfobloxPrivateSubnetAlreadyExist,
+                          self._create_subnet,
+                          ipam_controller,
+                          [[existing_network], [], [self._tenant_reply()]])
 
     @mock.patch.object(ib_objects, 'NetworkView')
     def test_create_subnet_existing_external_network_nwview_preexist(
@@ -289,8 +316,7 @@ class IpamSyncControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
 
     @mock.patch.object(dbi, 'update_network_view_id', mock.Mock())
     @mock.patch.object(dbi, 'associate_network_view', mock.Mock())
-    @mock.patch('infoblox_client.objects.Tenant')
-    def _test_create_subnet_existing_external_network(self, tenant_mock):
+    def _test_create_subnet_existing_external_network(self):
         test_opts = {'network_name': 'extnet',
                      'subnet_name': 'extsub',
                      'cidr': '172.192.1.0/24',
@@ -299,22 +325,25 @@ class IpamSyncControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
         self.helper.prepare_test(test_opts)
 
         ipam_controller = ipam.IpamSyncController(self.ib_cxt)
-        ipam_controller._allocate_pools = mock.Mock()
-        tenant = mock.Mock()
-        tenant_mock.search = mock.Mock(return_value=tenant)
-        with mock.patch.object(ib_objects.Network,
-                               'search',
-                               return_value=mock.Mock()):
-            rollback_list = []
-            ipam_controller.create_subnet(rollback_list)
-
-        tenant_mock.search.assert_called_once_with(
-            self.ib_cxt.connector, id=self.ib_cxt.tenant_id)
-        tenant.update.assert_called_once_with()
-        assert tenant.name == self.ib_cxt.tenant_name
-
+        existing_network = {'_ref': 'network/ref-1',
+                            'network_view': 'test-network-view',
+                            'network': self.helper.subnet['cidr']}
+        ib_network, rollback_list, send_mock = self._create_subnet(
+            ipam_controller,
+            [[existing_network], [], [self._tenant_reply()]],
+            ['range/ref-2', 'grid:cloudapi:tenant/ref-3'])
+
+        self.assertEqual('network/ref-1', ib_network.ref)
+        self.ib_cxt.reserve_service_members.assert_called_once_with(
+            ib_network)
         self.ib_cxt.ibom.update_network_options.assert_called_once_with(
-            mock.ANY, mock.ANY)
+            ib_network, mock.ANY)
+        writes = send_mock.call_args_list[1][0][1]
+        self.assertEqual([('POST', 'range'),
+                          ('PUT', 'grid:cloudapi:tenant/ref-3')],
+                         [(w['method'], w['object']) for w in writes])
+        self.assertEqual(['range/ref-2'],
+                         [ib_obj.ref for ib_obj in rollback_list[-1:]])
 
     def test_update_subnet_allocation_pools(self):
         test_opts = {'network_exists': True,
@@ -423,9 +452,11 @@ class IpamSyncControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
                                    'search_all',
                                    return_value=ib_ranges_mock):
                 ipam_controller.delete_subnet(ib_network_mock)
-                assert ib_network_mock.update.called
+                assert ib_network_mock.connector.update_object.called
+                assert not ib_network_mock.update.called
                 assert ib_network_mock.extattrs.to_dict() == expected_ea
-                assert ib_ranges_mock[0].update.called
+                assert ib_ranges_mock[0].connector.update_object.called
+                assert not ib_ranges_mock[0].update.called
                 assert ib_ranges_mock[0].extattrs.to_dict() == expected_ea
 
     def test_delete_subnet_for_external_network_deletable(self):
@@ -565,9 +596,13 @@ class IpamAsyncControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
                                return_value=[{'id': 'subnet-id',
                                               'cidr': '11.11.1.0/24',
                                               'network_id': 'test_net'}]):
-            ipam_controller.update_network_sync()
-            assert self.ib_cxt.ibom.get_network.called
-            assert self.ib_cxt.ibom.update_network_options.called
+            with mock.patch.object(eam, 'update_eas') as update_eas_mock:
+                ipam_controller.update_network_sync()
+                assert self.ib_cxt.ibom.get_network.called
+                update_eas_mock.assert_called_once_with(
+                    self.ib_cxt.ibom.get_network.return_value, mock.ANY,
+                    mock.ANY)
+            assert not self.ib_cxt.ibom.update_network_options.called
 
     @mock.patch('networking_infoblox.neutron.common.dns.DnsController')
     @mock.patch.object(dbi, 'get_network_view_mappings', return_value=[])
@@ -584,7 +619,7 @@ class IpamAsyncControllerTestCase(base.TestCase, testlib_api.SqlTestCase):
                                               'cidr': '11.11.1.0/24',
                                               'network_id': 'test_net'}]):
             ipam_controller.update_network_sync()
-            dns_controller.update_dns_zones.assert_called_once_with()
+            dns_controller.update_dns_zones.assert_called_once_with(mock.ANY)
 
     @mock.patch('networking_infoblox.neutron.common.context.InfobloxContext')
     @mock.patch('networking_infoblox.neutron.common.dns.DnsController')
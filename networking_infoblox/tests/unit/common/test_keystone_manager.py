@@ -50,6 +50,12 @@ class TestKeystoneManager(base.TestCase):
             {'tenant_id': '3'},
             {'tenant_id': '4'},
             ]
+        keystone_manager.reset_keystone_client()
+        self.addCleanup(keystone_manager.reset_keystone_client)
+        keystone_manager.tenant_sync_state = (
+            keystone_manager.TenantSyncState())
+        keystone_manager.tenant_name_cache = (
+            keystone_manager.TenantNameCache(size=100, ttl=60))
 
     def test_get_identity_service_with_auth_version(self):
         version = 'v3'
@@ -98,6 +104,9 @@ class TestKeystoneManager(base.TestCase):
                                                 auth=auth)
         ClientMock.assert_called_once_with(session=session)
         assert k_client == ClientMock.return_value
+        # client is reused by subsequent calls
+        assert keystone_manager.get_keystone_client() == k_client
+        ClientMock.assert_called_once_with(session=session)
 
     @mock.patch('networking_infoblox.neutron.common.keystone_manager.CONF')
     @mock.patch('keystoneclient.v2_0.client.Client')
@@ -130,7 +139,9 @@ class TestKeystoneManager(base.TestCase):
         if version == 'v3':
             client_mock.projects.list.assert_called_once_with()
         else:
-            client_mock.tenants.list.assert_called_once_with()
+            client_mock.tenants.list.assert_called_once_with(
+                limit=keystone_manager.CONF.infoblox.keystone_page_size,
+                marker=None)
 
     def test_get_all_tenants_v2_0(self):
         self._test_get_all_tenants('v2.0')
@@ -138,6 +149,24 @@ class TestKeystoneManager(base.TestCase):
     def test_get_all_tenants_v3(self):
         self._test_get_all_tenants('v3')
 
+    @mock.patch('networking_infoblox.neutron.common.keystone_manager.CONF')
+    @mock.patch('networking_infoblox.neutron.common.keystone_manager.'
+                'get_keystone_client')
+    def test_get_all_tenants_paged(self, get_keystone_client_mock, ConfMock):
+        ConfMock.infoblox.keystone_page_size = 2
+        client_mock = mock.Mock()
+        client_mock.version = 'v2.0'
+        client_mock.tenants.list.side_effect = [self.tenants[:2],
+                                                self.tenants[2:]]
+        get_keystone_client_mock.return_value = client_mock
+
+        tenants = keystone_manager.get_all_tenants()
+
+        assert tenants == self.tenants
+        assert client_mock.tenants.list.call_args_list == [
+            mock.call(limit=2, marker=None),
+            mock.call(limit=2, marker=self.tenants[1].id)]
+
     @mock.patch('networking_infoblox.neutron.common.keystone_manager.'
                 'sync_tenants_from_keystone')
     @mock.patch('networking_infoblox.neutron.db.infoblox_db.'
@@ -179,7 +208,8 @@ class TestKeystoneManager(base.TestCase):
         else:
             get_tenants.assert_not_called()
         if expected_results['sync_tenants_from_keystone_called']:
-            sync_tenants_from_keystone.assert_called_once_with(context)
+            sync_tenants_from_keystone.assert_called_once_with(
+                context, expected_results['sync_tenant_ids'])
         else:
             sync_tenants_from_keystone.assert_not_called()
 
@@ -203,7 +233,8 @@ class TestKeystoneManager(base.TestCase):
                 }],
             'get_tenants_called': True,
             'get_tenant_tenant_ids': ['2', '3', '4'],
-            'sync_tenants_from_keystone_called': True
+            'sync_tenants_from_keystone_called': True,
+            'sync_tenant_ids': ['4']
             }
         self._test_update_tenant_mapping(networks, tenants,
                                          expected_results)
@@ -255,19 +286,138 @@ class TestKeystoneManager(base.TestCase):
                                          expected_results)
 
     @mock.patch('networking_infoblox.neutron.common.keystone_manager.'
-                'get_all_tenants')
+                'get_tenant_pages')
     @mock.patch('networking_infoblox.neutron.db.infoblox_db.'
-                'add_or_update_tenant')
-    def test_sync_tenants_from_keystone(self, AddTenantMock, get_all_tenants):
+                'add_or_update_tenants')
+    def test_sync_tenants_from_keystone(self, AddTenantsMock,
+                                        get_tenant_pages):
         # prepare test data
         context = mock.Mock()
         context.session = 'test_session'
-        get_all_tenants.return_value = self.tenants
+        get_tenant_pages.return_value = [self.tenants[:2], self.tenants[2:]]
         # call tested function
         ret = keystone_manager.sync_tenants_from_keystone(context)
         # check return value and calls
         assert ret == len(self.tenants)
-        get_all_tenants.assert_called_once_with()
+        get_tenant_pages.assert_called_once_with()
         expected_call_list = [
-            mock.call(context.session, t.id, t.name) for t in self.tenants]
-        assert AddTenantMock.call_args_list == expected_call_list
+            mock.call(context.session,
+                      {t.id: t.name for t in self.tenants[:2]}),
+            mock.call(context.session,
+                      {t.id: t.name for t in self.tenants[2:]})]
+        assert AddTenantsMock.call_args_list == expected_call_list
+        for tenant in self.tenants:
+            assert (keystone_manager.tenant_name_cache.get(tenant.id) ==
+                    tenant.name)
+
+    @mock.patch('networking_infoblox.neutron.common.keystone_manager.'
+                'get_tenant_pages')
+    @mock.patch('networking_infoblox.neutron.db.infoblox_db.'
+                'add_or_update_tenants')
+    def test_sync_tenants_from_keystone_unknown_tenant(self, AddTenantsMock,
+                                                       get_tenant_pages):
+        context = mock.Mock()
+        get_tenant_pages.return_value = [self.tenants]
+
+        ret = keystone_manager.sync_tenants_from_keystone(context,
+                                                          ['unknown-id'])
+        assert ret == len(self.tenants)
+        # unknown tenant is cached, so keystone is not queried again
+        ret = keystone_manager.sync_tenants_from_keystone(context,
+                                                          ['unknown-id'])
+        assert ret == 0
+        get_tenant_pages.assert_called_once_with()
+
+        # known tenant does not get to the unknown list
+        keystone_manager.sync_tenants_from_keystone(context, ['1'])
+        assert get_tenant_pages.call_count == 2
+
+    @mock.patch('networking_infoblox.neutron.common.keystone_manager.'
+                'reset_keystone_client', mock.Mock())
+    @mock.patch('networking_infoblox.neutron.common.keystone_manager.'
+                'get_tenant_pages')
+    @mock.patch('networking_infoblox.neutron.db.infoblox_db.'
+                'add_or_update_tenants')
+    def test_sync_tenants_from_keystone_failure_keeps_tenants_unmarked(
+            self, AddTenantsMock, get_tenant_pages):
+        context = mock.Mock()
+
+        def failing_pages():
+            yield self.tenants[:2]
+            raise Exception('keystone is down')
+        get_tenant_pages.side_effect = failing_pages
+
+        ret = keystone_manager.sync_tenants_from_keystone(context,
+                                                          ['unknown-id'])
+        assert ret == 2
+        # the listing was cut short, so keystone is asked again
+        get_tenant_pages.side_effect = None
+        get_tenant_pages.return_value = [self.tenants]
+        keystone_manager.sync_tenants_from_keystone(context, ['unknown-id'])
+        assert get_tenant_pages.call_count == 2
+
+    @mock.patch('networking_infoblox.neutron.common.keystone_manager.'
+                'get_tenant_pages')
+    @mock.patch('networking_infoblox.neutron.db.infoblox_db.'
+                'add_or_update_tenants')
+    def test_sync_tenants_from_keystone_single_flight(self, AddTenantsMock,
+                                                      get_tenant_pages):
+        context = mock.Mock()
+        state = keystone_manager.tenant_sync_state
+        state.synced_count = 5
+        get_tenant_pages.return_value = [self.tenants]
+
+        # simulate sync completed by another greenthread while this one
+        # was waiting for the lock
+        def acquire_lock():
+            state.generation += 1
+            return True
+
+        with mock.patch.object(state, 'lock') as lock_mock:
+            lock_mock.__enter__ = mock.Mock(side_effect=acquire_lock)
+            lock_mock.__exit__ = mock.Mock(return_value=False)
+            ret = keystone_manager.sync_tenants_from_keystone(context)
+
+        assert ret == 5
+        get_tenant_pages.assert_not_called()
+        AddTenantsMock.assert_not_called()
+
+    def test_tenant_name_cache_lru(self):
+        cache = keystone_manager.TenantNameCache(size=2, ttl=60)
+        cache.put('1', 'tenant_1')
+        cache.put('2', 'tenant_2')
+        # access '1' so '2' becomes least recently used
+        assert cache.get('1') == 'tenant_1'
+        cache.put('3', 'tenant_3')
+        assert len(cache) == 2
+        assert cache.get('2') is None
+        assert cache.get('1') == 'tenant_1'
+        assert cache.get('3') == 'tenant_3'
+        assert cache.hits == 3
+        assert cache.misses == 1
+
+    @mock.patch('time.time')
+    def test_tenant_name_cache_ttl(self, time_mock):
+        cache = keystone_manager.TenantNameCache(size=10, ttl=60)
+        time_mock.return_value = 1000
+        cache.put('1', 'tenant_1')
+        time_mock.return_value = 1059
+        assert cache.get('1') == 'tenant_1'
+        time_mock.return_value = 1060
+        assert cache.get('1') is None
+        assert len(cache) == 0
+
+    def test_tenant_name_cache_disabled(self):
+        cache = keystone_manager.TenantNameCache(size=0, ttl=60)
+        cache.put('1', 'tenant_1')
+        assert cache.get('1') is None
+        assert cache.misses == 1
+
+    @mock.patch('networking_infoblox.neutron.db.infoblox_db.'
+                'add_or_update_tenant')
+    def test_update_tenant_mapping_refreshes_cache(self, AddTenantMock):
+        cache = keystone_manager.tenant_name_cache
+        cache.put('1', 'old_name')
+        context = mock.Mock()
+        keystone_manager.update_tenant_mapping(context, [], '1', 'new_name')
+        assert cache.get('1') == 'new_name'
@@ -0,0 +1,92 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from networking_infoblox.neutron.common import mac_index
+from networking_infoblox.neutron.db import infoblox_db as dbi
+from networking_infoblox.tests import base
+
+
+class HostMacIndexTestCase(base.TestCase):
+
+    def setUp(self):
+        super(HostMacIndexTestCase, self).setUp()
+        self.context = mock.MagicMock()
+        self.index = mac_index.HostMacIndex(self.context)
+        self.mac = 'DE:AD:BE:EF:00:01'
+
+    @mock.patch.object(dbi, 'get_infoblox_objects')
+    @mock.patch.object(dbi, 'get_operation_value', return_value='')
+    def test_may_have_host_when_index_is_incomplete(self, get_op_mock,
+                                                    get_objects_mock):
+        self.assertTrue(self.index.may_have_host('default', self.mac))
+        get_objects_mock.assert_not_called()
+
+    @mock.patch.object(dbi, 'get_infoblox_objects', return_value=[])
+    @mock.patch.object(dbi, 'get_operation_value',
+                       return_value='2016-10-01 10:00:00')
+    def test_may_have_host_when_mac_is_not_indexed(self, get_op_mock,
+                                                   get_objects_mock):
+        self.assertFalse(self.index.may_have_host('default', self.mac))
+        get_objects_mock.assert_called_once_with(
+            self.context.session, object_type='record:host',
+            search_hash=mac_index.get_search_hash('default', self.mac),
+            neutron_object_id='de:ad:be:ef:00:01')
+
+    @mock.patch.object(dbi, 'get_infoblox_objects',
+                       side_effect=Exception('db error'))
+    @mock.patch.object(dbi, 'get_operation_value',
+                       return_value='2016-10-01 10:00:00')
+    def test_may_have_host_on_lookup_error(self, get_op_mock,
+                                           get_objects_mock):
+        self.assertTrue(self.index.may_have_host('default', self.mac))
+
+    @mock.patch.object(dbi, 'set_operation_value')
+    @mock.patch.object(dbi, 'add_infoblox_object',
+                       side_effect=Exception('db error'))
+    def test_failed_add_marks_index_incomplete(self, add_mock, set_op_mock):
+        self.index.add('record:host/ref-1', 'default', self.mac)
+        set_op_mock.assert_called_once_with(
+            self.context.session, mac_index.OP_TYPE_HOST_MAC_INDEX_SYNC, '')
+
+    @mock.patch.object(dbi, 'set_operation_value')
+    @mock.patch.object(dbi, 'remove_infoblox_objects')
+    @mock.patch.object(dbi, 'add_infoblox_object')
+    @mock.patch.object(dbi, 'get_infoblox_objects')
+    def test_sync(self, get_objects_mock, add_mock, remove_mock,
+                  set_op_mock):
+        get_objects_mock.return_value = [
+            mock.Mock(object_id='record:host/ref-1#de:ad:be:ef:00:01'),
+            mock.Mock(object_id='record:host/ref-old#de:ad:be:ef:00:09')]
+        connector = mock.Mock()
+        connector.get_object.return_value = [
+            {'_ref': 'record:host/ref-1', 'network_view': 'default',
+             'ipv4addrs': [{'mac': 'de:ad:be:ef:00:01'}]},
+            {'_ref': 'record:host/ref-2', 'network_view': 'default',
+             'ipv6addrs': [{'duid': '00:ef:00:02:de:ad:be:ef:00:02'}]}]
+
+        self.index.sync(connector)
+
+        add_mock.assert_called_once_with(
+            self.context.session, 'record:host/ref-2#de:ad:be:ef:00:02',
+            'record:host', 'de:ad:be:ef:00:02',
+            mac_index.get_search_hash('default', 'de:ad:be:ef:00:02'))
+        remove_mock.assert_called_once_with(
+            self.context.session, object_type='record:host',
+            object_ids=['record:host/ref-old#de:ad:be:ef:00:09'])
+        set_op_mock.assert_called_once_with(
+            self.context.session, mac_index.OP_TYPE_HOST_MAC_INDEX_SYNC,
+            mock.ANY)
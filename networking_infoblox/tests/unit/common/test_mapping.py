@@ -22,6 +22,7 @@ from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import grid
 from networking_infoblox.neutron.common import mapping
 from networking_infoblox.neutron.common import member
+from networking_infoblox.neutron.common import member_scheduler
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
 
@@ -240,6 +241,8 @@ class GridMappingTestCase(base.TestCase, testlib_api.SqlTestCase):
         mapping_mgr._discover_dns_views = mock.Mock()
         mapping_mgr._discover_dns_views.return_value = dnsview_json
 
+        mapping_mgr._discover_ranges = mock.Mock(return_value=[])
+
         mapping_mgr.sync()
 
         # validate network views, mapping conditions, mapping members
@@ -268,9 +271,55 @@ class GridMappingTestCase(base.TestCase, testlib_api.SqlTestCase):
         mapping_mgr._discover_dns_views = mock.Mock()
         mapping_mgr._discover_dns_views.return_value = dnsview_json
 
+        mapping_mgr._discover_ranges = mock.Mock(return_value=[])
+
         mapping_mgr.sync()
 
         # validate network views, mapping conditions, mapping members
         self._validate_network_views(network_view_json)
         self._validate_mapping_conditions(network_view_json)
         self._validate_member_mapping(network_view_json, network_json)
+
+    def test_sync_member_loads(self):
+        self._create_members_with_cloud()
+
+        mapping_mgr = mapping.GridMappingManager(self.test_grid_config)
+        mapping_mgr.db_members = dbi.get_members(
+            self.ctx.session, grid_id=self.test_grid_config.grid_id)
+        gm_member = utils.find_one_in_list('member_type',
+                                           const.MEMBER_TYPE_GRID_MASTER,
+                                           mapping_mgr.db_members)
+        dhcp_member = utils.find_one_in_list('member_name',
+                                             'nios-7.2.0-member1.com',
+                                             mapping_mgr.db_members)
+        networks = [
+            {'network_view': 'default',
+             'network': '10.0.0.0/24',
+             'members': [{'_struct': 'dhcpmember',
+                          'ipv4addr': dhcp_member.member_ip}],
+             'options': [{'name': 'domain-name-servers',
+                          'value': dhcp_member.member_ip}]},
+            {'network_view': 'default',
+             'network': '10.0.1.0/24'}]
+        mapping_mgr._discover_ranges = mock.Mock(return_value=[
+            {'member': {'name': dhcp_member.member_name},
+             'network_view': 'default'}])
+
+        with mock.patch.object(member_scheduler, 'scheduler') as scheduler:
+            mapping_mgr._sync_member_loads([{'name': 'default'}], networks,
+                                           {})
+
+        loads = scheduler.update_loads.call_args[0][0]
+        self.assertEqual(member_scheduler.MemberLoad(networks=2),
+                         loads[gm_member.member_id])
+        self.assertEqual(
+            member_scheduler.MemberLoad(networks=1, ranges=1, zones=1),
+            loads[dhcp_member.member_id])
+
+        # loads are stored for selections made by neutron server
+        db_loads = dbi.get_member_loads(self.ctx.session,
+                                        self.test_grid_config.grid_id)
+        self.assertEqual(set(member.member_id
+                             for member in mapping_mgr.db_members),
+                         set(db_loads))
+        self.assertEqual(dict(loads), db_loads)
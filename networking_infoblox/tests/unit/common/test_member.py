@@ -19,6 +19,7 @@ from oslo_serialization import jsonutils
 from neutron.tests.unit import testlib_api
 from neutron_lib import context
 
+from networking_infoblox.neutron.common import constants as const
 from networking_infoblox.neutron.common import grid
 from networking_infoblox.neutron.common import member
 from networking_infoblox.neutron.common import utils
@@ -356,3 +357,97 @@ class GridMemberTestCase(base.TestCase, testlib_api.SqlTestCase):
         wapi_version = '2.1'
         return_fields = ['node_info', 'host_name', 'vip_setting', 'extattrs']
         self._test_discover_members(wapi_version, return_fields)
+
+    @mock.patch.object(dbi, 'add_service_member_if_missing')
+    @mock.patch.object(dbi, 'get_service_members')
+    def test_service_member_cache(self, get_service_members_mock,
+                                  add_service_member_mock):
+        session = mock.Mock()
+        # autocommit session without a transaction in progress
+        session.transaction = None
+        grid_id = 100
+        get_service_members_mock.return_value = [
+            utils.json_to_obj('ServiceMember',
+                              {'network_view_id': 'netview-1',
+                               'member_id': 'm1',
+                               'service': const.SERVICE_TYPE_DHCP})]
+        add_service_member_mock.return_value = True
+        cache = member.ServiceMemberCache(ttl=60)
+
+        self.assertEqual(['m1'], cache.get_member_ids(
+            session, grid_id, 'netview-1', const.SERVICE_TYPE_DHCP))
+        self.assertTrue(cache.is_serving(session, grid_id, 'm1',
+                                         const.SERVICE_TYPE_DHCP))
+        get_service_members_mock.assert_called_once_with(session,
+                                                         grid_id=grid_id)
+
+        # a view without cached members is looked up in db again
+        get_service_members_mock.return_value = []
+        self.assertEqual([], cache.get_member_ids(
+            session, grid_id, 'netview-1', const.SERVICE_TYPE_DNS))
+        get_service_members_mock.assert_called_with(
+            session, network_view_id='netview-1',
+            service=const.SERVICE_TYPE_DNS)
+        self.assertFalse(cache.is_serving(session, grid_id, 'm2',
+                                          const.SERVICE_TYPE_DHCP))
+        get_service_members_mock.assert_called_with(
+            session, member_id='m2', service=const.SERVICE_TYPE_DHCP)
+
+        # known service member is not registered again
+        self.assertFalse(cache.register(session, grid_id, 'netview-1', 'm1',
+                                        const.SERVICE_TYPE_DHCP))
+        add_service_member_mock.assert_not_called()
+
+        self.assertTrue(cache.register(session, grid_id, 'netview-1', 'm1',
+                                       const.SERVICE_TYPE_DNS))
+        self.assertFalse(cache.register(session, grid_id, 'netview-1', 'm1',
+                                        const.SERVICE_TYPE_DNS))
+        add_service_member_mock.assert_called_once_with(
+            session, 'netview-1', 'm1', const.SERVICE_TYPE_DNS)
+        call_count = get_service_members_mock.call_count
+        self.assertEqual(['m1'], cache.get_member_ids(
+            session, grid_id, 'netview-1', const.SERVICE_TYPE_DNS))
+        self.assertEqual(call_count, get_service_members_mock.call_count)
+
+        cache.invalidate(grid_id)
+        get_service_members_mock.return_value = [
+            utils.json_to_obj('ServiceMember',
+                              {'network_view_id': 'netview-1',
+                               'member_id': 'm1',
+                               'service': const.SERVICE_TYPE_DHCP})]
+        cache.get_member_ids(session, grid_id, 'netview-1',
+                             const.SERVICE_TYPE_DHCP)
+        self.assertEqual(call_count + 1, get_service_members_mock.call_count)
+
+    def test_service_member_cache_after_commit(self):
+        member_mgr = member.GridMemberManager(self.test_grid_config)
+        member_mgr.sync_grid()
+        grid_id = self.test_grid_config.grid_id
+        dbi.add_member(self.ctx.session, 'm1', grid_id, 'm1.com',
+                       '10.10.1.1', None, const.MEMBER_TYPE_GRID_MASTER,
+                       'ON', None, None, None, None, '10.10.1.1')
+        dbi.add_network_view(self.ctx.session, 'netview-1', 'default',
+                             grid_id, 'm1', False, 'default', 'default',
+                             'default', True, True)
+        session = self.ctx.session
+        cache = member.ServiceMemberCache(ttl=60)
+
+        # a service member rolled back with the caller's transaction is
+        # not cached
+        try:
+            with session.begin(subtransactions=True):
+                self.assertTrue(cache.register(session, grid_id, 'netview-1',
+                                               'm1', const.SERVICE_TYPE_DHCP))
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual([], cache.get_member_ids(
+            session, grid_id, 'netview-1', const.SERVICE_TYPE_DHCP))
+
+        with session.begin(subtransactions=True):
+            self.assertTrue(cache.register(session, grid_id, 'netview-1',
+                                           'm1', const.SERVICE_TYPE_DHCP))
+        with mock.patch.object(dbi, 'get_service_members') as get_mock:
+            self.assertEqual(['m1'], cache.get_member_ids(
+                session, grid_id, 'netview-1', const.SERVICE_TYPE_DHCP))
+            get_mock.assert_not_called()
@@ -0,0 +1,100 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from networking_infoblox.neutron.common import member_scheduler as ms
+from networking_infoblox.tests import base
+
+
+class MemberSchedulerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(MemberSchedulerTestCase, self).setUp()
+        self.members = []
+        for i in range(1, 4):
+            member = mock.Mock()
+            member.member_id = 'm%s' % i
+            member.member_name = 'm%s.com' % i
+            self.members.append(member)
+        self.loads = {'m1': ms.MemberLoad(networks=5, ranges=5, zones=5),
+                      'm2': ms.MemberLoad(networks=1, ranges=1, zones=2),
+                      'm3': ms.MemberLoad(networks=3, ranges=0, zones=0)}
+
+    def _get_scheduler(self, policy, weights=None, capacity=0):
+        scheduler = ms.MemberScheduler(
+            policy=policy,
+            weights=weights or {'network': 1, 'range': 1, 'zone': 1},
+            capacity=capacity)
+        scheduler.update_loads(self.loads)
+        return scheduler
+
+    def test_least_loaded(self):
+        scheduler = self._get_scheduler(ms.POLICY_LEAST_LOADED)
+        member = scheduler.select(self.members, 'test')
+        self.assertEqual('m3', member.member_id)
+        self.assertEqual(1, len(scheduler.decisions))
+        decision = scheduler.decisions[0]
+        self.assertEqual('m3', decision['member_id'])
+        self.assertEqual(3, decision['load'])
+        self.assertEqual(3, decision['candidates'])
+
+    def test_least_loaded_with_weights(self):
+        scheduler = self._get_scheduler(
+            ms.POLICY_LEAST_LOADED,
+            weights={'network': 10, 'range': 1, 'zone': 1})
+        member = scheduler.select(self.members, 'test')
+        self.assertEqual('m2', member.member_id)
+
+    def test_least_loaded_with_base_loads(self):
+        scheduler = self._get_scheduler(ms.POLICY_LEAST_LOADED)
+        member = scheduler.select(self.members, 'test',
+                                  base_loads={'m3': 2})
+        self.assertEqual('m2', member.member_id)
+
+    def test_placement_increases_load(self):
+        scheduler = self._get_scheduler(ms.POLICY_LEAST_LOADED)
+        self.loads['m2'] = ms.MemberLoad(networks=3)
+        scheduler.update_loads(self.loads)
+        selected = [scheduler.select(self.members, 'test').member_id
+                    for i in range(2)]
+        self.assertEqual(set(['m2', 'm3']), set(selected))
+
+    def test_unknown_loads(self):
+        scheduler = ms.MemberScheduler(policy=ms.POLICY_LEAST_LOADED,
+                                       weights={}, capacity=0)
+        member = scheduler.select(self.members, 'test')
+        self.assertIn(member, self.members)
+
+    def test_capacity_capped(self):
+        scheduler = self._get_scheduler(ms.POLICY_CAPACITY_CAPPED,
+                                        capacity=4)
+        member = scheduler.select(self.members, 'test')
+        self.assertEqual('m3', member.member_id)
+        # placement brought m3 to capacity, m1 and m2 are already there
+        member = scheduler.select(self.members, 'test')
+        self.assertIsNone(member)
+
+    def test_random(self):
+        scheduler = self._get_scheduler(ms.POLICY_RANDOM)
+        with mock.patch('random.choice') as choice:
+            choice.side_effect = lambda members: members[0]
+            member = scheduler.select(self.members, 'test')
+        self.assertEqual('m1', member.member_id)
+        self.assertEqual(self.members, choice.call_args[0][0])
+
+    def test_no_candidates(self):
+        scheduler = self._get_scheduler(ms.POLICY_LEAST_LOADED)
+        self.assertIsNone(scheduler.select([], 'test'))
@@ -0,0 +1,165 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import socket
+
+import mock
+from oslo_serialization import jsonutils
+from six.moves import urllib
+
+from networking_infoblox.neutron.common import metrics
+from networking_infoblox.tests import base
+
+
+class MetricsTestCase(base.TestCase):
+
+    def setUp(self):
+        super(MetricsTestCase, self).setUp()
+        self.registry = metrics.Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter('test_total', 'Test counter.',
+                                        ('kind',))
+        counter.inc(kind='a')
+        counter.inc(2, kind='a')
+        counter.inc(kind='b')
+        self.assertEqual(3, counter.get(kind='a'))
+        self.assertIs(counter, self.registry.counter('test_total', ''))
+        self.assertRaises(ValueError, counter.inc, other='a')
+        self.assertEqual({'kind=a': 3, 'kind=b': 1}, counter.summary())
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('test_seconds', 'Test.',
+                                            buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+        self.assertEqual(4, histogram.get_count())
+        self.assertEqual({'': {'count': 4, 'mean': 0.6625, 'p99': '+Inf'}},
+                         histogram.summary())
+
+        with mock.patch.object(metrics.time, 'time', side_effect=[10, 10.5]):
+            with histogram.time():
+                pass
+        self.assertEqual({'count': 5, 'mean': 0.63, 'p99': '+Inf'},
+                         histogram.summary()[''])
+
+    def test_aggregates(self):
+        counter = self.registry.counter('test_total', 'Test counter.',
+                                        ('kind', 'result'))
+        counter.inc(kind='a', result='ok')
+        counter.inc(2, kind='b', result='error')
+        counter.inc(kind='c', result='error')
+        self.assertEqual(4, counter.total())
+        self.assertEqual(3, counter.total(result='error'))
+        self.assertEqual(2, counter.total(kind='b', result='error'))
+
+        histogram = self.registry.histogram('test_seconds', 'Test.',
+                                            ('kind',), buckets=(0.1, 1))
+        self.assertIsNone(histogram.worst_p99())
+        histogram.observe(0.05, kind='a')
+        histogram.observe(0.5, kind='b')
+        self.assertEqual(1, histogram.worst_p99())
+        histogram.observe(2, kind='c')
+        self.assertEqual('+Inf', histogram.worst_p99())
+
+    def test_state_summary_is_bounded(self):
+        metrics.REGISTRY.reset()
+        self.addCleanup(metrics.REGISTRY.reset)
+        for i in range(200):
+            event_type = 'resource%d.update.end' % i
+            metrics.EVENTS.inc(event_type=event_type, result='handled')
+            metrics.EVENTS.inc(event_type=event_type, result='error')
+            metrics.EVENT_SECONDS.observe(0.2, event_type=event_type)
+        metrics.WAPI_REQUESTS.inc(method='GET', status='2xx')
+
+        summary = metrics.state_summary()
+        self.assertEqual(400, summary['events'])
+        self.assertEqual(200, summary['event_errors'])
+        self.assertEqual(0.25, summary['event_p99'])
+        self.assertEqual(1, summary['wapi_requests'])
+        self.assertLess(len(jsonutils.dumps(summary)), 512)
+
+    def test_to_prometheus(self):
+        counter = self.registry.counter('test_total', 'Test "counter".',
+                                        ('kind',))
+        histogram = self.registry.histogram('test_seconds', 'Test.',
+                                            ('kind',), buckets=(0.1, 1))
+        counter.inc(kind='a"b')
+        histogram.observe(0.5, kind='a')
+        self.assertEqual(
+            '# HELP test_seconds Test.\n'
+            '# TYPE test_seconds histogram\n'
+            'test_seconds_bucket{kind="a",le="0.1"} 0\n'
+            'test_seconds_bucket{kind="a",le="1.0"} 1\n'
+            'test_seconds_bucket{kind="a",le="+Inf"} 1\n'
+            'test_seconds_sum{kind="a"} 0.5\n'
+            'test_seconds_count{kind="a"} 1\n'
+            '# HELP test_total Test \\"counter\\".\n'
+            '# TYPE test_total counter\n'
+            'test_total{kind="a\\"b"} 1\n',
+            self.registry.to_prometheus())
+
+        self.registry.reset()
+        self.assertEqual({}, self.registry.summary())
+
+    def test_instrument_connector(self):
+        connector = mock.Mock()
+        connector.session.hooks = {'response': []}
+        metrics.instrument_connector(connector)
+        metrics.instrument_connector(connector)
+        self.assertEqual(1, len(connector.session.hooks['response']))
+
+        requests_before = metrics.WAPI_REQUESTS.get(method='GET',
+                                                    status='4xx')
+        response = mock.Mock(status_code=404,
+                             elapsed=datetime.timedelta(seconds=0.2))
+        response.request.method = 'GET'
+        connector.session.hooks['response'][0](response)
+        self.assertEqual(requests_before + 1,
+                         metrics.WAPI_REQUESTS.get(method='GET',
+                                                   status='4xx'))
+
+    def _start_http_server(self, server=None):
+        self.addCleanup(setattr, metrics, '_http_server', None)
+        with mock.patch.object(metrics.BaseHTTPServer, 'HTTPServer',
+                               return_value=server,
+                               side_effect=None if server else socket.error):
+            return metrics.start_http_server(9100)
+
+    def test_http_server(self):
+        metrics.EVENTS.inc(event_type='test.event', result='handled')
+        self.assertIsNone(metrics.start_http_server(0))
+
+        # the real server listens on a free port instead of 9100
+        server = self._start_http_server(metrics.BaseHTTPServer.HTTPServer(
+            ('127.0.0.1', 0), metrics._MetricsRequestHandler))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.assertIs(server, metrics.start_http_server(9100))
+
+        url = 'http://127.0.0.1:%d/metrics' % server.server_port
+        body = urllib.request.urlopen(url).read().decode('utf-8')
+        self.assertIn('infoblox_ipam_agent_events_total{'
+                      'event_type="test.event",result="handled"}', body)
+        self.assertRaises(urllib.error.HTTPError, urllib.request.urlopen,
+                          url[:-len('metrics')])
+
+    def test_http_server_port_in_use(self):
+        self.assertIsNone(self._start_http_server())
+        with mock.patch.object(metrics.BaseHTTPServer,
+                               'HTTPServer') as http_server:
+            self.assertIsNone(metrics.start_http_server(9100))
+        self.assertFalse(http_server.called)
@@ -0,0 +1,135 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from infoblox_client import exceptions as ib_exc
+from infoblox_client import objects as ib_objects
+
+from networking_infoblox.neutron.common import multi_request
+from networking_infoblox.tests import base
+
+
+class MultiRequestTestCase(base.TestCase):
+
+    def setUp(self):
+        super(MultiRequestTestCase, self).setUp()
+        self.connector = mock.Mock()
+        self.request = multi_request.MultiRequest(self.connector)
+
+    def test_call_sends_requests_in_order(self):
+        self.request.create('network', {'network': '10.0.0.0/24'},
+                            return_fields=['network', 'extattrs'])
+        self.request.update('network/ref-1', {'comment': 'test'})
+        self.request.delete('record:host/ref-2')
+        self.assertEqual(3, len(self.request))
+
+        with mock.patch.object(multi_request, 'send') as send_mock:
+            self.request.call()
+        send_mock.assert_called_once_with(
+            self.connector,
+            [{'method': 'POST', 'object': 'network',
+              'data': {'network': '10.0.0.0/24'},
+              'args': {'_return_fields': 'network,extattrs'}},
+             {'method': 'PUT', 'object': 'network/ref-1',
+              'data': {'comment': 'test'}},
+             {'method': 'DELETE', 'object': 'record:host/ref-2'}])
+        self.assertEqual(0, len(self.request))
+
+    def test_call_without_requests(self):
+        with mock.patch.object(multi_request, 'send') as send_mock:
+            self.assertEqual([], self.request.call())
+        send_mock.assert_not_called()
+
+    def test_send_accepts_ok_reply(self):
+        self.connector._get_request_options.return_value = {}
+        self.connector.session.post.return_value = mock.Mock(status_code=200)
+        self.connector._parse_reply.return_value = ['network/ref-1']
+        self.assertEqual(['network/ref-1'],
+                         multi_request.send(self.connector, []))
+
+    def test_send_raises_on_error_reply(self):
+        self.connector._get_request_options.return_value = {}
+        self.connector.session.post.return_value = mock.Mock(
+            status_code=400, content='{"text": "error"}')
+        self.assertRaises(ib_exc.InfobloxCannotCreateObject,
+                          multi_request.send, self.connector, [])
+
+
+class ProvisioningPlanTestCase(base.TestCase):
+
+    def setUp(self):
+        super(ProvisioningPlanTestCase, self).setUp()
+        self.connector = mock.Mock()
+        self.plan = multi_request.ProvisioningPlan(self.connector)
+        self.network_item = self.plan.create_check(
+            ib_objects.Network,
+            {'network_view': 'default', 'cidr': '10.0.0.0/24'},
+            fields=lambda: {'network_view': 'default',
+                            'cidr': '10.0.0.0/24',
+                            'comment': 'test'},
+            on_created=mock.Mock())
+        self.range_item = self.plan.create_check(
+            ib_objects.IPRange,
+            {'network_view': 'default', 'start_addr': '10.0.0.2',
+             'end_addr': '10.0.0.254'},
+            on_exists=self.plan.update)
+        self.existing_range = {'_ref': 'range/ref-2',
+                               'network_view': 'default',
+                               'start_addr': '10.0.0.2',
+                               'end_addr': '10.0.0.254'}
+
+    def test_run_creates_missing_objects(self):
+        rollback_list = []
+        with mock.patch.object(multi_request, 'send') as send_mock:
+            send_mock.side_effect = [
+                [[], [self.existing_range]],
+                [{'_ref': 'network/ref-1', 'network_view': 'default',
+                  'network': '10.0.0.0/24'}, 'range/ref-2']]
+            self.plan.run(rollback_list)
+
+        self.assertEqual(2, send_mock.call_count)
+        reads = send_mock.call_args_list[0][0][1]
+        self.assertEqual(['GET', 'GET'], [r['method'] for r in reads])
+        self.assertEqual({'network_view': 'default',
+                          'network': '10.0.0.0/24'}, reads[0]['data'])
+        writes = send_mock.call_args_list[1][0][1]
+        self.assertEqual([('POST', 'network'), ('PUT', 'range/ref-2')],
+                         [(w['method'], w['object']) for w in writes])
+        self.assertEqual('test', writes[0]['data']['comment'])
+
+        self.assertTrue(self.network_item.created)
+        self.assertEqual('network/ref-1', self.network_item.ib_obj.ref)
+        self.assertFalse(self.range_item.created)
+        self.assertEqual('range/ref-2', self.range_item.ib_obj.ref)
+        self.assertEqual([self.network_item.ib_obj], rollback_list)
+        self.network_item.on_created.assert_called_once_with(
+            self.network_item.ib_obj)
+
+    def test_run_without_missing_objects_only_searches(self):
+        rollback_list = []
+        self.range_item.on_exists = None
+        existing_network = {'_ref': 'network/ref-1',
+                            'network_view': 'default',
+                            'network': '10.0.0.0/24'}
+        with mock.patch.object(multi_request, 'send') as send_mock:
+            send_mock.return_value = [[existing_network],
+                                      [self.existing_range]]
+            self.plan.run(rollback_list)
+
+        send_mock.assert_called_once_with(self.connector, mock.ANY)
+        self.assertEqual('network/ref-1', self.network_item.ib_obj.ref)
+        self.assertEqual([], rollback_list)
+        self.network_item.on_created.assert_not_called()
@@ -0,0 +1,102 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from networking_infoblox.neutron.common import neutron_cache
+from networking_infoblox.tests import base
+
+
+class NeutronObjectCacheTestCase(base.TestCase):
+
+    def setUp(self):
+        super(NeutronObjectCacheTestCase, self).setUp()
+        self.context = mock.Mock()
+        self.plugin = mock.Mock()
+        self.cache = neutron_cache.NeutronObjectCache(self.context,
+                                                      self.plugin, ttl=60)
+
+    def test_get_reads_through_once(self):
+        subnet = {'id': 'subnet-id', 'cidr': '10.0.0.0/24'}
+        self.plugin.get_subnet.return_value = subnet
+
+        self.assertEqual(subnet, self.cache.get_subnet('subnet-id'))
+        self.assertEqual(subnet, self.cache.get_subnet('subnet-id'))
+        self.plugin.get_subnet.assert_called_once_with(self.context,
+                                                       'subnet-id')
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    def test_get_does_not_cache_missing_object(self):
+        self.plugin.get_network.return_value = None
+        self.assertIsNone(self.cache.get_network('network-id'))
+        self.assertIsNone(self.cache.get_network('network-id'))
+        self.assertEqual(2, self.plugin.get_network.call_count)
+
+    def test_get_expired_object_is_reloaded(self):
+        self.plugin.get_network.return_value = {'id': 'network-id'}
+        with mock.patch.object(neutron_cache.time, 'time',
+                               return_value=1000):
+            self.cache.get_network('network-id')
+        with mock.patch.object(neutron_cache.time, 'time',
+                               return_value=1061):
+            self.cache.get_network('network-id')
+        self.assertEqual(2, self.plugin.get_network.call_count)
+
+    def test_put_and_invalidate(self):
+        network = {'id': 'network-id', 'name': 'new-name'}
+        self.cache.put('network', network)
+        self.assertEqual(network, self.cache.get_network('network-id'))
+        self.plugin.get_network.assert_not_called()
+
+        self.cache.invalidate('network', 'network-id')
+        self.plugin.get_network.return_value = {'id': 'network-id'}
+        self.cache.get_network('network-id')
+        self.plugin.get_network.assert_called_once_with(self.context,
+                                                        'network-id')
+
+    def test_put_ignores_older_revision(self):
+        new_subnet = {'id': 'subnet-id', 'revision_number': 3}
+        old_subnet = {'id': 'subnet-id', 'revision_number': 2}
+        self.cache.put('subnet', new_subnet)
+        self.cache.put('subnet', old_subnet)
+        self.assertEqual(new_subnet, self.cache.get_subnet('subnet-id'))
+
+    def test_read_racing_with_notification_is_not_stored(self):
+        stale_subnet = {'id': 'subnet-id', 'name': 'old'}
+        new_subnet = {'id': 'subnet-id', 'name': 'new'}
+
+        def get_subnet(context, subnet_id):
+            # notification is processed while the plugin read is running
+            self.cache.invalidate('subnet', subnet_id)
+            return stale_subnet
+
+        self.plugin.get_subnet.side_effect = get_subnet
+        self.assertEqual(stale_subnet, self.cache.get_subnet('subnet-id'))
+        self.assertEqual(0, len(self.cache))
+
+        self.plugin.get_subnet.side_effect = None
+        self.plugin.get_subnet.return_value = new_subnet
+        self.assertEqual(new_subnet, self.cache.get_subnet('subnet-id'))
+        self.assertEqual(1, len(self.cache))
+
+    def test_zero_ttl_disables_cache(self):
+        cache = neutron_cache.NeutronObjectCache(self.context, self.plugin,
+                                                 ttl=0)
+        self.plugin.get_subnet.return_value = {'id': 'subnet-id'}
+        cache.get_subnet('subnet-id')
+        cache.get_subnet('subnet-id')
+        self.assertEqual(2, self.plugin.get_subnet.call_count)
+        self.assertEqual(0, len(cache))
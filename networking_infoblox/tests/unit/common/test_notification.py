@@ -17,6 +17,7 @@ import eventlet
 eventlet.monkey_patch()
 
 import mock
+import oslo_messaging
 import time
 
 from neutron.tests.unit import testlib_api
@@ -26,6 +27,7 @@ from networking_infoblox.neutron.common import grid
 from networking_infoblox.neutron.common import notification
 from networking_infoblox.neutron.common import notification_handler
 from networking_infoblox.neutron.common import utils
+from networking_infoblox.neutron.db import infoblox_db as dbi
 
 from networking_infoblox.tests import base
 from networking_infoblox.tests.unit import grid_sync_stub
@@ -36,6 +38,13 @@ class NotificationTestCase(testlib_api.BaseSqlTestCase, base.RpcTestCase):
     class NotificationEndpointTester(object):
         received_msg_count = 0
         received_payload = []
+        lanes = None
+
+        def start_lanes(self, size):
+            pass
+
+        def stop_lanes(self, timeout=None):
+            pass
 
         def info(self, ctxt, publisher_id, event_type, payload, metadata):
             self.received_payload.append(payload)
@@ -110,3 +119,207 @@ class NotificationTestCase(testlib_api.BaseSqlTestCase, base.RpcTestCase):
 
         for i in range(test_msg_count):
             self.assertEqual(test_msg_payload[i], endpoint.received_payload[i])
+
+    @mock.patch.object(notification_handler, 'IpamEventHandler')
+    def test_notification_endpoint_routes_events_by_resource_id(
+            self, mk_ipam_eh):
+        endpoints = [notification.NotificationEndpoint(self.ctx, None, i, 3)
+                     for i in range(3)]
+        for endpoint in endpoints:
+            endpoint.handler = mock.Mock()
+
+        handled = set()
+        for i in range(30):
+            payload = {'port': {'id': 'port-%d' % i}}
+            for endpoint in endpoints:
+                endpoint.handler.reset_mock()
+                for event_type in ('port.create.end', 'port.update.end'):
+                    endpoint.info({}, 'network', event_type, payload, {})
+            # both events of a port are handled by the same single worker
+            self.assertEqual([0, 0, 2], sorted(
+                endpoint.handler.process.call_count
+                for endpoint in endpoints))
+            handled.update(endpoint.worker_index for endpoint in endpoints
+                           if endpoint.handler.process.called)
+        self.assertEqual(set([0, 1, 2]), handled)
+
+        # port and instance events of a vm are handled by the same worker
+        for i in range(30):
+            port_payload = {'port': {'id': 'port-%d' % i,
+                                     'device_id': 'vm-%d' % i,
+                                     'device_owner': 'compute:nova'}}
+            instance_payload = {'instance_id': 'vm-%d' % i}
+            for endpoint in endpoints:
+                endpoint.handler.reset_mock()
+                endpoint.info({}, 'network', 'port.update.end',
+                              port_payload, {})
+                endpoint.info({}, 'compute', 'compute.instance.create.end',
+                              instance_payload, {})
+            self.assertEqual([0, 0, 2], sorted(
+                endpoint.handler.process.call_count
+                for endpoint in endpoints))
+
+        payload = {'subnet': {'id': 'subnet-id'}}
+        for endpoint in endpoints:
+            endpoint.handler.reset_mock()
+            endpoint.info({}, 'network', 'subnet.update.end', payload, {})
+        endpoints[0].handler.process.assert_called_once_with(
+            {}, 'network', 'subnet.update.end', payload, {})
+        self.assertFalse(endpoints[0].handler.update_caches.called)
+        for endpoint in endpoints[1:]:
+            self.assertFalse(endpoint.handler.process.called)
+            endpoint.handler.update_caches.assert_called_once_with(
+                'subnet.update.end', payload)
+
+    @mock.patch.object(notification, 'NotificationEndpoint', mock.Mock())
+    @mock.patch.object(grid, 'GridSyncer')
+    def test_notification_service_workers(self, mk_grid_syncer):
+        owner = notification.NotificationService(report_interval=30,
+                                                 worker_index=0, workers=2)
+        owner.grid_syncer.sync.assert_called_once_with(True)
+        self.assertEqual('infoblox-ipam-notification-0', owner.pool)
+
+        mk_grid_syncer.reset_mock()
+        worker = notification.NotificationService(report_interval=30,
+                                                  worker_index=1, workers=2)
+        self.assertFalse(worker.grid_syncer.sync.called)
+        worker.grid_syncer.get_config.assert_called_once_with()
+        self.assertEqual('infoblox-ipam-notification-1', worker.pool)
+
+        worker._init_agent_report_thread()
+        self.assertIsNone(worker.report_thread)
+
+        handler = worker.event_endpoints[0].handler
+        worker._refresh_snapshot()
+        self.assertFalse(handler.refresh_grid_data.called)
+        with mock.patch.object(notification.dbi, 'get_last_sync_time',
+                               return_value=mock.sentinel.sync_time):
+            worker._refresh_snapshot()
+            worker._refresh_snapshot()
+        handler.refresh_grid_data.assert_called_once_with()
+
+    @mock.patch.object(notification, 'NotificationEndpoint', mock.Mock())
+    @mock.patch.object(notification, 'delete_notification_pools')
+    @mock.patch.object(grid, 'GridSyncer')
+    def test_notification_service_removes_stale_pools(self, mk_grid_syncer,
+                                                      mk_delete_pools):
+        def get_recorded_workers():
+            return dbi.get_operation_value(self.ctx.session,
+                                           notification.OP_TYPE_AGENT_WORKERS)
+
+        notification.NotificationService(report_interval=30,
+                                         worker_index=0, workers=4)
+        self.assertFalse(mk_delete_pools.called)
+        self.assertEqual('4', get_recorded_workers())
+
+        # other workers leave the pools alone
+        notification.NotificationService(report_interval=30,
+                                         worker_index=1, workers=2)
+        self.assertFalse(mk_delete_pools.called)
+
+        owner = notification.NotificationService(report_interval=30,
+                                                 worker_index=0, workers=2)
+        mk_delete_pools.assert_called_once_with(
+            owner.transport, ['infoblox-ipam-notification-2',
+                              'infoblox-ipam-notification-3'])
+        self.assertEqual('2', get_recorded_workers())
+
+        # the number of workers is recorded once the queues are deleted
+        mk_delete_pools.reset_mock()
+        mk_delete_pools.side_effect = Exception('broker is down')
+        notification.NotificationService(report_interval=30,
+                                         worker_index=0, workers=1)
+        self.assertEqual('2', get_recorded_workers())
+        mk_delete_pools.side_effect = None
+        notification.NotificationService(report_interval=30,
+                                         worker_index=0, workers=1)
+        mk_delete_pools.assert_called_with(
+            mock.ANY, ['infoblox-ipam-notification-0',
+                       'infoblox-ipam-notification-1'])
+        self.assertEqual('1', get_recorded_workers())
+
+    def test_delete_notification_pools(self):
+        transport = mock.MagicMock()
+        connection = (
+            transport._driver._get_connection.return_value.__enter__.
+            return_value)
+        self.assertTrue(notification.delete_notification_pools(
+            transport, ['pool-1', 'pool-2']))
+        connection.channel.queue_delete.assert_has_calls(
+            [mock.call('pool-1'), mock.call('pool-2')])
+
+        # drivers without a queue per pool
+        transport._driver = object()
+        self.assertFalse(notification.delete_notification_pools(
+            transport, ['pool-1']))
+
+    @mock.patch.object(notification_handler, 'IpamEventHandler')
+    def test_notification_endpoint_lanes(self, mk_ipam_eh):
+        endpoint = notification.NotificationEndpoint(self.ctx, None)
+        endpoint.handler = mock.Mock()
+        endpoint.handler.is_trace_only.side_effect = (
+            lambda event_type: event_type == 'port.delete.end')
+        endpoint.handler.process.return_value = (
+            oslo_messaging.NotificationResult.HANDLED)
+        endpoint.lanes = mock.Mock()
+
+        events = [('port.delete.end', {'port_id': 'port-id'}),
+                  ('network.update.end', {'network': {'id': 'net-id'}}),
+                  ('port.update.end', {'port': {'id': 'port-id'}})]
+        for event_type, payload in events:
+            self.assertEqual(
+                oslo_messaging.NotificationResult.HANDLED,
+                endpoint.info({}, 'network', event_type, payload, {}))
+
+        endpoint.handler.process.assert_called_once_with(
+            {}, 'network', 'port.delete.end', {'port_id': 'port-id'}, {})
+        endpoint.lanes.put.assert_has_calls([
+            mock.call('low', {}, 'network', 'network.update.end',
+                      {'network': {'id': 'net-id'}}, {}),
+            mock.call('high', {}, 'network', 'port.update.end',
+                      {'port': {'id': 'port-id'}}, {})])
+
+    @mock.patch.object(grid, 'GridManager', mock.Mock())
+    @mock.patch.object(notification_handler, 'IpamEventHandler')
+    def test_notification_service_stop_handles_queued_events(self,
+                                                             mk_ipam_eh):
+        service = notification.NotificationService(report_interval=30)
+        endpoint = notification.NotificationEndpoint(self.ctx, None)
+        endpoint.handler = mock.Mock()
+        endpoint.handler.is_trace_only.return_value = False
+        service.event_endpoints = [endpoint]
+        service.event_listener = mock.Mock()
+        endpoint.start_lanes(10)
+
+        for i in range(5):
+            endpoint.info({}, 'network', 'port.update.end',
+                          {'port': {'id': 'port-%d' % i}}, {})
+        # oslo.service stops services without graceful
+        service.stop()
+
+        service.event_listener.stop.assert_called_once_with()
+        self.assertEqual(5, endpoint.handler.process.call_count)
+        self.assertIsNone(endpoint.lanes)
+
+    @mock.patch.object(notification_handler, 'IpamEventHandler')
+    def test_notification_endpoint_stop_lanes_drops_late_events(self,
+                                                                mk_ipam_eh):
+        endpoint = notification.NotificationEndpoint(self.ctx, None)
+        endpoint.handler = mock.Mock()
+        endpoint.handler.is_trace_only.return_value = False
+        endpoint.handler.process.side_effect = (
+            lambda *args: eventlet.sleep(10))
+        endpoint.start_lanes(10)
+        for i in range(3):
+            endpoint.info({}, 'network', 'port.update.end',
+                          {'port': {'id': 'port-%d' % i}}, {})
+        eventlet.sleep(0)
+
+        with mock.patch.object(notification.LOG, 'warning') as mk_warning:
+            endpoint.stop_lanes(timeout=0.2)
+
+        self.assertEqual(1, endpoint.handler.process.call_count)
+        self.assertEqual(['port-0', 'port-1', 'port-2'],
+                         [call[0][1]['resource_id']
+                          for call in mk_warning.call_args_list])
+        self.assertIsNone(endpoint.lanes)
@@ -20,9 +20,13 @@ from infoblox_client import objects as ib_objects
 from networking_infoblox.neutron.common import constants
 from networking_infoblox.neutron.common import context
 from networking_infoblox.neutron.common import dns
+from networking_infoblox.neutron.common import dns_binding
 from networking_infoblox.neutron.common import ipam
+from networking_infoblox.neutron.common import metrics
+from networking_infoblox.neutron.common import notification
 from networking_infoblox.neutron.common import notification_handler as handler
 from networking_infoblox.neutron.common import pattern
+from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
 from networking_infoblox.tests import base
 
@@ -53,11 +57,13 @@ class TestIpamEventHandler(base.TestCase):
         payload = {'network': {}}
         self.ipam_handler.create_network_alert(payload)
         self.ipam_handler._resync.assert_called_once_with()
+        self.grid_manager.resync_interval.tighten.assert_called_once_with()
 
     def test_create_subnet_alert_should_call_resync(self):
         payload = {'subnet': {}}
         self.ipam_handler.create_subnet_alert(payload)
         self.ipam_handler._resync.assert_called_once_with()
+        self.grid_manager.resync_interval.tighten.assert_called_once_with()
 
     def test_update_network_sync(self):
         payload = {'network': {}}
@@ -146,6 +152,40 @@ class TestIpamEventHandler(base.TestCase):
             True,
             mock.ANY)
 
+    def test_get_mapping_neutron_subnet(self):
+        subnets = [{'id': 'subnet-1', 'network_id': 'net-id',
+                    'cidr': '172.24.4.0/24'},
+                   {'id': 'subnet-2', 'network_id': 'net-id',
+                    'cidr': '172.24.5.0/24'}]
+        self.plugin.get_subnets_by_network.return_value = subnets
+
+        subnet = self.ipam_handler._get_mapping_neutron_subnet(
+            'net-id', '172.24.5.3')
+        self.assertEqual(subnets[1], subnet)
+        subnet = self.ipam_handler._get_mapping_neutron_subnet(
+            'net-id', '172.24.4.3')
+        self.assertEqual(subnets[0], subnet)
+        # subnets are fetched once for the network
+        self.plugin.get_subnets_by_network.assert_called_once_with(
+            self.context, 'net-id')
+
+        # subnet notifications keep the index current
+        new_subnet = {'id': 'subnet-3', 'network_id': 'net-id',
+                      'cidr': '172.24.6.0/24'}
+        self.ipam_handler.create_subnet_sync({'subnet': new_subnet})
+        self.ipam_handler.delete_subnet_sync({'subnet_id': 'subnet-1'})
+        self.assertEqual(new_subnet,
+                         self.ipam_handler._get_mapping_neutron_subnet(
+                             'net-id', '172.24.6.3'))
+        self.assertEqual(1, self.plugin.get_subnets_by_network.call_count)
+
+        # unknown ip triggers reload in case notification was missed
+        self.plugin.get_subnets_by_network.return_value = [subnets[1],
+                                                           new_subnet]
+        self.assertIsNone(self.ipam_handler._get_mapping_neutron_subnet(
+            'net-id', '172.24.4.3'))
+        self.assertEqual(2, self.plugin.get_subnets_by_network.call_count)
+
     @mock.patch.object(dbi, 'get_instance', mock.Mock())
     @mock.patch('networking_infoblox.neutron.common.context.InfobloxContext')
     def test_get_instance_name_from_fip(self, ib_cxt_mock):
@@ -370,3 +410,154 @@ class TestIpamEventHandler(base.TestCase):
                 ip_address, None, port_id, tenant_id, None, 'compute:nova',
                 port_name=port_name)
         ]
+
+    def test_process_records_metrics(self):
+        event_type = 'network.create.start'
+        handled = metrics.EVENTS.get(event_type=event_type, result='handled')
+        errors = metrics.EVENTS.get(event_type=event_type, result='error')
+        lags = metrics.EVENT_LAG_SECONDS.get_count()
+        metadata = {'timestamp': '2016-01-28 19:44:56.123456'}
+        self.ipam_handler.context = mock.MagicMock()
+
+        self.ipam_handler.process({}, 'network', event_type, {}, metadata)
+        self.ipam_handler._resync.side_effect = ValueError
+        self.ipam_handler.process({}, 'network', event_type, {}, {})
+
+        self.assertEqual(handled + 1, metrics.EVENTS.get(
+            event_type=event_type, result='handled'))
+        self.assertEqual(errors + 1, metrics.EVENTS.get(
+            event_type=event_type, result='error'))
+        self.assertEqual(lags + 1, metrics.EVENT_LAG_SECONDS.get_count())
+
+    def test_process_trace_only_event(self):
+        self.ipam_handler.context = mock.MagicMock()
+        self.ipam_handler.ctxt = {'user_id': 'user-id'}
+
+        self.assertTrue(self.ipam_handler.is_trace_only('port.delete.end'))
+        self.ipam_handler.process({'user_id': 'other-user-id'}, 'network',
+                                  'port.delete.end', {'port_id': 'port-id'},
+                                  {})
+        self.assertFalse(self.ipam_handler.context.session.begin.called)
+        self.assertEqual({'user_id': 'user-id'}, self.ipam_handler.ctxt)
+
+        self.assertFalse(self.ipam_handler.is_trace_only('port.update.end'))
+        with mock.patch.object(handler.dns_binding, 'is_enabled',
+                               return_value=True):
+            self.assertFalse(
+                self.ipam_handler.is_trace_only('port.create.end'))
+
+    def test_process_opens_transaction_for_db_writes_only(self):
+        self.ipam_handler.context = mock.MagicMock()
+        begin = self.ipam_handler.context.session.begin
+        self.ipam_handler.update_floatingip_sync = mock.Mock(
+            needs=frozenset([handler.DB_READ, handler.WAPI]),
+            needs_when=None)
+        self.ipam_handler.create_instance_sync = mock.Mock(
+            needs=frozenset([handler.DB_WRITE, handler.WAPI]),
+            needs_when=None)
+
+        self.ipam_handler.process({'user_id': 'user-id'}, 'network',
+                                  'floatingip.update.end', {}, {})
+        self.assertFalse(begin.called)
+        self.assertEqual('user-id', self.ipam_handler.user_id)
+        self.ipam_handler.update_floatingip_sync.assert_called_once_with({})
+
+        self.ipam_handler.process({}, 'compute', 'compute.instance.create.end',
+                                  {}, {})
+        begin.assert_called_once_with(subtransactions=True)
+        self.ipam_handler.create_instance_sync.assert_called_once_with({})
+
+    def test_handlers_declare_needs(self):
+        event_types = notification.NotificationEndpoint.event_subscription_list
+        for event_type in event_types:
+            handler_method = getattr(
+                self.ipam_handler,
+                utils.get_notification_handler_name(event_type))
+            self.assertIsInstance(handler_method.needs, frozenset,
+                                  event_type)
+        # binding names and registering service members write to db
+        self.assertIn(handler.DB_WRITE,
+                      self.ipam_handler.update_floatingip_sync.needs)
+
+    @mock.patch.object(context, 'InfobloxContext', mock.Mock())
+    @mock.patch.object(dns, 'DnsController', mock.Mock())
+    def test_process_port_reads_subnet_once(self):
+        subnet = {'id': 'subnet-id', 'cidr': '10.0.0.0/24'}
+        self.plugin.get_subnet = mock.Mock(return_value=subnet)
+        port = {'id': 'port-id',
+                'name': 'port-name',
+                'tenant_id': 'tenant-id',
+                'device_id': 'device-id',
+                'device_owner': 'compute:nova',
+                'fixed_ips': [{'subnet_id': 'subnet-id',
+                               'ip_address': '10.0.0.3'},
+                              {'subnet_id': 'subnet-id',
+                               'ip_address': '10.0.0.4'}]}
+        self.ipam_handler._process_port(port, 'Port update', 'instance')
+        self.ipam_handler._process_port(port, 'Port update', 'instance')
+        self.plugin.get_subnet.assert_called_once_with(mock.ANY, 'subnet-id')
+        self.assertEqual(1, context.InfobloxContext.call_count)
+
+        # subnet update notification replaces the cached subnet
+        updated_subnet = dict(subnet, name='new-name')
+        self.ipam_handler.update_subnet_sync({'subnet': updated_subnet})
+        self.ipam_handler._process_port(port, 'Port update', 'instance')
+        self.plugin.get_subnet.assert_called_once_with(mock.ANY, 'subnet-id')
+        context.InfobloxContext.assert_called_with(
+            mock.ANY, mock.ANY, None, updated_subnet, mock.ANY, mock.ANY,
+            mock.ANY, mock.ANY, mock.ANY)
+
+    @mock.patch.object(context, 'InfobloxContext', mock.Mock())
+    @mock.patch.object(dns, 'DnsController', mock.Mock())
+    def test_update_caches(self):
+        subnet = {'id': 'subnet-id', 'network_id': 'network-id',
+                  'cidr': '10.0.0.0/24', 'name': 'subnet-name'}
+        self.plugin.get_subnet = mock.Mock(return_value=subnet)
+        port = {'id': 'port-id',
+                'name': 'port-name',
+                'tenant_id': 'tenant-id',
+                'device_id': 'device-id',
+                'device_owner': 'compute:nova',
+                'fixed_ips': [{'subnet_id': 'subnet-id',
+                               'ip_address': '10.0.0.3'}]}
+
+        updated_subnet = dict(subnet, name='new-name')
+        self.ipam_handler.update_caches('subnet.update.end',
+                                        {'subnet': updated_subnet})
+        self.ipam_handler._process_port(port, 'Port update', 'instance')
+        self.assertFalse(self.plugin.get_subnet.called)
+        context.InfobloxContext.assert_called_with(
+            mock.ANY, mock.ANY, None, updated_subnet, mock.ANY, mock.ANY,
+            mock.ANY, mock.ANY, mock.ANY)
+
+        self.ipam_handler.update_caches('subnet.delete.end',
+                                        {'subnet_id': 'subnet-id'})
+        self.ipam_handler._process_port(port, 'Port update', 'instance')
+        self.plugin.get_subnet.assert_called_once_with(mock.ANY, 'subnet-id')
+        self.assertFalse(self.ipam_handler._resync.called)
+
+    @mock.patch.object(context, 'InfobloxContext', mock.Mock())
+    @mock.patch.object(dns, 'DnsController')
+    def test_create_port_sync_binds_queued_dns_names(self, dns_mock):
+        self.ipam_handler._dns_binding_queue = mock.Mock()
+        port = {'id': 'port-id',
+                'name': 'port-name',
+                'tenant_id': 'tenant-id',
+                'device_id': 'device-id',
+                'device_owner': 'compute:nova'}
+        self.plugin.get_subnet = mock.Mock(return_value={'id': 'subnet-id'})
+
+        self.ipam_handler.create_port_sync({'port': port})
+        self.ipam_handler._dns_binding_queue.drain.assert_not_called()
+
+        with mock.patch.object(dns_binding, 'is_enabled', return_value=True):
+            self.ipam_handler.create_port_sync({'port': port})
+        self.ipam_handler._dns_binding_queue.drain.assert_called_once_with(
+            self.ipam_handler._bind_dns_binding_job, ['port-id'])
+
+        job = mock.Mock(subnet_id='subnet-id', ip_address='10.0.0.3',
+                        user_id='user-id')
+        self.ipam_handler._bind_dns_binding_job(job, port)
+        dns_mock.return_value.bind_names.assert_called_once_with(
+            '10.0.0.3', None, 'port-id', 'tenant-id', 'device-id',
+            'compute:nova', port_name='port-name')
@@ -0,0 +1,106 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from networking_infoblox.neutron.common import subnet_index
+from networking_infoblox.tests import base
+
+
+class PrefixTreeTestCase(base.TestCase):
+
+    def test_lookup_longest_prefix(self):
+        tree = subnet_index.PrefixTree(4)
+        tree.insert('10.0.0.0/8', 'a')
+        tree.insert('10.1.0.0/16', 'b')
+        tree.insert('10.1.1.0/24', 'c')
+        self.assertEqual(3, len(tree))
+        self.assertEqual('c', tree.lookup('10.1.1.5'))
+        self.assertEqual('b', tree.lookup('10.1.2.5'))
+        self.assertEqual('a', tree.lookup('10.2.0.1'))
+        self.assertIsNone(tree.lookup('11.0.0.1'))
+
+        tree.remove('10.1.0.0/16')
+        self.assertEqual(2, len(tree))
+        self.assertEqual('a', tree.lookup('10.1.2.5'))
+        self.assertEqual('c', tree.lookup('10.1.1.5'))
+
+    def test_lookup_ipv6(self):
+        tree = subnet_index.PrefixTree(6)
+        tree.insert('fd00:1::/64', 'a')
+        tree.insert('fd00:2::/64', 'b')
+        self.assertEqual('a', tree.lookup('fd00:1::10'))
+        self.assertEqual('b', tree.lookup('fd00:2::ffff'))
+        self.assertIsNone(tree.lookup('fd00:3::1'))
+
+
+class SubnetIndexTestCase(base.TestCase):
+
+    def setUp(self):
+        super(SubnetIndexTestCase, self).setUp()
+        self.subnets = [
+            {'id': 'subnet-1', 'network_id': 'net-1',
+             'cidr': '172.24.4.0/24'},
+            {'id': 'subnet-2', 'network_id': 'net-1',
+             'cidr': '172.24.5.0/24'},
+            {'id': 'subnet-3', 'network_id': 'net-1',
+             'cidr': '2001:db8::/64'}]
+        self.index = subnet_index.SubnetIndex(ttl=60)
+        self.index.load_network('net-1', self.subnets)
+
+    def test_find_subnet(self):
+        self.assertTrue(self.index.is_loaded('net-1'))
+        self.assertFalse(self.index.is_loaded('net-2'))
+        self.assertEqual(self.subnets[0],
+                         self.index.find_subnet('net-1', '172.24.4.10'))
+        self.assertEqual(self.subnets[1],
+                         self.index.find_subnet('net-1', '172.24.5.10'))
+        self.assertEqual(self.subnets[2],
+                         self.index.find_subnet('net-1', '2001:db8::10'))
+        self.assertIsNone(self.index.find_subnet('net-1', '172.24.6.10'))
+        self.assertIsNone(self.index.find_subnet('net-2', '172.24.4.10'))
+
+    def test_add_and_remove_subnet(self):
+        new_subnet = {'id': 'subnet-4', 'network_id': 'net-1',
+                      'cidr': '172.24.6.0/24'}
+        self.index.add_subnet(new_subnet)
+        self.assertEqual(new_subnet,
+                         self.index.find_subnet('net-1', '172.24.6.10'))
+        self.assertEqual(new_subnet,
+                         self.index.get_subnet('net-1', 'subnet-4'))
+
+        self.index.remove_subnet('subnet-1')
+        self.assertIsNone(self.index.find_subnet('net-1', '172.24.4.10'))
+        self.assertIsNone(self.index.get_subnet('net-1', 'subnet-1'))
+
+        # subnet of not indexed network is ignored
+        self.index.add_subnet({'id': 'subnet-5', 'network_id': 'net-2',
+                               'cidr': '10.0.0.0/24'})
+        self.assertFalse(self.index.is_loaded('net-2'))
+
+    def test_remove_network(self):
+        self.index.remove_network('net-1')
+        self.assertFalse(self.index.is_loaded('net-1'))
+        self.assertIsNone(self.index.find_subnet('net-1', '172.24.4.10'))
+
+    @mock.patch('time.time')
+    def test_ttl(self, time_mock):
+        time_mock.return_value = 1000
+        index = subnet_index.SubnetIndex(ttl=60)
+        index.load_network('net-1', self.subnets)
+        time_mock.return_value = 1059
+        self.assertTrue(index.is_loaded('net-1'))
+        time_mock.return_value = 1060
+        self.assertFalse(index.is_loaded('net-1'))
@@ -0,0 +1,125 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+from oslo_serialization import jsonutils
+
+from neutron.tests.unit import testlib_api
+from neutron_lib import context
+
+from networking_infoblox.neutron.common import sync_profile
+from networking_infoblox.neutron.db import infoblox_db as dbi
+
+from networking_infoblox.tests import base
+
+
+class SyncProfileTestCase(base.TestCase, testlib_api.SqlTestCase):
+
+    def setUp(self):
+        super(SyncProfileTestCase, self).setUp()
+        self.ctx = context.get_admin_context()
+        self.grid_config = mock.Mock(context=self.ctx)
+        self.hooks = {'response': []}
+        self.grid_config.gm_connector.session.hooks = self.hooks
+
+    def _call_wapi(self):
+        for hook in self.hooks['response']:
+            hook(mock.Mock())
+
+    def test_phases_count_wapi_calls_and_db_statements(self):
+        profile = sync_profile.SyncProfile(self.grid_config)
+        with profile:
+            with profile.phase(sync_profile.PHASE_MEMBERS):
+                self._call_wapi()
+                self._call_wapi()
+                profile.add_objects(3)
+            with profile.phase(sync_profile.PHASE_DB_WRITES):
+                dbi.get_last_sync_time(self.ctx.session)
+            self._call_wapi()
+
+        members = profile.phases[sync_profile.PHASE_MEMBERS]
+        db_writes = profile.phases[sync_profile.PHASE_DB_WRITES]
+        self.assertEqual((2, 3, 0), (members.wapi_calls, members.objects,
+                                     members.db_statements))
+        self.assertEqual(0, db_writes.wapi_calls)
+        self.assertLess(0, db_writes.db_statements)
+        self.assertEqual(3, profile.wapi_calls)
+        self.assertEqual(3, profile.objects)
+
+        # hooks and listeners are removed once the profile is stopped
+        self.assertEqual([], self.hooks['response'])
+        dbi.get_last_sync_time(self.ctx.session)
+        self.assertEqual(db_writes.db_statements, profile.db_statements)
+
+    def test_db_statements_of_other_greenthreads_are_not_counted(self):
+        profile = sync_profile.SyncProfile(self.grid_config)
+        with profile:
+            with profile.phase(sync_profile.PHASE_DB_WRITES):
+                eventlet.spawn(dbi.get_last_sync_time,
+                               context.get_admin_context().session).wait()
+        self.assertEqual(0, profile.db_statements)
+
+    def test_phase_opened_twice_accumulates(self):
+        profile = sync_profile.SyncProfile()
+        for i in range(2):
+            with profile.phase(sync_profile.PHASE_NETWORKS):
+                profile.add_objects(2)
+        profile.add_objects(5)
+        self.assertEqual([sync_profile.PHASE_NETWORKS],
+                         list(profile.phases))
+        self.assertEqual(4, profile.objects)
+
+    def test_to_json(self):
+        profile = sync_profile.SyncProfile(self.grid_config)
+        with profile:
+            for name in (sync_profile.PHASE_MEMBERS,
+                         sync_profile.PHASE_CONFIG,
+                         sync_profile.PHASE_NETWORK_VIEWS,
+                         sync_profile.PHASE_NETWORKS,
+                         sync_profile.PHASE_DB_WRITES):
+                with profile.phase(name):
+                    self._call_wapi()
+                    profile.add_objects(10000)
+
+        value = profile.to_json()
+        self.assertLessEqual(len(value), 255)
+        stored = jsonutils.loads(value)
+        self.assertEqual([1, 10000],
+                         stored[sync_profile.PHASE_NETWORKS][1:3])
+        self.assertEqual([5, 50000], stored['total'][1:3])
+        self.assertEqual(50000, profile.to_dict()['objects'])
+
+    def test_to_json_is_bounded(self):
+        profile = sync_profile.SyncProfile()
+        for name in (sync_profile.PHASE_MEMBERS,
+                     sync_profile.PHASE_CONFIG,
+                     sync_profile.PHASE_NETWORK_VIEWS,
+                     sync_profile.PHASE_NETWORKS,
+                     sync_profile.PHASE_DB_WRITES):
+            with profile.phase(name) as phase:
+                phase.seconds = 12345.678
+                phase.wapi_calls = 10 ** 6
+                phase.db_statements = 10 ** 7
+                profile.add_objects(10 ** 8)
+
+        value = profile.to_json()
+        self.assertLessEqual(len(value), sync_profile.MAX_JSON_LENGTH)
+        stored = jsonutils.loads(value)
+        self.assertEqual(5 * 10 ** 8, stored['total'][2])
+        self.assertIn(sync_profile.PHASE_MEMBERS, stored)
+        self.assertNotIn(sync_profile.PHASE_DB_WRITES, stored)
+        self.assertEqual({'total': stored['total']},
+                         jsonutils.loads(profile.to_json(max_length=60)))
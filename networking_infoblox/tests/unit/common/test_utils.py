@@ -554,6 +554,35 @@ class TestUtils(testlib_api.SqlTestCase):
         self.assertEqual(expected,
                          utils.get_notification_handler_name(event_type))
 
+        # names are worked out once per event type
+        with mock.patch.dict(utils._notification_handler_names,
+                             {'port.update.end': 'cached_name'}):
+            self.assertEqual(
+                'cached_name',
+                utils.get_notification_handler_name('port.update.end'))
+
+    def test_get_notification_resource_id(self):
+        self.assertEqual('port-id', utils.get_notification_resource_id(
+            'port.update.end', {'port': {'id': 'port-id'}}))
+        self.assertEqual('port-id', utils.get_notification_resource_id(
+            'port.delete.end', {'port_id': 'port-id'}))
+        self.assertEqual('net-id', utils.get_notification_resource_id(
+            'network.create.end', {'networks': [{'id': 'net-id'}]}))
+        self.assertEqual('vm-id', utils.get_notification_resource_id(
+            'compute.instance.create.end', {'instance_id': 'vm-id'}))
+        self.assertIsNone(utils.get_notification_resource_id(
+            'floatingip.update.end', {}))
+        # ports of an instance go where the instance events go
+        self.assertEqual('vm-id', utils.get_notification_resource_id(
+            'port.update.end', {'port': {'id': 'port-id',
+                                         'device_id': 'vm-id',
+                                         'device_owner': 'compute:nova'}}))
+        self.assertEqual('port-id', utils.get_notification_resource_id(
+            'port.update.end', {'port': {'id': 'port-id',
+                                         'device_id': 'router-id',
+                                         'device_owner':
+                                             'network:router_interface'}}))
+
     def test_generate_network_view_name(self):
         self.assertRaises(ValueError, utils.generate_network_view_name, None)
         self.assertRaises(ValueError, utils.generate_network_view_name, [])
@@ -14,6 +14,8 @@
 #    under the License.
 
 from datetime import datetime
+from datetime import timedelta
+import mock
 from oslo_db import exception as db_exc
 from oslo_serialization import jsonutils
 
@@ -22,6 +24,7 @@ from neutron.tests.unit import testlib_api
 from neutron_lib import context
 
 from networking_infoblox.neutron.common import constants as const
+from networking_infoblox.neutron.common import member_scheduler
 from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db
 
@@ -35,6 +38,12 @@ class InfobloxDbTestCase(testlib_api.SqlTestCase):
         self.grid_name = "Test Grid 1000"
         self.grid_connection = "{}"
         self.grid_status = "ON"
+        # placements made by other tests must not affect member selection
+        scheduler_patch = mock.patch.object(
+            member_scheduler, 'scheduler',
+            member_scheduler.MemberScheduler(policy='least_loaded'))
+        scheduler_patch.start()
+        self.addCleanup(scheduler_patch.stop)
 
     def _create_tenants(self, tenants):
         for id, name in tenants.items():
@@ -69,6 +78,25 @@ class InfobloxDbTestCase(testlib_api.SqlTestCase):
         tenant = infoblox_db.get_tenant(self.ctx.session, 'tenant-id2')
         self.assertEqual('tenant-name2', tenant.tenant_name)
 
+    def test_add_or_update_tenants(self):
+        self._create_tenants({'tenant-id1': 'tenant-name1',
+                              'tenant-id2': 'tenant-name2'})
+        written = infoblox_db.add_or_update_tenants(
+            self.ctx.session, {'tenant-id1': 'tenant-name1',
+                               'tenant-id2': 'tenant-name-updated',
+                               'tenant-id3': 'tenant-name3'})
+        self.assertEqual(2, written)
+        tenants = {t.tenant_id: t.tenant_name
+                   for t in infoblox_db.get_tenants(self.ctx.session)}
+        self.assertEqual({'tenant-id1': 'tenant-name1',
+                          'tenant-id2': 'tenant-name-updated',
+                          'tenant-id3': 'tenant-name3'}, tenants)
+
+        self.assertEqual(0, infoblox_db.add_or_update_tenants(
+            self.ctx.session, {'tenant-id3': 'tenant-name3'}))
+        self.assertEqual(0, infoblox_db.add_or_update_tenants(
+            self.ctx.session, {}))
+
     def _create_default_grid(self):
         infoblox_db.add_grid(self.ctx.session, self.grid_id, self.grid_name,
                              self.grid_connection, self.grid_status,
@@ -620,6 +648,82 @@ class InfobloxDbTestCase(testlib_api.SqlTestCase):
         expected = 'm6'
         self.assertEqual(expected, authority_member.member_id)
 
+    def test_member_loads(self):
+        self._create_default_grid()
+        member_list = [{'member_id': 'm1',
+                        'member_name': 'm1.com',
+                        'member_ip': '10.10.1.1',
+                        'member_ipv6': None,
+                        'member_type': 'GM',
+                        'member_status': 'ON'},
+                       {'member_id': 'm2',
+                        'member_name': 'm2.com',
+                        'member_ip': '10.10.1.2',
+                        'member_ipv6': None,
+                        'member_type': 'CPM',
+                        'member_status': 'ON'}]
+        self._create_members(member_list, self.grid_id)
+        session = self.ctx.session
+        self.assertEqual({}, infoblox_db.get_member_loads(session,
+                                                          self.grid_id))
+
+        # no load is recorded before the first grid sync
+        infoblox_db.add_member_load(session, 'm1', networks=1)
+        self.assertEqual({}, infoblox_db.get_member_loads(session,
+                                                          self.grid_id))
+
+        infoblox_db.set_member_loads(
+            session, self.grid_id,
+            {'m1': member_scheduler.MemberLoad(networks=2, zones=1),
+             'm2': member_scheduler.MemberLoad()})
+        infoblox_db.add_member_load(session, 'm2', networks=1)
+        self.assertEqual(
+            {'m1': member_scheduler.MemberLoad(networks=2, zones=1),
+             'm2': member_scheduler.MemberLoad(networks=1)},
+            infoblox_db.get_member_loads(session, self.grid_id))
+
+        infoblox_db.set_member_loads(
+            session, self.grid_id,
+            {'m1': member_scheduler.MemberLoad(ranges=3)})
+        self.assertEqual(
+            {'m1': member_scheduler.MemberLoad(ranges=3)},
+            infoblox_db.get_member_loads(session, self.grid_id))
+        self.assertEqual({}, infoblox_db.get_member_loads(session, 200))
+
+    def test_get_next_authority_member_for_ipam_with_synced_loads(self):
+        self._create_default_grid()
+        member_list = [{'member_id': 'm%d' % i,
+                        'member_name': 'm%d.com' % i,
+                        'member_ip': '10.10.1.%d' % i,
+                        'member_ipv6': None,
+                        'member_type': 'GM' if i == 1 else 'CPM',
+                        'member_status': 'ON'} for i in range(1, 4)]
+        self._create_members(member_list, self.grid_id)
+        self._create_network_views({'default': 'm1'})
+        # loads synced by the ipam agent
+        infoblox_db.set_member_loads(
+            self.ctx.session, self.grid_id,
+            {'m1': member_scheduler.MemberLoad(networks=10),
+             'm2': member_scheduler.MemberLoad(networks=5, zones=4),
+             'm3': member_scheduler.MemberLoad(networks=8)})
+
+        # a neutron server worker has a scheduler without fed loads
+        session = context.get_admin_context().session
+        with mock.patch.object(member_scheduler, 'scheduler',
+                               member_scheduler.MemberScheduler(
+                                   policy='least_loaded', weights={})):
+            selected = [
+                infoblox_db.get_next_authority_member_for_ipam(
+                    session, self.grid_id).member_id for i in range(3)]
+        # placements are recorded, so the next selections see them
+        self.assertEqual('m3', selected[0])
+        self.assertEqual(['m2', 'm3', 'm3'], sorted(selected))
+        loads = infoblox_db.get_member_loads(self.ctx.session, self.grid_id)
+        self.assertEqual(member_scheduler.MemberLoad(networks=6, zones=4),
+                         loads['m2'])
+        self.assertEqual(member_scheduler.MemberLoad(networks=10),
+                         loads['m3'])
+
     def test_get_next_authority_member_for_dhcp_with_no_cpm(self):
         # prepare grid
         self._create_default_grid()
@@ -869,6 +973,53 @@ class InfobloxDbTestCase(testlib_api.SqlTestCase):
                                                  db_service_members)
         self.assertIsNone(m2m_dhcp_member)
 
+    def test_add_service_member_if_missing(self):
+        self._create_default_grid()
+        member_list = [{'member_id': 'm1',
+                        'member_name': 'm1.com',
+                        'member_ip': '10.10.1.1',
+                        'member_ipv6': None,
+                        'member_type': const.MEMBER_TYPE_GRID_MASTER,
+                        'member_status': 'ON'}]
+        self._create_members(member_list, self.grid_id)
+        self._create_network_views({'default': 'm1'})
+        netview = infoblox_db.get_network_views(self.ctx.session)[0]
+
+        self.assertTrue(infoblox_db.add_service_member_if_missing(
+            self.ctx.session, netview.id, 'm1', const.SERVICE_TYPE_DHCP))
+        # registering the same service member again is no-op
+        self.assertFalse(infoblox_db.add_service_member_if_missing(
+            self.ctx.session, netview.id, 'm1', const.SERVICE_TYPE_DHCP))
+
+        db_service_members = infoblox_db.get_service_members(
+            self.ctx.session, netview.id)
+        self.assertEqual(1, len(db_service_members))
+
+    def test_add_service_member_if_missing_keeps_outer_transaction(self):
+        self._create_default_grid()
+        member_list = [{'member_id': 'm1',
+                        'member_name': 'm1.com',
+                        'member_ip': '10.10.1.1',
+                        'member_ipv6': None,
+                        'member_type': const.MEMBER_TYPE_GRID_MASTER,
+                        'member_status': 'ON'}]
+        self._create_members(member_list, self.grid_id)
+        self._create_network_views({'default': 'm1'})
+        netview = infoblox_db.get_network_views(self.ctx.session)[0]
+        session = self.ctx.session
+
+        with session.begin(subtransactions=True):
+            self.assertTrue(infoblox_db.add_service_member_if_missing(
+                session, netview.id, 'm1', const.SERVICE_TYPE_DHCP))
+            self.assertFalse(infoblox_db.add_service_member_if_missing(
+                session, netview.id, 'm1', const.SERVICE_TYPE_DHCP))
+            # the duplicate does not end the transaction of the caller
+            infoblox_db.add_service_member(session, netview.id, 'm1',
+                                           const.SERVICE_TYPE_DNS)
+
+        self.assertEqual(2, len(infoblox_db.get_service_members(
+            session, netview.id)))
+
     def _create_instances(self, instances):
         for id, name in instances.items():
             infoblox_db.add_instance(self.ctx.session, id, name)
@@ -925,3 +1076,97 @@ class InfobloxDbTestCase(testlib_api.SqlTestCase):
                                           'network-id2', 'network-name2')
         network = infoblox_db.get_network(self.ctx.session, 'network-id2')
         self.assertEqual('network-name2', network.network_name)
+
+    def test_migration_checkpoints(self):
+        infoblox_db.add_migration_checkpoint(self.ctx.session, 'subnet',
+                                             'subnet-id1', 'created')
+        infoblox_db.add_migration_checkpoint(self.ctx.session, 'subnet',
+                                             'subnet-id2', 'mapped')
+        infoblox_db.add_migration_checkpoint(self.ctx.session, 'port',
+                                             'port-id1:10.0.0.3', 'synced')
+        # adding existing checkpoint overrides its status
+        infoblox_db.add_migration_checkpoint(self.ctx.session, 'subnet',
+                                             'subnet-id2', 'created')
+
+        subnets = infoblox_db.get_migration_checkpoints(self.ctx.session,
+                                                        'subnet')
+        self.assertEqual({'subnet-id1': 'created', 'subnet-id2': 'created'},
+                         subnets)
+        ports = infoblox_db.get_migration_checkpoints(self.ctx.session,
+                                                      'port')
+        self.assertEqual({'port-id1:10.0.0.3': 'synced'}, ports)
+
+        infoblox_db.clear_migration_checkpoints(self.ctx.session)
+        self.assertEqual({}, infoblox_db.get_migration_checkpoints(
+            self.ctx.session, 'subnet'))
+
+    def test_infoblox_objects(self):
+        infoblox_db.add_infoblox_object(self.ctx.session, 'host/ref-1#mac-1',
+                                        'record:host', 'mac-1', 1)
+        infoblox_db.add_infoblox_object(self.ctx.session, 'host/ref-1#mac-2',
+                                        'record:host', 'mac-2', 2)
+        infoblox_db.add_infoblox_object(self.ctx.session, 'host/ref-2#mac-1',
+                                        'record:host', 'mac-1', 1)
+
+        objs = infoblox_db.get_infoblox_objects(
+            self.ctx.session, object_type='record:host', search_hash=1,
+            neutron_object_id='mac-1')
+        self.assertEqual(set(['host/ref-1#mac-1', 'host/ref-2#mac-1']),
+                         set(o.object_id for o in objs))
+
+        infoblox_db.remove_infoblox_objects(self.ctx.session,
+                                            object_id_prefix='host/ref-1#')
+        objs = infoblox_db.get_infoblox_objects(self.ctx.session)
+        self.assertEqual(['host/ref-2#mac-1'], [o.object_id for o in objs])
+
+        infoblox_db.remove_infoblox_objects(self.ctx.session,
+                                            object_ids=['host/ref-2#mac-1'])
+        self.assertEqual([], infoblox_db.get_infoblox_objects(
+            self.ctx.session))
+
+    def test_operation_value(self):
+        self.assertIsNone(infoblox_db.get_operation_value(self.ctx.session,
+                                                          'test_op'))
+        infoblox_db.set_operation_value(self.ctx.session, 'test_op', 'a')
+        infoblox_db.set_operation_value(self.ctx.session, 'test_op', 'b')
+        self.assertEqual('b', infoblox_db.get_operation_value(
+            self.ctx.session, 'test_op'))
+
+    def test_dns_binding_jobs(self):
+        session = self.ctx.session
+        job1 = infoblox_db.add_dns_binding_job(session, 'port-1', 'subnet-1',
+                                               '10.0.0.3', 'user-id')
+        job2 = infoblox_db.add_dns_binding_job(session, 'port-2', 'subnet-1',
+                                               '10.0.0.4')
+        job3 = infoblox_db.add_dns_binding_job(session, 'port-1', 'subnet-1',
+                                               '10.0.0.5')
+        jobs = infoblox_db.get_dns_binding_jobs(session, port_ids=['port-1'])
+        self.assertEqual([job1.id, job3.id], [job.id for job in jobs])
+
+        now = datetime.utcnow()
+        lease_expired = now - timedelta(seconds=60)
+        claimed = infoblox_db.claim_dns_binding_jobs(
+            session, [job1.id, job2.id], 'token', now, lease_expired)
+        self.assertEqual(2, claimed)
+        # claimed jobs can not be claimed again until the lease expires
+        claimed = infoblox_db.claim_dns_binding_jobs(
+            session, [job1.id, job2.id], 'other', now, lease_expired)
+        self.assertEqual(0, claimed)
+        jobs = infoblox_db.get_dns_binding_jobs(
+            session, claimable_before=lease_expired)
+        self.assertEqual([job3.id], [job.id for job in jobs])
+        jobs = infoblox_db.get_dns_binding_jobs(session, claimed_by='token')
+        self.assertEqual([job1.id, job2.id], [job.id for job in jobs])
+
+        infoblox_db.release_dns_binding_jobs(session, [job1.id], failed=True)
+        session.expire_all()
+        jobs = infoblox_db.get_dns_binding_jobs(
+            session, claimable_before=lease_expired)
+        self.assertEqual([job1.id, job3.id], [job.id for job in jobs])
+        self.assertEqual(1, jobs[0].attempts)
+
+        infoblox_db.remove_dns_binding_jobs(session, job_ids=[job2.id])
+        infoblox_db.remove_dns_binding_jobs(session, subnet_id='subnet-1',
+                                            ip_address='10.0.0.5')
+        jobs = infoblox_db.get_dns_binding_jobs(session)
+        self.assertEqual([job1.id], [job.id for job in jobs])
@@ -25,6 +25,28 @@ from networking_infoblox.neutron.common import grid
 from networking_infoblox.tests import base
 
 
+def setup_config(wapi_version, grid_master_host='192.168.1.7'):
+    # config init is needed to initialize transport and config loading
+    common_config.init([])
+
+    # register infoblox stanza
+    config.register_infoblox_ipam_opts(cfg.CONF)
+    cfg.CONF.set_override("cloud_data_center_id", 100, 'infoblox')
+    cfg.CONF.set_override("ipam_agent_workers", 1, 'infoblox')
+
+    # register infoblox data center stanza
+    data_center_id = cfg.CONF.infoblox.cloud_data_center_id
+    config.register_infoblox_grid_opts(cfg.CONF, data_center_id)
+    data_center = 'infoblox-dc:%s' % data_center_id
+    cfg.CONF.set_override('grid_master_host', grid_master_host, data_center)
+    cfg.CONF.set_override('grid_master_name', 'nios-7.2.0-master.com',
+                          data_center)
+    cfg.CONF.set_override('data_center_name', 'admin', data_center)
+    cfg.CONF.set_override('admin_user_name', 'admin', data_center)
+    cfg.CONF.set_override('admin_password', 'infoblox', data_center)
+    cfg.CONF.set_override('wapi_version', wapi_version, data_center)
+
+
 class GridSyncStub(object):
 
     def __init__(self, context, connector_fixture):
@@ -34,7 +56,7 @@ class GridSyncStub(object):
     def prepare_grid_manager(self, wapi_version):
         self.wapi_version = wapi_version
 
-        self._setup_config()
+        setup_config(wapi_version)
         self.grid_mgr = grid.GridManager(self.context)
         self.grid_mgr.grid_config.gm_connector = mock.Mock()
         self.grid_mgr.member._discover_dns_settings = mock.Mock(
@@ -47,27 +69,6 @@ class GridSyncStub(object):
     def get_grid_manager(self):
         return self.grid_mgr
 
-    def _setup_config(self):
-        # config init is needed to initialize transport and config loading
-        common_config.init([])
-
-        # register infoblox stanza
-        config.register_infoblox_ipam_opts(cfg.CONF)
-        cfg.CONF.set_override("cloud_data_center_id", 100, 'infoblox')
-        cfg.CONF.set_override("ipam_agent_workers", 1, 'infoblox')
-
-        # register infoblox data center stanza
-        data_center_id = cfg.CONF.infoblox.cloud_data_center_id
-        config.register_infoblox_grid_opts(cfg.CONF, data_center_id)
-        data_center = 'infoblox-dc:%s' % data_center_id
-        cfg.CONF.set_override('grid_master_host', '192.168.1.7', data_center)
-        cfg.CONF.set_override('grid_master_name', 'nios-7.2.0-master.com',
-                              data_center)
-        cfg.CONF.set_override('data_center_name', 'admin', data_center)
-        cfg.CONF.set_override('admin_user_name', 'admin', data_center)
-        cfg.CONF.set_override('admin_password', 'infoblox', data_center)
-        cfg.CONF.set_override('wapi_version', self.wapi_version, data_center)
-
     def _prepare_discovery_resources(self):
         resource_map = base.FixtureResourceMap
 
@@ -115,3 +116,6 @@ class GridSyncStub(object):
         dnsview_json = self.fixture.get_object(dnsview_resource)
         self.grid_mgr.mapping._discover_dns_views = mock.Mock()
         self.grid_mgr.mapping._discover_dns_views.return_value = dnsview_json
+
+        self.grid_mgr.mapping._discover_ranges = mock.Mock(return_value=[])
+        self.grid_mgr.mapping._sync_host_mac_index = mock.Mock()
@@ -25,6 +25,7 @@ from oslo_config import cfg
 
 from networking_infoblox.ipam import driver as drv
 from networking_infoblox.neutron.common import grid
+from networking_infoblox.neutron.common import metrics
 from networking_infoblox.tests import base
 from networking_infoblox.tests.unit import grid_sync_stub
 
@@ -251,6 +252,33 @@ class TestDriver(base.TestCase, testlib_api.SqlTestCase):
             port['device_id'],
             port['device_owner'])
 
+    @mock.patch.object(drv.dns_binding, 'enqueue')
+    @mock.patch.object(drv.dns_binding, 'is_enabled', return_value=True)
+    @mock.patch('networking_infoblox.neutron.common.dns.DnsController')
+    @mock.patch('networking_infoblox.neutron.common.ipam.IpamSyncController')
+    @mock.patch('networking_infoblox.neutron.common.context.InfobloxContext')
+    def test_allocate_ip_with_async_dns_binding(self, ib_cxt_mock, ipam_mock,
+                                                dns_mock, enabled_mock,
+                                                enqueue_mock):
+        driver = self._mock_driver()
+        ipam_subnet = driver.get_subnet('subnet-id')
+        ipam_mock.return_value.allocate_specific_ip.return_value = (
+            '192.168.1.15')
+
+        port = self._mock_port('compute:nova')
+        address_factory = driver.get_address_request_factory()
+        address_request = address_factory.get_request(
+            self.ctx, port, {'ip_address': '192.168.1.15'})
+
+        allocated_ip = ipam_subnet.allocate(address_request)
+
+        self.assertEqual('192.168.1.15', allocated_ip)
+        dns_mock.return_value.bind_names.assert_not_called()
+        enqueue_mock.assert_called_once_with(
+            ib_cxt_mock.return_value.context.session, port['id'],
+            ipam_subnet._neutron_subnet['id'], allocated_ip,
+            ib_cxt_mock.return_value.user_id)
+
     @mock.patch('networking_infoblox.neutron.common.dns.DnsController')
     @mock.patch('networking_infoblox.neutron.common.ipam.IpamSyncController')
     @mock.patch('networking_infoblox.neutron.common.context.InfobloxContext')
@@ -298,6 +326,11 @@ class FakePool(object):
         if fail:
             raise ValueError
 
+    @drv.record_metrics
+    def remove_something(self, fail=False):
+        if fail:
+            raise ValueError
+
 
 class TestWrapper(base.TestCase):
 
@@ -320,3 +353,15 @@ class TestWrapper(base.TestCase):
         pool = FakePool(created_object)
         self.assertRaises(ValueError, pool.allocate_something, fail=True)
         self.assertEqual(True, created_object.delete.called)
+
+    def test_record_metrics(self):
+        pool = FakePool(mock.Mock())
+        calls = metrics.IPAM_DRIVER_SECONDS.get_count(
+            operation='remove_something')
+        errors = metrics.IPAM_DRIVER_ERRORS.get(operation='remove_something')
+        pool.remove_something()
+        self.assertRaises(ValueError, pool.remove_something, fail=True)
+        self.assertEqual(calls + 2, metrics.IPAM_DRIVER_SECONDS.get_count(
+            operation='remove_something'))
+        self.assertEqual(errors + 1, metrics.IPAM_DRIVER_ERRORS.get(
+            operation='remove_something'))
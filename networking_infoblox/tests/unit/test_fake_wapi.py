@@ -0,0 +1,137 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from infoblox_client import connector
+from infoblox_client import exceptions as ib_exc
+from infoblox_client import objects as ib_objects
+
+from networking_infoblox.neutron.common import multi_request
+from networking_infoblox.tests import base
+from networking_infoblox.tests import fake_wapi
+
+
+class FakeWapiTestCase(base.TestCase):
+
+    def setUp(self):
+        super(FakeWapiTestCase, self).setUp()
+        self.wapi = fake_wapi.FakeWapi()
+
+    def test_seed_from_fixtures(self):
+        self.wapi.seed_from_fixtures()
+        self.assertEqual(7, len(self.wapi.objects('member')))
+        gm = self.wapi.search('member',
+                              {'host_name': 'nios-7.2.0-master.com'})
+        self.assertIn('Default Network View Scope', gm[0]['extattrs'])
+        netviews = self.wapi.search('networkview',
+                                    {'*Cloud Adapter ID': '100'})
+        self.assertEqual(5, len(netviews))
+
+    def test_search_with_return_fields_and_paging(self):
+        for i in range(3):
+            self.wapi.create('networkview', {'name': 'view-%d' % i})
+        page = self.wapi.search('networkview', {'name~': 'view-'},
+                                {'_paging': '1', '_max_results': '2',
+                                 '_return_fields': 'name'})
+        self.assertEqual(['view-0', 'view-1'],
+                         [netview['name'] for netview in page['result']])
+        page = self.wapi.search('networkview', {'name~': 'view-'},
+                                {'_paging': '1', '_max_results': '2',
+                                 '_page_id': page['next_page_id']})
+        self.assertEqual(['view-2'],
+                         [netview['name'] for netview in page['result']])
+        self.assertNotIn('next_page_id', page)
+
+    def test_create_resolves_next_available_ip(self):
+        self.wapi.create('range', {'network_view': 'default',
+                                   'start_addr': '10.0.0.10',
+                                   'end_addr': '10.0.0.20'})
+        for expected_ip in ('10.0.0.10', '10.0.0.11'):
+            ref = self.wapi.create('record:host', {
+                'name': 'host-%s.example.com' % expected_ip,
+                'ipv4addrs': [{
+                    'ipv4addr': 'func:nextavailableip:'
+                                '10.0.0.10-10.0.0.20,default',
+                    'mac': 'aa:bb:cc:dd:ee:ff'}]})
+            host = self.wapi.read(ref)
+            self.assertEqual(expected_ip, host['ipv4addrs'][0]['ipv4addr'])
+        hosts = self.wapi.search('record:host', {'ipv4addr': '10.0.0.11'})
+        self.assertEqual(['host-10.0.0.11.example.com'],
+                         [record['name'] for record in hosts])
+
+    def test_create_rejects_duplicates(self):
+        self.wapi.create('network', {'network': '10.0.0.0/24'})
+        self.assertRaises(fake_wapi.WapiError, self.wapi.create, 'network',
+                          {'network': '10.0.0.0/24',
+                           'network_view': 'default'})
+        self.wapi.create('fixedaddress', {'ipv4addr': '10.0.0.5'})
+        self.assertRaises(fake_wapi.WapiError, self.wapi.create,
+                          'fixedaddress', {'ipv4addr': '10.0.0.5'})
+
+    def test_multi_request_rolls_back_on_error(self):
+        self.wapi.create('networkview', {'name': 'existing'})
+        self.assertRaises(fake_wapi.WapiError, self.wapi.multi_request,
+                          [{'method': 'POST', 'object': 'networkview',
+                            'data': {'name': 'new'}},
+                           {'method': 'POST', 'object': 'networkview',
+                            'data': {'name': 'existing'}}])
+        self.assertEqual(['existing'],
+                         [netview['name'] for netview in
+                          self.wapi.objects('networkview')])
+
+
+class FakeWapiServerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(FakeWapiServerTestCase, self).setUp()
+        self.wapi = fake_wapi.FakeWapi()
+        self.wapi.seed_from_fixtures()
+        self.server = fake_wapi.FakeWapiServer(self.wapi).start()
+        self.addCleanup(self.server.stop)
+        with self.server.patch_connectors():
+            self.connector = connector.Connector(
+                {'host': 'nios.example.com', 'username': 'admin',
+                 'password': 'infoblox', 'wapi_version': '2.3'})
+
+    def test_objects_round_trip(self):
+        ib_objects.Network.create(self.connector, network_view='default',
+                                  cidr='10.1.0.0/24')
+        ib_address = ib_objects.FixedAddress.create(
+            self.connector, network_view='default',
+            ip=ib_objects.IPAllocation.next_available_ip_from_cidr(
+                'default', '10.1.0.0/24'),
+            mac='fa:16:3e:00:00:01')
+        self.assertEqual('10.1.0.1', ib_address.ip)
+
+        ib_address.delete()
+        self.assertIsNone(ib_objects.FixedAddress.search(
+            self.connector, network_view='default', ip='10.1.0.1'))
+        self.assertEqual(1, self.server.calls[('POST', 'network')])
+        self.assertEqual(1, self.server.calls[('DELETE', 'fixedaddress')])
+
+    def test_errors_are_returned_to_connector(self):
+        self.assertRaises(ib_exc.InfobloxCannotCreateObject,
+                          ib_objects.NetworkView.create, self.connector,
+                          name='default', check_if_exists=False)
+
+    def test_multi_request_counts_as_one_call(self):
+        self.server.reset_calls()
+        results = multi_request.send(
+            self.connector,
+            [{'method': 'POST', 'object': 'networkview',
+              'data': {'name': 'multi'}},
+             {'method': 'GET', 'object': 'networkview',
+              'data': {'name': 'multi'}}])
+        self.assertEqual('multi', results[1][0]['name'])
+        self.assertEqual({('POST', 'request'): 1}, dict(self.server.calls))
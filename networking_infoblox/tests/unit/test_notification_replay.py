@@ -0,0 +1,82 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import fixtures
+
+from neutron.tests.unit import testlib_api
+
+from networking_infoblox.neutron.common import notification_capture
+from networking_infoblox.tests import base
+from networking_infoblox.tests import fake_wapi
+from networking_infoblox.tests.unit import grid_sync_stub
+from networking_infoblox.tools import notification_replay
+
+
+class NotificationReplayTestCase(base.TestCase, testlib_api.SqlTestCase):
+
+    def setUp(self):
+        super(NotificationReplayTestCase, self).setUp()
+        self.wapi = fake_wapi.FakeWapi()
+        self.wapi.seed_from_fixtures()
+        self.server = fake_wapi.FakeWapiServer(self.wapi).start()
+        self.addCleanup(self.server.stop)
+        patch = self.server.patch_connectors()
+        patch.start()
+        self.addCleanup(patch.stop)
+        grid_sync_stub.setup_config('2.3')
+
+    def test_capture_round_trip(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'capture.json')
+        capture = notification_capture.NotificationCapture(path)
+        capture.write({'user_id': 'user-id', 'auth_token': 'secret',
+                       'service_catalog': []},
+                      'network.host', 'port.update.end',
+                      {'port': {'id': 'port-id'}})
+        capture.close()
+
+        self.assertEqual(
+            [{'event_type': 'port.update.end',
+              'payload': {'port': {'id': 'port-id'}},
+              'ctxt': {'user_id': 'user-id'},
+              'publisher_id': 'network.host'}],
+            list(notification_capture.read_capture(path)))
+
+    def test_replay_generated_burst(self):
+        records = notification_replay.generate(ports=4, instances=2)
+        replay = notification_replay.Replay(self.server)
+        replay.prepare(records)
+        self.assertEqual(0, replay.unprepared_ips)
+
+        seconds, samples, calls, errors = replay.replay(records)
+
+        self.assertEqual({'network.create.end': 1,
+                          'subnet.create.end': 1,
+                          'port.update.end': 4,
+                          'compute.instance.create.end': 2},
+                         dict((event_type, len(latencies))
+                              for event_type, latencies in samples.items()))
+        self.assertEqual({}, dict(errors))
+        self.assertLess(0, calls['compute.instance.create.end'])
+        vm_names = dict(
+            (host['ipv4addrs'][0]['ipv4addr'],
+             host['extattrs']['VM Name']['value'])
+            for host in self.wapi.objects('record:host'))
+        self.assertEqual({'10.0.0.10': 'replay-vm-0',
+                          '10.0.0.11': 'replay-vm-1',
+                          '10.0.0.12': 'replay-vm-0',
+                          '10.0.0.13': 'replay-vm-1'}, vm_names)
@@ -0,0 +1,256 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+
+from neutron.tests.unit import testlib_api
+from neutron_lib import context
+from oslo_config import cfg
+
+from networking_infoblox.neutron.db import infoblox_db as dbi
+from networking_infoblox.tests import base
+from networking_infoblox.tools import sync_neutron_to_infoblox as migration
+
+
+class MigrationEngineTestCase(base.TestCase, testlib_api.SqlTestCase):
+
+    def setUp(self):
+        super(MigrationEngineTestCase, self).setUp()
+        self.ctx = context.get_admin_context()
+        self.subnet = {'id': 'subnet-id', 'network_id': 'network-id',
+                       'cidr': '11.11.1.0/24'}
+        self.port = {'id': 'port-id', 'name': '', 'tenant_id': 'tenant-id',
+                     'mac_address': 'fa:16:3e:00:00:01',
+                     'device_owner': 'compute:nova',
+                     'device_id': 'instance-id'}
+
+    def _get_engine(self):
+        return migration.MigrationEngine(
+            self.ctx, mock.Mock(), mock.Mock(),
+            [{'id': 'network-id', 'name': 'net'}], {}, {})
+
+    def test_cli_opts(self):
+        conf = cfg.ConfigOpts()
+        conf.register_cli_opts(migration.cli_opts)
+        conf(args=['--resume', '--workers', '4',
+                   '--workers-per-member', '1'])
+        self.assertTrue(conf.resume)
+        self.assertEqual(4, conf.workers)
+        self.assertEqual(1, conf.workers_per_member)
+        self.assertFalse(conf.delete_unknown_ips)
+
+    def test_engine_resume(self):
+        dbi.add_migration_checkpoint(self.ctx.session,
+                                     migration.SUBNET_CHECKPOINT,
+                                     'subnet-id', migration.SUBNET_CREATED)
+
+        engine = self._get_engine()
+        self.assertEqual({}, engine.subnet_checkpoints)
+        self.assertEqual({}, dbi.get_migration_checkpoints(
+            self.ctx.session, migration.SUBNET_CHECKPOINT))
+
+        dbi.add_migration_checkpoint(self.ctx.session,
+                                     migration.SUBNET_CHECKPOINT,
+                                     'subnet-id', migration.SUBNET_CREATED)
+        cfg.CONF.set_override('resume', True)
+        self.addCleanup(cfg.CONF.clear_override, 'resume')
+        engine = self._get_engine()
+        self.assertEqual({'subnet-id': migration.SUBNET_CREATED},
+                         engine.subnet_checkpoints)
+
+    @mock.patch('networking_infoblox.neutron.common.ipam.IpamSyncController')
+    def test_sync_fixed_ip_checks_subnet_created_before_resume(
+            self, ipam_controller_mock):
+        cfg.CONF.set_override('resume', True)
+        self.addCleanup(cfg.CONF.clear_override, 'resume')
+        dbi.add_migration_checkpoint(self.ctx.session,
+                                     migration.SUBNET_CHECKPOINT,
+                                     'subnet-id', migration.SUBNET_CREATED)
+        engine = self._get_engine()
+        addresses = mock.Mock()
+        addresses.is_used.return_value = True
+
+        # the ip was allocated before the previous run was interrupted
+        engine._sync_fixed_ip(self.ctx, mock.Mock(), self.subnet, self.port,
+                              '11.11.1.5', addresses)
+        addresses.is_used.assert_called_once_with('11.11.1.5')
+        ipam_controller_mock.assert_not_called()
+
+        # a subnet created by this run is not looked up
+        engine.created_subnets.add('subnet-id')
+        with mock.patch('networking_infoblox.neutron.common.dns.'
+                        'DnsController'):
+            engine._sync_fixed_ip(self.ctx, mock.Mock(), self.subnet,
+                                  self.port, '11.11.1.6', addresses)
+        self.assertEqual(1, addresses.is_used.call_count)
+        self.assertTrue(ipam_controller_mock.called)
+
+    def test_sync_subnets_of_new_network_view(self):
+        authority_members = {}
+        member = mock.Mock(member_name='member-1')
+
+        def build_context(context, user_id, network, subnet, grid_config,
+                          plugin=None):
+            ib_cxt = mock.Mock()
+            ib_cxt.mapping.network_view = 'new-view'
+            ib_cxt.mapping.authority_member = authority_members.get(
+                'new-view')
+            return ib_cxt
+
+        synced_members = []
+
+        def sync_ib_network(context, ib_cxt, network, subnet):
+            synced_members.append(ib_cxt.mapping.authority_member)
+            # let the other subnet wait for the network view
+            eventlet.sleep(0)
+            if not ib_cxt.mapping.authority_member:
+                authority_members['new-view'] = member
+
+        engine = self._get_engine()
+        subnets = [dict(self.subnet, id='subnet-id-%d' % i)
+                   for i in range(2)]
+        with mock.patch.object(migration.ib_context, 'InfobloxContext',
+                               side_effect=build_context):
+            with mock.patch.object(engine, '_sync_ib_network',
+                                   side_effect=sync_ib_network):
+                engine.sync_subnets(subnets)
+
+        self.assertEqual([], engine.errors)
+        # the second subnet sees the member reserved by the first one
+        self.assertEqual([None, member], synced_members)
+
+    def test_get_network_addresses_prefetches_once_per_network(self):
+        engine = self._get_engine()
+        connector = mock.Mock()
+        connector.get_object.return_value = [
+            {'ip_address': '11.11.1.5', 'objects': ['fixedaddress/ref']}]
+
+        addresses = engine._get_network_addresses(connector, 'default',
+                                                  '11.11.1.0/24')
+        for ip_address in ('11.11.1.5', '11.11.1.6', '11.11.1.5'):
+            addresses.is_used(ip_address)
+        self.assertIs(addresses, engine._get_network_addresses(
+            connector, 'default', '11.11.1.0/24'))
+        connector.get_object.assert_called_once_with(
+            'ipv4address', {'network_view': 'default',
+                            'network': '11.11.1.0/24',
+                            'status': 'USED'},
+            return_fields=['ip_address', 'objects'],
+            force_proxy=True, paging=True)
+
+        engine._get_network_addresses(connector, 'default', '11.11.2.0/24')
+        self.assertEqual(2, connector.get_object.call_count)
+
+
+class NetworkAddressesTestCase(base.TestCase):
+
+    def setUp(self):
+        super(NetworkAddressesTestCase, self).setUp()
+        self.connector = mock.Mock()
+
+    def test_is_used(self):
+        self.connector.get_object.return_value = [
+            {'ip_address': '11.11.1.5', 'objects': ['fixedaddress/ref']},
+            {'ip_address': '11.11.1.6', 'objects': []}]
+        addresses = migration.NetworkAddresses(self.connector, 'default',
+                                               '11.11.1.0/24')
+        self.assertTrue(addresses.is_used('11.11.1.5'))
+        # used by the network itself, e.g. broadcast, has no objects
+        self.assertFalse(addresses.is_used('11.11.1.6'))
+        self.assertFalse(addresses.is_used('11.11.1.7'))
+        self.assertIsNone(addresses.fixed_addresses)
+        self.assertEqual(1, self.connector.get_object.call_count)
+
+    def test_is_used_ipv6(self):
+        self.connector.get_object.return_value = [
+            {'ip_address': '2001:db8::0005', 'objects': ['ref']}]
+        addresses = migration.NetworkAddresses(self.connector, 'default',
+                                               '2001:db8::/64')
+        self.assertTrue(addresses.is_used('2001:db8:0::5'))
+        self.assertEqual('ipv6address',
+                         self.connector.get_object.call_args[0][0])
+
+    def test_fixed_addresses(self):
+        fixed_addresses = [{'_ref': 'fixedaddress/1', 'ipv4addr': '11.11.1.5',
+                            'extattrs': {}}]
+        self.connector.get_object.side_effect = [[], fixed_addresses]
+        addresses = migration.NetworkAddresses(self.connector, 'default',
+                                               '11.11.1.0/24',
+                                               with_fixed_addresses=True)
+        self.assertEqual(fixed_addresses, addresses.get_fixed_addresses())
+        self.assertEqual(fixed_addresses, addresses.get_fixed_addresses())
+        self.assertEqual(2, self.connector.get_object.call_count)
+        self.connector.get_object.assert_called_with(
+            'fixedaddress', {'network_view': 'default',
+                             'network': '11.11.1.0/24'},
+            return_fields=['ipv4addr', 'extattrs'], paging=True)
+
+
+class DeleteUnknownIpsTestCase(base.TestCase):
+
+    def _get_ib_network(self, extattrs):
+        ib_network = mock.Mock(network_view='default',
+                               network='11.11.1.0/24',
+                               extattrs=extattrs)
+        return ib_network
+
+    def _get_fixed_address(self, ref, port_id=None):
+        extattrs = {}
+        if port_id:
+            extattrs['Port ID'] = {'value': port_id}
+        return {'_ref': ref, 'ipv4addr': '11.11.1.5', 'extattrs': extattrs}
+
+    def test_delete_unknown_ips(self):
+        ib_network = self._get_ib_network({'Tenant ID': 'tenant-id'})
+        addresses = mock.Mock()
+        addresses.get_fixed_addresses.return_value = [
+            self._get_fixed_address('fixedaddress/known', 'port-id'),
+            self._get_fixed_address('fixedaddress/unknown', 'other-port-id'),
+            self._get_fixed_address('fixedaddress/no-ea')]
+        network_addresses = {('default', '11.11.1.0/24'): addresses}
+
+        with mock.patch.object(migration, 'NetworkAddresses') as na_mock:
+            migration.delete_unknown_ips([ib_network], [{'id': 'port-id'}],
+                                         network_addresses)
+            # prefetched addresses are not queried again
+            na_mock.assert_not_called()
+
+        self.assertEqual(
+            [mock.call('fixedaddress/unknown'),
+             mock.call('fixedaddress/no-ea')],
+            addresses.connector.delete_object.call_args_list)
+
+    def test_delete_unknown_ips_skips_shared_and_external(self):
+        ib_networks = [self._get_ib_network(None),
+                       self._get_ib_network({'Is Shared': 'True'}),
+                       self._get_ib_network({'Is External': 'True'})]
+        with mock.patch.object(migration, 'NetworkAddresses') as na_mock:
+            migration.delete_unknown_ips(ib_networks, [], {})
+            na_mock.assert_not_called()
+
+    def test_delete_unknown_ips_fetches_missing_network(self):
+        ib_network = self._get_ib_network({'Tenant ID': 'tenant-id'})
+        with mock.patch.object(migration, 'NetworkAddresses') as na_mock:
+            addresses = na_mock.return_value
+            addresses.get_fixed_addresses.return_value = [
+                self._get_fixed_address('fixedaddress/unknown', 'port-id')]
+            migration.delete_unknown_ips([ib_network], [], {})
+
+        na_mock.assert_called_once_with(ib_network.connector, 'default',
+                                        '11.11.1.0/24',
+                                        with_fixed_addresses=True)
+        addresses.connector.delete_object.assert_called_once_with(
+            'fixedaddress/unknown')
@@ -0,0 +1,340 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import oslo_messaging
+
+from neutron.db import models_v2
+from neutron.ipam import requests as ipam_req
+from neutron.tests.unit import testlib_api
+from neutron_lib import context as n_context
+
+from networking_infoblox.ipam import driver
+from networking_infoblox.ipam import requests
+from networking_infoblox.neutron.common import context
+from networking_infoblox.neutron.common import dns
+from networking_infoblox.neutron.common import grid
+from networking_infoblox.neutron.common import ipam
+from networking_infoblox.neutron.common import notification_handler
+from networking_infoblox.neutron.db import infoblox_db as dbi
+from networking_infoblox.tests import base
+from networking_infoblox.tests import fake_wapi
+from networking_infoblox.tests.unit import grid_sync_stub
+from networking_infoblox.tests import wapi_recorder
+
+
+# maximum number of WAPI calls and of bytes sent and received by an
+# operation; a multi request counts as one call. Byte budgets leave room
+# for generated names and references.
+GRID_SYNC_BUDGET = (54, 28000)
+RESYNC_BUDGET = (52, 28400)
+BUDGETS = {
+    'grid_sync': GRID_SYNC_BUDGET,
+    'create_subnet': (2, 3200),
+    'allocate': (6, 5600),
+    'allocate_specific': (4, 5600),
+    'deallocate': (5, 2100),
+    'delete_subnet': (5, 3900),
+    'bind_names': (2, 2900),
+    'network.create.start': RESYNC_BUDGET,
+    'subnet.create.start': RESYNC_BUDGET,
+    'network.create.end': (0, 0),
+    'network.update.end': (2, 900),
+    'network.delete.end': RESYNC_BUDGET,
+    'subnet.create.end': RESYNC_BUDGET,
+    'subnet.update.end': RESYNC_BUDGET,
+    'subnet.delete.end': RESYNC_BUDGET,
+    'port.create.end': (0, 0),
+    'port.update.end': (2, 2900),
+    'port.delete.end': (0, 0),
+    'floatingip.create.end': (0, 0),
+    'floatingip.update.end': (2, 2900),
+    'floatingip.delete.end': (0, 0),
+    'compute.instance.create.end': (2, 2900),
+    'compute.instance.delete.end': (4, 100),
+}
+
+TENANT_ID = 'tenant-id'
+NETWORK_ID = 'network-id'
+INSTANCE_ID = 'instance-id'
+
+
+class WapiBudgetTestBase(base.TestCase, testlib_api.SqlTestCase):
+    """Runs driver and agent operations against a fake WAPI.
+
+    A failing budget means an operation makes more or larger WAPI calls
+    than it used to; raise the budget only if that is intended.
+    """
+
+    def setUp(self):
+        super(WapiBudgetTestBase, self).setUp()
+        wapi = fake_wapi.FakeWapi()
+        wapi.seed_from_fixtures()
+        self.server = fake_wapi.FakeWapiServer(wapi).start()
+        self.addCleanup(self.server.stop)
+        self.recorder = wapi_recorder.WapiCallRecorder()
+        for patch in (self.server.patch_connectors(),
+                      self.recorder.patch_connectors()):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        grid_sync_stub.setup_config('2.3')
+        self.ctx = n_context.Context('user-id', TENANT_ID, is_admin=True,
+                                     tenant_name='tenant-name')
+        self.network = {'id': NETWORK_ID,
+                        'name': 'network-name',
+                        'tenant_id': TENANT_ID,
+                        'shared': False,
+                        'router:external': False}
+        self.ctx.session.add(models_v2.Network(
+            id=NETWORK_ID, name='network-name', tenant_id=TENANT_ID,
+            status='ACTIVE', admin_state_up=True))
+        self.ctx.session.flush()
+        self.plugin = mock.Mock()
+        self.plugin.get_network.return_value = self.network
+
+        self.grid_mgr = grid.GridManager(self.ctx)
+        self.grid_mgr.sync(force_sync=True)
+
+    def assertWithinBudget(self, name, func, *args, **kwargs):
+        if name is None:
+            return func(*args, **kwargs)
+        max_calls, max_bytes = BUDGETS[name]
+        self.recorder.reset()
+        result = func(*args, **kwargs)
+        self.assertTrue(
+            self.recorder.count <= max_calls,
+            "%s made %s WAPI calls, budget is %s:\n%s" % (
+                name, self.recorder.count, max_calls,
+                self.recorder.describe()))
+        self.assertTrue(
+            self.recorder.bytes <= max_bytes,
+            "%s sent and received %s bytes, budget is %s:\n%s" % (
+                name, self.recorder.bytes, max_bytes,
+                self.recorder.describe()))
+        return result
+
+    def _build_subnet(self, subnet_id, cidr, gateway_ip, pool_start,
+                      pool_end):
+        subnet = {'id': subnet_id,
+                  'name': subnet_id,
+                  'tenant_id': TENANT_ID,
+                  'network_id': NETWORK_ID,
+                  'cidr': cidr,
+                  'ip_version': 4,
+                  'gateway_ip': gateway_ip,
+                  'enable_dhcp': True,
+                  'subnetpool_id': None,
+                  'dns_nameservers': [],
+                  'allocation_pools': [{'start': pool_start,
+                                        'end': pool_end}]}
+        self.ctx.session.add(models_v2.Subnet(
+            id=subnet_id, name=subnet_id, tenant_id=TENANT_ID,
+            network_id=NETWORK_ID, cidr=cidr, ip_version=4,
+            gateway_ip=gateway_ip, enable_dhcp=True))
+        self.ctx.session.flush()
+        self.plugin.get_subnet.return_value = subnet
+        self.plugin.get_subnets.return_value = [subnet]
+        self.plugin.get_subnets_by_network.return_value = [subnet]
+        return subnet
+
+    def _build_context(self, subnet):
+        return context.InfobloxContext(self.ctx, 'user-id', self.network,
+                                       subnet, self.grid_mgr.grid_config,
+                                       plugin=self.plugin)
+
+    def _create_subnet(self, name='create_subnet'):
+        subnet = self._build_subnet('subnet-id', '10.10.0.0/24',
+                                    '10.10.0.1', '10.10.0.2', '10.10.0.254')
+        ib_cxt = self._build_context(subnet)
+        ib_network = self.assertWithinBudget(
+            name, ipam.IpamSyncController(ib_cxt).create_subnet, [],
+            dns.DnsController(ib_cxt))
+        subnet_request = ipam_req.SpecificSubnetRequest(
+            TENANT_ID, subnet['id'], subnet['cidr'], subnet['gateway_ip'])
+        return driver.InfobloxSubnet(subnet_request, subnet, ib_network,
+                                     ib_cxt)
+
+    @staticmethod
+    def _address_request(device_owner='compute:nova'):
+        return requests.InfobloxAnyAddressRequest(
+            TENANT_ID, 'fa:16:3e:00:00:01', 'port-id', INSTANCE_ID,
+            device_owner)
+
+    def _port(self, ip_address, device_owner='compute:nova'):
+        return {'id': 'port-id',
+                'name': 'port-name',
+                'tenant_id': TENANT_ID,
+                'network_id': NETWORK_ID,
+                'mac_address': 'fa:16:3e:00:00:01',
+                'device_id': INSTANCE_ID,
+                'device_owner': device_owner,
+                'binding:vif_type': 'ovs',
+                'fixed_ips': [{'subnet_id': 'subnet-id',
+                               'ip_address': ip_address}]}
+
+
+class DriverBudgetTestCase(WapiBudgetTestBase):
+
+    def test_grid_sync(self):
+        self.assertWithinBudget('grid_sync', self.grid_mgr.sync, True)
+
+    def test_create_subnet(self):
+        self._create_subnet()
+
+    def test_allocate(self):
+        ib_subnet = self._create_subnet()
+        self.assertWithinBudget('allocate', ib_subnet.allocate,
+                                self._address_request())
+
+    def test_allocate_specific(self):
+        ib_subnet = self._create_subnet()
+        self.assertWithinBudget(
+            'allocate_specific', ib_subnet.allocate,
+            requests.InfobloxFixedAddressRequest(
+                '10.10.0.20', TENANT_ID, 'fa:16:3e:00:00:02', 'port-id-2',
+                INSTANCE_ID, 'compute:nova'))
+
+    def test_deallocate(self):
+        ib_subnet = self._create_subnet()
+        ip_address = ib_subnet.allocate(self._address_request())
+        self.assertWithinBudget('deallocate', ib_subnet.deallocate,
+                                ip_address)
+
+    def test_delete_subnet(self):
+        ib_subnet = self._create_subnet()
+        ipam_controller = ipam.IpamSyncController(ib_subnet._ib_cxt)
+        self.assertWithinBudget('delete_subnet',
+                                ipam_controller.delete_subnet,
+                                ib_subnet._ib_network)
+
+    def test_bind_names(self):
+        ib_subnet = self._create_subnet()
+        ip_address = ib_subnet.allocate(
+            self._address_request(device_owner='network:dhcp'))
+        dns_controller = dns.DnsController(ib_subnet._ib_cxt)
+        self.assertWithinBudget(
+            'bind_names', dns_controller.bind_names, ip_address,
+            'instance-name', 'port-id', TENANT_ID, INSTANCE_ID,
+            'compute:nova', port_name='port-name')
+
+
+class IpamEventHandlerBudgetTestCase(WapiBudgetTestBase):
+
+    def setUp(self):
+        super(IpamEventHandlerBudgetTestCase, self).setUp()
+        self.ib_subnet = self._create_subnet(name=None)
+        self.ip_address = self.ib_subnet.allocate(self._address_request())
+        self.floating_ip = self.ib_subnet.allocate(
+            requests.InfobloxFloatingAddressRequest(
+                '10.10.0.100', TENANT_ID, 'fa:16:3e:00:00:03',
+                'floating-port-id', 'floatingip-id', 'network:floatingip'))
+        self.port = self._port(self.ip_address)
+        self.plugin.get_port.return_value = self.port
+        self.plugin.get_ports.return_value = [self.port]
+        dbi.add_or_update_instance(self.ctx.session, INSTANCE_ID,
+                                   'instance-name')
+
+        with mock.patch('neutron.manager.init'):
+            self.handler = notification_handler.IpamEventHandler(
+                self.ctx, self.plugin, self.grid_mgr)
+
+    def _process(self, event_type, payload):
+        ctxt = {'user_id': 'user-id', 'tenant_id': TENANT_ID,
+                'tenant_name': 'tenant-name'}
+        result = self.assertWithinBudget(
+            event_type, self.handler.process, ctxt, 'publisher-id',
+            event_type, payload, {})
+        self.assertEqual(oslo_messaging.NotificationResult.HANDLED, result)
+
+    def test_create_network_alert(self):
+        self._process('network.create.start', {'network': self.network})
+
+    def test_create_subnet_alert(self):
+        self._process('subnet.create.start',
+                      {'subnet': self.ib_subnet._neutron_subnet})
+
+    def test_create_network_sync(self):
+        self._process('network.create.end', {'network': self.network})
+
+    def test_update_network_sync(self):
+        self._process('network.update.end',
+                      {'network': dict(self.network, name='new-name')})
+
+    def test_delete_network_sync(self):
+        self._process('network.delete.end', {'network_id': NETWORK_ID})
+
+    def test_create_subnet_sync(self):
+        self._process('subnet.create.end',
+                      {'subnet': self.ib_subnet._neutron_subnet})
+
+    def test_update_subnet_sync(self):
+        self._process('subnet.update.end',
+                      {'subnet': self.ib_subnet._neutron_subnet})
+
+    def test_delete_subnet_sync(self):
+        self._process('subnet.delete.end', {'subnet_id': 'subnet-id'})
+
+    def test_create_port_sync(self):
+        self._process('port.create.end', {'port': self.port})
+
+    def test_update_port_sync(self):
+        self._process('port.update.end', {'port': self.port})
+
+    def test_delete_port_sync(self):
+        self._process('port.delete.end', {'port_id': 'port-id'})
+
+    def test_create_floatingip_sync(self):
+        self._process('floatingip.create.end',
+                      {'floatingip': {'id': 'floatingip-id'}})
+
+    def _floatingip(self):
+        return {'id': 'floatingip-id',
+                'tenant_id': TENANT_ID,
+                'port_id': 'port-id',
+                'fixed_ip_address': self.ip_address,
+                'floating_network_id': NETWORK_ID,
+                'floating_ip_address': self.floating_ip}
+
+    def test_update_floatingip_sync(self):
+        db_port = mock.Mock(id='floating-port-id', device_id='fip-id',
+                            device_owner='network:floatingip')
+        db_port.name = 'floating-port-name'
+        with mock.patch.object(dbi, 'get_port_by_id', return_value=db_port):
+            self._process('floatingip.update.end',
+                          {'floatingip': self._floatingip()})
+
+    def test_delete_floatingip_sync(self):
+        self._process('floatingip.delete.end',
+                      {'floatingip_id': 'floatingip-id'})
+
+    def test_create_instance_sync(self):
+        self._process('compute.instance.create.end',
+                      {'instance_id': INSTANCE_ID,
+                       'hostname': 'instance-name',
+                       'fixed_ips': [{'address': self.ip_address,
+                                      'vif_mac': 'fa:16:3e:00:00:01'}]})
+
+    def test_delete_instance_sync(self):
+        db_subnet = mock.Mock(id='subnet-id', network_id=NETWORK_ID)
+        floatingip_port = ('floating-port-id', 'fip-id',
+                           'network:floatingip', self.floating_ip,
+                           'floating-port-name')
+        with mock.patch.object(dbi, 'get_external_subnets',
+                               return_value=[db_subnet]), \
+                mock.patch.object(dbi, 'get_floatingip_ports',
+                                  return_value=[floatingip_port]):
+            self._process('compute.instance.delete.end',
+                          {'instance_id': INSTANCE_ID})
@@ -0,0 +1,113 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Records WAPI calls made through infoblox_client connectors.
+
+WapiCallRecorder.patch_connectors wraps the http session of every
+connector built while the patch is active, so calls made by connectors
+that are created deep inside the driver are recorded as well.
+"""
+
+import collections
+import re
+import threading
+
+import mock
+from six.moves.urllib import parse as urlparse
+
+from infoblox_client import connector
+
+
+WapiCall = collections.namedtuple(
+    'WapiCall', ['method', 'obj_type', 'return_fields', 'request_bytes',
+                 'reply_bytes'])
+
+
+class _RecordingSession(object):
+
+    def __init__(self, session, recorder):
+        self._session = session
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def _request(self, method, url, **opts):
+        reply = getattr(self._session, method)(url, **opts)
+        self._recorder.record(method.upper(), url, opts.get('data'),
+                              reply.content)
+        return reply
+
+    def get(self, url, **opts):
+        return self._request('get', url, **opts)
+
+    def post(self, url, **opts):
+        return self._request('post', url, **opts)
+
+    def put(self, url, **opts):
+        return self._request('put', url, **opts)
+
+    def delete(self, url, **opts):
+        return self._request('delete', url, **opts)
+
+
+class WapiCallRecorder(object):
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def patch_connectors(self):
+        configure_session = connector.Connector._configure_session
+        recorder = self
+
+        def _configure_session(conn):
+            configure_session(conn)
+            conn.session = _RecordingSession(conn.session, recorder)
+
+        return mock.patch.object(connector.Connector, '_configure_session',
+                                 _configure_session)
+
+    def record(self, method, url, data, content):
+        url = urlparse.urlsplit(url)
+        match = re.match(r'^/wapi/v[^/]+/([^/]+)', urlparse.unquote(url.path))
+        query = dict(urlparse.parse_qsl(url.query))
+        return_fields = (query.get('_return_fields') or
+                         query.get('_return_fields+'))
+        call = WapiCall(method,
+                        match.group(1) if match else None,
+                        return_fields.split(',') if return_fields else [],
+                        len(data or ''),
+                        len(content or ''))
+        with self._lock:
+            self.calls.append(call)
+
+    def reset(self):
+        with self._lock:
+            del self.calls[:]
+
+    @property
+    def count(self):
+        return len(self.calls)
+
+    @property
+    def bytes(self):
+        return sum(call.request_bytes + call.reply_bytes
+                   for call in self.calls)
+
+    def describe(self):
+        return '\n'.join('%s %s %s: %s bytes sent, %s bytes received' % (
+            call.method, call.obj_type, ','.join(call.return_fields),
+            call.request_bytes, call.reply_bytes) for call in self.calls)
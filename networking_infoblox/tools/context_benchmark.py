@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures InfobloxContext construction cost on the agent event path.
+
+Contexts are built for a subnet mapped to a cloud platform member, which
+is the case where a connector to the member is needed. The db layer is
+replaced by canned rows so only the cost of the context itself is timed.
+
+'mapping only' builds contexts the way mapping lookups use them, 'with
+managers' also builds the connector, object manager and allocators, which
+is what every construction used to cost.
+"""
+
+import argparse
+import timeit
+
+import mock
+# installs the _ builtin that networking_infoblox config needs
+import neutron  # noqa
+
+from networking_infoblox.neutron.common import constants as const
+from networking_infoblox.neutron.common import context
+from networking_infoblox.neutron.db import infoblox_db as dbi
+from networking_infoblox.neutron.db import infoblox_models as ib_models
+
+
+def build_fixtures():
+    member = {'member_id': 'member-id',
+              'member_name': 'cpm.infoblox.com',
+              'member_type': const.MEMBER_TYPE_CP_MEMBER,
+              'member_status': const.MEMBER_STATUS_ON,
+              'member_wapi': '192.168.1.10'}
+    netview = {'id': 'netview-id',
+               'network_view': 'default',
+               'authority_member_id': 'member-id',
+               'shared': False,
+               'dns_view': 'default',
+               'internal_dns_view': 'default'}
+    grid_config = mock.Mock(grid_id=1,
+                            is_cloud_wapi=True,
+                            dns_view='default',
+                            dns_support=True,
+                            dhcp_support=True,
+                            tenant_name_persistence=True,
+                            ip_allocation_strategy=(
+                                const.IP_ALLOCATION_STRATEGY_FIXED_ADDRESS),
+                            zone_creation_strategy=[
+                                const.ZONE_CREATION_STRATEGY_FORWARD])
+    grid_config.get_grid_connection.return_value = {
+        'wapi_version': '2.3',
+        'admin_user': {'name': 'admin', 'password': 'infoblox'},
+        'ssl_verify': False,
+        'http_pool_connections': 100,
+        'http_pool_maxsize': 100,
+        'http_request_timeout': 120}
+    network = {'id': 'network-id', 'name': 'net', 'tenant_id': 'tenant-id'}
+    subnet = {'id': 'subnet-id', 'name': 'subnet', 'cidr': '10.0.0.0/24',
+              'network_id': 'network-id', 'tenant_id': 'tenant-id',
+              'ip_version': 4}
+    # rows are transient db models, which allow both attribute and key
+    # access like the rows context gets from db
+    return (grid_config, [ib_models.InfobloxGridMember(**member)],
+            [ib_models.InfobloxNetworkView(**netview)], network, subnet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contexts', type=int, default=1000,
+                        help='number of contexts built per run')
+    args = parser.parse_args()
+
+    grid_config, members, netviews, network, subnet = build_fixtures()
+    neutron_context = mock.Mock(tenant_id='tenant-id', tenant_name='tenant')
+    plugin = mock.Mock()
+
+    def build(with_managers):
+        for _ in range(args.contexts):
+            ib_context = context.InfobloxContext(
+                neutron_context, 'user-id', network, subnet, grid_config,
+                plugin, members, netviews, [])
+            if with_managers:
+                ib_context.ip_alloc
+                ib_context.dhcp_port_ip_alloc
+
+    with mock.patch.object(dbi, 'get_network_view_mappings',
+                           return_value=[mock.Mock(
+                               network_view_id='netview-id')]), \
+            mock.patch.object(dbi, 'get_network_views',
+                              return_value=netviews):
+        mapping_only = timeit.timeit(lambda: build(False), number=1)
+        with_managers = timeit.timeit(lambda: build(True), number=1)
+
+    print("contexts: %d" % args.contexts)
+    for name, seconds in (('mapping only', mapping_only),
+                          ('with managers', with_managers)):
+        print("%s: %.4fs (%.3fms per context)" %
+              (name, seconds, seconds * 1000 / args.contexts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares ipam driver port allocation latency with and without async
+dns binding.
+
+Ports are allocated through the ipam driver against a FakeWapiServer
+seeded from the unit test fixtures, with every WAPI call delayed by the
+given latency, and an in-memory database. With sync dns binding the
+allocation waits for bind_names; with async dns binding it queues a job,
+and the queue is drained afterwards the way the ipam agent does, so the
+WAPI calls moved off the port create path are reported as well.
+"""
+
+import argparse
+import collections
+import time
+
+import netaddr
+from oslo_config import cfg
+
+from neutron.tests.unit import testlib_api
+
+from networking_infoblox.ipam import requests
+from networking_infoblox.neutron.common import context
+from networking_infoblox.neutron.common import dns
+from networking_infoblox.neutron.common import dns_binding
+from networking_infoblox.tests import fake_wapi
+from networking_infoblox.tools import notification_replay
+from networking_infoblox.tools import wapi_benchmark
+
+
+FIRST_IP = '10.0.1.10'
+
+
+def build_ports(prefix, count, first_ip):
+    subnet_id = notification_replay.SUBNET_ID
+    ports = []
+    for i in range(count):
+        port_id = '%s-port-%d' % (prefix, i)
+        ports.append({'id': port_id,
+                      'name': port_id,
+                      'tenant_id': notification_replay.TENANT_ID,
+                      'network_id': notification_replay.NETWORK_ID,
+                      'mac_address': 'fa:16:3e:%02x:%02x:%02x' % (
+                          (first_ip + i) // 65536 % 256,
+                          (first_ip + i) // 256 % 256, (first_ip + i) % 256),
+                      'device_id': '%s-instance-%d' % (prefix, i),
+                      'device_owner': 'compute:nova',
+                      'fixed_ips': [{'subnet_id': subnet_id,
+                                     'ip_address': str(netaddr.IPAddress(
+                                         first_ip + i))}]})
+    return ports
+
+
+class Benchmark(object):
+
+    def __init__(self, server):
+        self.server = server
+        self.replay = notification_replay.Replay(server)
+        # creates the network and subnet of the replay captures in NIOS
+        self.replay.prepare(notification_replay.generate(0, 0))
+        self.subnet = self.replay.ib_subnets[notification_replay.SUBNET_ID]
+        self.next_ip = int(netaddr.IPAddress(FIRST_IP))
+
+    def allocate(self, name, count):
+        """Returns allocation latencies and WAPI calls of count ports."""
+        ports = build_ports(name, count, self.next_ip)
+        self.next_ip += count
+        samples = []
+        call_count = self.server.call_count
+        for port in ports:
+            self.replay.plugin.add('port', port)
+            address_request = (
+                requests.InfobloxAddressRequestFactoryV2.get_request(
+                    self.replay.context, port, port['fixed_ips'][0]))
+            start = time.time()
+            self.subnet.allocate(address_request)
+            samples.append((time.time() - start) * 1000)
+        return samples, self.server.call_count - call_count
+
+    def drain(self):
+        """Binds names of queued jobs and returns time and WAPI calls."""
+        replay = self.replay
+        subnet = replay.plugin.subnets[notification_replay.SUBNET_ID]
+        network = replay.plugin.networks[subnet['network_id']]
+
+        def bind(job, port):
+            ib_cxt = context.InfobloxContext(
+                replay.context, job.user_id, network, subnet,
+                replay.grid_mgr.grid_config, plugin=replay.plugin)
+            dns.DnsController(ib_cxt).bind_names(
+                job.ip_address, None, port['id'], port['tenant_id'],
+                port['device_id'], port['device_owner'],
+                port_name=port['name'])
+
+        queue = dns_binding.DnsBindingQueue(replay.context, replay.plugin)
+        call_count = self.server.call_count
+        start = time.time()
+        done = 0
+        while True:
+            drained = queue.drain(bind)
+            if not drained:
+                break
+            done += drained
+        return done, time.time() - start, self.server.call_count - call_count
+
+
+def report(name, samples, calls):
+    print("%-20s p50 %7.1fms  p95 %7.1fms  p99 %7.1fms  %.1f WAPI/port" %
+          (name, wapi_benchmark.percentile(samples, 50),
+           wapi_benchmark.percentile(samples, 95),
+           wapi_benchmark.percentile(samples, 99),
+           float(calls) / len(samples)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ports', type=int, default=200,
+                        help='number of ports allocated per mode')
+    parser.add_argument('--latency', type=float, default=20,
+                        help='latency added to every WAPI call in ms')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='random extra latency of up to this many ms')
+    parser.add_argument('--wapi-version', default='2.3')
+    args = parser.parse_args()
+
+    wapi = fake_wapi.FakeWapi()
+    wapi.seed_from_fixtures()
+    server = fake_wapi.FakeWapiServer(wapi, latency=args.latency / 1000.0,
+                                      jitter=args.jitter / 1000.0)
+    db = testlib_api.StaticSqlFixture()
+    with server, server.patch_connectors():
+        wapi_benchmark.setup_config(server.host, args.wapi_version)
+        db.setUp()
+        try:
+            benchmark = Benchmark(server)
+            print("ports: %d, WAPI latency: %.1fms, jitter: %.1fms" %
+                  (args.ports, args.latency, args.jitter))
+            results = collections.OrderedDict()
+            for name, async_binding in (('sync', False), ('async', True)):
+                cfg.CONF.set_override('async_dns_binding', async_binding,
+                                      'infoblox')
+                results[name] = benchmark.allocate(name, args.ports)
+                report('%s dns binding' % name, *results[name])
+            done, seconds, calls = benchmark.drain()
+            print("draining %d jobs: %.1fs, %.1f WAPI/job" %
+                  (done, seconds, float(calls) / max(done, 1)))
+        finally:
+            db.cleanUp()
+
+
+if __name__ == "__main__":
+    main()
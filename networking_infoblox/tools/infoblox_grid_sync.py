@@ -25,6 +25,15 @@ from neutron_lib import context
 from networking_infoblox.neutron.common import config
 from networking_infoblox.neutron.common import grid
 
+PRINT_LINE = 72
+
+cli_opts = [
+    cfg.BoolOpt('profile',
+                default=False,
+                help='print the time, WAPI calls, objects and DB statements '
+                     'of each grid sync phase')
+]
+
 
 def register_options():
     agent_conf.register_agent_state_opts_helper(cfg.CONF)
@@ -33,11 +42,29 @@ def register_options():
                                        cfg.CONF.infoblox.cloud_data_center_id)
 
 
+def print_profile(profile):
+    print("%-16s%12s%12s%12s%16s" %
+          ('phase', 'seconds', 'WAPI calls', 'objects', 'DB statements'))
+    print("-" * PRINT_LINE)
+    for name, phase in profile.phases.items():
+        print("%-16s%12.3f%12d%12d%16d" %
+              (name, phase.seconds, phase.wapi_calls, phase.objects,
+               phase.db_statements))
+    print("-" * PRINT_LINE)
+    print("%-16s%12.3f%12d%12d%16d" %
+          ('total', profile.seconds, profile.wapi_calls, profile.objects,
+           profile.db_statements))
+
+
 def main():
+    cfg.CONF.register_cli_opts(cli_opts)
     common_config.init(sys.argv[1:])
     common_config.setup_logging()
     register_options()
-    grid.GridManager(context.get_admin_context()).sync(force_sync=True)
+    grid_manager = grid.GridManager(context.get_admin_context())
+    grid_manager.sync(force_sync=True)
+    if cfg.CONF.profile and grid_manager.last_sync_profile:
+        print_profile(grid_manager.last_sync_profile)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Replays captured notifications through the ipam agent endpoint.
+
+Captures are JSON lines of event_type, payload and ctxt, as written by the
+agent when ipam_agent_notification_capture_file is set or by the generate
+command, which builds a burst of port updates and instance creations.
+
+The replay command feeds a capture through NotificationEndpoint.info
+against a FakeWapiServer seeded from the unit test fixtures and an
+in-memory neutron plugin. Before the replay the state the neutron server
+would have created is prepared: networks and subnets found in the capture
+are created in NIOS, with a /24 or /64 around the address for subnets only
+referenced by ports, and the fixed ips of ports are allocated through the
+ipam driver. Throughput, latency and WAPI calls per event type are then
+reported; a multi request counts as one call.
+"""
+
+import argparse
+import collections
+import time
+
+import netaddr
+import oslo_messaging
+
+from neutron.db import models_v2
+from neutron.ipam import requests as ipam_req
+from neutron.tests.unit import testlib_api
+from neutron_lib import constants as n_const
+from neutron_lib import context as n_context
+from neutron_lib.plugins import directory
+
+from networking_infoblox.ipam import driver
+from networking_infoblox.ipam import requests
+from networking_infoblox.neutron.common import context
+from networking_infoblox.neutron.common import dns
+from networking_infoblox.neutron.common import grid
+from networking_infoblox.neutron.common import ipam
+from networking_infoblox.neutron.common import notification
+from networking_infoblox.neutron.common import notification_capture
+from networking_infoblox.neutron.db import infoblox_db as dbi
+from networking_infoblox.tests import fake_neutron_plugin
+from networking_infoblox.tests import fake_wapi
+from networking_infoblox.tools import wapi_benchmark
+
+
+TENANT_ID = 'replay-tenant-id'
+TENANT_NAME = 'replay-tenant'
+USER_ID = 'replay-user-id'
+NETWORK_ID = 'replay-network-id'
+SUBNET_ID = 'replay-subnet-id'
+SUBNET_CIDR = '10.0.0.0/16'
+
+
+def generate(ports, instances):
+    """Builds a capture of port updates followed by instance creations.
+
+    Ports are bound to instances round robin and every instance is created
+    after the updates of its ports, as nova does.
+    """
+    ctxt = {'user_id': USER_ID, 'tenant_id': TENANT_ID,
+            'tenant_name': TENANT_NAME}
+    network = {'id': NETWORK_ID, 'name': 'replay-network',
+               'tenant_id': TENANT_ID, 'shared': False,
+               'router:external': False}
+    subnet = {'id': SUBNET_ID, 'name': 'replay-subnet',
+              'tenant_id': TENANT_ID, 'network_id': NETWORK_ID,
+              'cidr': SUBNET_CIDR, 'ip_version': 4,
+              'gateway_ip': '10.0.0.1', 'enable_dhcp': True,
+              'subnetpool_id': None, 'dns_nameservers': [],
+              'allocation_pools': [{'start': '10.0.0.2',
+                                    'end': '10.0.255.254'}]}
+    records = [
+        notification_capture.build_record('network.create.end',
+                                          {'network': network}, ctxt),
+        notification_capture.build_record('subnet.create.end',
+                                          {'subnet': subnet}, ctxt)]
+
+    first_ip = int(netaddr.IPAddress('10.0.0.10'))
+    instance_ports = collections.defaultdict(list)
+    for i in range(ports):
+        instance_id = 'replay-instance-%d' % (i % instances)
+        port = {'id': 'replay-port-%d' % i,
+                'name': 'replay-port-%d' % i,
+                'tenant_id': TENANT_ID,
+                'network_id': NETWORK_ID,
+                'mac_address': 'fa:16:3e:%02x:%02x:%02x' % (
+                    i // 65536 % 256, i // 256 % 256, i % 256),
+                'device_id': instance_id,
+                'device_owner': 'compute:nova',
+                'binding:vif_type': 'ovs',
+                'fixed_ips': [{'subnet_id': SUBNET_ID,
+                               'ip_address': str(netaddr.IPAddress(
+                                   first_ip + i))}]}
+        instance_ports[instance_id].append(port)
+
+    for i in range(instances):
+        instance_id = 'replay-instance-%d' % i
+        for port in instance_ports[instance_id]:
+            records.append(notification_capture.build_record(
+                'port.update.end', {'port': port}, ctxt,
+                'network.replay-host'))
+        records.append(notification_capture.build_record(
+            'compute.instance.create.end',
+            {'instance_id': instance_id,
+             'hostname': 'replay-vm-%d' % i,
+             'tenant_id': TENANT_ID,
+             'fixed_ips': [{'address': port['fixed_ips'][0]['ip_address'],
+                            'vif_mac': port['mac_address']}
+                           for port in instance_ports[instance_id]]},
+            ctxt, 'compute.replay-host'))
+    return records
+
+
+def _payload_objects(record, resource):
+    payload = record['payload'] or {}
+    objs = payload.get(resource + 's') or [payload.get(resource)]
+    return [obj for obj in objs if isinstance(obj, dict) and obj.get('id')]
+
+
+class Replay(object):
+
+    def __init__(self, server):
+        self.server = server
+        self.context = n_context.Context(USER_ID, TENANT_ID, is_admin=True,
+                                         tenant_name=TENANT_NAME)
+        self.plugin = fake_neutron_plugin.FakeNeutronPlugin()
+        directory.add_plugin(n_const.CORE, self.plugin)
+        self.grid_mgr = grid.GridManager(self.context)
+        self.grid_mgr.sync(force_sync=True)
+        self.ib_subnets = {}
+        self.unprepared_ips = 0
+
+    def prepare(self, records):
+        """Creates the networks, subnets and ports the capture refers to."""
+        tenants = {}
+        ports = collections.OrderedDict()
+        for record in records:
+            ctxt = record.get('ctxt') or {}
+            if ctxt.get('tenant_id') and ctxt.get('tenant_name'):
+                tenants[ctxt['tenant_id']] = ctxt['tenant_name']
+            for network in _payload_objects(record, 'network'):
+                self.plugin.networks.setdefault(network['id'], network)
+            for subnet in _payload_objects(record, 'subnet'):
+                self.plugin.subnets.setdefault(subnet['id'], subnet)
+            for port in _payload_objects(record, 'port'):
+                ports.setdefault(port['id'], port)
+        dbi.add_or_update_tenants(self.context.session, tenants)
+
+        for port in ports.values():
+            for fixed_ip in port.get('fixed_ips') or []:
+                if fixed_ip['subnet_id'] not in self.plugin.subnets:
+                    self.plugin.add('subnet', self._build_subnet(port,
+                                                                 fixed_ip))
+        for subnet in self.plugin.subnets.values():
+            if subnet['network_id'] not in self.plugin.networks:
+                self.plugin.add('network', {
+                    'id': subnet['network_id'],
+                    'name': subnet['network_id'],
+                    'tenant_id': subnet['tenant_id'],
+                    'shared': False,
+                    'router:external': False})
+        for network in self.plugin.networks.values():
+            self._add_network(network)
+        for subnet in self.plugin.subnets.values():
+            self._create_subnet(subnet)
+        for port in ports.values():
+            self.plugin.add('port', port)
+            self._allocate_port(port)
+
+    @staticmethod
+    def _build_subnet(port, fixed_ip):
+        ip = netaddr.IPAddress(fixed_ip['ip_address'])
+        cidr = netaddr.IPNetwork('%s/%d' % (ip, 24 if ip.version == 4
+                                            else 64)).cidr
+        return {'id': fixed_ip['subnet_id'],
+                'name': fixed_ip['subnet_id'],
+                'tenant_id': port['tenant_id'],
+                'network_id': port['network_id'],
+                'cidr': str(cidr),
+                'ip_version': ip.version,
+                'gateway_ip': str(cidr[1]),
+                'enable_dhcp': True,
+                'subnetpool_id': None,
+                'dns_nameservers': [],
+                'allocation_pools': [{'start': str(cidr[2]),
+                                      'end': str(cidr[-2])}]}
+
+    def _add_network(self, network):
+        self.context.session.add(models_v2.Network(
+            id=network['id'], name=network.get('name'),
+            tenant_id=network['tenant_id'], status='ACTIVE',
+            admin_state_up=True))
+        self.context.session.flush()
+
+    def _create_subnet(self, subnet):
+        self.context.session.add(models_v2.Subnet(
+            id=subnet['id'], name=subnet.get('name'),
+            tenant_id=subnet['tenant_id'], network_id=subnet['network_id'],
+            cidr=subnet['cidr'], ip_version=subnet['ip_version'],
+            gateway_ip=subnet.get('gateway_ip'),
+            enable_dhcp=subnet.get('enable_dhcp', True)))
+        self.context.session.flush()
+        network = self.plugin.networks[subnet['network_id']]
+        ib_cxt = context.InfobloxContext(
+            self.context, USER_ID, network, subnet,
+            self.grid_mgr.grid_config, plugin=self.plugin)
+        ib_network = ipam.IpamSyncController(ib_cxt).create_subnet(
+            [], dns.DnsController(ib_cxt))
+        subnet_request = ipam_req.SpecificSubnetRequest(
+            subnet['tenant_id'], subnet['id'], subnet['cidr'],
+            subnet.get('gateway_ip'))
+        self.ib_subnets[subnet['id']] = driver.InfobloxSubnet(
+            subnet_request, subnet, ib_network, ib_cxt)
+
+    def _allocate_port(self, port):
+        for fixed_ip in port.get('fixed_ips') or []:
+            address_request = (
+                requests.InfobloxAddressRequestFactoryV2.get_request(
+                    self.context, port, fixed_ip))
+            try:
+                self.ib_subnets[fixed_ip['subnet_id']].allocate(
+                    address_request)
+            except Exception:
+                # e.g. router ports holding the gateway ip
+                self.unprepared_ips += 1
+
+    def replay(self, records):
+        """Returns wall time and latencies, calls and errors by event type."""
+        endpoint = notification.NotificationEndpoint(self.context,
+                                                     self.grid_mgr)
+        samples = collections.defaultdict(list)
+        calls = collections.Counter()
+        errors = collections.Counter()
+        start = time.time()
+        for record in records:
+            event_type = record['event_type']
+            self.plugin.update_from_notification(event_type,
+                                                 record['payload'])
+            call_count = self.server.call_count
+            event_start = time.time()
+            result = endpoint.info(record.get('ctxt') or {},
+                                   record.get('publisher_id'), event_type,
+                                   record['payload'], {})
+            samples[event_type].append((time.time() - event_start) * 1000)
+            calls[event_type] += self.server.call_count - call_count
+            if (event_type in endpoint.event_subscription_list and
+                    result != oslo_messaging.NotificationResult.HANDLED):
+                errors[event_type] += 1
+        return time.time() - start, samples, calls, errors
+
+
+def report(seconds, samples, calls, errors):
+    events = sum(len(latencies) for latencies in samples.values())
+    print("events: %d, %.1f events/s, %d WAPI calls" %
+          (events, events / seconds, sum(calls.values())))
+    print("%-30s%8s%10s%10s%12s%8s" % (
+        'event type', 'count', 'p50 ms', 'p99 ms', 'WAPI/event', 'errors'))
+    for event_type in sorted(samples):
+        latencies = samples[event_type]
+        print("%-30s%8d%10.1f%10.1f%12.1f%8d" % (
+            event_type, len(latencies),
+            wapi_benchmark.percentile(latencies, 50),
+            wapi_benchmark.percentile(latencies, 99),
+            float(calls[event_type]) / len(latencies), errors[event_type]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    generate_parser = subparsers.add_parser(
+        'generate', help='write a capture of a port update burst')
+    generate_parser.add_argument('capture')
+    generate_parser.add_argument('--ports', type=int, default=5000)
+    generate_parser.add_argument('--instances', type=int, default=2500)
+    replay_parser = subparsers.add_parser(
+        'replay', help='replay a capture against a fake WAPI')
+    replay_parser.add_argument('capture')
+    replay_parser.add_argument('--latency', type=float, default=0,
+                               help='latency added to every WAPI call in ms')
+    replay_parser.add_argument('--jitter', type=float, default=0,
+                               help='random extra latency of up to this '
+                                    'many ms')
+    replay_parser.add_argument('--wapi-version', default='2.3')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        notification_capture.write_capture(
+            args.capture, generate(args.ports, args.instances))
+        return
+
+    records = list(notification_capture.read_capture(args.capture))
+    wapi = fake_wapi.FakeWapi()
+    wapi.seed_from_fixtures()
+    server = fake_wapi.FakeWapiServer(wapi, latency=args.latency / 1000.0,
+                                      jitter=args.jitter / 1000.0)
+    db = testlib_api.StaticSqlFixture()
+    with server, server.patch_connectors():
+        wapi_benchmark.setup_config(server.host, args.wapi_version)
+        db.setUp()
+        try:
+            replay = Replay(server)
+            replay.prepare(records)
+            if replay.unprepared_ips:
+                print("%d fixed ips could not be allocated before the "
+                      "replay" % replay.unprepared_ips)
+            report(*replay.replay(records))
+        finally:
+            db.cleanUp()
+
+
+if __name__ == "__main__":
+    main()
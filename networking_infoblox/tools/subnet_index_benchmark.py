@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares floating ip subnet resolution by linear scan and by index.
+
+The linear scan mirrors what the ipam agent used to do for every floating
+ip update: build a netaddr.IPNetwork per subnet of the external network
+and check whether the address belongs to it.
+"""
+
+import argparse
+import timeit
+
+import netaddr
+# installs the _ builtin that networking_infoblox config needs
+import neutron  # noqa
+
+from networking_infoblox.neutron.common import subnet_index
+
+
+NETWORK_ID = 'external-network'
+
+
+def build_subnets(count):
+    subnets = []
+    for i in range(count):
+        subnets.append({'id': 'subnet-v4-%d' % i,
+                        'network_id': NETWORK_ID,
+                        'cidr': '10.%d.%d.0/24' % (i // 256, i % 256)})
+        subnets.append({'id': 'subnet-v6-%d' % i,
+                        'network_id': NETWORK_ID,
+                        'cidr': '2001:db8:%x::/64' % i})
+    return subnets
+
+
+def linear_scan(subnets, ip_address):
+    for subnet in subnets:
+        if netaddr.IPAddress(ip_address) in netaddr.IPNetwork(subnet['cidr']):
+            return subnet
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subnets', type=int, default=1000,
+                        help='number of subnets per ip version')
+    parser.add_argument('--lookups', type=int, default=200,
+                        help='number of lookups per run')
+    args = parser.parse_args()
+
+    subnets = build_subnets(args.subnets)
+    index = subnet_index.SubnetIndex(ttl=3600)
+    index.load_network(NETWORK_ID, subnets)
+
+    # spread lookups over the whole range so the scan is not favored
+    step = max(1, args.subnets // args.lookups)
+    addresses = []
+    for i in range(0, args.subnets, step):
+        addresses.append('10.%d.%d.10' % (i // 256, i % 256))
+        addresses.append('2001:db8:%x::10' % i)
+
+    for ip in addresses:
+        expected = linear_scan(subnets, ip)
+        assert index.find_subnet(NETWORK_ID, ip) == expected, ip
+
+    scan = timeit.timeit(
+        lambda: [linear_scan(subnets, ip) for ip in addresses], number=1)
+    lookup = timeit.timeit(
+        lambda: [index.find_subnet(NETWORK_ID, ip) for ip in addresses],
+        number=1)
+
+    print("subnets: %d, lookups: %d" % (len(subnets), len(addresses)))
+    print("linear scan: %.4fs (%.3fms per lookup)" %
+          (scan, scan * 1000 / len(addresses)))
+    print("prefix index: %.4fs (%.3fms per lookup)" %
+          (lookup, lookup * 1000 / len(addresses)))
+    if lookup:
+        print("speedup: %.1fx" % (scan / lookup))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,10 +14,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
+eventlet.monkey_patch()
+
 import ast
+import collections
 import os
 import sys
 
+from eventlet import semaphore
+import netaddr
+
 from keystoneauth1.identity import generic
 from keystoneauth1.loading import session as load_session
 
@@ -26,6 +33,7 @@ from keystoneclient.v3 import client as client_3
 
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import excutils
 
 from neutron.common import config as common_config
 from neutron_lib import context as neutron_context
@@ -43,7 +51,6 @@ from networking_infoblox.neutron.common import context as ib_context
 from networking_infoblox.neutron.common import dns
 from networking_infoblox.neutron.common import grid
 from networking_infoblox.neutron.common import ipam
-from networking_infoblox.neutron.common import utils
 from networking_infoblox.neutron.db import infoblox_db as dbi
 
 
@@ -58,12 +65,29 @@ cli_opts = [
                       'NOTE: only unknown IP in private network '
                       'will be deleted by this tool. '
                       'Unknown IP in shared/external network need '
-                      'to be deleted manually.'))
+                      'to be deleted manually.')),
+    cfg.IntOpt('workers',
+               default=10,
+               help=('Number of subnets migrated at a time.')),
+    cfg.IntOpt('workers-per-member',
+               default=2,
+               help=('Number of subnets migrated at a time against the '
+                     'same authority member.')),
+    cfg.BoolOpt('resume',
+                default=False,
+                help=('Skip subnets and ports already migrated by a '
+                      'previous run instead of starting over.'))
 ]
 
 cfg.CONF.register_cli_opts(cli_opts)
 
 NOVA_API_VERSION = '2'
+
+SUBNET_CHECKPOINT = 'subnet'
+PORT_CHECKPOINT = 'port'
+SUBNET_CREATED = 'created'
+SUBNET_MAPPED = 'mapped'
+PORT_SYNCED = 'synced'
 DEFAULT_CONFIG_FILES = ['/etc/neutron/neutron.conf']
 
 
@@ -157,12 +181,6 @@ def sync_neutron_to_infoblox(context, credentials, grid_manager):
     """
     LOG.info("Starting migration...\n")
 
-    delete_unknown_ips = cfg.CONF.delete_unknown_ips
-
-    grid_config = grid_manager.grid_config
-    grid_id = grid_config.grid_id
-    session = context.session
-
     neutron_api = neutron_client.Client(**credentials)
     payload = neutron_api.list_networks()
     networks = payload['networks']
@@ -192,42 +210,154 @@ def sync_neutron_to_infoblox(context, credentials, grid_manager):
         for fip in floating_ips:
             instance_names_by_floating_ip[fip] = server.name
 
-    user_id = neutron_api.httpclient.get_user_id()
-    user_tenant_id = neutron_api.httpclient.get_project_id()
+    engine = MigrationEngine(context, neutron_api, grid_manager.grid_config,
+                             networks, instance_names_by_instance_id,
+                             instance_names_by_floating_ip)
+    engine.sync_subnets(subnets)
+    engine.sync_ports(ports)
 
-    ib_networks = []
-    should_exit = False
+    if cfg.CONF.delete_unknown_ips:
+        delete_unknown_ips(engine.ib_networks, ports,
+                           engine.network_addresses)
 
-    # Maintaining a list of created networks to handle the case where
-    # network is deleted and zone is not deleted from NIOS.
-    # In such cases DNS records for all the ports exists in the NIOS but other
-    # data for port like MAC address, EA's are missing. This causes issues
-    # while deleting/updating the port.
-    #
-    # This list will help in identifying such networks and helps in updating
-    # all ports created by this network
-    created_subnets = []
+    engine.report()
+    LOG.info("Ending migration...")
+
+
+class MigrationEngine(object):
+    """Syncs neutron subnets and ports using a pool of greenthreads.
+
+    Subnets are synced concurrently, but not more than 'workers_per_member'
+    at a time per authority member. Ports are grouped by subnet, so one
+    InfobloxContext is built per subnet instead of one per fixed ip.
+    Completed subnets and ports are recorded in the checkpoint table and
+    skipped when the migration is run again with '--resume'. Errors are
+    collected per item and reported at the end of the migration.
+    """
 
-    # sync subnets
-    for subnet in subnets:
+    def __init__(self, context, neutron_api, grid_config, networks,
+                 instance_names_by_instance_id,
+                 instance_names_by_floating_ip):
+        self.context = context
+        self.neutron_api = neutron_api
+        self.grid_config = grid_config
+        self.networks = {network['id']: network for network in networks}
+        self.subnets = {}
+        self.instance_names_by_instance_id = instance_names_by_instance_id
+        self.instance_names_by_floating_ip = instance_names_by_floating_ip
+        self.delete_unknown_ips = cfg.CONF.delete_unknown_ips
+
+        self.user_id = neutron_api.httpclient.get_user_id()
+        self.user_tenant_id = neutron_api.httpclient.get_project_id()
+
+        self.pool = eventlet.GreenPool(cfg.CONF.workers)
+        workers_per_member = cfg.CONF.workers_per_member
+        self.member_semaphores = collections.defaultdict(
+            lambda: semaphore.Semaphore(workers_per_member))
+
+        self.ib_networks = []
+        self.network_addresses = {}
+        self.errors = []
+        self.failed_subnets = set()
+        # subnets created by this run have no addresses in NIOS yet
+        self.created_subnets = set()
+        self.synced_count = {SUBNET_CHECKPOINT: 0, PORT_CHECKPOINT: 0}
+        self.skipped_count = {SUBNET_CHECKPOINT: 0, PORT_CHECKPOINT: 0}
+
+        session = context.session
+        if cfg.CONF.resume:
+            self.subnet_checkpoints = dbi.get_migration_checkpoints(
+                session, SUBNET_CHECKPOINT)
+            self.port_checkpoints = dbi.get_migration_checkpoints(
+                session, PORT_CHECKPOINT)
+            LOG.info("Resuming migration: %s subnets and %s ports are "
+                     "already synced", len(self.subnet_checkpoints),
+                     len(self.port_checkpoints))
+        else:
+            dbi.clear_migration_checkpoints(session)
+            self.subnet_checkpoints = {}
+            self.port_checkpoints = {}
+
+    def _get_context(self):
+        # db session is not shared between greenthreads
+        context = neutron_context.get_admin_context()
+        context.auth_token = self.context.auth_token
+        context.user_id = self.context.user_id
+        context.tenant_id = self.context.tenant_id
+        return context
+
+    def _get_ib_context(self, network, subnet):
+        context = self._get_context()
+        ib_cxt = ib_context.InfobloxContext(context, self.user_id,
+                                            network, subnet,
+                                            self.grid_config,
+                                            plugin=self.neutron_api)
+        return context, ib_cxt
+
+    def _get_member_semaphore(self, ib_cxt):
+        authority_member = ib_cxt.mapping.authority_member
+        if authority_member:
+            return self.member_semaphores[authority_member.member_name]
+        # authority member is reserved on the first subnet created in the
+        # network view, so subnets of such a view are created one by one
+        key = 'network_view:%s' % ib_cxt.mapping.network_view
+        if key not in self.member_semaphores:
+            self.member_semaphores[key] = semaphore.Semaphore(1)
+        return self.member_semaphores[key]
+
+    def _add_checkpoint(self, context, object_type, object_id, status):
+        dbi.add_migration_checkpoint(context.session, object_type,
+                                     object_id, status)
+        if object_type == SUBNET_CHECKPOINT:
+            self.subnet_checkpoints[object_id] = status
+        else:
+            self.port_checkpoints[object_id] = status
+        self.synced_count[object_type] += 1
+
+    def _add_error(self, object_type, object_id, error):
+        LOG.error(_LE("Unable to sync %(type)s (%(id)s): %(error)s"),
+                  {'type': object_type, 'id': object_id, 'error': error})
+        self.errors.append((object_type, object_id, error))
+
+    def sync_subnets(self, subnets):
+        for subnet in subnets:
+            self.subnets[subnet['id']] = subnet
+            self.pool.spawn_n(self._sync_subnet, subnet)
+        self.pool.waitall()
+
+    def _sync_subnet(self, subnet):
         subnet_id = subnet['id']
-        subnet_name = subnet['name']
+        if (subnet_id in self.subnet_checkpoints and
+                not self.delete_unknown_ips):
+            self.skipped_count[SUBNET_CHECKPOINT] += 1
+            return
+
         network_id = subnet['network_id']
-        network = utils.find_one_in_list('id', network_id, networks)
+        network = self.networks.get(network_id)
         if not network:
             LOG.warning("network (%s) is not found. Skipping subnet (%s)",
                         network_id, subnet_id)
-            continue
+            return
 
-        network_name = network['name']
-        ib_cxt = ib_context.InfobloxContext(context, user_id,
-                                            network, subnet,
-                                            grid_config,
-                                            plugin=neutron_api)
+        try:
+            context, ib_cxt = self._get_ib_context(network, subnet)
+            with self._get_member_semaphore(ib_cxt):
+                if not ib_cxt.mapping.authority_member:
+                    # a subnet synced while waiting may have reserved the
+                    # authority member of the network view, so the mapping
+                    # is read again to not reserve the view a second time
+                    context, ib_cxt = self._get_ib_context(network, subnet)
+                self._sync_ib_network(context, ib_cxt, network, subnet)
+        except Exception as e:
+            self.failed_subnets.add(subnet_id)
+            self._add_error(SUBNET_CHECKPOINT, subnet_id, e)
+
+    def _sync_ib_network(self, context, ib_cxt, network, subnet):
+        subnet_id = subnet['id']
         db_mapped_netview = dbi.get_network_view_by_mapping(
-            session,
-            grid_id=grid_id,
-            network_id=network_id,
+            context.session,
+            grid_id=self.grid_config.grid_id,
+            network_id=network['id'],
             subnet_id=subnet_id)
         if db_mapped_netview:
             if len(db_mapped_netview) > 1:
@@ -239,182 +369,296 @@ def sync_neutron_to_infoblox(context, credentials, grid_manager):
                 cidr=subnet.get('cidr'))
             if ib_network:
                 LOG.info("Mapping found for network (%s), subnet (%s)",
-                         network_name, subnet_name)
-                if delete_unknown_ips:
-                    ib_networks.append(ib_network)
-                continue
+                         network['name'], subnet['name'])
+                if self.delete_unknown_ips:
+                    self.ib_networks.append(ib_network)
+                if subnet_id in self.subnet_checkpoints:
+                    self.skipped_count[SUBNET_CHECKPOINT] += 1
+                else:
+                    self._add_checkpoint(context, SUBNET_CHECKPOINT,
+                                         subnet_id, SUBNET_MAPPED)
+                return
 
         ipam_controller = ipam.IpamSyncController(ib_cxt)
         dns_controller = dns.DnsController(ib_cxt)
 
         rollback_list = []
         try:
-            ib_network = ipam_controller.create_subnet(rollback_list)
+            ib_network = ipam_controller.create_subnet(rollback_list,
+                                                       dns_controller)
             if ib_network:
-                created_subnets.append(subnet_id)
-                if delete_unknown_ips:
-                    ib_networks.append(ib_network)
-                dns_controller.create_dns_zones(rollback_list)
+                self.created_subnets.add(subnet_id)
+            if ib_network and self.delete_unknown_ips:
+                self.ib_networks.append(ib_network)
+            self._add_checkpoint(context, SUBNET_CHECKPOINT, subnet_id,
+                                 SUBNET_CREATED if ib_network
+                                 else SUBNET_MAPPED)
             LOG.info("Created network (%s), subnet (%s)",
-                     network_name, subnet_name)
+                     network['name'], subnet['name'])
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for ib_obj in reversed(rollback_list):
+                    try:
+                        ib_obj.delete()
+                    except ib_exc.InfobloxException as e:
+                        LOG.warning(_LW("Unable to delete %(obj)s due to "
+                                        "error: %(error)s."),
+                                    {'obj': ib_obj, 'error': e})
+
+    def sync_ports(self, ports):
+        fixed_ips_by_subnet = collections.OrderedDict()
+        for port in ports:
+            if port['network_id'] not in self.networks:
+                self._add_error(PORT_CHECKPOINT, port['id'],
+                                "network (%s) not found" %
+                                port['network_id'])
+                continue
+            for ip_set in port.get('fixed_ips'):
+                subnet_id = ip_set['subnet_id']
+                if subnet_id not in self.subnets:
+                    self._add_error(PORT_CHECKPOINT, port['id'],
+                                    "subnet (%s) not found" % subnet_id)
+                    continue
+                fixed_ips_by_subnet.setdefault(subnet_id, []).append(
+                    (port, ip_set['ip_address']))
+
+        for subnet_id, fixed_ips in fixed_ips_by_subnet.items():
+            self.pool.spawn_n(self._sync_subnet_ports, self.subnets[subnet_id],
+                              fixed_ips)
+        self.pool.waitall()
+
+    def _sync_subnet_ports(self, subnet, fixed_ips):
+        subnet_id = subnet['id']
+        pending = [(port, ip_address) for port, ip_address in fixed_ips
+                   if self._get_port_key(port, ip_address) not in
+                   self.port_checkpoints]
+        self.skipped_count[PORT_CHECKPOINT] += len(fixed_ips) - len(pending)
+        if not pending:
+            return
+        if subnet_id in self.failed_subnets:
+            for port, ip_address in pending:
+                self._add_error(PORT_CHECKPOINT,
+                                self._get_port_key(port, ip_address),
+                                "subnet (%s) is not synced" % subnet_id)
+            return
+
+        try:
+            network = self.networks[subnet['network_id']]
+            context, ib_cxt = self._get_ib_context(network, subnet)
         except Exception as e:
-            LOG.error(_LE("Error occurred: %(error)s"), {'error': e})
-            for ib_obj in reversed(rollback_list):
+            self._add_error(SUBNET_CHECKPOINT, subnet_id, e)
+            return
+
+        with self._get_member_semaphore(ib_cxt):
+            try:
+                addresses = self._get_network_addresses(
+                    ib_cxt.connector, ib_cxt.mapping.network_view,
+                    subnet['cidr'])
+            except Exception as e:
+                self._add_error(SUBNET_CHECKPOINT, subnet_id, e)
+                return
+
+            for port, ip_address in pending:
+                port_key = self._get_port_key(port, ip_address)
                 try:
-                    ib_obj.delete()
-                except ib_exc.InfobloxException as e:
-                    LOG.warning(_LW("Unable to delete %(obj)s due to "
-                                    "error: %(error)s."),
-                                {'obj': ib_obj, 'error': e})
-            should_exit = True
-            break
-
-    if should_exit:
-        LOG.info("Exiting due to the error in creating subnet...")
-        return
-
-    # sync ports
-    for port in ports:
+                    self._sync_fixed_ip(context, ib_cxt, subnet, port,
+                                        ip_address, addresses)
+                    self._add_checkpoint(context, PORT_CHECKPOINT, port_key,
+                                         PORT_SYNCED)
+                except Exception as e:
+                    self._add_error(PORT_CHECKPOINT, port_key, e)
+
+    @staticmethod
+    def _get_port_key(port, ip_address):
+        return '%s:%s' % (port['id'], ip_address)
+
+    def _get_network_addresses(self, connector, network_view, cidr):
+        key = (network_view, cidr)
+        if key not in self.network_addresses:
+            self.network_addresses[key] = NetworkAddresses(
+                connector, network_view, cidr,
+                with_fixed_addresses=self.delete_unknown_ips)
+        return self.network_addresses[key]
+
+    def _sync_fixed_ip(self, context, ib_cxt, subnet, port, ip_address,
+                       addresses):
         port_id = port['id']
         port_name = port['name']
         port_mac_address = port['mac_address']
-        tenant_id = port.get('tenant_id') or user_tenant_id
-        network_id = port['network_id']
+        tenant_id = port.get('tenant_id') or self.user_tenant_id
         device_owner = port['device_owner']
         device_id = port['device_id']
+        instance_name = self.instance_names_by_instance_id.get(device_id)
+        LOG.info("Adding port for %s: %s...", device_owner, ip_address)
 
-        instance_name = (instance_names_by_instance_id[device_id]
-                         if device_id in instance_names_by_instance_id
-                         else None)
+        # a subnet created by an interrupted run may already hold the ip
+        if (subnet['id'] not in self.created_subnets and
+                addresses.is_used(ip_address)):
+            LOG.info("%s is found...no need to create", ip_address)
+            return
 
-        network = utils.find_one_in_list('id', network_id, networks)
-        if not network:
-            LOG.error("network (%s) not found", network_id)
-            break
-
-        for ip_set in port.get('fixed_ips'):
-            subnet_id = ip_set['subnet_id']
-            ip_address = ip_set['ip_address']
-            LOG.info("Adding port for %s: %s...", device_owner, ip_address)
-
-            subnet = utils.find_one_in_list('id', subnet_id, subnets)
-            if not subnet:
-                should_exit = True
-                LOG.error("subnet (%s) not found", subnet_id)
-                break
-
-            ib_cxt = ib_context.InfobloxContext(context, user_id,
-                                                network, subnet,
-                                                grid_config,
-                                                plugin=neutron_api)
-            connector = ib_cxt.connector
-            netview = ib_cxt.mapping.network_view
-
-            search_fields = {
-                'network_view': netview,
-                'ip_address': ip_address
-            }
-            obj_type = ('ipv4address'if utils.get_ip_version(ip_address) == 4
-                        else 'ipv6address')
-            ib_address = connector.get_object(obj_type,
-                                              search_fields,
-                                              return_fields=['objects'],
-                                              force_proxy=True)
-            if ib_address and ib_address[0]['objects'] and (
-                    subnet_id not in created_subnets):
-                LOG.info("%s is found...no need to create", ip_address)
-                continue
+        ipam_controller = ipam.IpamSyncController(ib_cxt)
+        dns_controller = dns.DnsController(ib_cxt)
 
-            ipam_controller = ipam.IpamSyncController(ib_cxt)
-            dns_controller = dns.DnsController(ib_cxt)
-
-            # for a floating ip port, check for its association.
-            # if associated, then port info needs to be the associated port,
-            # not the floating ip port because the associated port contains
-            # actual attached device info
-            is_floating_ip = False
-            if ip_address in instance_names_by_floating_ip:
-                db_floatingip = dbi.get_floatingip_by_ip_address(session,
-                                                                 ip_address)
-                db_port = dbi.get_port_by_id(session,
-                                             db_floatingip.fixed_port_id)
-                port_id = db_port.id
-                port_name = db_port.name
-                tenant_id = db_port.tenant_id
-                device_id = db_port.device_id
-                device_owner = db_port.device_owner
-                instance_name = instance_names_by_floating_ip[ip_address]
-                is_floating_ip = True
-
-            allocated_ip = ipam_controller.allocate_specific_ip(
-                ip_address,
-                port_mac_address,
-                port_id,
-                tenant_id,
-                device_id,
-                device_owner)
-            if allocated_ip and device_owner:
-                try:
-                    dns_controller.bind_names(
-                        allocated_ip,
-                        instance_name,
-                        port_id,
-                        tenant_id,
-                        device_id,
-                        device_owner,
-                        is_floating_ip,
-                        port_name)
-                except Exception as e:
-                    should_exit = True
-                    LOG.error("Unable to allocate ip (%s): %s", ip_address, e)
+        # for a floating ip port, check for its association.
+        # if associated, then port info needs to be the associated port,
+        # not the floating ip port because the associated port contains
+        # actual attached device info
+        is_floating_ip = False
+        if ip_address in self.instance_names_by_floating_ip:
+            session = context.session
+            db_floatingip = dbi.get_floatingip_by_ip_address(session,
+                                                             ip_address)
+            db_port = dbi.get_port_by_id(session,
+                                         db_floatingip.fixed_port_id)
+            port_id = db_port.id
+            port_name = db_port.name
+            tenant_id = db_port.tenant_id
+            device_id = db_port.device_id
+            device_owner = db_port.device_owner
+            instance_name = self.instance_names_by_floating_ip[ip_address]
+            is_floating_ip = True
+
+        allocated_ip = ipam_controller.allocate_specific_ip(
+            ip_address,
+            port_mac_address,
+            port_id,
+            tenant_id,
+            device_id,
+            device_owner)
+        if allocated_ip and device_owner:
+            try:
+                dns_controller.bind_names(
+                    allocated_ip,
+                    instance_name,
+                    port_id,
+                    tenant_id,
+                    device_id,
+                    device_owner,
+                    is_floating_ip,
+                    port_name)
+            except Exception:
+                with excutils.save_and_reraise_exception():
                     ipam_controller.deallocate_ip(allocated_ip)
-                    break
 
-            LOG.info("Allocated %s", ip_address)
-
-        if should_exit:
-            LOG.info("Existing due to error in port creation...")
-            break
-
-    if delete_unknown_ips:
-        LOG.info("Start deleting unknown Fixed IP's from Infoblox...")
-        for ib_network in ib_networks:
+        LOG.info("Allocated %s", ip_address)
+
+    def report(self):
+        LOG.info("Subnets synced: %s, skipped: %s. Ports synced: %s, "
+                 "skipped: %s. Errors: %s",
+                 self.synced_count[SUBNET_CHECKPOINT],
+                 self.skipped_count[SUBNET_CHECKPOINT],
+                 self.synced_count[PORT_CHECKPOINT],
+                 self.skipped_count[PORT_CHECKPOINT],
+                 len(self.errors))
+        for object_type, object_id, error in self.errors:
+            LOG.error(_LE("Failed %(type)s (%(id)s): %(error)s"),
+                      {'type': object_type, 'id': object_id, 'error': error})
+        if self.errors:
+            LOG.info("Fix the errors above and run the tool with --resume "
+                     "to sync the failed items.")
+
+
+class NetworkAddresses(object):
+    """Addresses of a NIOS network prefetched with paged queries.
+
+    Used addresses of the network are fetched at once, so checking whether
+    a fixed ip already exists in NIOS is a set lookup instead of a WAPI call
+    per fixed ip. Fixed addresses are fetched with their 'Port ID' EA when
+    unknown ips are going to be deleted.
+    """
 
-            nw_ea = ib_network.extattrs
-            # Skip network if it doesn't have EA or if EA indicates it's
-            # shared or external.
-            if (not nw_ea or
-                    nw_ea.get('Is External') or nw_ea.get('Is Shared')):
-                continue
+    def __init__(self, connector, network_view, cidr,
+                 with_fixed_addresses=False):
+        self.connector = connector
+        self.network_view = network_view
+        self.cidr = cidr
+        ipv4 = netaddr.IPNetwork(cidr).version == 4
+        self._address_type = 'ipv4address' if ipv4 else 'ipv6address'
+        self._fixed_address_type = ('fixedaddress' if ipv4
+                                    else 'ipv6fixedaddress')
+        self._ip_field = 'ipv4addr' if ipv4 else 'ipv6addr'
+
+        self.used_ips = self._get_used_ips()
+        self.fixed_addresses = None
+        if with_fixed_addresses:
+            self.fixed_addresses = self._get_fixed_addresses()
+
+    def _get_used_ips(self):
+        search_fields = {'network_view': self.network_view,
+                         'network': self.cidr,
+                         'status': 'USED'}
+        ib_addresses = self.connector.get_object(
+            self._address_type, search_fields,
+            return_fields=['ip_address', 'objects'],
+            force_proxy=True, paging=True)
+        return set(self._normalize_ip(address['ip_address'])
+                   for address in ib_addresses or []
+                   if address.get('objects'))
+
+    def _get_fixed_addresses(self):
+        search_fields = {'network_view': self.network_view,
+                         'network': self.cidr}
+        return self.connector.get_object(
+            self._fixed_address_type, search_fields,
+            return_fields=[self._ip_field, 'extattrs'],
+            paging=True) or []
+
+    @staticmethod
+    def _normalize_ip(ip_address):
+        # ipv6 address may be written in different forms
+        return str(netaddr.IPAddress(ip_address))
+
+    def is_used(self, ip_address):
+        return self._normalize_ip(ip_address) in self.used_ips
+
+    def get_fixed_addresses(self):
+        if self.fixed_addresses is None:
+            self.fixed_addresses = self._get_fixed_addresses()
+        return self.fixed_addresses
+
+
+def delete_unknown_ips(ib_networks, ports, network_addresses):
+    LOG.info("Start deleting unknown Fixed IP's from Infoblox...")
+    port_ids = set(port['id'] for port in ports)
+    for ib_network in ib_networks:
+
+        nw_ea = ib_network.extattrs
+        # Skip network if it doesn't have EA or if EA indicates it's
+        # shared or external.
+        if (not nw_ea or
+                nw_ea.get('Is External') or nw_ea.get('Is Shared')):
+            continue
 
-            LOG.info("Searching for Fixed IP: network_view='%s', cidr='%s'" %
+        key = (ib_network.network_view, ib_network.network)
+        addresses = network_addresses.get(key)
+        if addresses is None:
+            LOG.info("Searching for Fixed IP: network_view='%s', "
+                     "cidr='%s'" % key)
+            addresses = NetworkAddresses(ib_network.connector,
+                                         ib_network.network_view,
+                                         ib_network.network,
+                                         with_fixed_addresses=True)
+        fixed_ips = addresses.get_fixed_addresses()
+
+        if not fixed_ips:
+            LOG.info("No FixedIP found: network_view='%s', cidr='%s'" %
                      (ib_network.network_view, ib_network.network))
-            fixed_ips = ib_objects.FixedAddress.search_all(
-                ib_cxt.connector,
-                network_view=ib_network.network_view,
-                network=ib_network.network)
-
-            if not fixed_ips:
-                LOG.info("No FixedIP found: network_view='%s', cidr='%s'" %
-                         (ib_network.network_view, ib_network.network))
-                continue
-
-            for fixed_ip in fixed_ips:
-                ea = fixed_ip.extattrs
-                port_id = None
-                if ea:
-                    port_id = ea.get('Port ID')
-
-                # Delete Fixed IP if:
-                #   - Fixed IP does not have 'Port ID' EA, or
-                #   - No port_id in neutron matches 'Port ID' EA value
-                if not (port_id and
-                        utils.find_one_in_list('id', port_id, ports)):
-                    LOG.info("Deleting Fixed IP from Infoblox: '%s'" %
-                             fixed_ip)
-                    fixed_ip.delete()
+            continue
 
-    LOG.info("Ending migration...")
+        for fixed_ip in fixed_ips:
+            ea = ib_objects.EA.from_dict(fixed_ip.get('extattrs'))
+            port_id = None
+            if ea:
+                port_id = ea.get('Port ID')
+
+            # Delete Fixed IP if:
+            #   - Fixed IP does not have 'Port ID' EA, or
+            #   - No port_id in neutron matches 'Port ID' EA value
+            if not (port_id and port_id in port_ids):
+                LOG.info("Deleting Fixed IP from Infoblox: '%s'" %
+                         fixed_ip['_ref'])
+                addresses.connector.delete_object(fixed_ip['_ref'])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the main driver and agent flows against a fake NIOS WAPI.
+
+A FakeWapiServer seeded from the unit test fixtures is started on a local
+port and every connector is pointed to it, so the flows run the real
+infoblox_client requests over HTTP. Neutron and infoblox tables live in
+an in-memory sqlite db.
+
+For grid sync, subnet creation, ip allocation and deallocation the number
+of operations per second, the p50 and p99 latency and the number of WAPI
+calls per operation are reported. A multi request counts as one call.
+"""
+
+import argparse
+import time
+
+import mock
+from oslo_config import cfg
+
+from neutron.common import config as common_config
+from neutron.db import models_v2
+from neutron.ipam import requests as ipam_req
+from neutron.tests.unit import testlib_api
+from neutron_lib import context as n_context
+
+from networking_infoblox.ipam import driver
+from networking_infoblox.ipam import requests
+from networking_infoblox.neutron.common import config
+from networking_infoblox.neutron.common import context
+from networking_infoblox.neutron.common import dns
+from networking_infoblox.neutron.common import grid
+from networking_infoblox.neutron.common import ipam
+from networking_infoblox.tests import fake_wapi
+
+
+TENANT_ID = 'bench-tenant-id'
+TENANT_NAME = 'bench-tenant'
+USER_ID = 'bench-user-id'
+NETWORK_ID = 'bench-network-id'
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    index = int(round(pct / 100.0 * (len(samples) - 1)))
+    return samples[index]
+
+
+def setup_config(grid_master_host, wapi_version):
+    common_config.init([])
+    config.register_infoblox_ipam_opts(cfg.CONF)
+    cfg.CONF.set_override('cloud_data_center_id', 100, 'infoblox')
+
+    data_center_id = cfg.CONF.infoblox.cloud_data_center_id
+    config.register_infoblox_grid_opts(cfg.CONF, data_center_id)
+    data_center = 'infoblox-dc:%s' % data_center_id
+    cfg.CONF.set_override('grid_master_host', grid_master_host, data_center)
+    cfg.CONF.set_override('grid_master_name', 'nios-7.2.0-master.com',
+                          data_center)
+    cfg.CONF.set_override('data_center_name', 'admin', data_center)
+    cfg.CONF.set_override('admin_user_name', 'admin', data_center)
+    cfg.CONF.set_override('admin_password', 'infoblox', data_center)
+    cfg.CONF.set_override('wapi_version', wapi_version, data_center)
+
+
+class Benchmark(object):
+
+    def __init__(self, server):
+        self.server = server
+        self.context = n_context.Context(USER_ID, TENANT_ID, is_admin=True,
+                                         tenant_name=TENANT_NAME)
+        self.plugin = mock.Mock()
+        self.network = {'id': NETWORK_ID,
+                        'name': 'bench-network',
+                        'tenant_id': TENANT_ID,
+                        'shared': False,
+                        'router:external': False}
+        self.context.session.add(models_v2.Network(
+            id=NETWORK_ID, name='bench-network', tenant_id=TENANT_ID,
+            status='ACTIVE', admin_state_up=True))
+        self.context.session.flush()
+
+        self.grid_mgr = grid.GridManager(self.context)
+        self.subnets = 0
+        self.ib_subnet = None
+        self.allocated = []
+
+    def run(self, ops, func):
+        """Calls func ops times and returns latencies, time and calls."""
+        self.server.reset_calls()
+        samples = []
+        start = time.time()
+        for i in range(ops):
+            op_start = time.time()
+            func(i)
+            samples.append((time.time() - op_start) * 1000)
+        return samples, time.time() - start, self.server.call_count
+
+    def grid_sync(self, i):
+        self.grid_mgr.sync(force_sync=True)
+
+    def _build_subnet(self, cidr, pool_start, pool_end, gateway_ip):
+        self.subnets += 1
+        return {'id': 'bench-subnet-id-%d' % self.subnets,
+                'name': 'bench-subnet-%d' % self.subnets,
+                'tenant_id': TENANT_ID,
+                'network_id': NETWORK_ID,
+                'cidr': cidr,
+                'ip_version': 4,
+                'gateway_ip': gateway_ip,
+                'enable_dhcp': True,
+                'subnetpool_id': None,
+                'dns_nameservers': [],
+                'allocation_pools': [{'start': pool_start,
+                                      'end': pool_end}]}
+
+    def _create_subnet(self, subnet):
+        ib_cxt = context.InfobloxContext(
+            self.context, USER_ID, self.network, subnet,
+            self.grid_mgr.grid_config, plugin=self.plugin)
+        ib_network = ipam.IpamSyncController(ib_cxt).create_subnet(
+            [], dns.DnsController(ib_cxt))
+        return ib_cxt, ib_network
+
+    def create_subnet(self, i):
+        prefix = '10.%d.%d' % (i // 256 + 1, i % 256)
+        subnet = self._build_subnet(prefix + '.0/24', prefix + '.2',
+                                    prefix + '.254', prefix + '.1')
+        self._create_subnet(subnet)
+
+    def prepare_allocation(self):
+        subnet = self._build_subnet('172.16.0.0/16', '172.16.0.2',
+                                    '172.16.255.254', '172.16.0.1')
+        ib_cxt, ib_network = self._create_subnet(subnet)
+        subnet_request = ipam_req.SpecificSubnetRequest(
+            TENANT_ID, subnet['id'], subnet['cidr'], subnet['gateway_ip'])
+        self.ib_subnet = driver.InfobloxSubnet(subnet_request, subnet,
+                                               ib_network, ib_cxt)
+
+    def allocate(self, i):
+        address_request = requests.InfobloxAnyAddressRequest(
+            TENANT_ID, 'fa:16:3e:%02x:%02x:%02x' % (
+                i // 65536 % 256, i // 256 % 256, i % 256),
+            'bench-port-%d' % i, 'bench-device-%d' % i, 'compute:nova')
+        self.allocated.append(self.ib_subnet.allocate(address_request))
+
+    def deallocate(self, i):
+        self.ib_subnet.deallocate(self.allocated[i])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ops', type=int, default=200,
+                        help='number of operations per flow')
+    parser.add_argument('--syncs', type=int, default=10,
+                        help='number of grid syncs')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='latency added to every WAPI call in ms')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='random extra latency of up to this many ms')
+    parser.add_argument('--wapi-version', default='2.3')
+    args = parser.parse_args()
+
+    wapi = fake_wapi.FakeWapi()
+    wapi.seed_from_fixtures()
+    server = fake_wapi.FakeWapiServer(wapi, latency=args.latency / 1000.0,
+                                      jitter=args.jitter / 1000.0)
+    db = testlib_api.StaticSqlFixture()
+    with server, server.patch_connectors():
+        setup_config(server.host, args.wapi_version)
+        db.setUp()
+        try:
+            benchmark = Benchmark(server)
+            flows = [('grid sync', args.syncs, benchmark.grid_sync),
+                     ('create subnet', args.ops, benchmark.create_subnet),
+                     ('allocate', args.ops, benchmark.allocate),
+                     ('deallocate', args.ops, benchmark.deallocate)]
+
+            print("ops: %d, wapi latency: %.1fms, jitter: %.1fms" %
+                  (args.ops, args.latency, args.jitter))
+            for name, ops, func in flows:
+                if func == benchmark.allocate:
+                    benchmark.prepare_allocation()
+                samples, seconds, calls = benchmark.run(ops, func)
+                print("%s: %.1f ops/s, p50 %.1fms, p99 %.1fms, "
+                      "%.1f WAPI calls per op" %
+                      (name, ops / seconds, percentile(samples, 50),
+                       percentile(samples, 99), float(calls) / ops))
+        finally:
+            db.cleanUp()
+
+
+if __name__ == "__main__":
+    main()